@@ -0,0 +1,283 @@
+"""
+End-to-end benchmark of the Cobra colorization stages.
+
+Builds an Engine around small randomly initialized components (causal DiT,
+control model, VAE with GSRP head, CLIP encoder and res_skip line
+extractor) and runs extraction, reference indexing, retrieval,
+colorization and GSRP refinement over a matrix of reference counts,
+top_k, resolutions from ratio_list and step counts. For every
+configuration it reports the latency of each stage, the peak RSS (and
+peak accelerator memory on CUDA) and the denoising throughput in latent
+tokens per second.
+
+Every configuration runs in its own subprocess, because ru_maxrss is the
+high-water mark of the whole process: measured in one process, each row
+would report at least the peak of every row before it. The reported peak
+RSS therefore covers the interpreter, the tiny models and one
+configuration, a fixed overhead that is the same for every row.
+
+Nothing is downloaded, so the script runs on CPU and can be used to catch
+performance regressions or to size hardware. The timings reflect the
+model shapes of the tiny components, not those of the released
+checkpoints; `--scale` shrinks the ratio_list resolutions so the matrix
+stays fast on CPU (use `--scale 1` for the real page sizes).
+
+Usage:
+    python Test/benchmark_cobra.py [--references 1 10 200] [--top-k 1 3]
+        [--resolutions 0 4 12] [--steps 4 10] [--scale 0.25] [--json out.json]
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from peft import LoraConfig
+from transformers import CLIPImageProcessor, CLIPVisionConfig, CLIPVisionModelWithProjection
+
+from diffusers import (
+    AutoencoderKL,
+    CausalSparseDiTControlModel,
+    CausalSparseDiTModel,
+    CobraPixArtAlphaPipeline,
+    DPMSolverMultistepScheduler,
+)
+from cobra_engine import Engine, ratio_list
+from cobra_utils.style_bank import StyleBank
+from cobra_utils.utils import MultiHiddenResNetModel, res_skip
+
+
+STAGES = ["extract", "index", "retrieve", "colorize", "refine"]
+MODEL_KWARGS = dict(
+    num_attention_heads=4,
+    attention_head_dim=16,
+    in_channels=4,
+    out_channels=8,
+    num_layers=4,
+    sample_size=32,
+    patch_size=2,
+    cross_attention_dim=64,
+    norm_num_groups=4,
+)
+# Four down blocks downsample by 8 like the PixArt VAE; the encoder returns
+# conv_in plus one hidden state per down block for the GSRP head
+VAE_BLOCK_OUT_CHANNELS = (8, 16, 16, 16)
+GSRP_CHANNELS = [8, 8, 16, 16, 16]
+
+
+def build_engine(device, dtype):
+    """Build an Engine around tiny randomly initialized components."""
+    torch.manual_seed(0)
+    transformer = CausalSparseDiTModel(caption_channels=32, **MODEL_KWARGS)
+    vae = AutoencoderKL(
+        down_block_types=("DownEncoderBlock2D",) * len(VAE_BLOCK_OUT_CHANNELS),
+        up_block_types=("UpDecoderBlock2D",) * len(VAE_BLOCK_OUT_CHANNELS),
+        block_out_channels=VAE_BLOCK_OUT_CHANNELS,
+        latent_channels=4,
+        norm_num_groups=4,
+    )
+
+    lora_config = LoraConfig(r=4, lora_alpha=4, init_lora_weights="gaussian", target_modules=["to_k", "to_q", "to_v"])
+    style_bank = StyleBank(transformer, lora_config)
+    for style, adapter_name in (("line", "line"), ("line + shadow", "shadow")):
+        controlnet = CausalSparseDiTControlModel(cond_chanels=9, **MODEL_KWARGS)
+        gsrp_model = MultiHiddenResNetModel(GSRP_CHANNELS, len(GSRP_CHANNELS)).eval()
+        style_bank.add_style(style, adapter_name, {}, controlnet, gsrp_model)
+    transformer.to(device, dtype=dtype)
+    style_bank.to(device, dtype=dtype)
+
+    pipeline = CobraPixArtAlphaPipeline(
+        vae=vae,
+        transformer=transformer,
+        controlnet=style_bank.activate("line + shadow").controlnet,
+        scheduler=DPMSolverMultistepScheduler(),
+    )
+    pipeline.register_prompt_embeds(torch.randn(12, 32), torch.ones(12, dtype=torch.int64))
+    pipeline.set_progress_bar_config(disable=True)
+    pipeline = pipeline.to(device, dtype)
+
+    clip_config = CLIPVisionConfig(
+        hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=2, projection_dim=16, image_size=224, patch_size=32
+    )
+    return Engine.from_components(
+        line_model=res_skip().eval().to(device),
+        image_encoder=CLIPVisionModelWithProjection(clip_config).eval().to(device, dtype=dtype),
+        image_processor=CLIPImageProcessor(),
+        pipeline=pipeline,
+        style_bank=style_bank,
+        model_path="/nonexistent",
+        device=device,
+        dtype=dtype,
+    )
+
+
+def random_image(width, height, seed):
+    rng = np.random.RandomState(seed)
+    return Image.fromarray(rng.randint(0, 255, (height, width, 3), dtype=np.uint8))
+
+
+def scaled_resolution(idx, scale):
+    """Scale an entry of ratio_list, keeping both sides multiples of 32."""
+    width, height = ratio_list[idx]
+    return [max(32, int(round(width * scale / 32)) * 32), max(32, int(round(height * scale / 32)) * 32)]
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process in MB, over its whole lifetime."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def synchronize(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def run_config(engine, num_references, top_k, resolution, steps, seed=0):
+    """
+    Run every stage once for one configuration.
+
+    Returns:
+        Dictionary with the configuration, stage timings in seconds,
+        peak memory and denoising throughput
+    """
+    device = engine.device
+    width, height = resolution
+    page = random_image(width, height, seed)
+    references = [random_image(width, height, 1000 + idx) for idx in range(num_references)]
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+
+    timings = {}
+
+    def timed(stage, fn, *args, **kwargs):
+        synchronize(device)
+        start = time.perf_counter()
+        with torch.no_grad():
+            result = fn(*args, **kwargs)
+        synchronize(device)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    extracted_line, hint_mask = timed("extract", engine.extract_line_image, page, resolution)
+    reference_index = engine.build_reference_index(references)
+    timed("index", reference_index.prepare, [resolution])
+    reference_patches = timed("retrieve", engine.retrieve, page, resolution, top_k, reference_index)
+    colorized = timed(
+        "colorize",
+        engine.colorize,
+        extracted_line,
+        reference_patches,
+        resolution,
+        seed,
+        steps,
+        hint_mask,
+        page,
+    )
+    timed("refine", engine.refine, colorized, extracted_line, resolution)
+
+    # tokens of the page the transformer denoises at every step
+    patch_size = engine.pipeline.transformer.config.patch_size
+    latent_scale = engine.pipeline.vae_scale_factor * patch_size
+    tokens = (width // latent_scale) * (height // latent_scale)
+
+    result = {
+        "references": num_references,
+        "reference_patches": len(reference_index.get_bucket(resolution)),
+        "top_k": top_k,
+        "resolution": resolution,
+        "steps": steps,
+        "timings": timings,
+        "total": sum(timings.values()),
+        "tokens_per_step": tokens,
+        "tokens_per_sec": tokens * steps / timings["colorize"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if device.type == "cuda":
+        result["peak_cuda_mb"] = torch.cuda.max_memory_allocated(device) / (1024 * 1024)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--references', type=int, nargs='+', default=[1, 10, 200],
+                        help="Numbers of reference images")
+    parser.add_argument('--top-k', type=int, nargs='+', default=[3],
+                        help="Reference patches retrieved per query patch")
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[0, 4, 12],
+                        help="Indices into ratio_list")
+    parser.add_argument('--steps', type=int, nargs='+', default=[4],
+                        help="Denoising step counts")
+    parser.add_argument('--scale', type=float, default=0.25,
+                        help="Scale applied to the ratio_list resolutions")
+    parser.add_argument('--device', type=str, default="cpu")
+    parser.add_argument('--fp16', action='store_true', help="Run the models in float16 (accelerators only)")
+    parser.add_argument('--json', type=str, default=None, help="Write the results to this JSON file")
+    parser.add_argument('--config', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.config is not None:
+        # child process: run one configuration and report it as the last line of stdout
+        num_references, top_k, resolution, steps = json.loads(args.config)
+        engine = build_engine(torch.device(args.device), torch.float16 if args.fp16 else torch.float32)
+        # warm-up run so the configuration does not pay one-time allocation costs
+        run_config(engine, 1, 1, resolution, 2)
+        print(json.dumps(run_config(engine, num_references, top_k, resolution, steps)))
+        return
+
+    for idx in args.resolutions:
+        if not 0 <= idx < len(ratio_list):
+            parser.error(f"resolution index {idx} out of range 0-{len(ratio_list) - 1}")
+
+    def run_isolated(num_references, top_k, resolution, steps):
+        command = [sys.executable, __file__, '--device', args.device,
+                   '--config', json.dumps([num_references, top_k, resolution, steps])]
+        if args.fp16:
+            command.append('--fp16')
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            sys.exit(f"Configuration {num_references} refs, top_k {top_k}, {resolution}, {steps} steps failed:\n"
+                     f"{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    print("\n" + "="*118)
+    print(f"Cobra end-to-end benchmark (device {args.device}, scale {args.scale}, one process per row)")
+    print("="*118)
+    header = f"   {'refs':>4} {'top_k':>5} {'resolution':>10} {'steps':>5}"
+    header += "".join(f" {stage + ' (s)':>13}" for stage in STAGES)
+    header += f" {'total (s)':>9} {'tok/s':>9} {'RSS (MB)':>9}"
+    print(header)
+
+    results = []
+    for resolution_idx in args.resolutions:
+        resolution = scaled_resolution(resolution_idx, args.scale)
+        for num_references in args.references:
+            for top_k in args.top_k:
+                for steps in args.steps:
+                    result = run_isolated(num_references, top_k, resolution, steps)
+                    results.append(result)
+                    line = f"   {num_references:>4} {top_k:>5} {'x'.join(map(str, resolution)):>10} {steps:>5}"
+                    line += "".join(f" {result['timings'][stage]:>13.3f}" for stage in STAGES)
+                    line += f" {result['total']:>9.3f} {result['tokens_per_sec']:>9.0f} {result['peak_rss_mb']:>9.0f}"
+                    if "peak_cuda_mb" in result:
+                        line += f" (cuda {result['peak_cuda_mb']:.0f} MB)"
+                    print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"device": args.device, "scale": args.scale, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
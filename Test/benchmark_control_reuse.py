@@ -0,0 +1,144 @@
+"""
+Quality-vs-speed report for controlnet residual reuse.
+
+Runs CobraPixArtAlphaPipeline with the controlnet on every step and with the
+reuse schedules (`control_every_n_steps`, `control_max_steps`,
+`control_reuse`) across several step counts. It reports the wall time, the
+number of controlnet calls, and the PSNR / max abs error against the
+every-step output.
+
+Tiny random-weight components are used so the script runs on CPU. They
+measure scheduling overhead and numerical drift, not the visual quality
+of the released checkpoints. The VAE posterior is read through its mode
+(as in Test/test_cobra_pipeline.py), so the schedules differ from the
+baseline only by the controlnet reuse, not by posterior samples drawn from
+the global RNG.
+
+Usage:
+    python Test/benchmark_control_reuse.py [--steps 10 20] [--size 64]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from diffusers import (
+    AutoencoderKL,
+    CausalSparseDiTControlModel,
+    CausalSparseDiTModel,
+    CobraPixArtAlphaPipeline,
+    DPMSolverMultistepScheduler,
+)
+from diffusers.models.autoencoders.vae import DiagonalGaussianDistribution
+
+
+SCHEDULES = [
+    ("every step", {}),
+    ("every 2, hold", {"control_every_n_steps": 2}),
+    ("every 2, linear", {"control_every_n_steps": 2, "control_reuse": "linear"}),
+    ("every 3, hold", {"control_every_n_steps": 3}),
+    ("first 50%, hold", {"control_max_steps": 0.5}),
+]
+
+
+def build_pipeline():
+    torch.manual_seed(0)
+    common = dict(
+        num_attention_heads=4,
+        attention_head_dim=16,
+        in_channels=4,
+        out_channels=8,
+        num_layers=14,
+        sample_size=32,
+        patch_size=2,
+        cross_attention_dim=64,
+        norm_num_groups=4,
+    )
+    transformer = CausalSparseDiTModel(caption_channels=32, **common)
+    controlnet = CausalSparseDiTControlModel(cond_chanels=9, **common)
+    for param in controlnet.adapter_linear.parameters():
+        torch.nn.init.normal_(param, std=0.02)
+    vae = AutoencoderKL(
+        down_block_types=("DownEncoderBlock2D",) * 2,
+        up_block_types=("UpDecoderBlock2D",) * 2,
+        block_out_channels=(8, 16),
+        latent_channels=4,
+        norm_num_groups=4,
+    )
+    pipe = CobraPixArtAlphaPipeline(vae=vae, transformer=transformer, controlnet=controlnet, scheduler=DPMSolverMultistepScheduler())
+    pipe.register_prompt_embeds(torch.randn(12, 32), torch.ones(12, dtype=torch.int64))
+    pipe.set_progress_bar_config(disable=True)
+    return pipe
+
+
+def random_image(width, height, seed):
+    rng = np.random.RandomState(seed)
+    return Image.fromarray(rng.randint(0, 255, (height, width, 3), dtype=np.uint8))
+
+
+def psnr(a, b):
+    mse = float(np.mean((a - b) ** 2))
+    return float('inf') if mse == 0 else 10 * np.log10(1.0 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, nargs='+', default=[10, 20])
+    parser.add_argument('--size', type=int, default=64)
+    args = parser.parse_args()
+
+    pipe = build_pipeline()
+    # the tiny VAE downsamples by 2, so the hint mask is half the page size
+    size = args.size
+    inputs = {
+        "cond_input": random_image(size, size, 1),
+        "cond_refs": [[random_image(size // 2, size // 2, 10 + q)] for q in range(4)],
+        "hint_mask": Image.new("RGB", (size // 2, size // 2), "black"),
+        "hint_color": random_image(size, size, 2),
+    }
+
+    # VAE encodes sample without the generator; use the mode so runs are comparable
+    DiagonalGaussianDistribution.sample = lambda self, generator=None: self.mode()
+
+    # warm-up run so the first timed schedule does not pay one-time allocation costs
+    with torch.no_grad():
+        pipe(**inputs, num_inference_steps=2, generator=torch.Generator().manual_seed(0), output_type="np")
+
+    calls = []
+    original_forward = pipe.controlnet.forward
+    pipe.controlnet.forward = lambda *a, **kw: calls.append(1) or original_forward(*a, **kw)
+
+    print("\n" + "="*78)
+    print("Controlnet residual reuse ({0}x{0} page)".format(size))
+    print("="*78)
+    print(f"   {'steps':>5}  {'schedule':<18} {'calls':>5} {'time (s)':>9} {'speedup':>8} {'PSNR (dB)':>10} {'max err':>8}")
+    for steps in args.steps:
+        baseline = None
+        for name, options in SCHEDULES:
+            options = dict(options)
+            if isinstance(options.get("control_max_steps"), float):
+                options["control_max_steps"] = max(1, int(steps * options["control_max_steps"]))
+            calls.clear()
+            torch.manual_seed(0)
+            generator = torch.Generator().manual_seed(0)
+            start = time.perf_counter()
+            with torch.no_grad():
+                image = pipe(**inputs, num_inference_steps=steps, generator=generator, output_type="np", **options)[0]
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = (image, elapsed)
+            print(
+                f"   {steps:>5}  {name:<18} {len(calls):>5} {elapsed:>9.3f} {baseline[1] / elapsed:>7.2f}x"
+                f" {psnr(image, baseline[0]):>10.2f} {np.abs(image - baseline[0]).max():>8.4f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
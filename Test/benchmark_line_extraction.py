@@ -0,0 +1,121 @@
+"""
+Throughput benchmark of the batched line extractor.
+
+Runs a randomly initialized res_skip (same shapes as the released
+checkpoint) through LineExtractor over synthetic pages of one ratio_list
+resolution and reports pages/sec for every batch size, optionally in
+float16/bfloat16, channels_last and with torch.compile. The first entry
+(batch size 1 in float32) corresponds to the former one-page-at-a-time
+extraction.
+
+Usage:
+    python Test/benchmark_line_extraction.py [--batch-sizes 1 2 4 8] [--pages 32]
+        [--resolution 0] [--scale 0.5] [--device cuda] [--dtype fp16]
+        [--channels-last] [--compile] [--json out.json]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cobra_engine import ratio_list
+from cobra_utils.line_extractor import LineExtractor
+from cobra_utils.utils import res_skip
+
+
+DTYPES = {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}
+
+
+def synchronize(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def make_pages(num_pages, width, height):
+    rng = np.random.RandomState(0)
+    return [rng.randint(0, 255, (height, width), dtype=np.uint8) for _ in range(num_pages)]
+
+
+def benchmark(extractor, pages, repeats):
+    """Return the best pages/sec over `repeats` passes after one warm-up pass."""
+    device = extractor.device
+    extractor.extract(pages[:extractor.max_batch_size])
+    synchronize(device)
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        lines = extractor.extract(pages)
+        # include the copy back to host the caller needs
+        lines = [line.cpu() for line in lines]
+        synchronize(device)
+        best = max(best, len(pages) / (time.perf_counter() - start))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Pages per forward")
+    parser.add_argument('--pages', type=int, default=16, help="Pages per pass")
+    parser.add_argument('--resolution', type=int, default=0, help="Index into ratio_list")
+    parser.add_argument('--scale', type=float, default=0.5,
+                        help="Scale applied to the ratio_list resolution")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed passes per batch size")
+    parser.add_argument('--device', type=str, default="cpu")
+    parser.add_argument('--dtype', choices=sorted(DTYPES), default="fp32")
+    parser.add_argument('--channels-last', action='store_true')
+    parser.add_argument('--compile', action='store_true', help="Wrap the network with torch.compile")
+    parser.add_argument('--json', type=str, default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if not 0 <= args.resolution < len(ratio_list):
+        parser.error(f"resolution index {args.resolution} out of range 0-{len(ratio_list) - 1}")
+    width, height = (max(16, int(side * args.scale)) for side in ratio_list[args.resolution])
+    device = torch.device(args.device)
+    pages = make_pages(args.pages, width, height)
+
+    torch.manual_seed(0)
+    model = res_skip().eval()
+
+    print("\n" + "="*60)
+    print(f"Line extraction throughput ({device}, {args.dtype}, {width}x{height})")
+    print("="*60)
+    print(f"   {'batch':>5} {'pages/s':>10} {'speedup':>8}")
+
+    results = []
+    for batch_size in args.batch_sizes:
+        extractor = LineExtractor(
+            model,
+            device,
+            dtype=DTYPES[args.dtype],
+            channels_last=args.channels_last,
+            compile=args.compile,
+            max_batch_size=batch_size,
+        )
+        pages_per_sec = benchmark(extractor, pages, args.repeats)
+        speedup = pages_per_sec / results[0]["pages_per_sec"] if results else 1.0
+        results.append({"batch_size": batch_size, "pages_per_sec": pages_per_sec, "speedup": speedup})
+        print(f"   {batch_size:>5} {pages_per_sec:>10.2f} {speedup:>7.2f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "device": str(device),
+                "dtype": args.dtype,
+                "channels_last": args.channels_last,
+                "compile": args.compile,
+                "resolution": [width, height],
+                "results": results,
+            }, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Micro-benchmark of ImageQueue.
+
+Enqueues and drains a job of synthetic items with a few priority levels and
+reports operations/sec for the heap-backed ImageQueue, for several threads
+draining it with the blocking get(), and for the former list-based queue
+(linear-scan insert, pop(0)) on a smaller job since it is quadratic.
+
+Usage:
+    python Test/benchmark_queue.py [--items 100000] [--baseline-items 20000]
+        [--priorities 3] [--consumers 4] [--json out.json]
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from batch_processing.core.queue import ImageQueue, ImageQueueItem
+
+
+class ListQueue:
+    """The former ImageQueue algorithm, kept as a baseline."""
+
+    def __init__(self):
+        self._queue = []
+
+    def enqueue(self, item):
+        insert_pos = len(self._queue)
+        for i, queued_item in enumerate(self._queue):
+            if item.priority > queued_item.priority:
+                insert_pos = i
+                break
+        self._queue.insert(insert_pos, item)
+
+    def dequeue(self):
+        return self._queue.pop(0) if self._queue else None
+
+
+def make_items(count, priorities):
+    rng = random.Random(0)
+    return [
+        ImageQueueItem(
+            id=f"img_{i}",
+            input_path=f"/in/{i}.png",
+            output_path=f"/out/{i}.png",
+            priority=rng.randrange(priorities)
+        )
+        for i in range(count)
+    ]
+
+
+def time_fill_and_drain(queue, items):
+    """Return (enqueue seconds, dequeue seconds) for one job."""
+    start = time.perf_counter()
+    for item in items:
+        queue.enqueue(item)
+    enqueued = time.perf_counter()
+    while queue.dequeue() is not None:
+        pass
+    return enqueued - start, time.perf_counter() - enqueued
+
+
+def time_concurrent_drain(items, consumers):
+    """Return the seconds for `consumers` threads to drain a queue fed concurrently."""
+    queue = ImageQueue()
+    feeding = [True]
+
+    def consume():
+        while queue.get(timeout=0.01) is not None or feeding[0]:
+            pass
+
+    threads = [threading.Thread(target=consume) for _ in range(consumers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for item in items:
+        queue.enqueue(item)
+    feeding[0] = False
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100000, help="Items per job")
+    parser.add_argument('--baseline-items', type=int, default=20000,
+                        help="Items per job for the list-based baseline (0 skips it)")
+    parser.add_argument('--priorities', type=int, default=3, help="Distinct priority levels")
+    parser.add_argument('--consumers', type=int, default=4, help="Threads draining with get()")
+    parser.add_argument('--json', type=str, default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print(f"ImageQueue micro-benchmark ({args.priorities} priority levels)")
+    print("="*60)
+    print(f"   {'queue':<22} {'items':>8} {'enqueue/s':>12} {'dequeue/s':>12}")
+
+    results = []
+
+    def report(name, count, enqueue_s, dequeue_s):
+        result = {
+            "queue": name,
+            "items": count,
+            "enqueue_per_sec": count / enqueue_s,
+            "dequeue_per_sec": count / dequeue_s,
+        }
+        results.append(result)
+        print(f"   {name:<22} {count:>8} {result['enqueue_per_sec']:>12.0f} {result['dequeue_per_sec']:>12.0f}")
+
+    items = make_items(args.items, args.priorities)
+    report("heap", args.items, *time_fill_and_drain(ImageQueue(), items))
+    total = time_concurrent_drain(items, args.consumers)
+    results.append({"queue": "heap (concurrent)", "items": args.items, "consumers": args.consumers,
+                    "items_per_sec": args.items / total})
+    print(f"   {'heap, ' + str(args.consumers) + ' consumers':<22} {args.items:>8} "
+          f"{args.items / total:>12.0f} {'(end to end)':>12}")
+
+    if args.baseline_items:
+        baseline_items = make_items(args.baseline_items, args.priorities)
+        report("heap", args.baseline_items, *time_fill_and_drain(ImageQueue(), baseline_items))
+        report("list (former)", args.baseline_items, *time_fill_and_drain(ListQueue(), baseline_items))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"priorities": args.priorities, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark for style switching latency.
+
+Compares the old switch path (torch.load of the LoRA, controlnet and GSRP
+checkpoints followed by load_state_dict) against StyleBank.activate, which
+keeps every style resident and only swaps the active adapter and modules.
+Tiny random-weight models are used so the script runs on CPU.
+
+Usage:
+    python Test/benchmark_style_switch.py [--repeats 20]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from peft import LoraConfig
+
+from diffusers import CausalSparseDiTControlModel, CausalSparseDiTModel
+from cobra_utils.style_bank import StyleBank
+
+
+STYLES = {'line': 'line', 'line + shadow': 'shadow'}
+MODEL_KWARGS = dict(
+    num_attention_heads=4,
+    attention_head_dim=32,
+    in_channels=4,
+    out_channels=8,
+    num_layers=8,
+    sample_size=32,
+    patch_size=2,
+    cross_attention_dim=128,
+    norm_num_groups=4,
+)
+
+
+def lora_config():
+    return LoraConfig(r=16, lora_alpha=16, init_lora_weights="gaussian", target_modules=["to_k", "to_q", "to_v", "to_out.0"])
+
+
+def save_checkpoints(root):
+    """Write one LoRA / controlnet / GSRP checkpoint per style, like the released checkpoint layout."""
+    for style_dir in STYLES.values():
+        os.makedirs(os.path.join(root, style_dir), exist_ok=True)
+        transformer = CausalSparseDiTModel(caption_channels=32, **MODEL_KWARGS)
+        transformer.add_adapter(lora_config())
+        lora_state_dict = {k: v for k, v in transformer.state_dict().items() if "lora_" in k}
+        torch.save(lora_state_dict, os.path.join(root, style_dir, 'transformer_lora_pos.bin'))
+        controlnet = CausalSparseDiTControlModel(cond_chanels=9, **MODEL_KWARGS)
+        torch.save(controlnet.state_dict(), os.path.join(root, style_dir, 'controlnet.bin'))
+        torch.save(torch.nn.Linear(512, 512).state_dict(), os.path.join(root, style_dir, 'MultiResNetModel.bin'))
+
+
+def time_calls(fn, repeats):
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(list(STYLES)[i % len(STYLES)])
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        save_checkpoints(root)
+
+        # reload path: one shared transformer / controlnet / GSRP head, weights read from disk per switch
+        transformer = CausalSparseDiTModel(caption_channels=32, **MODEL_KWARGS)
+        transformer.add_adapter(lora_config())
+        controlnet = CausalSparseDiTControlModel(cond_chanels=9, **MODEL_KWARGS)
+        gsrp_model = torch.nn.Linear(512, 512)
+
+        def reload_switch(style):
+            ckpt_dir = os.path.join(root, STYLES[style])
+            gsrp_model.load_state_dict(torch.load(os.path.join(ckpt_dir, 'MultiResNetModel.bin'), map_location='cpu'))
+            transformer.load_state_dict(torch.load(os.path.join(ckpt_dir, 'transformer_lora_pos.bin'), map_location='cpu'), strict=False)
+            controlnet.load_state_dict(torch.load(os.path.join(ckpt_dir, 'controlnet.bin'), map_location='cpu'))
+
+        # resident path: every style loaded once into a StyleBank
+        bank = StyleBank(CausalSparseDiTModel(caption_channels=32, **MODEL_KWARGS), lora_config())
+        for style, style_dir in STYLES.items():
+            ckpt_dir = os.path.join(root, style_dir)
+            style_controlnet = CausalSparseDiTControlModel(cond_chanels=9, **MODEL_KWARGS)
+            style_controlnet.load_state_dict(torch.load(os.path.join(ckpt_dir, 'controlnet.bin'), map_location='cpu'))
+            style_gsrp = torch.nn.Linear(512, 512)
+            style_gsrp.load_state_dict(torch.load(os.path.join(ckpt_dir, 'MultiResNetModel.bin'), map_location='cpu'))
+            lora_state_dict = torch.load(os.path.join(ckpt_dir, 'transformer_lora_pos.bin'), map_location='cpu')
+            bank.add_style(style, style_dir, lora_state_dict, style_controlnet, style_gsrp)
+
+        reload_ms = time_calls(reload_switch, args.repeats)
+        resident_ms = time_calls(bank.activate, args.repeats)
+
+    print("\n" + "="*60)
+    print("Style switch latency ({} switches)".format(args.repeats))
+    print("="*60)
+    for name, timings in (("disk reload", reload_ms), ("StyleBank.activate", resident_ms)):
+        print(f"   {name:<20} median {statistics.median(timings):8.3f} ms   max {max(timings):8.3f} ms")
+    print(f"   speedup: {statistics.median(reload_ms) / max(statistics.median(resident_ms), 1e-6):.0f}x")
+
+
+if __name__ == '__main__':
+    main()
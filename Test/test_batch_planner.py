@@ -0,0 +1,83 @@
+"""
+Tests for the batch execution planner.
+
+This module tests that BatchPlanner groups queue items by resolution
+bucket, keeps the first item and the order within groups, that a planned
+ImageQueue is processed in the planned order, and that BatchProcessor
+plans from the sizes it read when the images were added.
+"""
+
+from pathlib import Path
+
+from PIL import Image
+
+from batch_processing import BatchConfig, BatchProcessor
+from batch_processing.core.planner import BatchPlanner, PlanKey
+from batch_processing.core.queue import ImageQueue, ImageQueueItem
+
+
+def make_items(buckets):
+    return [
+        ImageQueueItem(id=f"img{i}", input_path=f"/in/{bucket}/{i}.png", output_path=f"/out/{i}.png")
+        for i, bucket in enumerate(buckets)
+    ]
+
+
+def bucket_from_path(item):
+    return {"tall": (576, 1088), "square": (800, 800), "wide": (1088, 576)}[item.input_path.split("/")[2]]
+
+
+def test_groups_alternating_buckets():
+    """Test that alternating page shapes are grouped, in first-appearance order."""
+    items = make_items(["tall", "square", "tall", "wide", "square", "tall"])
+    planner = BatchPlanner(bucket_of=bucket_from_path)
+
+    planned = planner.plan(items)
+
+    assert [item.id for item in planned] == ["img0", "img2", "img5", "img1", "img4", "img3"]
+    keys = [planner.key_for(item) for item in planned]
+    assert BatchPlanner.count_switches(keys)["bucket"] == 2
+
+
+def test_unknown_buckets_keep_the_order():
+    """Test that without bucket information every item shares one key and nothing moves."""
+    items = make_items(["wide", "tall", "wide"])
+    planner = BatchPlanner()
+
+    assert planner.key_for(items[0]) == PlanKey(bucket=None)
+    assert planner.plan(items) == items
+
+
+def test_planned_queue_order():
+    """Test that reordering a queue by the plan changes the dequeue order but keeps the first item."""
+    queue = ImageQueue()
+    for item in make_items(["wide", "tall", "wide", "tall"]):
+        queue.enqueue(item)
+    planner = BatchPlanner(bucket_of=bucket_from_path)
+
+    queue.reorder([item.id for item in planner.plan(queue.snapshot())])
+
+    assert [queue.dequeue().id for _ in range(4)] == ["img0", "img2", "img1", "img3"]
+
+
+def test_processor_plans_from_sizes_read_when_added(tmp_path, monkeypatch):
+    """Test that the processor groups pages by shape without opening them again to plan."""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    paths = []
+    for i, size in enumerate([(600, 1100), (1100, 600), (600, 1100), (1100, 600)]):
+        paths.append(str(input_dir / f"page_{i}.png"))
+        Image.new('RGB', size, color=(255, 255, 255)).save(paths[-1])
+    config = BatchConfig(input_dir=str(input_dir), output_dir=str(tmp_path / "output"), reference_images=[])
+    processor = BatchProcessor(config, engine=object())
+    processor.add_images(paths)
+
+    def fail(open_input):
+        raise AssertionError("input opened again to plan")
+
+    monkeypatch.setattr(processor, "_resolution_bucket", fail)
+    processor._plan_queue()
+
+    assert [Path(item.input_path).stem for item in processor.queue.snapshot()] == [
+        "page_0", "page_2", "page_1", "page_3",
+    ]
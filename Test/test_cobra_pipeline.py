@@ -0,0 +1,262 @@
+"""
+Tests for CobraPixArtAlphaPipeline on tiny random-weight components.
+
+The VAE posterior is sampled through its mode so runs are deterministic,
+which lets the tests compare cached and uncached outputs exactly. Batched
+calls are covered in test_cobra_pipeline_batched.py.
+"""
+
+import os
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+diffusers = pytest.importorskip("diffusers")
+from diffusers import (
+    AutoencoderKL,
+    CausalSparseDiTControlModel,
+    CausalSparseDiTModel,
+    CobraPixArtAlphaPipeline,
+    CobraReferenceContext,
+    DPMSolverMultistepScheduler,
+)
+from diffusers.models.autoencoders.vae import DiagonalGaussianDistribution
+
+
+CAPTION_CHANNELS = 32
+
+
+@pytest.fixture(autouse=True)
+def deterministic_vae(monkeypatch):
+    """Use the posterior mode instead of sampling from it."""
+    monkeypatch.setattr(DiagonalGaussianDistribution, "sample", lambda self, generator=None: self.mode())
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    """Build a pipeline with tiny randomly initialized components."""
+    torch.manual_seed(0)
+    common = dict(
+        num_attention_heads=2,
+        attention_head_dim=8,
+        in_channels=4,
+        out_channels=8,
+        num_layers=4,
+        sample_size=32,
+        patch_size=2,
+        cross_attention_dim=16,
+        norm_num_groups=4,
+    )
+    transformer = CausalSparseDiTModel(caption_channels=CAPTION_CHANNELS, **common)
+    controlnet = CausalSparseDiTControlModel(cond_chanels=9, **common)
+    for param in controlnet.adapter_linear.parameters():
+        torch.nn.init.normal_(param, std=0.02)
+    vae = AutoencoderKL(
+        down_block_types=("DownEncoderBlock2D",) * 2,
+        up_block_types=("UpDecoderBlock2D",) * 2,
+        block_out_channels=(8, 16),
+        latent_channels=4,
+        norm_num_groups=4,
+    )
+    pipe = CobraPixArtAlphaPipeline(
+        vae=vae, transformer=transformer, controlnet=controlnet, scheduler=DPMSolverMultistepScheduler()
+    )
+    pipe.register_prompt_embeds(torch.randn(12, CAPTION_CHANNELS), torch.ones(12, dtype=torch.int64))
+    pipe.set_progress_bar_config(disable=True)
+    return pipe
+
+
+def random_image(width, height, seed):
+    """Create a random RGB image."""
+    rng = np.random.RandomState(seed)
+    return Image.fromarray(rng.randint(0, 255, (height, width, 3), dtype=np.uint8))
+
+
+def page_inputs(seed, n_refs=(1, 1, 0, 2), width=64, height=64):
+    """Create pipeline inputs for one page."""
+    cond_refs = [
+        [random_image(width // 2, height // 2, seed * 100 + q * 10 + i) for i in range(n)]
+        for q, n in enumerate(n_refs)
+    ]
+    return {
+        "cond_input": random_image(width, height, seed + 1),
+        "cond_refs": cond_refs,
+        "hint_mask": Image.new("RGB", (width // 2, height // 2), "black"),  # latent size of the tiny VAE
+        "hint_color": random_image(width, height, seed + 2),
+    }
+
+
+def run(pipe, inputs, seeds, **kwargs):
+    """Run the pipeline with one seeded generator per page."""
+    generator = [torch.Generator().manual_seed(s) for s in seeds]
+    return pipe(**inputs, num_inference_steps=3, generator=generator, output_type="np", **kwargs)
+
+
+def test_reference_context_reuse_matches_full_run(pipeline):
+    """Test that a reused reference context reproduces the uncached result."""
+    inputs = page_inputs(0)
+    images, context = run(pipeline, inputs, [1], return_reference_context=True)
+
+    assert isinstance(context, CobraReferenceContext)
+    assert context.num_ref_list == [1, 1, 0, 2]
+    assert context.nbytes > 0
+
+    cached_inputs = dict(inputs, cond_refs=None)
+    cached_images = run(pipeline, cached_inputs, [1], reference_context=context)[0]
+    assert np.abs(images - cached_images).max() == 0
+
+
+def test_reference_context_resolution_mismatch(pipeline):
+    """Test that a context built for another resolution is rejected."""
+    _, context = run(pipeline, page_inputs(0), [1], return_reference_context=True)
+    with pytest.raises(ValueError, match="reference_context was built for"):
+        run(pipeline, page_inputs(0, width=128), [1], reference_context=context)
+
+
+def test_build_key_depends_on_quadrants_and_style():
+    """Test that the context key changes with quadrant assignment and style."""
+    patch = random_image(16, 16, 0)
+    key = CobraReferenceContext.build_key([[patch], [], [], []], 32, 32, style="line")
+    assert key == CobraReferenceContext.build_key([[patch], [], [], []], 32, 32, style="line")
+    assert key != CobraReferenceContext.build_key([[], [patch], [], []], 32, 32, style="line")
+    assert key != CobraReferenceContext.build_key([[patch], [], [], []], 32, 32, style="line + shadow")
+
+
+def test_reference_latent_cache_matches_uncached_run(pipeline, monkeypatch, tmp_path):
+    """Test that cached and deduplicated reference latents reproduce the uncached result."""
+    from batch_processing.memory import ReferenceLatentCache
+
+    inputs = page_inputs(0)
+    patch = inputs["cond_refs"][0][0]
+    # the same patch retrieved for two quadrants
+    inputs["cond_refs"][3][0] = patch
+    expected = run(pipeline, inputs, [1])[0]
+
+    encoded = []
+    original_encode = pipeline.vae.encode
+    monkeypatch.setattr(pipeline.vae, "encode", lambda x, *args, **kwargs: encoded.append(x.shape[0]) or original_encode(x, *args, **kwargs))
+    cache = ReferenceLatentCache(cache_dir=str(tmp_path))
+    first = run(pipeline, inputs, [1], reference_latent_cache=cache)[0]
+    # cond_input, the three distinct references and hint_color
+    assert sorted(encoded) == [1, 1, 3]
+
+    encoded.clear()
+    second = run(pipeline, inputs, [1], reference_latent_cache=ReferenceLatentCache(cache_dir=str(tmp_path)))[0]
+    assert encoded == [1, 1]
+
+    assert np.abs(first - expected).max() < 1e-5
+    assert np.abs(second - expected).max() < 1e-5
+
+
+def test_reference_latent_key_depends_on_content_and_size(pipeline):
+    """Test that the latent key identifies the patch pixels and the target size."""
+    patch = random_image(16, 16, 0)
+    key = pipeline.reference_latent_key(patch, 16, 16)
+    assert key == pipeline.reference_latent_key(patch.copy(), 16, 16)
+    assert key != pipeline.reference_latent_key(patch, 32, 32)
+    assert key != pipeline.reference_latent_key(random_image(16, 16, 1), 16, 16)
+
+
+def test_caption_projection_runs_once_across_steps_and_calls(pipeline, monkeypatch):
+    """Test that the constant prompt is projected once and reused."""
+    calls = []
+    projection = pipeline.transformer.caption_projection
+    original_forward = projection.forward
+    monkeypatch.setattr(projection, "forward", lambda caption: calls.append(1) or original_forward(caption))
+    pipeline.transformer.clear_caption_cache()
+
+    run(pipeline, page_inputs(0), [1])
+    run(pipeline, page_inputs(1), [1])
+    assert len(calls) == 1
+
+    # an in-place weight update must invalidate the cached projection
+    with torch.no_grad():
+        projection.linear_1.bias.add_(0.0)
+    run(pipeline, page_inputs(0), [1])
+    assert len(calls) == 2
+
+
+def test_load_prompt_embeds_from_directory(pipeline, tmp_path):
+    """Test loading the prompt tensors from an explicit directory."""
+    prompt_embeds = torch.randn(12, CAPTION_CHANNELS)
+    prompt_attention_mask = torch.ones(12, dtype=torch.int64)
+    torch.save(prompt_embeds, tmp_path / "prompt_embeds.pt")
+    torch.save(prompt_attention_mask, tmp_path / "prompt_attention_mask.pt")
+
+    previous = (pipeline.prompt_embeds, pipeline.prompt_attention_mask)
+    try:
+        pipeline.load_prompt_embeds(str(tmp_path))
+        assert torch.equal(pipeline.prompt_embeds, prompt_embeds)
+        embeds, mask = pipeline._get_prompt_embeds(3, "cpu", torch.float32)
+        assert embeds.shape == (3, 12, CAPTION_CHANNELS)
+        assert mask.shape == (3, 12)
+    finally:
+        pipeline.register_prompt_embeds(*previous)
+
+
+def test_default_prompt_tensor_dir_ignores_working_directory(pipeline, tmp_path, monkeypatch):
+    """Test that the default prompt tensor directory is the checkout's, wherever the process runs."""
+    from diffusers.pipelines.cobra.pipeline_cobra_pixart import DEFAULT_PROMPT_TENSOR_DIR
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert os.path.samefile(DEFAULT_PROMPT_TENSOR_DIR, os.path.join(repo_root, "prompt_tensor"))
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("COBRA_PROMPT_TENSOR_DIR", str(tmp_path / "missing"))
+    with pytest.raises(FileNotFoundError, match="COBRA_PROMPT_TENSOR_DIR"):
+        pipeline.load_prompt_embeds()
+
+
+def test_sliced_pos_embed_matches_full_grid_and_is_shared(pipeline):
+    """Test that cached page/quadrant slices match the full sincos grid and are shared by both models."""
+    patch_embed = pipeline.transformer.pos_embed
+    height, width = 12, 16
+    full = patch_embed.get_pos_embed(height, width).reshape(2, height // 2, 4, width // 2, -1)
+
+    pos_center, pos_quadrants = patch_embed.get_sliced_pos_embed(height, width)
+    for quadrant, (row, col) in zip(pos_quadrants, [(0, 0), (0, 3), (1, 0), (1, 3)]):
+        assert torch.equal(quadrant.reshape(height // 2, width // 2, -1), full[row, :, col])
+    center = pos_center.reshape(2, height // 2, 2, width // 2, -1)
+    assert torch.equal(center[0, :, 0], full[0, :, 1])
+    assert torch.equal(center[1, :, 1], full[1, :, 2])
+
+    control_center, _ = pipeline.controlnet.pos_embed.get_sliced_pos_embed(height, width)
+    assert control_center is pos_center
+
+
+@pytest.mark.parametrize(
+    "options, expected_calls",
+    [
+        ({}, 3),
+        ({"control_every_n_steps": 2}, 2),
+        ({"control_max_steps": 1}, 1),
+        ({"control_every_n_steps": 2, "control_reuse": "linear"}, 2),
+    ],
+)
+def test_control_residual_reuse_skips_controlnet(pipeline, monkeypatch, options, expected_calls):
+    """Test that the controlnet only runs on the scheduled steps and reuse still produces an image."""
+    calls = []
+    original_forward = pipeline.controlnet.forward
+    monkeypatch.setattr(pipeline.controlnet, "forward", lambda *args, **kwargs: calls.append(1) or original_forward(*args, **kwargs))
+
+    images = run(pipeline, page_inputs(0), [1], **options)[0]
+    assert len(calls) == expected_calls
+    assert np.isfinite(images).all()
+
+
+def test_extrapolate_control_is_linear_in_timestep():
+    """Test linear extrapolation of control residuals from the last two computed steps."""
+    history = [(900.0, [[torch.zeros(2)]]), (800.0, [[torch.ones(2)]])]
+    extrapolated = CobraPixArtAlphaPipeline._extrapolate_control(history, 750)
+    assert torch.allclose(extrapolated[0][0], torch.full((2,), 1.5))
+    assert CobraPixArtAlphaPipeline._extrapolate_control(history[:1], 750) is history[0][1]
+
+
+def test_control_reuse_rejects_invalid_options(pipeline):
+    """Test validation of the control reuse options."""
+    with pytest.raises(ValueError, match="control_every_n_steps"):
+        run(pipeline, page_inputs(0), [1], control_every_n_steps=0)
+    with pytest.raises(ValueError, match="control_reuse"):
+        run(pipeline, page_inputs(0), [1], control_reuse="cubic")
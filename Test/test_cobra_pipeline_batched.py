@@ -0,0 +1,69 @@
+"""
+Tests for batched pages in CobraPixArtAlphaPipeline.
+
+Runs several pages through one pipeline call on the tiny random-weight
+components of test_cobra_pipeline.py and checks the result against
+per-page calls.
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("diffusers")
+from test_cobra_pipeline import deterministic_vae, page_inputs, pipeline, run  # noqa: F401 (fixtures)
+
+
+def test_batched_pages_match_single_runs(pipeline):
+    """Test that a batch of pages reproduces per-page runs."""
+    first = page_inputs(0, n_refs=(1, 1, 0, 2))
+    second = page_inputs(5, n_refs=(2, 0, 1, 1))
+    expected_first = run(pipeline, first, [1])[0]
+    expected_second = run(pipeline, second, [2])[0]
+
+    batched = {key: [first[key], second[key]] for key in first}
+    images, contexts = run(pipeline, batched, [1, 2], return_reference_context=True)
+
+    assert images.shape[0] == 2
+    assert np.abs(images[0] - expected_first[0]).max() < 1e-5
+    assert np.abs(images[1] - expected_second[0]).max() < 1e-5
+    assert [ctx.num_ref_list for ctx in contexts] == [[1, 1, 0, 2], [2, 0, 1, 1]]
+
+
+def test_batched_pages_require_equal_reference_totals(pipeline):
+    """Test that pages with different reference totals cannot be batched."""
+    first = page_inputs(0, n_refs=(1, 1, 0, 2))
+    second = page_inputs(3, n_refs=(1, 0, 0, 0))
+    batched = {key: [first[key], second[key]] for key in first}
+    with pytest.raises(ValueError, match="same total number of references"):
+        run(pipeline, batched, [1, 2])
+
+
+def test_batched_reference_contexts_are_reusable(pipeline):
+    """Test that per-page contexts returned by a batched call reproduce it without references."""
+    first = page_inputs(0, n_refs=(1, 1, 0, 2))
+    second = page_inputs(5, n_refs=(2, 0, 1, 1))
+    batched = {key: [first[key], second[key]] for key in first}
+    images, contexts = run(pipeline, batched, [1, 2], return_reference_context=True)
+
+    cached_images = run(pipeline, dict(batched, cond_refs=None), [1, 2], reference_context=contexts)[0]
+    assert np.abs(images - cached_images).max() == 0
+
+
+def test_batched_reference_contexts_own_their_memory(pipeline):
+    """Test that a page's context does not hold the K/V storage of the whole batch."""
+    first = page_inputs(0, n_refs=(1, 1, 0, 2))
+    second = page_inputs(5, n_refs=(2, 0, 1, 1))
+    batched = {key: [first[key], second[key]] for key in first}
+    contexts = run(pipeline, batched, [1, 2], return_reference_context=True)[1]
+
+    for ctx in contexts:
+        assert ctx.nbytes == sum(t.untyped_storage().nbytes() for t in ctx.K_cache + ctx.V_cache)
+
+
+def test_batched_pages_require_one_size(pipeline):
+    """Test that pages of different sizes cannot be batched."""
+    first = page_inputs(0)
+    second = page_inputs(1, width=128)
+    batched = {key: [first[key], second[key]] for key in first}
+    with pytest.raises(ValueError, match="must share one size"):
+        run(pipeline, batched, [1, 2])
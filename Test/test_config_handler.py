@@ -138,6 +138,23 @@ class TestBatchConfig:
                 max_concurrent=0
             )
     
+    def test_batch_config_validation_invalid_refine_settings(self):
+        """Test that a non-positive refine_scale or a tiny refine_tile_size raises ConfigurationError."""
+        with pytest.raises(ConfigurationError, match="refine_scale must be positive"):
+            BatchConfig(
+                input_dir="/input",
+                output_dir="/output",
+                reference_images=["ref.png"],
+                refine_scale=0
+            )
+        with pytest.raises(ConfigurationError, match="refine_tile_size must be at least 64"):
+            BatchConfig(
+                input_dir="/input",
+                output_dir="/output",
+                reference_images=["ref.png"],
+                refine_tile_size=32
+            )
+    
     def test_batch_config_auto_zip_name(self):
         """Test that zip_output_name is auto-generated when output_as_zip is True."""
         config = BatchConfig(
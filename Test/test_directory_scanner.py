@@ -0,0 +1,140 @@
+"""
+Tests for concurrent directory scanning.
+
+This module tests the DirectoryScanner and ScanManifest classes, the header
+check, and feeding scanned images to a BatchProcessor while it runs. The
+model stages are replaced by fakes so no models are loaded.
+"""
+
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from batch_processing import BatchConfig, BatchProcessor
+from batch_processing.exceptions import ValidationError
+from batch_processing.io import DirectoryScanner, ScanManifest, check_image_header
+
+
+@pytest.fixture
+def image_tree(tmp_path):
+    """Create a tree of real, fake and empty images."""
+    root = tmp_path / "input"
+    (root / "chapter" / "extra").mkdir(parents=True)
+    Image.new('RGB', (8, 8)).save(root / "cover.png")
+    Image.new('RGB', (8, 8)).save(root / "chapter" / "page_1.jpg")
+    Image.new('RGB', (8, 8)).save(root / "chapter" / "extra" / "page_2.webp")
+    (root / "chapter" / "fake.png").write_text("not really a png")
+    (root / "empty.png").touch()
+    (root / "notes.txt").write_text("text")
+    return root
+
+
+def test_check_image_header(image_tree):
+    """Test that only files with their format's signature pass."""
+    assert check_image_header(str(image_tree / "cover.png"))
+    assert check_image_header(str(image_tree / "chapter" / "page_1.jpg"))
+    assert check_image_header(str(image_tree / "chapter" / "extra" / "page_2.webp"))
+    assert not check_image_header(str(image_tree / "chapter" / "fake.png"))
+    assert not check_image_header(str(image_tree / "missing.png"))
+
+
+class TestDirectoryScanner:
+    """Test the DirectoryScanner class."""
+
+    def test_recursive_scan_in_walk_order(self, image_tree):
+        """Test that valid images are returned in walk order, files before subdirectories."""
+        scanner = DirectoryScanner(str(image_tree), recursive=True, max_workers=4)
+        names = [os.path.relpath(path, image_tree) for path in scanner.scan()]
+
+        assert names == [
+            "cover.png",
+            os.path.join("chapter", "page_1.jpg"),
+            os.path.join("chapter", "extra", "page_2.webp"),
+        ]
+        assert scanner.invalid_count == 2
+
+    def test_without_header_checks(self, image_tree):
+        """Test that check_headers=False only rejects empty files."""
+        scanner = DirectoryScanner(str(image_tree), recursive=True, check_headers=False)
+        assert len(scanner.scan()) == 4
+
+    def test_non_recursive(self, image_tree):
+        """Test that subdirectories are skipped unless recursive."""
+        assert [os.path.basename(path) for path in DirectoryScanner(str(image_tree)).scan()] == ["cover.png"]
+
+    def test_yields_before_the_scan_completes(self, image_tree):
+        """Test that the first image is available while the rest is still pending."""
+        images = DirectoryScanner(str(image_tree), recursive=True).iter_images()
+        first = next(images)
+        assert first.endswith("cover.png")
+        assert len(list(images)) == 2
+
+    def test_missing_directory(self, tmp_path):
+        """Test that a missing directory raises ValidationError."""
+        with pytest.raises(ValidationError, match="does not exist"):
+            DirectoryScanner(str(tmp_path / "missing"))
+
+
+class TestScanManifest:
+    """Test the persistent scan manifest."""
+
+    def test_rescan_reads_no_headers(self, image_tree, tmp_path, monkeypatch):
+        """Test that an unchanged tree is rescanned from the manifest alone."""
+        manifest_path = str(tmp_path / "manifest.json")
+        first = DirectoryScanner(str(image_tree), recursive=True, manifest_path=manifest_path).scan()
+
+        def fail(path):
+            raise AssertionError(f"header read for {path}")
+
+        monkeypatch.setattr("batch_processing.io.scanner.check_image_header", fail)
+        scanner = DirectoryScanner(str(image_tree), recursive=True, manifest_path=manifest_path)
+        assert scanner.scan() == first
+        assert scanner.manifest.misses == 0
+
+    def test_changed_file_is_checked_again(self, image_tree, tmp_path):
+        """Test that a file whose size or mtime changed misses the manifest."""
+        manifest_path = str(tmp_path / "manifest.json")
+        DirectoryScanner(str(image_tree), recursive=True, manifest_path=manifest_path).scan()
+
+        Image.new('RGB', (8, 8)).save(image_tree / "chapter" / "fake.png")
+        scanner = DirectoryScanner(str(image_tree), recursive=True, manifest_path=manifest_path)
+        assert len(scanner.scan()) == 4
+        assert scanner.manifest.misses == 1
+
+    def test_removed_files_are_pruned(self, image_tree, tmp_path):
+        """Test that entries of deleted files are dropped on save."""
+        manifest_path = str(tmp_path / "manifest.json")
+        DirectoryScanner(str(image_tree), recursive=True, manifest_path=manifest_path).scan()
+        (image_tree / "cover.png").unlink()
+        DirectoryScanner(str(image_tree), recursive=True, manifest_path=manifest_path).scan()
+
+        assert len(ScanManifest(manifest_path)) == 3
+
+
+def test_processing_starts_while_feeding(image_tree, tmp_path, monkeypatch):
+    """Test that the processor runs the first page before the feed has finished."""
+    config = BatchConfig(input_dir=str(image_tree), output_dir=str(tmp_path / "output"), reference_images=[])
+    processor = BatchProcessor(config, engine=object())
+    first_page_done = threading.Event()
+
+    def colorize_page(queue_item, page, engine=None):
+        first_page_done.set()
+        return page.convert('RGB')
+
+    monkeypatch.setattr(processor, "_load_page", lambda queue_item: Image.open(queue_item.input_path))
+    monkeypatch.setattr(processor, "_colorize_page", colorize_page)
+
+    def images():
+        scanned = DirectoryScanner(str(image_tree), recursive=True).scan()
+        yield scanned[0]
+        # would deadlock if processing waited for the whole scan
+        assert first_page_done.wait(timeout=10)
+        yield from scanned[1:]
+
+    processor.feed_images(images())
+    processor.start_processing()
+
+    assert processor.status_tracker.get_summary().completed == 3
+    assert processor.queue.size() == 0
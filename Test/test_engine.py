@@ -0,0 +1,237 @@
+"""
+Tests for the cobra_engine Engine.
+
+Tiny randomly initialized components are injected with
+Engine.from_components so the stages run on CPU without downloading
+checkpoints.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+pytest.importorskip("peft")
+diffusers = pytest.importorskip("diffusers")
+transformers = pytest.importorskip("transformers")
+from peft import LoraConfig
+from transformers import CLIPImageProcessor, CLIPVisionConfig, CLIPVisionModelWithProjection
+
+from diffusers import (
+    AutoencoderKL,
+    CausalSparseDiTControlModel,
+    CausalSparseDiTModel,
+    CobraPixArtAlphaPipeline,
+    DPMSolverMultistepScheduler,
+)
+from diffusers.models.autoencoders.vae import DiagonalGaussianDistribution
+
+from batch_processing.memory import ReferenceContextCache
+from cobra_engine import ColorizationResult, Engine, LineExtraction, ratio_list
+from cobra_utils.style_bank import StyleBank
+from cobra_utils.utils import MultiHiddenResNetModel
+
+
+REPO_ROOT = Path(__file__).parent.parent
+
+
+class IdentityLineModel(torch.nn.Module):
+    """Stand-in for res_skip that returns its grayscale input."""
+
+    def forward(self, x):
+        return x
+
+
+@pytest.fixture(autouse=True)
+def deterministic_vae(monkeypatch):
+    """Use the posterior mode instead of sampling from it."""
+    monkeypatch.setattr(DiagonalGaussianDistribution, "sample", lambda self, generator=None: self.mode())
+
+
+@pytest.fixture(scope="module")
+def engine():
+    """Build an Engine around tiny randomly initialized components."""
+    torch.manual_seed(0)
+    common = dict(
+        num_attention_heads=2,
+        attention_head_dim=8,
+        in_channels=4,
+        out_channels=8,
+        num_layers=2,
+        sample_size=32,
+        patch_size=2,
+        cross_attention_dim=16,
+        norm_num_groups=4,
+    )
+    transformer = CausalSparseDiTModel(caption_channels=32, **common)
+    vae = AutoencoderKL(
+        down_block_types=("DownEncoderBlock2D",) * 2,
+        up_block_types=("UpDecoderBlock2D",) * 2,
+        block_out_channels=(8, 16),
+        latent_channels=4,
+        norm_num_groups=4,
+    )
+
+    style_bank = StyleBank(transformer, LoraConfig(r=4, lora_alpha=4, init_lora_weights="gaussian", target_modules=["to_q"]))
+    for style, adapter_name in (("line", "line"), ("line + shadow", "shadow")):
+        controlnet = CausalSparseDiTControlModel(cond_chanels=9, **common)
+        # hidden states of the tiny VAE encoder have 8, 8 and 16 channels
+        style_bank.add_style(style, adapter_name, {}, controlnet, MultiHiddenResNetModel([8, 8, 16], 3).eval())
+
+    pipeline = CobraPixArtAlphaPipeline(
+        vae=vae,
+        transformer=transformer,
+        controlnet=style_bank.activate("line + shadow").controlnet,
+        scheduler=DPMSolverMultistepScheduler(),
+    )
+    pipeline.register_prompt_embeds(torch.randn(12, 32), torch.ones(12, dtype=torch.int64))
+    pipeline.set_progress_bar_config(disable=True)
+
+    config = CLIPVisionConfig(
+        hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=2, projection_dim=16, image_size=224, patch_size=32
+    )
+    return Engine.from_components(
+        line_model=IdentityLineModel(),
+        image_encoder=CLIPVisionModelWithProjection(config).eval(),
+        image_processor=CLIPImageProcessor(),
+        pipeline=pipeline,
+        style_bank=style_bank,
+        model_path="/nonexistent",
+        device="cpu",
+        dtype=torch.float32,
+    )
+
+
+def random_image(width, height, seed):
+    rng = np.random.RandomState(seed)
+    return Image.fromarray(rng.randint(0, 255, (height, width, 3), dtype=np.uint8))
+
+
+def test_import_has_no_side_effects():
+    """Test that importing cobra_engine neither imports Gradio nor loads models."""
+    code = (
+        "import sys\n"
+        "import cobra_engine\n"
+        "engine = cobra_engine.Engine(model_path='/nonexistent')\n"
+        "assert 'gradio' not in sys.modules\n"
+        "assert not engine.is_loaded()\n"
+        "assert engine._line_model is None and engine._pipeline is None\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, check=True)
+
+
+def test_extract_uses_closest_resolution(engine):
+    """Test line extraction on a page with a wide aspect ratio."""
+    page = random_image(300, 160, 0)
+    extraction = engine.extract(page, "line")
+
+    assert isinstance(extraction, LineExtraction)
+    assert extraction.resolution in ratio_list
+    assert extraction.extracted_line.size == tuple(extraction.resolution)
+    assert extraction.hint_mask.getbbox() is None
+    assert extraction.query_image_origin is page
+    assert engine.style == "line"
+
+
+def test_extract_batch_matches_extract(engine):
+    """Test that batched extraction of pages in different buckets matches page-by-page extraction."""
+    pages = [random_image(300, 160, 0), random_image(160, 300, 1), random_image(310, 160, 2)]
+
+    batched = engine.extract_batch(pages, "line + shadow")
+
+    for page, extraction in zip(pages, batched):
+        single = engine.extract(page)
+        assert extraction.resolution == single.resolution
+        assert np.array_equal(np.array(extraction.extracted_line), np.array(single.extracted_line))
+        assert np.array_equal(np.array(extraction.extracted_image_ori), np.array(single.extracted_image_ori))
+
+
+def test_shadow_style_keeps_dark_regions(engine):
+    """Test that the line + shadow style clamps dark page regions to the shadow tone."""
+    page = Image.new("RGB", (400, 400), (10, 10, 10))
+    extraction = engine.extract(page, "line + shadow")
+    assert np.array(extraction.extracted_line).max() == 18
+
+
+def test_set_style_switches_controlnet_and_gsrp(engine):
+    """Test that style switches swap the pipeline controlnet and GSRP head."""
+    engine.set_style("line")
+    line_controlnet, line_gsrp = engine.pipeline.controlnet, engine.gsrp_model
+    engine.set_style("line + shadow")
+    assert engine.pipeline.controlnet is not line_controlnet
+    assert engine.gsrp_model is not line_gsrp
+
+    with pytest.raises(ValueError, match="Invalid style"):
+        engine.set_style("watercolor")
+
+
+def test_tiled_refine_matches_untiled_refine(engine):
+    """Test that a tile covering the whole page gives the untiled refinement."""
+    colorized = random_image(64, 64, 5)
+    extracted_line = random_image(64, 64, 6).convert("L").convert("RGB")
+
+    untiled = engine.refine(colorized, extracted_line, (64, 64))
+    tiled = engine.refine(colorized, extracted_line, (64, 64), tile_size=96)
+
+    assert tiled.size == untiled.size == (96, 96)
+    assert np.array_equal(np.array(tiled), np.array(untiled))
+
+
+def test_tiled_refine_upscales_on_small_tiles(engine):
+    """Test that tiled refinement at 2x blends the tiles into a page of the scaled size."""
+    colorized = random_image(64, 48, 5)
+    extracted_line = random_image(64, 48, 6).convert("L").convert("RGB")
+    hidden_sizes = []
+    gsrp_model = engine.gsrp_model
+    hook = gsrp_model.register_forward_pre_hook(lambda module, args: hidden_sizes.append(args[0][0].shape[-2:]))
+    try:
+        refined = engine.refine(colorized, extracted_line, (64, 48), scale=2, tile_size=64)
+    finally:
+        hook.remove()
+
+    assert refined.size == (128, 96)
+    assert len(hidden_sizes) > 1
+    assert all(max(size) <= 64 for size in hidden_sizes)
+
+
+def test_tiled_refine_rejects_misaligned_tiles(engine):
+    """Test that the tile stride must be a multiple of the VAE scale factor."""
+    sample = torch.zeros(1, 3, 64, 64)
+    with pytest.raises(ValueError, match="multiples"):
+        engine.pipeline.vae.tiled_refine(sample, sample, lambda hidden, hidden_cond: hidden, tile_size=42)
+
+
+def test_run_produces_refined_page(engine):
+    """Test the full retrieve / colorize / refine path and the reference cache hit."""
+    resolution = (64, 64)
+    extracted_line = random_image(64, 64, 1).convert("L").convert("RGB")
+    reference_index = engine.build_reference_index([random_image(96, 96, 2), random_image(128, 96, 3)])
+    messages = []
+    cache = ReferenceContextCache()
+
+    kwargs = dict(
+        extracted_line=extracted_line,
+        reference_index=reference_index,
+        resolution=resolution,
+        seed=0,
+        num_inference_steps=2,
+        top_k=1,
+        hint_mask=Image.new("RGB", resolution, "black"),
+        hint_color=extracted_line,
+        query_image_origin=random_image(64, 64, 4),
+        extracted_image_ori=extracted_line,
+        reference_cache=cache,
+    )
+    result = engine.run(progress=messages.append, **kwargs)
+    cached = engine.run(**kwargs)
+
+    assert isinstance(result, ColorizationResult)
+    assert result.image.size == (96, 96)
+    assert len(result.gallery()) == 5
+    assert messages[-1] == "Colorization complete!"
+    assert cache.get_stats()["hits"] == 1
+    assert np.array_equal(np.array(result.image), np.array(cached.image))
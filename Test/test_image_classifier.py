@@ -0,0 +1,299 @@
+"""
+Tests for the single-decode, cached image classifier.
+
+This module tests that ImageClassifier decodes images at reduced size,
+counts colors exactly, analyzes batches in parallel with the same results
+as in-process analysis, reuses metrics by content across paths and
+across instances through the persistent cache, and gives the verdicts the
+full-resolution analysis the thresholds were tuned on gives.
+"""
+
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from batch_processing.classification import ImageClassifier
+from batch_processing.classification.classifier import (
+    ANALYSIS_SIZE,
+    compute_image_metrics,
+    load_for_analysis,
+)
+from batch_processing.core.journal import hash_file
+
+
+def save_line_art(path, size=(256, 256)):
+    image = Image.new('L', size, 255)
+    draw = ImageDraw.Draw(image)
+    for offset in range(0, size[0], 16):
+        draw.line([(offset, 0), (size[0] - offset, size[1])], fill=0, width=2)
+    image.save(path)
+
+
+def save_colored(path, size=(256, 256), seed=0):
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(50, 255, (size[1], size[0], 3), dtype=np.uint8)).save(path)
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = {}
+    for i in range(3):
+        paths[f"line_{i}"] = str(tmp_path / f"line_{i}.png")
+        save_line_art(paths[f"line_{i}"], size=(256 + 32 * i, 256))
+        paths[f"color_{i}"] = str(tmp_path / f"color_{i}.png")
+        save_colored(paths[f"color_{i}"], seed=i)
+    return paths
+
+
+def test_large_images_are_decoded_at_reduced_size(tmp_path):
+    """Test that analysis never works on the full-resolution image."""
+    path = tmp_path / "large.jpg"
+    Image.new('RGB', (3000, 2000), color=(200, 30, 30)).save(path)
+
+    image = load_for_analysis(str(path))
+    assert max(image.size) <= ANALYSIS_SIZE
+    assert compute_image_metrics(str(path))["saturation"] > 0.5
+
+
+def test_color_count_is_exact(tmp_path):
+    """Test that the packed color count matches a row-wise unique count."""
+    rng = np.random.default_rng(1)
+    pixels = (rng.integers(0, 5, (64, 64, 3)) * 60).astype(np.uint8)
+    classifier = ImageClassifier()
+
+    assert classifier.count_unique_colors(Image.fromarray(pixels)) == len(np.unique(pixels.reshape(-1, 3), axis=0))
+    assert classifier.count_unique_colors(Image.new('L', (8, 8), 7)) == 1
+
+
+@pytest.mark.parametrize("use_processes", [True, False])
+def test_parallel_batch_matches_serial(images, use_processes):
+    """Test that pooled analysis gives the same classifications as in-process analysis."""
+    serial = ImageClassifier(max_workers=1).classify_batch(list(images.values()))
+    pooled = ImageClassifier(max_workers=3, use_processes=use_processes).classify_batch(list(images.values()))
+
+    assert {path: result.type for path, result in pooled.items()} == {
+        path: result.type for path, result in serial.items()
+    }
+    assert all(pooled[images[f"line_{i}"]].type == "line_art" for i in range(3))
+    assert all(pooled[images[f"color_{i}"]].type == "colored" for i in range(3))
+
+
+def test_copies_share_cached_metrics(images, tmp_path):
+    """Test that an image copied to a new path is not analyzed again."""
+    classifier = ImageClassifier(max_workers=1)
+    classifier.classify(images["color_0"])
+
+    copy = str(tmp_path / "reupload" / "renamed.png")
+    (tmp_path / "reupload").mkdir()
+    shutil.copy(images["color_0"], copy)
+    result = classifier.classify(copy)
+
+    assert result.type == "colored"
+    assert classifier.cache_hits == 1
+    assert classifier.cache_misses == 1
+
+
+def test_persistent_cache_survives_restart(images, tmp_path, monkeypatch):
+    """Test that a new classifier classifies from the cache file without decoding."""
+    cache_path = str(tmp_path / "cache" / "classification.json")
+    first = ImageClassifier(max_workers=2, use_processes=False, cache_path=cache_path)
+    expected = first.classify_batch(list(images.values()))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("image decoded despite cache")
+
+    monkeypatch.setattr("batch_processing.classification.classifier.compute_image_metrics", fail)
+    second = ImageClassifier(cache_path=cache_path)
+    results = second.classify_batch(list(images.values()))
+
+    assert {path: result.type for path, result in results.items()} == {
+        path: result.type for path, result in expected.items()
+    }
+    assert second.cache_misses == 0
+
+
+def test_thresholds_apply_to_cached_metrics(images):
+    """Test that cached metrics are re-scored with the current thresholds."""
+    classifier = ImageClassifier(max_workers=1)
+    assert classifier.classify(images["color_0"]).type == "colored"
+
+    classifier.saturation_threshold = 1.0
+    classifier.color_count_threshold = 10 ** 9
+    assert classifier.classify(images["color_0"]).type == "line_art"
+    assert classifier.cache_misses == 1
+
+
+def test_unreadable_image_is_skipped(images, tmp_path):
+    """Test that a broken file is skipped by classify_batch."""
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+
+    results = ImageClassifier(max_workers=2, use_processes=False).classify_batch([images["line_0"], str(broken)])
+    assert list(results) == [images["line_0"]]
+
+
+def test_classify_defers_cache_writes(images, tmp_path):
+    """Test that classify() leaves the cache file to close() and classify_batch()."""
+    cache_path = tmp_path / "classification.json"
+    classifier = ImageClassifier(cache_path=str(cache_path))
+    for key in ("line_0", "color_0"):
+        classifier.classify(images[key])
+    assert not cache_path.exists()
+
+    classifier.close()
+    assert cache_path.exists()
+    restarted = ImageClassifier(cache_path=str(cache_path))
+    restarted.classify(images["line_0"])
+    assert restarted.cache_hits == 1
+
+    classifier.classify(images["line_1"])
+    classifier.classify_batch([images["color_1"]])
+    assert ImageClassifier(cache_path=str(cache_path))._cached_metrics(
+        hash_file(images["line_1"])
+    ) is not None
+
+
+# Full-resolution pages (A4 at 150 dpi) for the regression test below
+PAGE_SIZE = (1240, 1754)
+
+
+def _draw_panels(draw, rng, fill=False):
+    width, height = PAGE_SIZE
+    boxes = []
+    for top, bottom in [(30, height // 3 - 8), (height // 3 + 8, 2 * height // 3 - 8), (2 * height // 3 + 8, height - 30)]:
+        split = width // 2 + int(rng.integers(-150, 150))
+        for left, right in [(30, split - 8), (split + 8, width - 30)]:
+            boxes.append((left, top, right, bottom))
+            color = tuple(int(c) for c in rng.integers(60, 255, 3)) if fill else None
+            draw.rectangle((left, top, right, bottom), outline=0, width=5, fill=color)
+    return boxes
+
+
+def _draw_strokes(draw, boxes, rng, count, color):
+    for left, top, right, bottom in boxes:
+        for _ in range(count):
+            x, y = int(rng.integers(left + 10, right - 10)), int(rng.integers(top + 10, bottom - 10))
+            points = [(x, y)]
+            for _ in range(6):
+                x = int(np.clip(x + rng.integers(-45, 45), left + 8, right - 8))
+                y = int(np.clip(y + rng.integers(-45, 45), top + 8, bottom - 8))
+                points.append((x, y))
+            draw.line(points, fill=color, width=int(rng.integers(1, 5)))
+
+
+def _line_art(mode, rng):
+    image = Image.new(mode, PAGE_SIZE, 255 if mode == 'L' else (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    _draw_strokes(draw, _draw_panels(draw, rng), rng, 60, 0 if mode == 'L' else (0, 0, 0))
+    return image
+
+
+def _screentone(rng):
+    pixels = np.asarray(_line_art('L', rng)).copy()
+    yy, xx = np.mgrid[0:PAGE_SIZE[1], 0:PAGE_SIZE[0]]
+    pixels[(((xx % 8 - 4) ** 2 + (yy % 8 - 4) ** 2) < 5) & (yy > 600) & (yy < 1100)] = 80
+    return Image.fromarray(pixels).convert('RGB')
+
+
+def _pencil_scan(rng):
+    image = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    _draw_strokes(draw, _draw_panels(draw, rng), rng, 60, 90)
+    pixels = np.asarray(image.filter(ImageFilter.GaussianBlur(1))).astype(np.int16)
+    pixels += rng.integers(-12, 12, pixels.shape, dtype=np.int16)
+    paper = np.stack([pixels, pixels - 3, pixels - 10], axis=-1)
+    return Image.fromarray(np.clip(paper, 0, 255).astype(np.uint8))
+
+
+def _flat_colored(rng, strokes=0):
+    image = Image.new('RGB', PAGE_SIZE, (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    boxes = _draw_panels(draw, rng, fill=True)
+    for left, top, right, bottom in boxes:
+        for _ in range(20):
+            x, y = int(rng.integers(left, right - 60)), int(rng.integers(top, bottom - 60))
+            size = rng.integers(30, 180, 2)
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            draw.ellipse((x, y, x + int(size[0]), y + int(size[1])), fill=color, outline=(0, 0, 0), width=3)
+    _draw_strokes(draw, boxes, rng, strokes, (0, 0, 0))
+    return image
+
+
+def _painted(rng):
+    yy, xx = np.mgrid[0:PAGE_SIZE[1], 0:PAGE_SIZE[0]].astype(np.float32)
+    pixels = np.stack([
+        128 + 100 * np.sin(xx / 300),
+        128 + 100 * np.sin(yy / 250 + 1),
+        128 + 100 * np.cos((xx + yy) / 400),
+    ], axis=-1) + rng.normal(0, 6, (PAGE_SIZE[1], PAGE_SIZE[0], 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(2))
+
+
+def _sepia(rng):
+    gray = np.asarray(_flat_colored(rng).convert('L')).astype(np.float32)
+    return Image.fromarray(np.clip(np.stack([gray, gray * 0.85, gray * 0.65], axis=-1), 0, 255).astype(np.uint8))
+
+
+REPRESENTATIVE_PAGES = {
+    "line_art.png": lambda rng: _line_art('L', rng),
+    "line_art.jpg": lambda rng: _line_art('RGB', rng),
+    "screentone.png": _screentone,
+    "pencil_scan.jpg": _pencil_scan,
+    "flat_colored.png": _flat_colored,
+    "flat_colored.jpg": _flat_colored,
+    "inked_colored.png": lambda rng: _flat_colored(rng, strokes=60),
+    "painted.jpg": _painted,
+    "sepia.jpg": _sepia,
+}
+
+
+def full_resolution_metrics(image_path):
+    """The metrics as computed before reduced-size analysis, which the thresholds were tuned on."""
+    image = Image.open(image_path)
+    pixels = np.array(image)
+    saturation = 0.0
+    if pixels.ndim == 3:
+        saturation = float(np.mean(cv2.cvtColor(pixels[:, :, :3], cv2.COLOR_RGB2HSV)[:, :, 1] / 255.0))
+
+    sample = image.copy()
+    sample.thumbnail((256, 256), Image.Resampling.LANCZOS)
+    color_count = len(np.unique(np.array(sample.convert('RGB')).reshape(-1, 3), axis=0))
+
+    gray = np.array(image.convert('L'))
+    median = np.median(gray)
+    edges = cv2.Canny(gray, int(max(0, 0.7 * median)), int(min(255, 1.3 * median)))
+    return {
+        "saturation": saturation,
+        "color_count": float(color_count),
+        "edge_density": float(np.count_nonzero(edges) / edges.size),
+    }
+
+
+@pytest.fixture(scope="module")
+def representative_pages(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("pages")
+    paths = {}
+    for seed, (name, make) in enumerate(REPRESENTATIVE_PAGES.items()):
+        paths[name] = str(directory / name)
+        make(np.random.default_rng(seed)).save(paths[name])
+    return paths
+
+
+@pytest.mark.parametrize("name", list(REPRESENTATIVE_PAGES))
+def test_verdicts_match_full_resolution_analysis(representative_pages, name):
+    """Test that reduced-size analysis keeps the verdicts of full-resolution analysis.
+
+    The baseline uses the edge density threshold the full-resolution
+    metrics were tuned with.
+    """
+    path = representative_pages[name]
+    classifier = ImageClassifier(max_workers=1)
+    baseline = ImageClassifier(edge_ratio_threshold=0.3)._decide(path, full_resolution_metrics(path))
+
+    result = classifier.classify(path)
+    assert result.type == baseline.type
+    # equal confidence means the same indicators fired
+    assert result.confidence == pytest.approx(baseline.confidence)
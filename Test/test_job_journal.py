@@ -0,0 +1,219 @@
+"""
+Tests for the write-ahead job journal.
+
+This module tests the JobJournal class, the hashing helpers and resuming an
+interrupted BatchProcessor run from its journal. The model stages are
+replaced by fakes so no models are loaded.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from batch_processing import BatchConfig, BatchProcessor
+from batch_processing.core import JobJournal, hash_config, hash_file
+from batch_processing.core.journal import JOURNAL_FILENAME
+
+
+@pytest.fixture
+def sample_images(tmp_path):
+    """Create sample input pages and a reference image."""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    paths = []
+    for i in range(3):
+        path = input_dir / f"page_{i}.png"
+        Image.new('RGB', (32, 32), color=(255, i * 40, 255)).save(path)
+        paths.append(str(path))
+    reference = tmp_path / "reference.png"
+    Image.new('RGB', (32, 32), color=(10, 20, 30)).save(reference)
+    return paths, [str(reference)]
+
+
+def make_processor(tmp_path, references, monkeypatch, colorize=None, **kwargs):
+    kwargs.setdefault("resume", True)
+    config = BatchConfig(
+        input_dir=str(tmp_path / "input"),
+        output_dir=str(tmp_path / "output"),
+        reference_images=references,
+        **kwargs
+    )
+    processor = BatchProcessor(config, engine=object())
+
+    def load_page(queue_item):
+        processor._journal_record(queue_item, JobJournal.STARTED)
+        return Image.open(queue_item.input_path)
+
+    def colorize_page(queue_item, page, engine=None):
+        if colorize is not None:
+            colorize(queue_item)
+        return page.convert('RGB')
+
+    monkeypatch.setattr(processor, "_load_page", load_page)
+    monkeypatch.setattr(processor, "_colorize_page", colorize_page)
+    return processor
+
+
+class TestJobJournal:
+    """Test the JobJournal class."""
+
+    def test_replays_latest_state(self, tmp_path):
+        """Test that a reopened journal returns the last record of each image."""
+        path = tmp_path / "journal.jsonl"
+        with JobJournal(str(path)) as journal:
+            journal.record("a", JobJournal.STARTED, "in", "cfg", "out.png")
+            journal.record("a", JobJournal.COMPLETED, "in", "cfg", "out.png")
+            journal.record("b", JobJournal.FAILED, "in", "cfg", "b.png", error="boom")
+
+        with JobJournal(str(path)) as journal:
+            assert len(journal) == 2
+            assert journal.get_entry("a").state == JobJournal.COMPLETED
+            assert journal.get_entry("b").error == "boom"
+            assert journal.get_entry("c") is None
+
+    def test_ignores_truncated_record(self, tmp_path):
+        """Test that a record cut off by a crash is skipped and not appended to."""
+        path = tmp_path / "journal.jsonl"
+        with JobJournal(str(path)) as journal:
+            journal.record("a", JobJournal.COMPLETED, "in", "cfg", "out.png")
+        with open(path, "a") as f:
+            f.write('{"key": "b", "sta')
+
+        with JobJournal(str(path)) as journal:
+            assert journal.get_entry("b") is None
+            journal.record("c", JobJournal.STARTED, "in", "cfg", "c.png")
+
+        lines = path.read_text().splitlines()
+        assert json.loads(lines[-1])["key"] == "c"
+        assert JobJournal(str(path)).get_entry("c").state == JobJournal.STARTED
+
+    def test_is_completed(self, tmp_path):
+        """Test that completion requires the same hashes and an existing output."""
+        output = tmp_path / "out.png"
+        output.write_bytes(b"png")
+        journal = JobJournal(str(tmp_path / "journal.jsonl"))
+        journal.record("a", JobJournal.COMPLETED, "in", "cfg", str(output))
+
+        assert journal.is_completed("a", "in", "cfg")
+        assert not journal.is_completed("a", "changed", "cfg")
+        assert not journal.is_completed("a", "in", "changed")
+
+        output.unlink()
+        assert not journal.is_completed("a", "in", "cfg")
+
+    def test_invalid_state(self, tmp_path):
+        """Test that unknown states are rejected."""
+        journal = JobJournal(str(tmp_path / "journal.jsonl"))
+        with pytest.raises(ValueError, match="Invalid journal state"):
+            journal.record("a", "done", "in", "cfg", "out.png")
+
+
+def test_hash_config_tracks_output_settings(sample_images):
+    """Test that the config hash changes with output settings and reference content only."""
+    _, references = sample_images
+    base = BatchConfig(input_dir="in", output_dir="out", reference_images=references)
+
+    assert hash_config(base) == hash_config(
+        BatchConfig(input_dir="other", output_dir="out", reference_images=references, max_concurrent=2)
+    )
+    assert hash_config(base) != hash_config(
+        BatchConfig(input_dir="in", output_dir="out", reference_images=references, seed=1)
+    )
+
+    before = hash_config(base), hash_file(references[0])
+    Image.new('RGB', (32, 32), color=(0, 0, 0)).save(references[0])
+    assert hash_file(references[0]) != before[1]
+    assert hash_config(base) != before[0]
+
+
+class TestResume:
+    """Test resuming a BatchProcessor run from its journal."""
+
+    def test_journal_records_every_image(self, tmp_path, sample_images, monkeypatch):
+        """Test that each processed image ends with a completed record."""
+        pages, references = sample_images
+        processor = make_processor(tmp_path, references, monkeypatch)
+        processor.add_images(pages)
+        processor.start_processing()
+
+        journal_path = tmp_path / "output" / JOURNAL_FILENAME
+        states = [json.loads(line)["state"] for line in journal_path.read_text().splitlines()]
+        assert states.count(JobJournal.STARTED) == 3
+        assert states.count(JobJournal.COMPLETED) == 3
+        assert not list((tmp_path / "output").glob(".*.partial*"))
+
+    def test_resume_skips_completed_images(self, tmp_path, sample_images, monkeypatch):
+        """Test that a resumed run redoes only the images that did not complete."""
+        pages, references = sample_images
+
+        def crash_on_last(queue_item):
+            if Path(queue_item.input_path).name == "page_2.png":
+                raise first._record_failure(queue_item, "colorizing", RuntimeError("crash"))
+
+        first = make_processor(tmp_path, references, monkeypatch, colorize=crash_on_last)
+        first.add_images(pages)
+        first.start_processing()
+        first.journal.close()
+
+        colorized = []
+        second = make_processor(tmp_path, references, monkeypatch, colorize=colorized.append)
+        second.add_images(pages)
+        second.start_processing()
+
+        assert [Path(item.input_path).name for item in colorized] == ["page_2.png"]
+        assert second.get_status()["resumed"] == 2
+        assert second.status_tracker.get_summary().completed == 1
+
+    def test_changed_input_is_redone(self, tmp_path, sample_images, monkeypatch):
+        """Test that an image whose content changed since it completed is processed again."""
+        pages, references = sample_images
+        first = make_processor(tmp_path, references, monkeypatch)
+        first.add_images(pages)
+        first.start_processing()
+        first.journal.close()
+
+        Image.new('RGB', (32, 32), color=(0, 0, 0)).save(pages[0])
+        second = make_processor(tmp_path, references, monkeypatch)
+        second.add_images(pages)
+
+        assert second.queue.size() == 1
+        assert second.resumed_count == 2
+        # the journal owns the earlier output, so it is redone in place rather than next to it
+        assert Path(second.queue.dequeue().output_path).name == "page_0_colorized.png"
+
+    def test_rerun_without_resume_keeps_earlier_outputs(self, tmp_path, sample_images, monkeypatch):
+        """Test that a journaled rerun without resume or overwrite numbers new outputs."""
+        pages, references = sample_images
+        journal_path = str(tmp_path / "output" / JOURNAL_FILENAME)
+        first = make_processor(tmp_path, references, monkeypatch, resume=False, journal_path=journal_path)
+        first.add_images(pages)
+        first.start_processing()
+        first.journal.close()
+
+        second = make_processor(tmp_path, references, monkeypatch, resume=False, journal_path=journal_path)
+        second.add_images(pages)
+
+        assert second.queue.size() == 3
+        assert all(Path(item.output_path).stem.endswith("_colorized_1") for item in second.queue)
+
+    def test_all_completed_adds_nothing(self, tmp_path, sample_images, monkeypatch):
+        """Test that resuming a finished batch queues nothing without raising."""
+        pages, references = sample_images
+        first = make_processor(tmp_path, references, monkeypatch)
+        first.add_images(pages)
+        first.start_processing()
+        first.journal.close()
+
+        second = make_processor(tmp_path, references, monkeypatch)
+        second.add_images(pages)
+        assert second.queue.size() == 0
+        assert second.resumed_count == 3
+
+    def test_no_journal_by_default(self, tmp_path, sample_images, monkeypatch):
+        """Test that no journal is kept unless a path or resume is configured."""
+        _, references = sample_images
+        processor = make_processor(tmp_path, references, monkeypatch, resume=False)
+        assert processor.journal is None
+        assert not (tmp_path / "output" / JOURNAL_FILENAME).exists()
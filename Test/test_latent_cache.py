@@ -0,0 +1,105 @@
+"""
+Tests for the ReferenceLatentCache class.
+
+This module tests the in-memory LRU tier, the memory-mapped on-disk tier
+and the statistics of the reference latent store used by BatchProcessor.
+"""
+
+import pytest
+import torch
+
+from batch_processing.config import BatchConfig
+from batch_processing.exceptions import ConfigurationError
+from batch_processing.memory import ReferenceLatentCache
+
+
+def latent(value):
+    return torch.full((8, 4, 4), float(value))
+
+
+class TestReferenceLatentCache:
+    """Tests for ReferenceLatentCache behaviour."""
+
+    def test_memory_hit_and_miss(self):
+        """Test that lookups count memory hits and misses."""
+        cache = ReferenceLatentCache(max_entries=2)
+        assert cache.get("a") is None
+
+        cache.put("a", latent(1))
+        assert torch.equal(cache.get("a"), latent(1))
+        assert cache.get_stats() == {"entries": 1, "memory_hits": 1, "disk_hits": 0, "misses": 1, "evictions": 0}
+
+    def test_evicts_least_recently_used(self):
+        """Test that the memory tier evicts the least recently used latent."""
+        cache = ReferenceLatentCache(max_entries=2)
+        cache.put("a", latent(1))
+        cache.put("b", latent(2))
+        cache.get("a")
+        cache.put("c", latent(3))
+
+        assert "a" in cache and "c" in cache
+        assert "b" not in cache
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_stores_a_copy(self):
+        """Test that a cached slice does not alias the encoded batch."""
+        batch = torch.stack([latent(1), latent(2)])
+        cache = ReferenceLatentCache()
+        cache.put("a", batch[0])
+        batch.zero_()
+
+        assert torch.equal(cache.get("a"), latent(1))
+
+    def test_disk_tier_persists_across_instances(self, tmp_path):
+        """Test that latents written by one cache are served from disk by another."""
+        ReferenceLatentCache(cache_dir=str(tmp_path)).put("ab12", latent(3))
+
+        cache = ReferenceLatentCache(cache_dir=str(tmp_path))
+        assert "ab12" in cache
+        loaded = cache.get("ab12")
+        assert torch.equal(loaded, latent(3))
+        assert cache.get("ab12") is loaded
+        assert cache.get_stats()["disk_hits"] == 1
+        assert cache.get_stats()["memory_hits"] == 1
+        assert (tmp_path / "ab" / "ab12.npy").exists()
+
+    def test_disk_tier_stores_bfloat16_as_float32(self, tmp_path):
+        """Test that bfloat16 latents round-trip through the disk tier."""
+        ReferenceLatentCache(cache_dir=str(tmp_path)).put("cd34", latent(0.5).to(torch.bfloat16))
+
+        loaded = ReferenceLatentCache(cache_dir=str(tmp_path)).get("cd34")
+        assert loaded.dtype == torch.float32
+        assert torch.equal(loaded, latent(0.5))
+
+    def test_unreadable_file_is_a_miss(self, tmp_path):
+        """Test that a corrupt cache file is ignored."""
+        (tmp_path / "ef").mkdir()
+        (tmp_path / "ef" / "ef56.npy").write_bytes(b"not a numpy file")
+
+        cache = ReferenceLatentCache(cache_dir=str(tmp_path))
+        assert cache.get("ef56") is None
+        assert cache.get_stats()["misses"] == 1
+
+    def test_clear_disk(self, tmp_path):
+        """Test that clear(disk=True) removes the persistent tier."""
+        cache = ReferenceLatentCache(cache_dir=str(tmp_path))
+        cache.put("ab12", latent(1))
+        cache.clear(disk=True)
+
+        assert len(cache) == 0
+        assert "ab12" not in cache
+
+    def test_invalid_limits(self):
+        """Test that a negative entry limit is rejected."""
+        with pytest.raises(ValueError, match="max_entries"):
+            ReferenceLatentCache(max_entries=-1)
+
+
+def test_batch_config_latent_cache_settings():
+    """Test the latent cache defaults and validation of BatchConfig."""
+    config = BatchConfig(input_dir="in", output_dir="out", reference_images=[])
+    assert config.latent_cache_size == 256
+    assert config.latent_cache_dir is None
+
+    with pytest.raises(ConfigurationError, match="latent_cache_size"):
+        BatchConfig(input_dir="in", output_dir="out", reference_images=[], latent_cache_size=-1)
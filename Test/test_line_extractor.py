@@ -0,0 +1,99 @@
+"""
+Tests for the batched LineExtractor.
+
+A randomly initialized res_skip stands in for the checkpoint; the tests
+compare the batched extractor against the single-page reference path.
+"""
+
+import copy
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from cobra_utils.line_extractor import LineExtractor, to_gray_array
+from cobra_utils.utils import res_skip
+
+
+class CountingModel(torch.nn.Module):
+    """Stand-in for res_skip that records its batch sizes and inverts the page."""
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def forward(self, x):
+        self.batch_sizes.append(x.shape[0])
+        return 255 - x
+
+
+@pytest.fixture(scope="module")
+def line_model():
+    torch.manual_seed(0)
+    return res_skip().eval()
+
+
+def random_page(width, height, seed):
+    rng = np.random.RandomState(seed)
+    return Image.fromarray(rng.randint(0, 255, (height, width, 3), dtype=np.uint8))
+
+
+def reference_extract(model, image):
+    """Single-page float32 extraction, padding with ones to a multiple of 16."""
+    src = to_gray_array(image)
+    rows = int(np.ceil(src.shape[0] / 16)) * 16
+    cols = int(np.ceil(src.shape[1] / 16)) * 16
+    patch = np.ones((1, 1, rows, cols), dtype="float32")
+    patch[0, 0, 0:src.shape[0], 0:src.shape[1]] = src
+    with torch.no_grad():
+        y = model(torch.from_numpy(patch)).numpy()[0, 0]
+    return np.clip(y, 0, 255)[0:src.shape[0], 0:src.shape[1]].astype(np.uint8)
+
+
+def test_batched_output_matches_single_page_extraction(line_model):
+    """Test that pages of mixed sizes give the same line art as one-by-one extraction."""
+    pages = [random_page(40, 32, 0), random_page(48, 32, 1), random_page(40, 30, 2), random_page(64, 48, 3)]
+    extractor = LineExtractor(line_model, "cpu", max_batch_size=4)
+
+    lines = extractor.extract(pages)
+
+    assert [line.dtype for line in lines] == [torch.uint8] * len(pages)
+    for page, line in zip(pages, lines):
+        assert tuple(line.shape) == (page.height, page.width)
+        expected = reference_extract(line_model, page)
+        assert np.abs(line.numpy().astype(int) - expected.astype(int)).max() <= 1
+
+
+def test_pages_are_grouped_by_padded_size():
+    """Test that pages sharing a padded size are batched up to max_batch_size."""
+    model = CountingModel()
+    extractor = LineExtractor(model, "cpu", max_batch_size=2)
+    pages = [np.full((32, 32), idx, dtype=np.uint8) for idx in range(3)] + [np.zeros((20, 48), dtype=np.uint8)]
+
+    lines = extractor.extract(pages)
+
+    # 32x32 pages in batches of 2 and 1, the 20x48 page padded to 32x48 on its own
+    assert model.batch_sizes == [2, 1, 1]
+    assert [int(line[0, 0]) for line in lines] == [255, 254, 253, 255]
+    assert tuple(lines[3].shape) == (20, 48)
+
+
+def test_channels_last_and_half_precision(line_model):
+    """Test channels_last execution against the reference and bfloat16 output types."""
+    pages = [random_page(32, 32, 4), random_page(32, 32, 5)]
+
+    channels_last = LineExtractor(copy.deepcopy(line_model), "cpu", channels_last=True).extract(pages)
+    half = LineExtractor(copy.deepcopy(line_model), "cpu", dtype=torch.bfloat16).extract(pages)
+
+    for page, line in zip(pages, channels_last):
+        expected = reference_extract(line_model, page)
+        assert np.abs(line.numpy().astype(int) - expected.astype(int)).max() <= 1
+    assert [tuple(line.shape) for line in half] == [(32, 32), (32, 32)]
+    assert all(line.dtype == torch.uint8 for line in half)
+
+
+def test_invalid_batch_size():
+    """Test that max_batch_size must be positive."""
+    with pytest.raises(ValueError, match="max_batch_size"):
+        LineExtractor(CountingModel(), "cpu", max_batch_size=0)
@@ -4,6 +4,9 @@ Tests for the batch processing queue system.
 This module contains unit tests for the ImageQueue and ImageQueueItem classes.
 """
 
+import threading
+import time
+
 import pytest
 from batch_processing.core.queue import ImageQueue, ImageQueueItem
 
@@ -488,5 +491,135 @@ class TestQueueIntegration:
         assert actual_order == expected_order
 
 
+
+def make_item(item_id, priority=0):
+    return ImageQueueItem(
+        id=item_id,
+        input_path=f"/path/to/{item_id}.png",
+        output_path=f"/path/to/{item_id}_out.png",
+        priority=priority
+    )
+
+
+class TestImageQueueUpdates:
+    """Tests for removal, priority updates and snapshots."""
+    
+    def test_remove_by_id(self):
+        """Test that a removed item is never dequeued."""
+        queue = ImageQueue()
+        for item_id in ["img1", "img2", "img3"]:
+            queue.enqueue(make_item(item_id))
+        
+        assert queue.remove("img2").id == "img2"
+        assert queue.remove("img2") is None
+        assert "img2" not in queue
+        assert len(queue) == 2
+        assert [queue.dequeue().id, queue.dequeue().id] == ["img1", "img3"]
+        assert queue.dequeue() is None
+    
+    def test_update_priority(self):
+        """Test that a re-prioritized item moves but keeps FIFO order within its priority."""
+        queue = ImageQueue()
+        for item_id, priority in [("img1", 5), ("img2", 0), ("img3", 5), ("img4", 0)]:
+            queue.enqueue(make_item(item_id, priority))
+        
+        assert queue.update_priority("img2", 5)
+        assert not queue.update_priority("missing", 1)
+        # img2 was enqueued before img3, so it precedes it at priority 5
+        assert [item.id for item in queue] == ["img1", "img2", "img3", "img4"]
+        assert queue.peek().priority == 5
+    
+    def test_snapshot_is_not_affected_by_consumers(self):
+        """Test that iteration walks a snapshot while items are dequeued."""
+        queue = ImageQueue()
+        for i in range(10):
+            queue.enqueue(make_item(f"img{i}"))
+        
+        seen = []
+        for item in queue:
+            seen.append(item.id)
+            queue.dequeue()
+        
+        assert seen == [f"img{i}" for i in range(10)]
+        assert len(queue) == 0
+    
+    def test_many_removals_keep_order(self):
+        """Test that compacting removed entries keeps the processing order."""
+        queue = ImageQueue()
+        for i in range(500):
+            queue.enqueue(make_item(f"img{i}", priority=i % 3))
+        for i in range(0, 500, 2):
+            queue.remove(f"img{i}")
+        
+        order = []
+        while queue:
+            order.append(queue.dequeue())
+        
+        assert len(order) == 250
+        assert [item.priority for item in order] == sorted((item.priority for item in order), reverse=True)
+        for priority in range(3):
+            ids = [int(item.id[3:]) for item in order if item.priority == priority]
+            assert ids == sorted(ids)
+    
+    def test_reorder_permutes_listed_items_only(self):
+        """Test that reorder rearranges listed items among their positions, below priorities."""
+        queue = ImageQueue()
+        for item_id, priority in [("img1", 0), ("img2", 0), ("img3", 1), ("img4", 0), ("img5", 0)]:
+            queue.enqueue(make_item(item_id, priority))
+        
+        assert queue.reorder(["img5", "img3", "img2", "missing"]) == 3
+        # img2/img3/img5 swap positions; img1 and img4 keep theirs, img3 keeps its priority
+        assert [item.id for item in queue] == ["img3", "img1", "img5", "img4", "img2"]
+        queue.enqueue(make_item("img6"))
+        assert [queue.dequeue().id for _ in range(6)] == ["img3", "img1", "img5", "img4", "img2", "img6"]
+
+
+class TestImageQueueBlockingGet:
+    """Tests for the blocking get used by concurrent consumers."""
+    
+    def test_get_times_out_on_empty_queue(self):
+        """Test that get returns None once the timeout expires."""
+        queue = ImageQueue()
+        start = time.monotonic()
+        assert queue.get(timeout=0.05) is None
+        assert time.monotonic() - start >= 0.04
+    
+    def test_get_wakes_when_an_item_arrives(self):
+        """Test that a blocked consumer receives an item enqueued later."""
+        queue = ImageQueue()
+        received = []
+        consumer = threading.Thread(target=lambda: received.append(queue.get(timeout=5)))
+        consumer.start()
+        time.sleep(0.05)
+        queue.enqueue(make_item("img1"))
+        consumer.join(timeout=5)
+        
+        assert [item.id for item in received] == ["img1"]
+    
+    def test_multiple_consumers_receive_each_item_once(self):
+        """Test that concurrent consumers split the items without duplicates."""
+        queue = ImageQueue()
+        received = []
+        lock = threading.Lock()
+        
+        def consume():
+            while True:
+                item = queue.get(timeout=0.5)
+                if item is None:
+                    return
+                with lock:
+                    received.append(item.id)
+        
+        consumers = [threading.Thread(target=consume) for _ in range(4)]
+        for consumer in consumers:
+            consumer.start()
+        for i in range(1000):
+            queue.enqueue(make_item(f"img{i}"))
+        for consumer in consumers:
+            consumer.join(timeout=10)
+        
+        assert sorted(received) == sorted(f"img{i}" for i in range(1000))
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,102 @@
+"""
+Tests for the ReferenceContextCache class.
+
+This module tests LRU ordering, entry and byte budgets, and hit/miss
+statistics of the reference context store used by BatchProcessor.
+"""
+
+import pytest
+
+from batch_processing.config import BatchConfig
+from batch_processing.exceptions import ConfigurationError
+from batch_processing.memory import ReferenceContextCache
+
+
+class FakeContext:
+    """Stand-in for a pipeline reference context with a known size."""
+
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+class TestReferenceContextCache:
+    """Tests for ReferenceContextCache behaviour."""
+
+    def test_get_miss_and_hit(self):
+        """Test that lookups count hits and misses."""
+        cache = ReferenceContextCache(max_entries=2)
+        assert cache.get("a") is None
+
+        context = FakeContext(10)
+        cache.put("a", context)
+
+        assert cache.get("a") is context
+        assert cache.get_stats() == {"entries": 1, "bytes": 10, "hits": 1, "misses": 1, "evictions": 0}
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = ReferenceContextCache(max_entries=2)
+        cache.put("a", FakeContext(1))
+        cache.put("b", FakeContext(1))
+        cache.get("a")
+        cache.put("c", FakeContext(1))
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+        assert cache.evictions == 1
+
+    def test_byte_budget(self):
+        """Test that the byte budget evicts entries and rejects oversized ones."""
+        cache = ReferenceContextCache(max_entries=10, max_bytes=100)
+        cache.put("a", FakeContext(60))
+        cache.put("b", FakeContext(60))
+
+        assert len(cache) == 1
+        assert "b" in cache
+        assert cache.total_bytes == 60
+
+        cache.put("huge", FakeContext(500))
+        assert "huge" not in cache
+
+    def test_replace_existing_key(self):
+        """Test that re-inserting a key replaces its size accounting."""
+        cache = ReferenceContextCache(max_entries=2)
+        cache.put("a", FakeContext(10))
+        cache.put("a", FakeContext(30))
+
+        assert len(cache) == 1
+        assert cache.total_bytes == 30
+
+    def test_disabled_cache(self):
+        """Test that max_entries=0 never stores anything."""
+        cache = ReferenceContextCache(max_entries=0)
+        cache.put("a", FakeContext(1))
+        assert len(cache) == 0
+
+    def test_clear(self):
+        """Test that clear drops entries and statistics."""
+        cache = ReferenceContextCache()
+        cache.put("a", FakeContext(5))
+        cache.get("a")
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.get_stats()["hits"] == 0
+
+    def test_invalid_limits(self):
+        """Test that negative limits are rejected."""
+        with pytest.raises(ValueError, match="max_entries must be non-negative"):
+            ReferenceContextCache(max_entries=-1)
+        with pytest.raises(ValueError, match="max_bytes must be non-negative"):
+            ReferenceContextCache(max_bytes=-1)
+
+
+def test_batch_config_reference_cache_size():
+    """Test the reference_cache_size configuration field."""
+    config = BatchConfig(input_dir="in", output_dir="out", reference_images=[])
+    assert config.reference_cache_size == 4
+    assert config.to_dict()["reference_cache_size"] == 4
+
+    with pytest.raises(ConfigurationError, match="reference_cache_size must be non-negative"):
+        BatchConfig(input_dir="in", output_dir="out", reference_images=[], reference_cache_size=-1)
@@ -0,0 +1,124 @@
+"""
+Tests for the ReferenceIndex used for reference patch retrieval.
+
+A tiny randomly initialized CLIP vision model stands in for the real
+encoder so the tests run on CPU without downloading weights.
+"""
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+transformers = pytest.importorskip("transformers")
+from transformers import CLIPImageProcessor, CLIPVisionConfig, CLIPVisionModelWithProjection
+
+from cobra_utils.reference_index import ReferenceIndex, clip_preprocess, image_to_tensor, reference_patches, window_patches
+from cobra_utils.utils import process_image, process_image_Q_varres, process_image_ref_varres
+
+
+@pytest.fixture(scope="module")
+def tiny_encoder():
+    """Create a small CLIP vision encoder with random weights."""
+    torch.manual_seed(0)
+    config = CLIPVisionConfig(
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        projection_dim=16,
+        image_size=224,
+        patch_size=32,
+    )
+    return CLIPVisionModelWithProjection(config).eval(), CLIPImageProcessor()
+
+
+@pytest.fixture
+def reference_images():
+    """Create random reference images with different aspect ratios."""
+    rng = np.random.RandomState(0)
+    return [Image.fromarray(rng.randint(0, 255, (300, 200 + 50 * i, 3), dtype=np.uint8)) for i in range(3)]
+
+
+def test_retrieve_matches_pairwise_cosine_ranking(tiny_encoder, reference_images):
+    """Test that matmul + topk retrieval matches the per-page cosine/argsort ranking."""
+    encoder, processor = tiny_encoder
+    width, height = 128, 160
+    index = ReferenceIndex(reference_images, encoder, processor, "cpu", encode_batch_size=4)
+
+    query = Image.fromarray(np.random.RandomState(1).randint(0, 255, (256, 256, 3), dtype=np.uint8))
+    query_patches = process_image_Q_varres(query.resize((width, height)), width, height)
+    retrieved = index.retrieve(index.encode(query_patches), (width, height), top_k=3)
+
+    expected_patches = []
+    for image in reference_images:
+        expected_patches += process_image_ref_varres(process_image(image, width, height), width, height)
+    def embed(patches):
+        return torch.cat([
+            encoder(clip_preprocess(image_to_tensor(patch)[None], processor, "cpu", torch.float32)).image_embeds
+            for patch in patches
+        ])
+
+    with torch.no_grad():
+        query_embeds = embed(query_patches)
+        ref_embeds = embed(expected_patches)
+    similarities = F.cosine_similarity(query_embeds.unsqueeze(1), ref_embeds.unsqueeze(0), dim=-1)
+    expected = torch.argsort(similarities, descending=True, dim=1)[:, :3].tolist()
+
+    assert len(retrieved) == len(query_patches)
+    for patches, indices in zip(retrieved, expected):
+        assert [patch.tobytes() for patch in patches] == [expected_patches[i].tobytes() for i in indices]
+
+
+def test_bucket_is_encoded_once(tiny_encoder, reference_images, monkeypatch):
+    """Test that reference patches are encoded once per resolution bucket."""
+    encoder, processor = tiny_encoder
+    index = ReferenceIndex(reference_images, encoder, processor, "cpu")
+
+    calls = []
+    original_encode = index.encode
+    monkeypatch.setattr(index, "encode", lambda patches: calls.append(len(patches)) or original_encode(patches))
+
+    query = torch.randn(4, 16)
+    index.retrieve(query, (128, 160), top_k=2)
+    index.retrieve(query, (128, 160), top_k=2)
+    assert len(calls) == 1
+
+    index.retrieve(query, (160, 128), top_k=2)
+    assert len(calls) == 2
+    assert len(index.get_bucket((128, 160)).embeddings) == calls[0]
+
+
+def test_tensor_patches_match_pil_crops(reference_images):
+    """Test that the tensor windows are the crops of process_image_Q_varres / process_image_ref_varres."""
+    width, height = 128, 160
+    image = process_image(reference_images[1], width, height)
+
+    expected = process_image_ref_varres(image, width, height)
+    patches = reference_patches(image_to_tensor(image))
+
+    assert len(patches) == len(expected) == 5
+    for patch, crop in zip(patches, expected):
+        assert np.array_equal(patch.permute(1, 2, 0).numpy(), np.array(crop))
+    windows = window_patches(image_to_tensor(image))
+    assert [tuple(window.shape) for window in windows] == [(3, 120, 96)] * 4
+    assert all(np.array_equal(window.permute(1, 2, 0).numpy(), np.array(crop))
+               for window, crop in zip(windows, process_image_Q_varres(image, width, height)))
+
+
+def test_clip_preprocess_matches_image_processor(tiny_encoder):
+    """Test that batched tensor preprocessing is close to CLIPImageProcessor."""
+    _, processor = tiny_encoder
+    # smooth images, so the comparison measures the pipeline rather than resampling of noise
+    gradient = np.linspace(0, 255, 300, dtype=np.float32)
+    images = [
+        Image.fromarray(np.stack([np.tile(gradient[:200], (300, 1)).T * scale for scale in (1.0, 0.5, 0.25)], -1).astype(np.uint8))
+        for _ in range(2)
+    ]
+
+    expected = processor(images=images, return_tensors="pt").pixel_values
+    pixel_values = clip_preprocess(torch.stack([image_to_tensor(image) for image in images]), processor, "cpu", torch.float32)
+
+    assert pixel_values.shape == expected.shape
+    assert (pixel_values - expected).abs().mean() < 0.02
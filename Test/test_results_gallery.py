@@ -0,0 +1,71 @@
+"""
+Tests for the incremental results gallery.
+
+This module tests that ResultsGallery collects completed pages from
+StatusTracker events as thumbnails, adds each page once, and loads the
+full-resolution output of a selected item.
+"""
+
+from PIL import Image
+
+from batch_processing.core.status import ProcessingState, StatusTracker
+from batch_processing.io.thumbnails import ThumbnailCache
+from batch_processing.ui.results_gallery import ResultsGallery
+
+
+def complete(tracker, tmp_path, index, size=(120, 80)):
+    image_id = f"img_{index}"
+    output = tmp_path / f"page_{index}_colorized.png"
+    Image.new('RGB', size, (index * 40, 0, 0)).save(output)
+    tracker.add_image(image_id, input_path=f"/in/page_{index}.png")
+    tracker.update_status(image_id, ProcessingState.COMPLETED.value, output_path=str(output))
+    return str(output)
+
+
+def test_refresh_adds_only_completed_pages(tmp_path):
+    """Test that refresh() adds newly completed pages once, as thumbnails."""
+    tracker = StatusTracker()
+    complete(tracker, tmp_path, 0)
+    gallery = ResultsGallery(tracker, ThumbnailCache(cache_dir=str(tmp_path / "thumbs"), size=32))
+    assert len(gallery) == 1
+
+    tracker.add_image("pending", input_path="/in/pending.png")
+    complete(tracker, tmp_path, 1)
+    assert gallery.refresh() == 1
+    assert gallery.refresh() == 0
+
+    items = gallery.items()
+    assert [caption for _, caption in items] == ["page_0_colorized.png", "page_1_colorized.png"]
+    assert gallery.items(start=1) == items[1:]
+    for thumbnail_path, _ in items:
+        with Image.open(thumbnail_path) as thumbnail:
+            assert max(thumbnail.size) == 32
+
+
+def test_full_resolution_on_demand(tmp_path):
+    """Test that a selected item is loaded from its output at full size."""
+    tracker = StatusTracker()
+    output = complete(tracker, tmp_path, 0, size=(640, 480))
+    gallery = ResultsGallery(tracker, ThumbnailCache(cache_dir=str(tmp_path / "thumbs")))
+
+    assert gallery.output_path(0) == output
+    assert gallery.load_full_resolution(0).size == (640, 480)
+    assert gallery.load_full_resolution(5) is None
+
+
+def test_clear_changes_version_and_close(tmp_path):
+    """Test that clearing the tracker empties the gallery and a closed gallery stops updating."""
+    tracker = StatusTracker()
+    complete(tracker, tmp_path, 0)
+    gallery = ResultsGallery(tracker, ThumbnailCache(cache_dir=str(tmp_path / "thumbs")))
+    version = gallery.version
+
+    tracker.clear()
+    gallery.refresh()
+    assert len(gallery) == 0
+    assert gallery.version != version
+
+    gallery.close()
+    complete(tracker, tmp_path, 1)
+    gallery.refresh()
+    assert len(gallery) == 0
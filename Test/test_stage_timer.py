@@ -0,0 +1,48 @@
+"""
+Tests for StageTimer.
+
+This module tests that stages are reported with their wall time, that no
+per-stage memory is reported on the CPU, and that CUDA stages are only
+reported on flush, together with the page's peak memory.
+"""
+
+import time
+
+import pytest
+import torch
+
+from cobra_utils.stage_timer import StageTimer
+
+
+def test_cpu_stages_are_reported_immediately():
+    """Test that CPU stages report their time at once and no memory."""
+    records = []
+    timer = StageTimer(lambda *record: records.append(record), measure_peak=True)
+
+    with timer.stage("decode"):
+        time.sleep(0.01)
+    with pytest.raises(RuntimeError):
+        with timer.stage("save"):
+            raise RuntimeError("disk full")
+
+    assert [(name, peak) for name, _, peak in records] == [("decode", None), ("save", None)]
+    assert records[0][1] >= 0.01
+    timer.flush()
+    assert len(records) == 2
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="requires CUDA")
+def test_cuda_stages_are_deferred_until_flush():
+    """Test that CUDA stages are reported by flush, followed by the page peak."""
+    records = []
+    timer = StageTimer(lambda *record: records.append(record), device="cuda", measure_peak=True)
+
+    for _ in range(3):
+        with timer.stage("denoise"):
+            torch.randn(256, 256, device="cuda") @ torch.randn(256, 256, device="cuda")
+    assert records == []
+
+    timer.flush()
+    assert [name for name, _, _ in records] == ["denoise"] * 3 + ["model"]
+    assert all(peak is None for _, _, peak in records[:3])
+    assert records[-1][2] > 0
@@ -0,0 +1,278 @@
+"""
+Tests for the overlapped batch pipeline.
+
+This module tests the StagedPipeline and the BatchProcessor running with
+overlap_stages enabled. The model stages are replaced by fakes so no models
+are loaded.
+"""
+
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from batch_processing import BatchConfig, BatchProcessor
+from batch_processing.core import PipelineStage, StagedPipeline
+from batch_processing.core.status import ProcessingState
+from batch_processing.exceptions import ConfigurationError, ImageProcessingError
+
+
+def make_source(items):
+    remaining = iter(items)
+    return lambda: next(remaining, None)
+
+
+@pytest.fixture
+def temp_dirs():
+    """Create temporary input and output directories."""
+    input_dir = tempfile.mkdtemp()
+    output_dir = tempfile.mkdtemp()
+
+    yield input_dir, output_dir
+
+    shutil.rmtree(input_dir, ignore_errors=True)
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def sample_images(temp_dirs):
+    """Create sample input and reference images."""
+    input_dir, _ = temp_dirs
+    paths = []
+    for name in [f"page_{i}" for i in range(5)] + ["reference"]:
+        path = Path(input_dir) / f"{name}.png"
+        Image.new('RGB', (32, 32), color=(255, 255, 255)).save(path)
+        paths.append(str(path))
+    return paths[:-1], paths[-1:]
+
+
+def make_processor(temp_dirs, references, monkeypatch, colorize=None, **kwargs):
+    input_dir, output_dir = temp_dirs
+    config = BatchConfig(input_dir=input_dir, output_dir=output_dir, reference_images=references, **kwargs)
+    processor = BatchProcessor(config, engine=object())
+
+    def load_page(queue_item):
+        processor.status_tracker.update_status(queue_item.id, ProcessingState.PROCESSING.value)
+        return Image.open(queue_item.input_path)
+
+    def colorize_page(queue_item, page, engine=None):
+        if colorize is not None:
+            colorize(queue_item)
+        return page.convert('RGB')
+
+    monkeypatch.setattr(processor, "_load_page", load_page)
+    monkeypatch.setattr(processor, "_colorize_page", colorize_page)
+    return processor
+
+
+class TestStagedPipeline:
+    """Test the StagedPipeline class."""
+
+    def test_items_pass_through_every_stage(self):
+        """Test that every item is processed by every stage."""
+        written = []
+        lock = threading.Lock()
+
+        def write(item, worker_idx):
+            with lock:
+                written.append(item)
+
+        pipeline = StagedPipeline(
+            make_source(range(10)),
+            [
+                PipelineStage("load", lambda item, worker_idx: item * 2, workers=2),
+                PipelineStage("model", lambda item, worker_idx: item + 1),
+                PipelineStage("write", write, workers=3),
+            ],
+        )
+        pipeline.run()
+
+        assert sorted(written) == [item * 2 + 1 for item in range(10)]
+        stats = pipeline.get_stats()
+        assert [stats["stages"][name]["items"] for name in ("load", "model", "write")] == [10, 10, 10]
+        assert set(stats["queues"]) == {"model", "write"}
+        assert all(queue["depth"] == 0 for queue in stats["queues"].values())
+
+    def test_stages_overlap(self):
+        """Test that a slow model stage keeps running while other pages are loaded and written."""
+        events = []
+        lock = threading.Lock()
+
+        def record(name, delay):
+            def func(item, worker_idx):
+                with lock:
+                    events.append((name, item))
+                time.sleep(delay)
+                return item
+            return func
+
+        pipeline = StagedPipeline(
+            make_source(range(4)),
+            [
+                PipelineStage("load", record("load", 0.0)),
+                PipelineStage("model", record("model", 0.05)),
+                PipelineStage("write", record("write", 0.0)),
+            ],
+            queue_size=2,
+        )
+        pipeline.run()
+
+        # Page 1 is loaded before page 0 leaves the model stage
+        assert events.index(("load", 1)) < events.index(("write", 0))
+        assert pipeline.get_stats()["stages"]["model"]["utilization"] > 0.5
+
+    def test_queue_size_bounds_prefetch(self):
+        """Test that loading cannot run ahead of the model stage by more than the queue size."""
+        model_started = threading.Event()
+        release = threading.Event()
+        loaded = []
+
+        def load(item, worker_idx):
+            loaded.append(item)
+            return item
+
+        def model(item, worker_idx):
+            model_started.set()
+            release.wait(timeout=5)
+            return item
+
+        pipeline = StagedPipeline(
+            make_source(range(10)),
+            [PipelineStage("load", load), PipelineStage("model", model)],
+            queue_size=2,
+        )
+        thread = threading.Thread(target=pipeline.run)
+        thread.start()
+        model_started.wait(timeout=5)
+        time.sleep(0.05)
+
+        # One page in the model, two queued, one blocked on the full queue
+        assert len(loaded) <= 4
+        assert pipeline.get_stats()["queues"]["model"]["depth"] == 2
+
+        release.set()
+        thread.join(timeout=5)
+        assert len(loaded) == 10
+        assert pipeline.get_stats()["queues"]["model"]["max_depth"] == 2
+
+    def test_errors_drop_the_item(self):
+        """Test that an exception in a stage drops the item without stopping the pipeline."""
+        written = []
+
+        def model(item, worker_idx):
+            if item == 1:
+                raise RuntimeError("boom")
+            return item
+
+        StagedPipeline(
+            make_source(range(3)),
+            [
+                PipelineStage("model", model),
+                PipelineStage("write", lambda item, worker_idx: written.append(item)),
+            ],
+        ).run()
+        assert sorted(written) == [0, 2]
+
+    def test_stop_discards_cancellable_items(self):
+        """Test that a stop request discards queued model inputs but still writes finished items."""
+        stop = threading.Event()
+        discarded = []
+        written = []
+
+        def load(item, worker_idx):
+            return item
+
+        def model(item, worker_idx):
+            stop.set()
+            return item
+
+        pipeline = StagedPipeline(
+            make_source(range(10)),
+            [
+                PipelineStage("load", load),
+                PipelineStage("model", model),
+                PipelineStage("write", lambda item, worker_idx: written.append(item), cancellable=False),
+            ],
+            queue_size=2,
+            should_stop=stop.is_set,
+            on_discard=discarded.append,
+        )
+        pipeline.run()
+
+        assert written == [0]
+        assert len(written) + len(discarded) == pipeline.get_stats()["stages"]["load"]["items"]
+
+    def test_invalid_arguments(self):
+        """Test that empty pipelines and empty queues are rejected."""
+        with pytest.raises(ValueError, match="at least one stage"):
+            StagedPipeline(make_source([]), [])
+        with pytest.raises(ValueError, match="queue_size"):
+            StagedPipeline(make_source([]), [PipelineStage("load", lambda item, worker_idx: item)], queue_size=0)
+        with pytest.raises(ValueError, match="at least 1 worker"):
+            StagedPipeline(make_source([]), [PipelineStage("load", lambda item, worker_idx: item, workers=0)])
+
+
+class TestOverlappedBatchProcessor:
+    """Test BatchProcessor with overlap_stages enabled."""
+
+    def test_processes_and_saves_every_image(self, temp_dirs, sample_images, monkeypatch):
+        """Test that every image is colorized, saved and reported in the pipeline stats."""
+        pages, references = sample_images
+        processor = make_processor(temp_dirs, references, monkeypatch, writer_workers=2)
+        processor.add_images(pages)
+        processor.start_processing()
+
+        summary = processor.status_tracker.get_summary()
+        assert summary.completed == len(pages)
+        for image_id, status in processor.status_tracker.get_all_statuses().items():
+            assert Path(status.output_path).stat().st_size > 0
+
+        pipeline = processor.get_status()["pipeline"]
+        assert pipeline["stages"]["model"]["items"] == len(pages)
+        assert pipeline["stages"]["write"]["workers"] == 2
+        assert pipeline["queues"]["write"]["capacity"] == processor.config.stage_queue_size
+
+    def test_failed_image_does_not_stop_batch(self, temp_dirs, sample_images, monkeypatch):
+        """Test that a model failure marks only that image as failed."""
+        pages, references = sample_images
+
+        def colorize(queue_item):
+            if queue_item.input_path == pages[1]:
+                processor.status_tracker.update_status(queue_item.id, ProcessingState.FAILED.value)
+                raise ImageProcessingError(queue_item.input_path, "boom")
+
+        processor = make_processor(temp_dirs, references, monkeypatch, colorize=colorize)
+        processor.add_images(pages)
+        processor.start_processing()
+
+        summary = processor.status_tracker.get_summary()
+        assert summary.completed == len(pages) - 1
+        assert summary.failed == 1
+
+    def test_pause_requeues_loaded_pages(self, temp_dirs, sample_images, monkeypatch):
+        """Test that pausing puts loaded pages back into the queue as pending."""
+        pages, references = sample_images
+
+        def colorize(queue_item):
+            processor._paused = True
+
+        processor = make_processor(temp_dirs, references, monkeypatch, colorize=colorize)
+        processor.add_images(pages)
+        processor.start_processing()
+
+        summary = processor.status_tracker.get_summary()
+        assert summary.completed == 1
+        assert summary.pending == len(pages) - 1
+        assert processor.queue.size() == len(pages) - 1
+
+
+def test_stage_settings_validation(temp_dirs):
+    """Test that pipeline worker counts and queue size must be positive."""
+    input_dir, output_dir = temp_dirs
+    for name in ("prefetch_workers", "writer_workers", "stage_queue_size"):
+        with pytest.raises(ConfigurationError, match=name):
+            BatchConfig(input_dir=input_dir, output_dir=output_dir, reference_images=[], **{name: 0})
@@ -5,6 +5,9 @@ This module tests the StatusTracker and ProcessingStatus classes to ensure
 they correctly track and report processing status for batch operations.
 """
 
+import json
+import threading
+
 import pytest
 import time
 from batch_processing.core.status import (
@@ -463,5 +466,186 @@ class TestStatusTracker:
         assert status.output_path == "/out/img_001.png"
 
 
+class TestStageMetrics:
+    """Tests for per-stage timing and memory metrics."""
+    
+    def make_tracker(self):
+        tracker = StatusTracker()
+        for i in range(5):
+            image_id = f"img_{i}"
+            tracker.add_image(image_id)
+            tracker.update_status(image_id, ProcessingState.PROCESSING.value)
+            tracker.record_stage(image_id, "decode", 0.1 * (i + 1), peak_memory=1000 * (i + 1))
+            for _ in range(4):
+                tracker.record_stage(image_id, "denoise", 0.5)
+            tracker.update_status(image_id, ProcessingState.COMPLETED.value)
+        return tracker
+    
+    def test_record_stage_accumulates(self):
+        """Test that repeated runs of a stage add up and keep the highest peak."""
+        tracker = StatusTracker()
+        tracker.add_image("img_001")
+        tracker.record_stage("img_001", "controlnet", 0.25, peak_memory=100)
+        tracker.record_stage("img_001", "controlnet", 0.5, peak_memory=50)
+        tracker.record_stage("img_001", "save", 0.1)
+        
+        metrics = tracker.get_status("img_001").stage_metrics
+        assert list(metrics) == ["controlnet", "save"]
+        assert metrics["controlnet"].duration == pytest.approx(0.75)
+        assert metrics["controlnet"].calls == 2
+        assert metrics["controlnet"].peak_memory == 100
+        assert metrics["save"].peak_memory is None
+    
+    def test_record_stage_untracked_image(self):
+        """Test that recording a stage of an unknown image raises KeyError."""
+        with pytest.raises(KeyError):
+            StatusTracker().record_stage("missing", "decode", 0.1)
+    
+    def test_summary_percentiles(self):
+        """Test that the summary aggregates stage durations into percentiles."""
+        stats = self.make_tracker().get_summary().stage_stats
+        
+        assert stats["decode"]["images"] == 5
+        assert stats["decode"]["p50"] == pytest.approx(0.3)
+        assert stats["decode"]["p95"] == pytest.approx(0.48)
+        assert stats["decode"]["max"] == pytest.approx(0.5)
+        assert stats["decode"]["peak_memory"] == 5000
+        assert stats["denoise"]["p50"] == pytest.approx(2.0)
+        assert stats["denoise"]["total"] == pytest.approx(10.0)
+        assert stats["denoise"]["peak_memory"] is None
+    
+    def test_export_json(self):
+        """Test the JSON export of the stage metrics."""
+        exported = json.loads(self.make_tracker().export_metrics("json"))
+        
+        assert exported["summary"]["completed"] == 5
+        assert exported["stages"]["decode"]["p95"] == pytest.approx(0.48)
+        assert exported["images"]["img_0"]["stages"]["denoise"]["calls"] == 4
+    
+    def test_export_prometheus(self):
+        """Test the Prometheus text export of the stage metrics."""
+        exported = self.make_tracker().export_metrics("prometheus")
+        
+        assert '# TYPE cobra_stage_duration_seconds summary' in exported
+        assert 'cobra_batch_images{state="completed"} 5' in exported
+        assert 'cobra_stage_duration_seconds{stage="decode",quantile="0.95"} 0.480000' in exported
+        assert 'cobra_stage_duration_seconds_count{stage="denoise"} 5' in exported
+        assert 'cobra_stage_peak_memory_bytes{stage="decode"} 5000' in exported
+        assert 'cobra_stage_peak_memory_bytes{stage="denoise"}' not in exported
+    
+    def test_export_unknown_format(self):
+        """Test that an unknown export format is rejected."""
+        with pytest.raises(ValueError, match="Unknown metrics format"):
+            StatusTracker().export_metrics("csv")
+
+
+
+class TestStatusEvents:
+    """Test incremental counts and the status event stream."""
+    
+    def test_counts_follow_every_transition(self):
+        """Test that the O(1) summary matches the states after many updates."""
+        tracker = StatusTracker()
+        for i in range(100):
+            tracker.add_image(f"img_{i}")
+        for i in range(60):
+            tracker.update_status(f"img_{i}", ProcessingState.PROCESSING.value)
+        for i in range(40):
+            tracker.update_status(f"img_{i}", ProcessingState.COMPLETED.value)
+        tracker.update_status("img_40", ProcessingState.FAILED.value)
+        
+        summary = tracker.get_summary(include_stage_stats=False)
+        assert (summary.pending, summary.processing, summary.completed, summary.failed) == (40, 19, 40, 1)
+        assert summary.stage_stats == {}
+        for state in ProcessingState:
+            assert len(tracker.get_images_by_state(state.value)) == getattr(summary, state.value)
+    
+    def test_subscribers_receive_deltas_in_order(self):
+        """Test that subscribers get one event per change, with the previous state."""
+        tracker = StatusTracker()
+        events = []
+        tracker.subscribe(events.append)
+        
+        tracker.add_image("img_1", input_path="/in/page_1.png")
+        tracker.update_status("img_1", ProcessingState.PROCESSING.value)
+        tracker.update_status("img_1", ProcessingState.COMPLETED.value, output_path="/out/page_1.png")
+        tracker.clear()
+        
+        assert [event.kind for event in events] == ["added", "updated", "updated", "cleared"]
+        assert [event.sequence for event in events] == [1, 2, 3, 4]
+        assert events[0].input_path == "/in/page_1.png"
+        assert events[2].previous_state == ProcessingState.PROCESSING.value
+        assert events[2].output_path == "/out/page_1.png"
+        assert tracker.get_summary().total == 0
+    
+    def test_unsubscribe_and_faulty_subscribers(self):
+        """Test that unsubscribed callbacks stop and failing ones do not break updates."""
+        tracker = StatusTracker()
+        events = []
+        unsubscribe = tracker.subscribe(events.append)
+        
+        def fail(event):
+            raise RuntimeError("observer bug")
+        
+        tracker.subscribe(fail)
+        tracker.add_image("img_1")
+        unsubscribe()
+        tracker.update_status("img_1", ProcessingState.COMPLETED.value)
+        
+        assert len(events) == 1
+        assert tracker.get_status("img_1").state == ProcessingState.COMPLETED.value
+    
+    def test_concurrent_updates_keep_counts_consistent(self):
+        """Test that counts stay exact when workers update from several threads."""
+        tracker = StatusTracker()
+        for i in range(400):
+            tracker.add_image(f"img_{i}")
+        
+        def work(offset):
+            for i in range(offset, 400, 4):
+                tracker.update_status(f"img_{i}", ProcessingState.PROCESSING.value)
+                tracker.update_status(f"img_{i}", ProcessingState.COMPLETED.value)
+        
+        threads = [threading.Thread(target=work, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        summary = tracker.get_summary(include_stage_stats=False)
+        assert summary.completed == 400
+        assert summary.is_complete
+        assert summary.end_time is not None
+    
+    def test_reads_during_concurrent_adds(self):
+        """Test that state queries never see the status table mid-update."""
+        tracker = StatusTracker()
+        errors = []
+        done = threading.Event()
+        
+        def add():
+            for i in range(5000):
+                tracker.add_image(f"img_{i}")
+                tracker.update_status(f"img_{i}", ProcessingState.PROCESSING.value)
+            done.set()
+        
+        def read():
+            try:
+                while not done.is_set():
+                    for image_id in tracker.get_images_by_state(ProcessingState.PROCESSING.value):
+                        assert tracker.get_status(image_id).state == ProcessingState.PROCESSING.value
+                        break
+            except Exception as e:
+                errors.append(e)
+        
+        reader = threading.Thread(target=read)
+        reader.start()
+        add()
+        reader.join()
+        
+        assert errors == []
+        assert len(tracker.get_images_by_state(ProcessingState.PROCESSING.value)) == 5000
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
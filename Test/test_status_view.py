@@ -0,0 +1,68 @@
+"""
+Tests for the paged batch status table.
+
+This module tests that StatusTableView follows a StatusTracker through its
+events, keeps rows in the order images were added and renders single pages.
+"""
+
+from batch_processing.core.status import ProcessingState, StatusTracker
+from batch_processing.ui.status_view import StatusTableView
+
+
+def make_tracker(count):
+    tracker = StatusTracker()
+    for i in range(count):
+        tracker.add_image(f"img_{i}", input_path=f"/in/page_{i}.png")
+    return tracker
+
+
+def test_view_starts_from_existing_statuses():
+    """Test that images tracked before the view was attached are shown."""
+    tracker = make_tracker(3)
+    tracker.update_status("img_0", ProcessingState.COMPLETED.value, output_path="/out/page_0_colorized.png")
+    view = StatusTableView(tracker)
+
+    assert view.page_rows(1) == [
+        ["page_0.png", "completed", "100%", "page_0_colorized.png"],
+        ["page_1.png", "pending", "0%", "N/A"],
+        ["page_2.png", "pending", "0%", "N/A"],
+    ]
+
+
+def test_refresh_applies_only_new_events():
+    """Test that changes appear after refresh and are applied once."""
+    tracker = make_tracker(2)
+    view = StatusTableView(tracker)
+    tracker.update_status("img_1", ProcessingState.PROCESSING.value)
+    tracker.add_image("img_2", input_path="/in/page_2.png")
+
+    assert view.page_rows(1)[1][1] == "pending"
+    assert view.refresh() == 2
+    assert view.refresh() == 0
+    assert [row[1] for row in view.page_rows(1)] == ["pending", "processing", "pending"]
+
+
+def test_paging():
+    """Test that pages hold page_size rows and out-of-range pages are clamped."""
+    tracker = make_tracker(120)
+    view = StatusTableView(tracker, page_size=50)
+
+    assert view.page_count == 3
+    assert len(view.page_rows(1)) == 50
+    assert view.page_rows(3)[0][0] == "page_100.png"
+    assert view.page_rows(99) == view.page_rows(3)
+    assert view.page_rows(0) == view.page_rows(1)
+
+
+def test_clear_and_close():
+    """Test that a cleared tracker empties the view and a closed view stops updating."""
+    tracker = make_tracker(2)
+    view = StatusTableView(tracker)
+    tracker.clear()
+    view.refresh()
+    assert len(view) == 0
+
+    view.close()
+    tracker.add_image("img_9", input_path="/in/page_9.png")
+    view.refresh()
+    assert len(view) == 0
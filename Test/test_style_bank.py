@@ -0,0 +1,110 @@
+"""
+Tests for the StyleBank used to switch colorization styles.
+
+Two styles are registered on a tiny random-weight transformer; the tests
+check that activation swaps adapters, controlnets and GSRP heads without
+reloading anything and that outputs match a freshly loaded checkpoint.
+"""
+
+import pytest
+import torch
+
+pytest.importorskip("peft")
+diffusers = pytest.importorskip("diffusers")
+from peft import LoraConfig
+
+from diffusers import CausalSparseDiTModel
+from cobra_utils.style_bank import StyleBank
+
+
+def lora_config():
+    return LoraConfig(r=4, lora_alpha=4, init_lora_weights="gaussian", target_modules=["to_q", "to_k", "to_v"])
+
+
+def tiny_transformer():
+    torch.manual_seed(0)
+    return CausalSparseDiTModel(
+        num_attention_heads=2,
+        attention_head_dim=8,
+        in_channels=4,
+        out_channels=8,
+        num_layers=2,
+        sample_size=16,
+        patch_size=2,
+        cross_attention_dim=16,
+        norm_num_groups=4,
+        caption_channels=16,
+    )
+
+
+def style_checkpoint(seed):
+    """Create a LoRA state dict saved under the default PEFT adapter name."""
+    transformer = tiny_transformer()
+    transformer.add_adapter(lora_config())
+    generator = torch.Generator().manual_seed(seed)
+    state_dict = {}
+    for key, value in transformer.state_dict().items():
+        if "lora_" in key:
+            state_dict[key] = torch.randn(value.shape, generator=generator) * 0.1
+    return state_dict
+
+
+def lora_weights(transformer, adapter_name):
+    return {
+        key: value for key, value in transformer.state_dict().items() if f".{adapter_name}." in key and "lora_" in key
+    }
+
+
+@pytest.fixture
+def bank():
+    transformer = tiny_transformer()
+    bank = StyleBank(transformer, lora_config())
+    bank.add_style("line", "line", style_checkpoint(1), torch.nn.Linear(2, 2), torch.nn.Linear(2, 2))
+    bank.add_style("line + shadow", "shadow", style_checkpoint(2), torch.nn.Linear(2, 2), torch.nn.Linear(2, 2))
+    return bank
+
+
+def test_add_style_loads_renamed_lora_weights(bank):
+    """Test that default-named LoRA keys are loaded into the named adapter."""
+    expected = style_checkpoint(1)
+    loaded = lora_weights(bank.transformer, "line")
+    assert len(loaded) == len(expected)
+    for key, value in expected.items():
+        assert torch.equal(loaded[key.replace(".default.", ".line.")], value)
+
+
+def test_activate_switches_adapter_and_modules(bank):
+    """Test that activation swaps the adapter, controlnet and GSRP head."""
+    line = bank.activate("line")
+    assert bank.transformer.active_adapters() == ["line"]
+    shadow = bank.activate("line + shadow")
+    assert bank.transformer.active_adapters() == ["shadow"]
+    assert shadow.controlnet is not line.controlnet
+    assert shadow.gsrp_model is not line.gsrp_model
+    assert bank.current_style == "line + shadow"
+
+
+def test_activated_style_matches_single_checkpoint_load(bank):
+    """Test that a resident style reproduces a transformer loaded from that checkpoint alone."""
+    reference = tiny_transformer()
+    reference.add_adapter(lora_config())
+    reference.load_state_dict(style_checkpoint(1), strict=False)
+
+    bank.activate("line + shadow")
+    bank.activate("line")
+    x = torch.randn(1, 16, 16)
+    attention = bank.transformer.transformer_blocks[0].attn1
+    with torch.no_grad():
+        assert torch.allclose(attention.to_q(x), reference.transformer_blocks[0].attn1.to_q(x))
+
+
+def test_activate_invalid_style(bank):
+    """Test that unknown styles are rejected."""
+    with pytest.raises(ValueError, match="Invalid style"):
+        bank.activate("watercolor")
+
+
+def test_duplicate_style(bank):
+    """Test that a style cannot be registered twice."""
+    with pytest.raises(ValueError, match="already registered"):
+        bank.add_style("line", "line2", {}, torch.nn.Linear(2, 2), torch.nn.Linear(2, 2))
@@ -0,0 +1,82 @@
+"""
+Tests for the output thumbnail cache.
+
+This module tests that ThumbnailCache stores small previews of loose and
+zipped outputs, regenerates stale ones lazily, and that open_output_image
+reads outputs at full resolution from both kinds of location.
+"""
+
+import os
+import time
+
+from PIL import Image
+
+from batch_processing.io.thumbnails import (
+    ThumbnailCache,
+    load_thumbnail,
+    make_thumbnail,
+    open_output_image,
+)
+from batch_processing.io.zip_source import MEMBER_SEPARATOR
+from batch_processing.io.zip_writer import StreamingZipWriter
+
+
+def test_make_thumbnail_fits_and_keeps_aspect():
+    """Test that thumbnails fit the size, keep the aspect ratio and leave small images alone."""
+    thumbnail = make_thumbnail(Image.new('RGBA', (2000, 1000), (10, 20, 30, 255)), 256)
+    assert thumbnail.size == (256, 128)
+    assert thumbnail.mode == 'RGB'
+    assert make_thumbnail(Image.new('RGB', (100, 50)), 256).size == (100, 50)
+
+
+def test_load_thumbnail_decodes_at_reduced_size(tmp_path):
+    """Test that a large JPEG is loaded at thumbnail size."""
+    path = tmp_path / "large.jpg"
+    Image.new('RGB', (3000, 2000), (200, 30, 30)).save(path)
+    assert max(load_thumbnail(str(path), 128).size) <= 128
+
+
+def test_save_and_get(tmp_path):
+    """Test that a saved thumbnail is returned without touching the output."""
+    cache = ThumbnailCache(cache_dir=str(tmp_path / "thumbs"), size=64)
+    output = tmp_path / "out" / "page_colorized.png"
+    output.parent.mkdir()
+    image = Image.new('RGB', (640, 480), (0, 128, 255))
+    image.save(output)
+
+    thumbnail_path = cache.save(str(output), image)
+    assert thumbnail_path == cache.get(str(output))
+    assert not str(thumbnail_path).startswith(str(output.parent))
+    with Image.open(thumbnail_path) as thumbnail:
+        assert thumbnail.size == (64, 48)
+
+
+def test_get_creates_missing_and_stale_thumbnails(tmp_path):
+    """Test that get() creates thumbnails lazily and refreshes them after the output changes."""
+    cache = ThumbnailCache(cache_dir=str(tmp_path / "thumbs"), size=32)
+    output = tmp_path / "page.png"
+    Image.new('RGB', (200, 100), (255, 0, 0)).save(output)
+
+    thumbnail_path = cache.get(str(output))
+    with Image.open(thumbnail_path) as thumbnail:
+        assert thumbnail.getpixel((5, 5))[0] > 200
+
+    Image.new('RGB', (200, 100), (0, 0, 255)).save(output)
+    later = time.time() + 10
+    os.utime(output, (later, later))
+    with Image.open(cache.get(str(output))) as thumbnail:
+        assert thumbnail.getpixel((5, 5))[2] > 200
+
+    assert cache.get(str(tmp_path / "missing.png")) is None
+
+
+def test_zip_member_outputs(tmp_path):
+    """Test thumbnails and full-resolution loading of pages in the output ZIP."""
+    writer = StreamingZipWriter(str(tmp_path / "out.zip"))
+    member = writer.add_image("page.png", Image.new('RGB', (300, 150), (0, 255, 0)))
+    output_path = f"{writer.zip_path}{MEMBER_SEPARATOR}{member}"
+
+    cache = ThumbnailCache(cache_dir=str(tmp_path / "thumbs"), size=60)
+    with Image.open(cache.get(output_path)) as thumbnail:
+        assert thumbnail.size == (60, 30)
+    assert open_output_image(output_path).size == (300, 150)
@@ -0,0 +1,225 @@
+"""
+Tests for concurrent batch processing.
+
+This module tests the WorkerPool, worker device assignment and the
+BatchProcessor running with max_concurrent > 1. Fake engines stand in for
+cobra_engine.Engine so no models are loaded.
+"""
+
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import torch
+from PIL import Image
+
+from batch_processing import BatchConfig, BatchProcessor
+from batch_processing.core import ImageQueue, ImageQueueItem, WorkerPool, resolve_worker_devices
+from batch_processing.core.status import ProcessingState
+from batch_processing.exceptions import ConfigurationError
+
+
+class FakeEngine:
+    """Engine stand-in that records which thread used it."""
+
+    def __init__(self, device="cpu"):
+        self.device = torch.device(device)
+        self.threads = set()
+
+
+def make_queue(count):
+    queue = ImageQueue()
+    for i in range(count):
+        queue.enqueue(ImageQueueItem(id=f"img_{i}", input_path=f"/in/{i}.png", output_path=f"/out/{i}.png"))
+    return queue
+
+
+@pytest.fixture
+def temp_dirs():
+    """Create temporary input and output directories."""
+    input_dir = tempfile.mkdtemp()
+    output_dir = tempfile.mkdtemp()
+
+    yield input_dir, output_dir
+
+    shutil.rmtree(input_dir, ignore_errors=True)
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def sample_images(temp_dirs):
+    """Create sample input and reference images."""
+    input_dir, _ = temp_dirs
+    paths = []
+    for name in [f"page_{i}" for i in range(6)] + ["reference"]:
+        path = Path(input_dir) / f"{name}.png"
+        Image.new('RGB', (64, 64), color=(255, 255, 255)).save(path)
+        paths.append(str(path))
+    return paths[:-1], paths[-1:]
+
+
+def make_config(temp_dirs, references, **kwargs):
+    input_dir, output_dir = temp_dirs
+    return BatchConfig(input_dir=input_dir, output_dir=output_dir, reference_images=references, **kwargs)
+
+
+class TestResolveWorkerDevices:
+    """Test device assignment for workers."""
+
+    def test_explicit_devices_are_round_robin(self):
+        """Test that explicit devices are assigned round-robin."""
+        devices = resolve_worker_devices(3, ["cuda:0", "cuda:1"])
+        assert devices == [torch.device("cuda:0"), torch.device("cuda:1"), torch.device("cuda:0")]
+
+    def test_default_falls_back_to_cpu(self, monkeypatch):
+        """Test that workers share the CPU when no accelerator is available."""
+        monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+        monkeypatch.setattr(torch.backends.mps, "is_available", lambda: False)
+        assert resolve_worker_devices(2) == [torch.device("cpu")] * 2
+
+    def test_invalid_worker_count(self):
+        """Test that fewer than one worker is rejected."""
+        with pytest.raises(ValueError, match="at least 1"):
+            resolve_worker_devices(0)
+
+
+class TestWorkerPool:
+    """Test the WorkerPool class."""
+
+    def test_processes_every_item_concurrently(self):
+        """Test that all items are processed and work overlaps across workers."""
+        engines = [FakeEngine(), FakeEngine()]
+        processed = []
+        started = iter(range(6))
+        barrier = threading.Barrier(2, timeout=5)
+
+        def process_item(item, engine):
+            engine.threads.add(threading.get_ident())
+            if next(started) < 2:
+                # both workers must be inside process_item at the same time
+                barrier.wait()
+            processed.append(item.id)
+
+        pool = WorkerPool(make_queue(6), engines, process_item, should_stop=lambda: False)
+        assert pool.run() == 6
+        assert sorted(processed) == [f"img_{i}" for i in range(6)]
+        assert all(len(engine.threads) == 1 for engine in engines)
+        assert engines[0].threads != engines[1].threads
+
+    def test_errors_do_not_stop_workers(self):
+        """Test that an exception on one item does not stop the worker."""
+        processed = []
+
+        def process_item(item, engine):
+            if item.id == "img_0":
+                raise RuntimeError("boom")
+            processed.append(item.id)
+
+        WorkerPool(make_queue(3), [FakeEngine()], process_item, should_stop=lambda: False).run()
+        assert sorted(processed) == ["img_1", "img_2"]
+
+    def test_stop_prevents_new_items(self):
+        """Test that should_stop is checked before every dequeue."""
+        queue = make_queue(5)
+        stop = threading.Event()
+
+        def process_item(item, engine):
+            stop.set()
+
+        pool = WorkerPool(queue, [FakeEngine()], process_item, should_stop=stop.is_set)
+        assert pool.run() == 1
+        assert queue.size() == 4
+
+    def test_waits_for_items_while_more_are_coming(self):
+        """Test that idle workers wait for a producer instead of exiting."""
+        queue = ImageQueue()
+        feeding = [True]
+        processed = []
+
+        def produce():
+            for i in range(5):
+                time.sleep(0.02)
+                queue.enqueue(ImageQueueItem(id=f"img_{i}", input_path=f"/in/{i}.png", output_path=f"/out/{i}.png"))
+            feeding[0] = False
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        pool = WorkerPool(
+            queue,
+            [FakeEngine(), FakeEngine()],
+            lambda item, engine: processed.append(item.id),
+            should_stop=lambda: False,
+            more_coming=lambda: feeding[0],
+        )
+        assert pool.run() == 5
+        producer.join()
+        assert sorted(processed) == [f"img_{i}" for i in range(5)]
+
+    def test_requires_an_engine(self):
+        """Test that an empty pool is rejected."""
+        with pytest.raises(ValueError, match="at least one engine"):
+            WorkerPool(make_queue(1), [], lambda item, engine: None, should_stop=lambda: False)
+
+
+class TestConcurrentBatchProcessor:
+    """Test BatchProcessor with max_concurrent > 1."""
+
+    def test_workers_use_their_own_engines(self, temp_dirs, sample_images, monkeypatch):
+        """Test that every image is processed and each worker uses its own engine."""
+        pages, references = sample_images
+        config = make_config(temp_dirs, references, max_concurrent=3, devices=["cpu"], threads_per_worker=1,
+                             overlap_stages=False)
+        created = []
+
+        def engine_factory(device):
+            created.append(FakeEngine(device))
+            return created[-1]
+
+        primary = FakeEngine("cpu")
+        processor = BatchProcessor(config, engine=primary, engine_factory=engine_factory)
+        used = {}
+
+        def process_single_image(queue_item, engine=None):
+            used[queue_item.id] = engine
+            time.sleep(0.01)
+            processor.status_tracker.update_status(queue_item.id, ProcessingState.COMPLETED.value)
+
+        monkeypatch.setattr(processor, "process_single_image", process_single_image)
+        monkeypatch.setattr(torch, "set_num_threads", lambda num_threads: None)
+        processor.add_images(pages)
+        processor.start_processing()
+
+        assert len(created) == 2
+        assert processor.get_worker_engines() == [primary] + created
+        assert len(used) == len(pages)
+        assert set(map(id, used.values())) <= set(map(id, [primary] + created))
+        assert processor.status_tracker.get_summary().completed == len(pages)
+
+    def test_cancel_marks_remaining_images(self, temp_dirs, sample_images, monkeypatch):
+        """Test that cancelling a concurrent batch cancels the queued images."""
+        pages, references = sample_images
+        config = make_config(temp_dirs, references, max_concurrent=2, devices=["cpu"], threads_per_worker=1,
+                             overlap_stages=False)
+        processor = BatchProcessor(config, engine=FakeEngine(), engine_factory=FakeEngine)
+
+        def process_single_image(queue_item, engine=None):
+            processor._cancelled = True
+            processor.status_tracker.update_status(queue_item.id, ProcessingState.COMPLETED.value)
+
+        monkeypatch.setattr(processor, "process_single_image", process_single_image)
+        monkeypatch.setattr(torch, "set_num_threads", lambda num_threads: None)
+        processor.add_images(pages)
+        processor.start_processing()
+
+        summary = processor.status_tracker.get_summary()
+        assert 1 <= summary.completed <= 2
+        assert summary.completed + summary.cancelled == len(pages)
+
+
+def test_threads_per_worker_validation(temp_dirs):
+    """Test that threads_per_worker must be positive."""
+    with pytest.raises(ConfigurationError, match="threads_per_worker"):
+        make_config(temp_dirs, [], threads_per_worker=0)
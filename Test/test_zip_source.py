@@ -0,0 +1,156 @@
+"""
+Tests for streaming ZIP ingestion.
+
+This module tests the ZipImageSource class and adding a ZIP archive to a
+BatchProcessor without extracting it. The model stages are replaced by
+fakes so no models are loaded.
+"""
+
+import io
+import zipfile
+
+import pytest
+from PIL import Image
+
+from batch_processing import BatchConfig, BatchProcessor
+from batch_processing.exceptions import ValidationError, ZIPExtractionError
+from batch_processing.io import ZipImageSource
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16), color=color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def chapter_zip(tmp_path):
+    """Create a ZIP with pages, metadata files and a nested archive."""
+    nested = io.BytesIO()
+    with zipfile.ZipFile(nested, 'w') as zf:
+        zf.writestr("extra/nested_page.png", png_bytes((0, 0, 255)))
+
+    path = tmp_path / "chapter.zip"
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("pages/page_0.png", png_bytes((255, 0, 0)))
+        zf.writestr("pages/page_1.png", png_bytes((0, 255, 0)))
+        zf.writestr("__MACOSX/pages/._page_0.png", b"resource fork")
+        zf.writestr("notes.txt", b"not an image")
+        zf.writestr("bonus.zip", nested.getvalue())
+    return str(path)
+
+
+class TestZipImageSource:
+    """Test the ZipImageSource class."""
+
+    def test_lists_images_and_nested_archives(self, chapter_zip):
+        """Test that images are listed in order, skipping metadata, with nested ones included."""
+        with ZipImageSource(chapter_zip) as source:
+            assert [member.path for member in source.members()] == [
+                "chapter.zip!/pages/page_0.png",
+                "chapter.zip!/pages/page_1.png",
+                "chapter.zip!/bonus.zip!/extra/nested_page.png",
+            ]
+
+    def test_nested_level_limit(self, chapter_zip):
+        """Test that nested archives are not opened beyond max_nested_level."""
+        with ZipImageSource(chapter_zip, max_nested_level=0) as source:
+            assert len(source) == 2
+
+    def test_reads_members_in_memory(self, chapter_zip, tmp_path):
+        """Test that images decode from the archive without files being extracted."""
+        with ZipImageSource(chapter_zip) as source:
+            nested = source.members()[2]
+            assert source.open_image(nested).getpixel((0, 0)) == (0, 0, 255)
+            assert source.read(nested) == png_bytes((0, 0, 255))
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["chapter.zip"]
+
+    def test_input_hash_follows_content(self, chapter_zip):
+        """Test that members with different content have different input hashes."""
+        with ZipImageSource(chapter_zip) as source:
+            hashes = {member.input_hash for member in source.members()}
+        assert len(hashes) == 3
+
+    def test_iter_images_keeps_order(self, chapter_zip):
+        """Test that prefetched images are yielded in archive order."""
+        with ZipImageSource(chapter_zip) as source:
+            colors = [image.getpixel((0, 0)) for _, image in source.iter_images(prefetch=2)]
+        assert colors == [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+
+    def test_open_stream_reads_only_the_header(self, tmp_path):
+        """Test that an image's size is read from the first bytes of its member."""
+        buffer = io.BytesIO()
+        Image.effect_noise((1200, 1800), 64).convert('RGB').save(buffer, format='PNG')
+        path = tmp_path / "large.zip"
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("page.png", buffer.getvalue())
+
+        with ZipImageSource(str(path)) as source, source.open_stream(source.members()[0]) as stream:
+            with Image.open(stream) as image:
+                assert image.size == (1200, 1800)
+            assert stream.tell() < 64 * 1024 < len(buffer.getvalue())
+
+    def test_corrupted_archive(self, tmp_path):
+        """Test that an unreadable archive raises ZIPExtractionError."""
+        path = tmp_path / "broken.zip"
+        path.write_bytes(b"not a zip")
+        with pytest.raises(ZIPExtractionError):
+            ZipImageSource(str(path))
+
+
+class TestProcessorZipInput:
+    """Test adding a ZIP archive to BatchProcessor."""
+
+    def make_processor(self, tmp_path, monkeypatch, **kwargs):
+        config = BatchConfig(
+            input_dir=str(tmp_path),
+            output_dir=str(tmp_path / "output"),
+            reference_images=[],
+            input_is_zip=True,
+            **kwargs
+        )
+        processor = BatchProcessor(config, engine=object())
+        loaded = []
+
+        def load_page(queue_item):
+            image = Image.open(processor._open_input(queue_item))
+            loaded.append(queue_item.input_path)
+            return image
+
+        monkeypatch.setattr(processor, "_load_page", load_page)
+        monkeypatch.setattr(processor, "_colorize_page", lambda queue_item, page, engine=None: page.convert('RGB'))
+        return processor, loaded
+
+    def test_processes_members_without_extracting(self, chapter_zip, tmp_path, monkeypatch):
+        """Test that every member is processed and saved under its own name."""
+        processor, loaded = self.make_processor(tmp_path, monkeypatch)
+        processor.add_zip(chapter_zip)
+        processor.start_processing()
+
+        assert processor.status_tracker.get_summary().completed == 3
+        assert len(loaded) == 3
+        outputs = sorted(path.name for path in (tmp_path / "output").glob("*.png"))
+        assert outputs == ["nested_page_colorized.png", "page_0_colorized.png", "page_1_colorized.png"]
+        assert Image.open(tmp_path / "output" / "nested_page_colorized.png").getpixel((0, 0)) == (0, 0, 255)
+
+    def test_resume_skips_completed_members(self, chapter_zip, tmp_path, monkeypatch):
+        """Test that journaled ZIP members are skipped on resume."""
+        first, _ = self.make_processor(tmp_path, monkeypatch, resume=True)
+        first.add_zip(chapter_zip)
+        first.start_processing()
+        first.journal.close()
+
+        second, _ = self.make_processor(tmp_path, monkeypatch, resume=True)
+        second.add_zip(chapter_zip)
+        assert second.queue.size() == 0
+        assert second.resumed_count == 3
+
+    def test_archive_without_images(self, tmp_path, monkeypatch):
+        """Test that an archive with no images is rejected."""
+        path = tmp_path / "empty.zip"
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr("readme.txt", b"nothing here")
+
+        processor, _ = self.make_processor(tmp_path, monkeypatch)
+        with pytest.raises(ValidationError, match="No images found"):
+            processor.add_zip(str(path))
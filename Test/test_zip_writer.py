@@ -0,0 +1,203 @@
+"""
+Tests for incremental ZIP output.
+
+This module tests the StreamingZipWriter class and a BatchProcessor writing
+its outputs straight into a ZIP archive. The model stages are replaced by
+fakes so no models are loaded.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import time
+import zipfile
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from batch_processing import BatchConfig, BatchProcessor
+from batch_processing.io import StreamingZipWriter
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class TestStreamingZipWriter:
+    """Test the StreamingZipWriter class."""
+
+    def test_archive_is_valid_after_each_append(self, tmp_path):
+        """Test that the archive can be read between appends, however many there are."""
+        path = tmp_path / "out.zip"
+        writer = StreamingZipWriter(str(path))
+        assert zipfile.ZipFile(path).namelist() == []
+
+        for i in range(40):
+            writer.add(f"page_{i}.png", bytes([i]) * (100 + 37 * i))
+            with zipfile.ZipFile(path) as zf:
+                assert zf.testzip() is None
+                assert len(zf.namelist()) == i + 1
+                assert zf.read(f"page_{i}.png") == bytes([i]) * (100 + 37 * i)
+
+    def test_images_are_stored_and_metadata_deflated(self, tmp_path):
+        """Test that image members are not recompressed."""
+        path = tmp_path / "out.zip"
+        writer = StreamingZipWriter(str(path))
+        writer.add_image("page.png", Image.new('RGB', (8, 8), color=(1, 2, 3)))
+        writer.write_metadata({"seed": 1})
+
+        with zipfile.ZipFile(path) as zf:
+            assert zf.getinfo("page.png").compress_type == zipfile.ZIP_STORED
+            assert zf.getinfo("processing_metadata.json").compress_type == zipfile.ZIP_DEFLATED
+            assert json.loads(zf.read("processing_metadata.json"))["seed"] == 1
+
+    def test_duplicate_names_are_numbered(self, tmp_path):
+        """Test that a taken member name gets a numbered variant."""
+        writer = StreamingZipWriter(str(tmp_path / "out.zip"))
+        assert writer.add("page.png", b"a") == "page.png"
+        assert writer.add("page.png", b"b") == "page_1.png"
+        assert writer.names() == ["page.png", "page_1.png"]
+
+    def test_append_continues_existing_archive(self, tmp_path):
+        """Test that append=True keeps earlier members and replace starts over."""
+        path = tmp_path / "out.zip"
+        StreamingZipWriter(str(path)).add("page.png", b"a")
+
+        writer = StreamingZipWriter(str(path), append=True)
+        assert "page.png" in writer
+        writer.write_metadata({})
+        writer.write_metadata({})
+        assert len(writer) == 2
+
+        assert len(StreamingZipWriter(str(path))) == 0
+
+    def test_central_directory_follows_the_last_member(self, tmp_path):
+        """Test the zipfile internals the writer relies on to rewrite the central directory."""
+        assert callable(getattr(zipfile.ZipFile, "_write_end_record", None))
+        path = tmp_path / "out.zip"
+        writer = StreamingZipWriter(str(path))
+        for i in range(3):
+            writer.add(f"page_{i}.png", b"data" * (i + 1))
+            # start_dir is where the next member goes: right after the last one
+            with zipfile.ZipFile(path) as zf:
+                info = zf.getinfo(f"page_{i}.png")
+                assert writer._zip.start_dir == zf.start_dir
+                assert zf.start_dir == info.header_offset + len(info.FileHeader()) + info.compress_size
+        writer.close()
+
+    def test_resume_repairs_archive_cut_mid_member(self, tmp_path):
+        """Test that a torn archive keeps its complete members when resumed."""
+        path = tmp_path / "out.zip"
+        writer = StreamingZipWriter(str(path))
+        for i in range(3):
+            writer.add(f"page_{i}.png", bytes([i]) * 1000)
+        writer.write_metadata({"seed": 1})
+        writer.close()
+        with zipfile.ZipFile(path) as zf:
+            cut = zf.getinfo("processing_metadata.json").header_offset + 40
+        with open(path, 'r+b') as f:
+            f.truncate(cut)
+
+        resumed = StreamingZipWriter(str(path), append=True)
+        assert resumed.names() == ["page_0.png", "page_1.png", "page_2.png"]
+        resumed.add("page_3.png", b"more")
+        resumed.close()
+        with zipfile.ZipFile(path) as zf:
+            assert zf.testzip() is None
+            assert zf.read("page_1.png") == bytes([1]) * 1000
+            assert zf.read("page_3.png") == b"more"
+
+    def test_resume_after_writer_is_killed_mid_append(self, tmp_path):
+        """Test that an archive left by a killed writer process can be resumed."""
+        path = tmp_path / "out.zip"
+        script = textwrap.dedent(f"""
+            import os, sys
+            sys.path.insert(0, {str(REPO_ROOT)!r})
+            from batch_processing.io import StreamingZipWriter
+            writer = StreamingZipWriter({str(path)!r})
+            i = 0
+            while True:
+                writer.add(f"page_{{i}}.png", os.urandom(256 * 1024))
+                i += 1
+        """)
+        child = subprocess.Popen([sys.executable, "-c", script])
+        try:
+            deadline = time.monotonic() + 60
+            while not (path.exists() and path.stat().st_size > 8 * 1024 * 1024):
+                assert child.poll() is None, "writer process exited"
+                assert time.monotonic() < deadline, "writer process too slow"
+                time.sleep(0.01)
+        finally:
+            child.kill()
+            child.wait()
+
+        resumed = StreamingZipWriter(str(path), append=True)
+        names = resumed.names()
+        assert len(names) >= 16
+        assert set(names) == {f"page_{i}.png" for i in range(len(names))}
+        resumed.add("after_resume.png", b"data")
+        resumed.close()
+        with zipfile.ZipFile(path) as zf:
+            assert zf.testzip() is None
+            assert len(zf.namelist()) == len(names) + 1
+
+
+class TestProcessorZipOutput:
+    """Test BatchProcessor with output_as_zip."""
+
+    @pytest.fixture
+    def pages(self, tmp_path):
+        input_dir = tmp_path / "input"
+        input_dir.mkdir()
+        paths = []
+        for i in range(3):
+            path = input_dir / f"page_{i}.png"
+            Image.new('RGB', (16, 16), color=(i * 50, 0, 0)).save(path)
+            paths.append(str(path))
+        return paths
+
+    def make_processor(self, tmp_path, monkeypatch, **kwargs):
+        config = BatchConfig(
+            input_dir=str(tmp_path / "input"),
+            output_dir=str(tmp_path / "output"),
+            reference_images=[],
+            output_as_zip=True,
+            zip_output_name="chapter.zip",
+            **kwargs
+        )
+        processor = BatchProcessor(config, engine=object())
+        monkeypatch.setattr(processor, "_load_page", lambda queue_item: Image.open(queue_item.input_path))
+        monkeypatch.setattr(processor, "_colorize_page", lambda queue_item, page, engine=None: page.convert('RGB'))
+        return processor
+
+    def test_outputs_go_only_into_the_archive(self, tmp_path, pages, monkeypatch):
+        """Test that pages are appended to the ZIP and no loose files are written."""
+        processor = self.make_processor(tmp_path, monkeypatch)
+        processor.add_images(pages)
+        processor.start_processing()
+
+        zip_path = tmp_path / "output" / "chapter.zip"
+        assert processor.get_status()["output_zip"] == str(zip_path)
+        assert processor.status_tracker.get_summary().completed == 3
+        assert not list((tmp_path / "output").glob("*.png"))
+        with zipfile.ZipFile(zip_path) as zf:
+            assert sorted(zf.namelist()) == [
+                "page_0_colorized.png", "page_1_colorized.png", "page_2_colorized.png",
+                "processing_metadata.json",
+            ]
+
+    def test_resume_skips_pages_in_the_archive(self, tmp_path, pages, monkeypatch):
+        """Test that a resumed batch continues the archive without redoing its pages."""
+        first = self.make_processor(tmp_path, monkeypatch, resume=True)
+        first.add_images(pages[:2])
+        first.start_processing()
+        first.journal.close()
+
+        second = self.make_processor(tmp_path, monkeypatch, resume=True)
+        second.add_images(pages)
+        assert second.resumed_count == 2
+        second.start_processing()
+
+        with zipfile.ZipFile(tmp_path / "output" / "chapter.zip") as zf:
+            assert len(zf.namelist()) == 4
@@ -56,20 +56,22 @@ from diffusers import (
     CausalSparseDiTModel,
     CausalSparseDiTControlModel,
     CobraPixArtAlphaPipeline,
+    CobraReferenceContext,
     UniPCMultistepScheduler,
 )
 from cobra_utils.utils import *
-
-from huggingface_hub import snapshot_download
+import cobra_engine
+from cobra_engine import get_default_engine, get_rate, ratio_list, transform
 
 # Import batch processing UI
 from batch_ui import create_batch_processing_ui
 
-# Set device to MPS if available, otherwise CPU
-device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+# Shared inference engine - the single image and batch processing tabs use the same warm models
+engine = get_default_engine()
+device = engine.device
 print(f"Using device: {device}")
 
-model_global_path = snapshot_download(repo_id="JunhaoZhuang/Cobra", cache_dir='./Cobra/', repo_type="model")
+model_global_path = engine.model_path
 print(model_global_path)
 examples = [
     [
@@ -142,196 +144,51 @@ examples = [
         3, # top k
     ],]
 
-ratio_list = [[800, 800], [768, 896], [704, 928], [672, 960], [640, 1024], [608, 1056], [576, 1088], [576, 1184]]
-ratio_list += [[896, 768], [928, 704], [960, 672], [1024, 640], [1056, 608], [1088, 576], [1184, 576]]
-
-def get_rate(image):
-    # 计算输入图片的长宽比
-    input_rate = image.size[0] / image.size[1]
-    # 计算与每个预设比例的差距
-    min_diff = float('inf')
-    best_idx = 0
-    
-    for i, ratio in enumerate(ratio_list):
-        ratio_rate = ratio[0] / ratio[1]
-        diff = abs(input_rate - ratio_rate)
-        if diff < min_diff:
-            min_diff = diff
-            best_idx = i
-            
-    return ratio_list[best_idx]
-
-
-transform = transforms.Compose([
-    transforms.ToTensor(),  
-    transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])  
-])
-weight_dtype = torch.float16
+weight_dtype = engine.dtype
 
 # line model
-line_model_path = os.path.join(model_global_path, 'LE', 'erika.pth')
-line_model = res_skip()
-line_model.load_state_dict(torch.load(line_model_path, map_location=device))
-line_model.eval()
-line_model.to(device)
+line_model = engine.line_model
 
 
 # image encoder
-image_processor = CLIPImageProcessor()
-image_encoder = CLIPVisionModelWithProjection.from_pretrained(os.path.join(model_global_path, 'image_encoder')).to(device)
+image_processor = engine.image_processor
+image_encoder = engine.image_encoder
 
 
 
 # Global model instances - shared between single image and batch processing modes
 global pipeline
 global MultiResNetModel
+global cur_style
+cur_style = engine.style
 
 def load_ckpt():
     global pipeline
     global MultiResNetModel
     global causal_dit
     global controlnet
-    weight_dtype = torch.float16
-
-    block_out_channels = [128, 128, 256, 512, 512]
-    MultiResNetModel = MultiHiddenResNetModel(block_out_channels, len(block_out_channels))
-    MultiResNetModel.load_state_dict(torch.load(os.path.join(model_global_path, 'shadow_GSRP', 'MultiResNetModel.bin'), map_location=device), strict=True)
-    MultiResNetModel.to(device, dtype=weight_dtype)
-
-
-    # transformer
-    transform = transforms.Compose([
-                transforms.ToTensor(),  
-                transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5]) 
-            ])
-    # seed = 43
-    lora_rank = 128
-    pretrained_model_name_or_path = "PixArt-alpha/PixArt-XL-2-1024-MS"
-
-    transformer = PixArtTransformer2DModel.from_pretrained(
-            pretrained_model_name_or_path, subfolder="transformer", revision=None, variant=None
-        )
-    pixart_config = get_pixart_config()
-    causal_dit = CausalSparseDiTModel(num_attention_heads=pixart_config.get("num_attention_heads"),
-                        attention_head_dim=pixart_config.get("attention_head_dim"),
-                        in_channels=pixart_config.get("in_channels"),
-                        out_channels=pixart_config.get("out_channels"),
-                        num_layers=pixart_config.get("num_layers"),
-                        dropout=pixart_config.get("dropout"),
-                        norm_num_groups=pixart_config.get("norm_num_groups"),
-                        cross_attention_dim=pixart_config.get("cross_attention_dim"),
-                        attention_bias=pixart_config.get("attention_bias"),
-                        sample_size=pixart_config.get("sample_size"),
-                        patch_size=pixart_config.get("patch_size"),
-                        activation_fn=pixart_config.get("activation_fn"),
-                        num_embeds_ada_norm=pixart_config.get("num_embeds_ada_norm"),
-                        upcast_attention=pixart_config.get("upcast_attention"),
-                        norm_type=pixart_config.get("norm_type"),
-                        norm_elementwise_affine=pixart_config.get("norm_elementwise_affine"),
-                        norm_eps=pixart_config.get("norm_eps"),
-                        caption_channels=pixart_config.get("caption_channels"),
-                        attention_type=pixart_config.get("attention_type"))
-
-    causal_dit = init_causal_dit(causal_dit, transformer)
-    print('loaded causal_dit')
-    controlnet = CausalSparseDiTControlModel(num_attention_heads=pixart_config.get("num_attention_heads"),
-                                    attention_head_dim=pixart_config.get("attention_head_dim"),
-                                    in_channels=pixart_config.get("in_channels"),
-                                    cond_chanels = 9,
-                                    out_channels=pixart_config.get("out_channels"),
-                                    num_layers=pixart_config.get("num_layers"),
-                                    dropout=pixart_config.get("dropout"),
-                                    norm_num_groups=pixart_config.get("norm_num_groups"),
-                                    cross_attention_dim=pixart_config.get("cross_attention_dim"),
-                                    attention_bias=pixart_config.get("attention_bias"),
-                                    sample_size=pixart_config.get("sample_size"),
-                                    patch_size=pixart_config.get("patch_size"),
-                                    activation_fn=pixart_config.get("activation_fn"),
-                                    num_embeds_ada_norm=pixart_config.get("num_embeds_ada_norm"),
-                                    upcast_attention=pixart_config.get("upcast_attention"),
-                                    norm_type=pixart_config.get("norm_type"),
-                                    norm_elementwise_affine=pixart_config.get("norm_elementwise_affine"),
-                                    norm_eps=pixart_config.get("norm_eps"),
-                                    caption_channels=pixart_config.get("caption_channels"),
-                                    attention_type=pixart_config.get("attention_type")
-                                )
-    # controlnet = init_controlnet(controlnet, causal_dit)
-    del transformer
-    transformer_lora_config = LoraConfig(
-            r=lora_rank,
-            lora_alpha=lora_rank,
-            # use_dora=True,
-            init_lora_weights="gaussian",
-            target_modules=["to_k",
-                "to_q",
-                "to_v",
-                "to_out.0",
-                "proj_in",
-                "proj_out",
-                "ff.net.0.proj",
-                "ff.net.2",
-                "proj",
-                "linear",
-                "linear_1",
-                "linear_2"],
-        )
-    causal_dit.add_adapter(transformer_lora_config)
-
-    
-    lora_state_dict = torch.load(os.path.join(model_global_path, 'shadow_ckpt', 'transformer_lora_pos.bin'), map_location=device)
-    causal_dit.load_state_dict(lora_state_dict, strict=False)
-    controlnet_state_dict = torch.load(os.path.join(model_global_path, 'shadow_ckpt', 'controlnet.bin'), map_location=device)
-    controlnet.load_state_dict(controlnet_state_dict, strict=True)
-
-    causal_dit.to(device, dtype=weight_dtype)
-    controlnet.to(device, dtype=weight_dtype)
-
-    pipeline = CobraPixArtAlphaPipeline.from_pretrained(
-            pretrained_model_name_or_path,
-            transformer=causal_dit,
-            controlnet=controlnet,
-            safety_checker=None,    
-            revision=None,
-            variant=None,
-            torch_dtype=weight_dtype,
-        )
-
-    pipeline = pipeline.to(device)
+    global style_bank
+
+    engine.load_pipeline()
+    pipeline = engine.pipeline
+    style_bank = engine.style_bank
+    causal_dit = pipeline.transformer
+    controlnet = pipeline.controlnet
+    MultiResNetModel = engine.gsrp_model
     
-global cur_style
-cur_style = 'line + shadow'
 def change_ckpt(style):
     global pipeline
     global MultiResNetModel
+    global controlnet
     global cur_style
-    weight_dtype = torch.float16
-
-    if style == 'line':
-        MultiResNetModel_path = os.path.join(model_global_path, 'line_GSRP', 'MultiResNetModel.bin')
-        causal_dit_lora_path = os.path.join(model_global_path, 'line_ckpt', 'transformer_lora_pos.bin')
-        controlnet_path = os.path.join(model_global_path, 'line_ckpt', 'controlnet.bin')
-    elif style == 'line + shadow':
-        MultiResNetModel_path = os.path.join(model_global_path, 'shadow_GSRP', 'MultiResNetModel.bin')
-        causal_dit_lora_path = os.path.join(model_global_path, 'shadow_ckpt', 'transformer_lora_pos.bin')
-        controlnet_path = os.path.join(model_global_path, 'shadow_ckpt', 'controlnet.bin')
-    else:
-        raise ValueError("Invalid style: {}".format(style))
 
+    # every style is resident, so switching only swaps the active adapter, controlnet and GSRP head
+    engine.set_style(style)
     cur_style = style
+    MultiResNetModel = engine.gsrp_model
+    controlnet = pipeline.controlnet
 
-    MultiResNetModel.load_state_dict(torch.load(MultiResNetModel_path, map_location=device), strict=True)
-    MultiResNetModel.to(device, dtype=weight_dtype)
-
-
-    lora_state_dict = torch.load(causal_dit_lora_path, map_location=device)
-    pipeline.transformer.load_state_dict(lora_state_dict, strict=False)
-    controlnet_state_dict = torch.load(controlnet_path, map_location=device)
-    pipeline.controlnet.load_state_dict(controlnet_state_dict, strict=True)
-
-    pipeline.transformer.to(device, dtype=weight_dtype)
-    pipeline.controlnet.to(device, dtype=weight_dtype)
-
-    print('loaded {} ckpt'.format(style))
+    print('switched to {} ckpt'.format(style))
 
     return style
 
@@ -340,14 +197,7 @@ def change_ckpt(style):
 load_ckpt()
 
 def fix_random_seeds(seed):
-    random.seed(seed)
-    np.random.seed(seed)
-    torch.manual_seed(seed)
-    if device.type == "cuda":
-        torch.cuda.manual_seed(seed)
-        torch.cuda.manual_seed_all(seed)
-    elif device.type == "mps":
-        torch.mps.manual_seed(seed)
+    cobra_engine.fix_random_seeds(seed, device)
 
 def process_multi_images(files):
     images = [Image.open(file.name) for file in files]
@@ -357,170 +207,44 @@ def process_multi_images(files):
     return imgs 
 
 def extract_lines(image):
-    src = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2GRAY)
-
-    rows = int(np.ceil(src.shape[0] / 16)) * 16
-    cols = int(np.ceil(src.shape[1] / 16)) * 16
-
-    patch = np.ones((1, 1, rows, cols), dtype="float32")
-    patch[0, 0, 0:src.shape[0], 0:src.shape[1]] = src
-
-    tensor = torch.from_numpy(patch).to(device)
-
-    with torch.no_grad():
-        y = line_model(tensor)
-
-    yc = y.cpu().numpy()[0, 0, :, :]
-    yc[yc > 255] = 255
-    yc[yc < 0] = 0
-
-    outimg = yc[0:src.shape[0], 0:src.shape[1]]
-    outimg = outimg.astype(np.uint8)
-    outimg = Image.fromarray(outimg)
-    if device.type == "cuda":
-        torch.cuda.empty_cache()
-    elif device.type == "mps":
-        torch.mps.empty_cache()
-    return outimg
+    return engine.extract_lines(image)
 
 def extract_line_image(query_image_, resolution):
-    tar_width, tar_height = resolution
-    query_image = query_image_.resize((tar_width, tar_height))
-    query_image = query_image.convert('L').convert('RGB')
-    extracted_line = extract_lines(query_image)
-    extracted_line = extracted_line.convert('L').convert('RGB')
-    if device.type == "cuda":
-        torch.cuda.empty_cache()
-    elif device.type == "mps":
-        torch.mps.empty_cache()
-    return extracted_line, Image.new('RGB', (tar_width, tar_height), 'black')
+    return engine.extract_line_image(query_image_, resolution)
 
 def extract_sketch_line_image(query_image_, input_style):
     global cur_style
     if input_style != cur_style:
         change_ckpt(input_style)
 
-    resolution = get_rate(query_image_)
-    extracted_line, hint_mask = extract_line_image(query_image_, resolution)
-    extracted_sketch = extracted_line
-    extracted_sketch_line = Image.blend(extracted_sketch, extracted_line, 0.5)
-
-    extracted_sketch_line_ori = copy.deepcopy(extracted_sketch_line)
-
-    extracted_sketch_line_np = np.array(extracted_sketch_line)
-    extracted_sketch_line = Image.fromarray(np.uint8(extracted_sketch_line_np))
-    if input_style == 'line + shadow':
-        print('line + shadow sketch')
-        black_rate = 74
-        black_value = 18
-        gary_rate = 155
-        up_bound = 145
-        ori_np = np.array(extracted_sketch_line_ori)
-        query_image_np = np.array(query_image_.resize(resolution).convert('L').convert('RGB'))
-        extracted_sketch_line_np = np.array(extracted_sketch_line.convert('L').convert('RGB'))
-        ori_np[query_image_np <= black_rate] = black_value
-        ori_np[(ori_np > gary_rate) & (query_image_np < up_bound) & (query_image_np > black_rate)] = gary_rate
-        extracted_sketch_line_ori = Image.fromarray(np.uint8(ori_np))
-
-        extracted_sketch_line_np[query_image_np <= black_rate] = black_value
-        extracted_sketch_line_np[(extracted_sketch_line_np > gary_rate) & (query_image_np < up_bound) & (query_image_np > black_rate)] = gary_rate
-        extracted_sketch_line = Image.fromarray(np.uint8(extracted_sketch_line_np))
-
-    return extracted_sketch_line.convert('RGB'), extracted_sketch_line.convert('RGB'), hint_mask, query_image_, extracted_sketch_line_ori.convert('RGB'), resolution
-
-def colorize_image(extracted_line, reference_images, resolution, seed, num_inference_steps, top_k, hint_mask=None, hint_color=None, query_image_origin=None, extracted_image_ori=None):
+    return tuple(engine.extract(query_image_))
+
+def build_reference_index(reference_images):
+    """Open the uploaded reference files and wrap them in a ReferenceIndex bound to the engine's CLIP encoder."""
+    return engine.build_reference_index(reference_images)
+
+def colorize_image(extracted_line, reference_images, resolution, seed, num_inference_steps, top_k, hint_mask=None, hint_color=None, query_image_origin=None, extracted_image_ori=None, reference_cache=None, reference_index=None):
     if extracted_line is None:
         gr.Info("Please preprocess the image first")
         raise ValueError("Please preprocess the image first")
-    global pipeline
-    global MultiResNetModel
-    reference_images = process_multi_images(reference_images)
-    fix_random_seeds(seed)
-
-    tar_width, tar_height = resolution
-
-    gr.Info("Image retrieval in progress...")
-
-    query_image_bw = extracted_line.resize((tar_width, tar_height))
-    query_image = query_image_bw.convert('RGB')
-
-    query_image_origin = query_image_origin.resize((tar_width, tar_height))
-
-    query_image_vae = extracted_image_ori.resize((int(tar_width*1.5), int(tar_height*1.5)))
-    reference_images = [process_image(ref_image, tar_width, tar_height) for ref_image in reference_images]
-    query_patches_pil = process_image_Q_varres(query_image_origin, tar_width, tar_height)
-    reference_patches_pil = []
-
-    for reference_image in reference_images:
-        reference_patches_pil += process_image_ref_varres(reference_image, tar_width, tar_height)
-    with torch.no_grad():
-        clip_img = image_processor(images=query_patches_pil, return_tensors="pt").pixel_values.to(device, dtype=image_encoder.dtype)
-        query_embeddings = image_encoder(clip_img).image_embeds
-        reference_patches_pil_gray = [rimg.convert('RGB').convert('RGB') for rimg in reference_patches_pil]
-        clip_img = image_processor(images=reference_patches_pil_gray, return_tensors="pt").pixel_values.to(device, dtype=image_encoder.dtype)
-        reference_embeddings = image_encoder(clip_img).image_embeds
-        cosine_similarities = F.cosine_similarity(query_embeddings.unsqueeze(1), reference_embeddings.unsqueeze(0), dim=-1)
-        len_ref = len(reference_patches_pil)
-        # print(cosine_similarities)
-        sorted_indices = torch.argsort(cosine_similarities, descending=True, dim=1).tolist()
-
-        top_k_indices = [cur_sortlist[:top_k] for cur_sortlist in sorted_indices]
-        available_ref_patches = [[],[],[],[]]
-        for i in range(len(top_k_indices)):
-            for j in range(top_k):
-                available_ref_patches[i].append(reference_patches_pil[top_k_indices[i][j]].resize((tar_width//2, tar_height//2)).convert('RGB'))
-
-        flat_available_ref_patches = [item for sublist in available_ref_patches for item in sublist]
-
-    grid_N = int(np.ceil(np.sqrt(len(flat_available_ref_patches))))
-    small_tar_width = tar_width//grid_N
-    small_tar_height = tar_height//grid_N
-    grid_img = Image.new('RGB', (grid_N*small_tar_width, grid_N*small_tar_height), 'black')
-    for i in range(len(flat_available_ref_patches)):
-        grid_img.paste(flat_available_ref_patches[i].resize((small_tar_width, small_tar_height)), (i%grid_N*small_tar_width, int(i/grid_N)*small_tar_height))
-
-    draw = ImageDraw.Draw(grid_img)
-    draw.text((0, 0), "Reference Images", fill='red', font_size=50)
-
-    gr.Info("Model inference in progress...")
-    generator = torch.Generator(device=device).manual_seed(seed)
-    hint_mask = hint_mask.resize((tar_width//8, tar_height//8)).convert('RGB')
-    hint_color = hint_color.convert('RGB')
-    
-    colorized_image = pipeline(
-            cond_input=query_image_bw.convert('RGB'),
-            cond_refs=available_ref_patches,
-            hint_mask=hint_mask,
-            hint_color=hint_color,
-            num_inference_steps=num_inference_steps,
-            generator = generator,
-        )[0][0]
-    gr.Info("Post-processing image...")
-    with torch.no_grad():
-        up_img = colorized_image.resize(query_image_vae.size)
-        test_low_color = transform(up_img).unsqueeze(0).to(device, dtype=weight_dtype)
-        query_image_vae_ = transform(query_image_vae).unsqueeze(0).to(device, dtype=weight_dtype)
-
-        h_color, hidden_list_color = pipeline.vae._encode(test_low_color,return_dict = False, hidden_flag = True)
-        h_bw, hidden_list_bw = pipeline.vae._encode(query_image_vae_, return_dict = False, hidden_flag = True)
-
-        hidden_list_double = [torch.cat((hidden_list_color[hidden_idx], hidden_list_bw[hidden_idx]), dim = 1) for hidden_idx in range(len(hidden_list_color))]
-
-
-        hidden_list = MultiResNetModel(hidden_list_double)
-        output = pipeline.vae._decode(h_color.sample(),return_dict = False, hidden_list = hidden_list)[0]
-
-        output[output > 1] = 1
-        output[output < -1] = -1
-        high_res_image = Image.fromarray(((output[0] * 0.5 + 0.5).permute(1, 2, 0).detach().cpu().numpy() * 255).astype(np.uint8)).convert("RGB")
-    gr.Info("Colorization complete!")
-    if device.type == "cuda":
-        torch.cuda.empty_cache()
-    elif device.type == "mps":
-        torch.mps.empty_cache()
-    
-    output_gallery = [high_res_image, query_image_bw, hint_mask, hint_color, grid_img] 
-    return output_gallery
+    if reference_index is None:
+        reference_index = build_reference_index(reference_images)
+
+    result = engine.run(
+        extracted_line,
+        reference_index,
+        resolution,
+        seed,
+        num_inference_steps,
+        top_k,
+        hint_mask,
+        hint_color,
+        query_image_origin,
+        extracted_image_ori,
+        reference_cache=reference_cache,
+        progress=gr.Info,
+    )
+    return result.gallery()
 
 
 # Function to get color value from reference image
@@ -726,4 +450,5 @@ with gr.Blocks(
             create_batch_processing_ui()
 
 
-demo.launch()
+if __name__ == "__main__":
+    demo.launch()
@@ -77,15 +77,17 @@ from batch_processing.io.zip_handler import (
     is_zip_file,
     extract_zip_file,
     cleanup_temp_directory,
-    separate_line_art_and_references,
     create_output_zip
 )
-from batch_processing.classification.classifier import ImageClassifier
+from batch_processing.io.file_handler import separate_line_art_and_references
+from batch_processing.classification.classifier import ImageClassifier, CLASSIFICATION_CACHE_FILENAME
 from batch_processing.ui.reference_preview import (
     ReferencePreviewGallery,
     filter_references
 )
 from batch_processing.core.status import ProcessingState
+from batch_processing.ui.status_view import StatusTableView
+from batch_processing.ui.results_gallery import ResultsGallery
 
 # Set device to MPS if available, otherwise CPU
 device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
@@ -124,8 +126,17 @@ from app import (
 # Global state for batch processing
 batch_processor: Optional[BatchProcessor] = None
 temp_extract_dir: Optional[str] = None
-classifier = ImageClassifier()
+# threads, not processes: spawned workers would re-run this module's model setup;
+# the persistent cache lets re-uploaded pages skip decoding entirely
+classifier = ImageClassifier(
+    use_processes=False,
+    cache_path=str(Path("./Cobra") / CLASSIFICATION_CACHE_FILENAME)
+)
 reference_gallery_manager = ReferencePreviewGallery()
+# Paged status table fed by the running batch's status events
+status_view: Optional[StatusTableView] = None
+# Thumbnail gallery of the running batch's finished pages
+results_view: Optional[ResultsGallery] = None
 
 # Store detected references for filtering
 detected_line_art: List[str] = []
@@ -161,14 +172,14 @@ def handle_zip_upload(zip_file) -> Tuple[str, List, List, List, str]:
             return "No images found in ZIP file", [], [], [], ""
         
         # Classify images
-        line_art, references = separate_line_art_and_references(all_images, classifier)
+        line_art, references, classifications = separate_line_art_and_references(all_images, classifier)
         
         detected_line_art = line_art
         detected_references = references
         
-        # Get classifications for references
+        # Reuse the classifications of the references
         reference_classifications = {
-            path: classifier.classify(path) for path in references
+            path: classifications[path] for path in references
         }
         
         # Load references for preview
@@ -253,7 +264,7 @@ def start_batch_processing(
     Returns:
         Status message
     """
-    global batch_processor, detected_line_art, detected_references
+    global batch_processor, status_view, results_view, detected_line_art, detected_references
     
     if not detected_line_art:
         return "❌ No images to process. Please upload a ZIP file or select a directory first."
@@ -294,6 +305,12 @@ def start_batch_processing(
         
         # Create batch processor
         batch_processor = BatchProcessor(config)
+        if status_view is not None:
+            status_view.close()
+        status_view = StatusTableView(batch_processor.status_tracker)
+        if results_view is not None:
+            results_view.close()
+        results_view = ResultsGallery(batch_processor.status_tracker, batch_processor.thumbnails)
         
         # Add images to queue
         batch_processor.add_images(detected_line_art)
@@ -316,45 +333,31 @@ def start_batch_processing(
         return f"❌ Error starting batch processing: {str(e)}"
 
 
-def get_batch_status() -> Tuple[pd.DataFrame, str, float]:
+def get_batch_status(page: int = 1) -> Tuple[pd.DataFrame, str, float]:
     """
     Get current batch processing status.
     
+    Args:
+        page: 1-based page of the status table to show
+    
     Returns:
         Tuple of (status_dataframe, progress_text, progress_value)
     """
-    global batch_processor
+    global batch_processor, status_view
     
-    if batch_processor is None:
-        empty_df = pd.DataFrame(columns=["Image", "Status", "Progress", "Output"])
+    if batch_processor is None or status_view is None:
+        empty_df = pd.DataFrame(columns=StatusTableView.COLUMNS)
         return empty_df, "No batch processing active", 0.0
     
     try:
-        # Get status from processor
-        status = batch_processor.get_status()
+        # Counts only: stage percentiles would walk every image on each poll
+        status = batch_processor.get_status(include_stage_stats=False)
         summary = status["summary"]
         
-        # Get all statuses
-        all_statuses = batch_processor.status_tracker.get_all_statuses()
-        
-        # Create dataframe
-        rows = []
-        for image_id, img_status in all_statuses.items():
-            # Find the queue item to get the filename
-            filename = "Unknown"
-            for item in [batch_processor.queue.peek()]:
-                if item and item.id == image_id:
-                    filename = Path(item.input_path).name
-                    break
-            
-            rows.append({
-                "Image": filename,
-                "Status": img_status.state,
-                "Progress": f"{img_status.progress:.0f}%" if hasattr(img_status, 'progress') else "N/A",
-                "Output": Path(img_status.output_path).name if img_status.output_path else "N/A"
-            })
-        
-        df = pd.DataFrame(rows)
+        # Apply the status changes since the last poll and render one page
+        status_view.refresh()
+        page = min(max(1, int(page or 1)), status_view.page_count)
+        df = pd.DataFrame(status_view.page_rows(page), columns=StatusTableView.COLUMNS)
         
         # Create progress text
         total = summary.total
@@ -364,6 +367,8 @@ def get_batch_status() -> Tuple[pd.DataFrame, str, float]:
         progress_text = f"Progress: {completed}/{total} completed"
         if failed > 0:
             progress_text += f", {failed} failed"
+        if status_view.page_count > 1:
+            progress_text += f" (page {page}/{status_view.page_count})"
         
         # Calculate progress value
         progress_value = (completed / total) if total > 0 else 0.0
@@ -408,33 +413,51 @@ def cancel_batch() -> str:
     return "⏹️ Batch processing cancelled"
 
 
-def get_batch_results() -> List[Image.Image]:
+def get_batch_results(shown: Optional[List[str]] = None):
     """
-    Get all processed images for display in results gallery.
+    Get the results gallery, unless the browser already shows it.
+    
+    Args:
+        shown: [gallery version, item count] last sent to this browser
+            session, kept in a gr.State
     
     Returns:
-        List of PIL Images
+        Tuple of the gallery value ((thumbnail path, caption) pairs, or
+        gr.skip() when nothing was added since the last refresh) and the
+        new value of the state
     """
-    global batch_processor
+    global results_view
     
-    if batch_processor is None:
-        return []
+    if results_view is None:
+        return [], None
     
     try:
-        # Get all completed images
-        all_statuses = batch_processor.status_tracker.get_all_statuses()
-        
-        result_images = []
-        for img_status in all_statuses.values():
-            if img_status.state == ProcessingState.COMPLETED.value and img_status.output_path:
-                if Path(img_status.output_path).exists():
-                    result_images.append(Image.open(img_status.output_path))
-        
-        return result_images
+        results_view.refresh()
+        current = [results_view.version, len(results_view)]
+        if shown == current:
+            return gr.skip(), shown
+        return results_view.items(), current
         
     except Exception as e:
         print(f"Error getting batch results: {e}")
-        return []
+        return gr.skip(), shown
+
+
+def get_full_result(evt: gr.SelectData) -> Optional[Image.Image]:
+    """
+    Load the selected result at full resolution.
+    
+    Args:
+        evt: Selection event of the results gallery
+    
+    Returns:
+        The output image, or None if it cannot be loaded
+    """
+    global results_view
+    
+    if results_view is None:
+        return None
+    return results_view.load_full_resolution(evt.index)
 
 
 # Create the Gradio interface
@@ -629,6 +652,7 @@ with gr.Blocks(title="Cobra - Batch Processing") as demo:
                 resume_btn = gr.Button("▶️ Resume", size="sm")
                 cancel_btn = gr.Button("⏹️ Cancel", size="sm")
                 refresh_status_btn = gr.Button("🔄 Refresh Status", size="sm")
+                status_page = gr.Number(label="Status page", value=1, precision=0, minimum=1)
             
             # Subtask 13.4: Batch results gallery
             gr.Markdown("---")
@@ -644,6 +668,11 @@ with gr.Blocks(title="Cobra - Batch Processing") as demo:
                     height="auto",
                     object_fit="contain"
                 )
+                # Full-resolution page, loaded only when a thumbnail is selected
+                full_result = gr.Image(label="Selected Result", type="pil", interactive=False)
+            
+            # [gallery version, item count] shown in this browser session (see get_batch_results)
+            results_shown = gr.State(None)
             
             with gr.Row():
                 refresh_results_btn = gr.Button("🔄 Refresh Results", size="sm")
@@ -756,12 +785,23 @@ with gr.Blocks(title="Cobra - Batch Processing") as demo:
             # Connect refresh buttons
             refresh_status_btn.click(
                 fn=get_batch_status,
+                inputs=[status_page],
+                outputs=[status_table, progress_text, progress_bar]
+            )
+            status_page.change(
+                fn=get_batch_status,
+                inputs=[status_page],
                 outputs=[status_table, progress_text, progress_bar]
             )
             
             refresh_results_btn.click(
                 fn=get_batch_results,
-                outputs=[results_gallery]
+                inputs=[results_shown],
+                outputs=[results_gallery, results_shown]
+            )
+            results_gallery.select(
+                fn=get_full_result,
+                outputs=[full_result]
             )
             
             # Download all as ZIP
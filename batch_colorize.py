@@ -23,8 +23,10 @@ import time
 
 from batch_processing.config import BatchConfig
 from batch_processing.processor import BatchProcessor
+from batch_processing.core.journal import JOURNAL_FILENAME
 from batch_processing.io.file_handler import scan_directory
-from batch_processing.io.zip_handler import is_zip_file, extract_zip_file
+from batch_processing.io.scanner import DirectoryScanner, MANIFEST_FILENAME
+from batch_processing.io.zip_handler import is_zip_file
 from batch_processing.exceptions import BatchProcessingError, ConfigurationError, ValidationError
 from batch_processing.logging_config import get_logger
 
@@ -71,6 +73,10 @@ Examples:
   # With configuration file
   python batch_colorize.py --input-dir ./input --output-dir ./output \\
       --reference-dir ./references --config config.json
+
+  # Resume an interrupted batch, skipping the pages already colorized
+  python batch_colorize.py --input-dir ./input --output-dir ./output \\
+      --reference-dir ./references --resume
         """
     )
     
@@ -136,6 +142,95 @@ Examples:
         help="Number of top reference images to use (default: 3)"
     )
     
+    parser.add_argument(
+        "--refine-scale",
+        type=float,
+        default=1.5,
+        help="Upscaling factor of the GSRP refinement (default: 1.5)"
+    )
+    
+    parser.add_argument(
+        "--refine-tile-size",
+        type=int,
+        default=None,
+        help="Refine in overlapping tiles of this many pixels to bound memory at high scales (default: untiled)"
+    )
+    
+    parser.add_argument(
+        "--latent-cache-dir",
+        type=str,
+        default=None,
+        help="Directory persisting reference VAE latents across runs (default: memory only)"
+    )
+    
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip images the job journal records as completed with unchanged input and settings"
+    )
+    
+    parser.add_argument(
+        "--journal",
+        type=str,
+        default=None,
+        help="Job journal file (default: .cobra_journal.jsonl in the output directory)"
+    )
+    
+    parser.add_argument(
+        "--device",
+        type=str,
+        default=None,
+        help="Torch device to run on, e.g. cuda, cuda:1, mps or cpu (default: auto-detect)"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of images to process concurrently, one model copy per worker (default: 1)"
+    )
+    
+    parser.add_argument(
+        "--devices",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Devices to spread workers over round-robin, e.g. cuda:0 cuda:1 (default: all visible GPUs)"
+    )
+    
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Torch intra-op threads per CPU worker (default: cores divided by workers)"
+    )
+    
+    parser.add_argument(
+        "--no-overlap",
+        action="store_true",
+        help="Run decoding, inference and saving of each image back to back instead of overlapping pages"
+    )
+    
+    parser.add_argument(
+        "--no-plan",
+        action="store_true",
+        help="Process images in the order they were found instead of grouping them by resolution"
+    )
+    
+    parser.add_argument(
+        "--prefetch-workers",
+        type=int,
+        default=1,
+        help="Threads loading and preprocessing upcoming images (default: 1)"
+    )
+    
+    parser.add_argument(
+        "--writer-workers",
+        type=int,
+        default=2,
+        help="Threads encoding and saving finished images (default: 2)"
+    )
+    
     # Processing options
     parser.add_argument(
         "--recursive",
@@ -149,6 +244,13 @@ Examples:
         help="Overwrite existing output files"
     )
     
+    parser.add_argument(
+        "--scan-workers",
+        type=int,
+        default=8,
+        help="Threads checking input files while scanning the input directory (default: 8)"
+    )
+    
     parser.add_argument(
         "--preview",
         action="store_true",
@@ -161,6 +263,22 @@ Examples:
         help="Path to JSON configuration file for per-image settings"
     )
     
+    # Metrics options
+    parser.add_argument(
+        "--metrics-output",
+        type=str,
+        default=None,
+        help="Write per-stage timing and memory metrics to this file after the batch"
+    )
+    
+    parser.add_argument(
+        "--metrics-format",
+        type=str,
+        choices=["json", "prometheus"],
+        default=None,
+        help="Format of --metrics-output (default: prometheus for .prom/.txt files, json otherwise)"
+    )
+    
     # Logging options
     parser.add_argument(
         "--verbose",
@@ -329,17 +447,35 @@ def setup_batch_processor(args: argparse.Namespace) -> BatchProcessor:
         seed=args.seed,
         num_inference_steps=args.steps,
         top_k=args.top_k,
+        refine_scale=getattr(args, "refine_scale", 1.5),
+        refine_tile_size=getattr(args, "refine_tile_size", None),
         recursive=args.recursive,
         overwrite=args.overwrite,
         preview_mode=args.preview,
-        max_concurrent=1,  # CLI always processes sequentially
+        max_concurrent=getattr(args, "workers", 1),
+        devices=getattr(args, "devices", None),
+        threads_per_worker=getattr(args, "threads_per_worker", None),
+        overlap_stages=not getattr(args, "no_overlap", False),
+        plan_order=not getattr(args, "no_plan", False),
+        prefetch_workers=getattr(args, "prefetch_workers", 1),
+        writer_workers=getattr(args, "writer_workers", 2),
+        latent_cache_dir=getattr(args, "latent_cache_dir", None),
+        journal_path=getattr(args, "journal", None) or str(Path(output_dir) / JOURNAL_FILENAME),
+        resume=getattr(args, "resume", False),
         input_is_zip=input_is_zip,
         output_as_zip=output_as_zip,
         zip_output_name=zip_output_name
     )
     
-    # Create batch processor
-    processor = BatchProcessor(config)
+    # Create batch processor; models load lazily when the first image is processed
+    device = getattr(args, "device", None)
+    if device is not None:
+        from cobra_engine import Engine, set_default_engine
+        engine = Engine(device=device, style=args.style)
+        set_default_engine(engine)
+        processor = BatchProcessor(config, engine=engine)
+    else:
+        processor = BatchProcessor(config)
     
     # Load configuration file if provided
     if args.config:
@@ -359,7 +495,7 @@ def display_progress(processor: BatchProcessor) -> None:
     Args:
         processor: BatchProcessor instance
     """
-    status = processor.get_status()
+    status = processor.get_status(include_stage_stats=False)
     summary = status["summary"]
     
     # Calculate progress percentage
@@ -398,32 +534,32 @@ def run_batch_processing(processor: BatchProcessor, args: argparse.Namespace) ->
     try:
         # Scan for input images
         if args.input_zip:
-            logger.info(f"Extracting ZIP file: {args.input_zip}")
-            # Extract ZIP to temporary directory
-            import tempfile
-            temp_dir = tempfile.mkdtemp(prefix="cobra_batch_")
-            extracted_files = extract_zip_file(args.input_zip, temp_dir)
-            input_images = extracted_files
-            logger.info(f"Extracted {len(input_images)} images from ZIP")
+            # Pages are read from the archive as they are processed, without extracting it
+            logger.info(f"Reading ZIP file: {args.input_zip}")
+            processor.add_zip(args.input_zip)
+            if processor.queue.size() == 0:
+                if not args.quiet:
+                    print(f"\nAll {processor.resumed_count} images were already completed; nothing to resume")
+                return 0
         else:
             logger.info(f"Scanning input directory: {args.input_dir}")
-            input_images = scan_directory(
+            scanner = DirectoryScanner(
                 args.input_dir,
-                recursive=args.recursive
+                recursive=args.recursive,
+                max_workers=getattr(args, "scan_workers", 8),
+                manifest_path=str(Path(processor.config.output_dir) / MANIFEST_FILENAME)
             )
-            logger.info(f"Found {len(input_images)} images to process")
-        
-        if not input_images:
-            logger.error("No valid images found to process")
-            return 1
-        
-        # Add images to processor
-        logger.info("Adding images to processing queue")
-        processor.add_images(input_images)
+            # Pages start processing while the rest of the directory is still being scanned
+            processor.feed_images(scanner.iter_images())
         
         # Display initial status
         if not args.quiet:
-            print(f"\nStarting batch processing of {len(input_images)} images")
+            if args.input_zip:
+                print(f"\nStarting batch processing of {processor.queue.size()} images")
+                if processor.resumed_count:
+                    print(f"Resumed: skipping {processor.resumed_count} images already completed")
+            else:
+                print(f"\nStarting batch processing of images in {args.input_dir} (scanning)")
             print(f"Style: {args.style}")
             print(f"Seed: {args.seed}")
             print(f"Steps: {args.steps}")
@@ -444,8 +580,19 @@ def run_batch_processing(processor: BatchProcessor, args: argparse.Namespace) ->
         status = processor.get_status()
         summary = status["summary"]
         
+        if summary.total == 0:
+            if processor.resumed_count:
+                if not args.quiet:
+                    print(f"\nAll {processor.resumed_count} images were already completed; nothing to resume")
+                return 0
+            logger.error("No valid images found to process")
+            return 1
+        
         elapsed_time = time.time() - start_time
         
+        if getattr(args, "metrics_output", None):
+            processor.export_metrics(args.metrics_output, getattr(args, "metrics_format", None))
+        
         # Display final results
         if not args.quiet:
             print()  # New line after progress
@@ -453,6 +600,8 @@ def run_batch_processing(processor: BatchProcessor, args: argparse.Namespace) ->
             print("Batch Processing Complete")
             print("=" * 60)
             print(f"Total images: {summary.total}")
+            if processor.resumed_count:
+                print(f"Resumed (skipped): {processor.resumed_count}")
             print(f"Completed: {summary.completed}")
             print(f"Failed: {summary.failed}")
             print(f"Success rate: {summary.success_rate:.1f}%")
@@ -462,10 +611,18 @@ def run_batch_processing(processor: BatchProcessor, args: argparse.Namespace) ->
                 avg_time = elapsed_time / summary.completed
                 print(f"Average time per image: {avg_time:.2f} seconds")
             
+            if summary.stage_stats:
+                print("\nPer-stage time per image (p50 / p95 seconds):")
+                for stage, stats in summary.stage_stats.items():
+                    print(f"  {stage:<16} {stats['p50']:>8.3f} / {stats['p95']:.3f}")
+            
+            if getattr(args, "metrics_output", None):
+                print(f"\nMetrics: {args.metrics_output}")
+            
             if args.output_dir:
                 print(f"\nOutput directory: {args.output_dir}")
             elif args.output_zip:
-                print(f"\nOutput ZIP: {args.output_zip}")
+                print(f"\nOutput ZIP: {status['output_zip'] or args.output_zip}")
             
             print("=" * 60)
         
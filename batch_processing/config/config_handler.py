@@ -34,13 +34,45 @@ class BatchConfig:
         seed: Random seed for reproducible results
         num_inference_steps: Number of diffusion steps
         top_k: Number of top reference images to use
+        refine_scale: Upscaling factor of the GSRP refinement
+        refine_tile_size: Tile size in pixels for refining in overlapping
+            tiles on bounded memory; None refines the whole page at once
         recursive: Whether to scan input directory recursively
         overwrite: Whether to overwrite existing output files
         preview_mode: Whether to process only first image for preview
-        max_concurrent: Maximum number of images to process concurrently
+        max_concurrent: Maximum number of images to process concurrently;
+            each concurrent worker owns its own inference engine
+        devices: Devices the workers are assigned to round-robin
+            (e.g. ["cuda:0", "cuda:1"]); auto-detected when None
+        threads_per_worker: Torch intra-op threads per worker when workers
+            share the CPU; defaults to an even split of the host's cores
+        overlap_stages: Whether to overlap decoding, inference and saving
+            of different pages in a staged pipeline
+        prefetch_workers: Threads decoding and preprocessing upcoming pages
+            when overlap_stages is enabled
+        writer_workers: Threads encoding and saving finished pages when
+            overlap_stages is enabled
+        stage_queue_size: Capacity of the queues between pipeline stages
+        plan_order: Whether to reorder queued images so pages resized to
+            the same resolution bucket run back to back (see BatchPlanner);
+            output names are unaffected
         input_is_zip: Whether input is a ZIP file
         output_as_zip: Whether to package output as ZIP file
         zip_output_name: Name for output ZIP file (if output_as_zip is True)
+        reference_cache_size: Number of reference K/V contexts kept resident
+            for reuse across pages (0 disables the cache)
+        latent_cache_size: Number of reference VAE latents kept in memory
+        latent_cache_dir: Optional directory persisting reference VAE
+            latents across runs
+        thumbnail_size: Longest side of the preview thumbnail saved with
+            every output for the result galleries (0 disables thumbnails)
+        thumbnail_dir: Directory holding the thumbnails; defaults to
+            cobra_thumbnails in the system temp directory
+        journal_path: Write-ahead job journal recording the state of every
+            image; defaults to .cobra_journal.jsonl in output_dir when
+            resume is enabled, otherwise no journal is kept
+        resume: Whether to skip images the journal records as completed
+            with unchanged input and settings
     """
     input_dir: str
     output_dir: str
@@ -49,6 +81,8 @@ class BatchConfig:
     seed: int = 0
     num_inference_steps: int = 10
     top_k: int = 3
+    refine_scale: float = 1.5
+    refine_tile_size: Optional[int] = None
     recursive: bool = False
     overwrite: bool = False
     preview_mode: bool = False
@@ -56,6 +90,20 @@ class BatchConfig:
     input_is_zip: bool = False
     output_as_zip: bool = False
     zip_output_name: Optional[str] = None
+    reference_cache_size: int = 4
+    latent_cache_size: int = 256
+    latent_cache_dir: Optional[str] = None
+    thumbnail_size: int = 256
+    thumbnail_dir: Optional[str] = None
+    journal_path: Optional[str] = None
+    resume: bool = False
+    devices: Optional[List[str]] = None
+    threads_per_worker: Optional[int] = None
+    overlap_stages: bool = True
+    prefetch_workers: int = 1
+    writer_workers: int = 2
+    stage_queue_size: int = 2
+    plan_order: bool = True
     
     def __post_init__(self):
         """Validate configuration after initialization."""
@@ -86,11 +134,47 @@ class BatchConfig:
                 f"top_k must be at least 1, got {self.top_k}"
             )
         
+        if self.refine_scale <= 0:
+            raise ConfigurationError(
+                f"refine_scale must be positive, got {self.refine_scale}"
+            )
+        
+        if self.refine_tile_size is not None and self.refine_tile_size < 64:
+            raise ConfigurationError(
+                f"refine_tile_size must be at least 64, got {self.refine_tile_size}"
+            )
+        
         if self.max_concurrent < 1:
             raise ConfigurationError(
                 f"max_concurrent must be at least 1, got {self.max_concurrent}"
             )
         
+        if self.threads_per_worker is not None and self.threads_per_worker < 1:
+            raise ConfigurationError(
+                f"threads_per_worker must be at least 1, got {self.threads_per_worker}"
+            )
+        
+        for name in ("prefetch_workers", "writer_workers", "stage_queue_size"):
+            if getattr(self, name) < 1:
+                raise ConfigurationError(
+                    f"{name} must be at least 1, got {getattr(self, name)}"
+                )
+        
+        if self.reference_cache_size < 0:
+            raise ConfigurationError(
+                f"reference_cache_size must be non-negative, got {self.reference_cache_size}"
+            )
+        
+        if self.latent_cache_size < 0:
+            raise ConfigurationError(
+                f"latent_cache_size must be non-negative, got {self.latent_cache_size}"
+            )
+        
+        if self.thumbnail_size < 0:
+            raise ConfigurationError(
+                f"thumbnail_size must be non-negative, got {self.thumbnail_size}"
+            )
+        
         # Validate ZIP options
         if self.output_as_zip and not self.zip_output_name:
             # Generate default ZIP name from output directory
@@ -111,6 +195,8 @@ class BatchConfig:
             "seed": self.seed,
             "num_inference_steps": self.num_inference_steps,
             "top_k": self.top_k,
+            "refine_scale": self.refine_scale,
+            "refine_tile_size": self.refine_tile_size,
             "recursive": self.recursive,
             "overwrite": self.overwrite,
             "preview_mode": self.preview_mode,
@@ -118,6 +204,20 @@ class BatchConfig:
             "input_is_zip": self.input_is_zip,
             "output_as_zip": self.output_as_zip,
             "zip_output_name": self.zip_output_name,
+            "reference_cache_size": self.reference_cache_size,
+            "latent_cache_size": self.latent_cache_size,
+            "latent_cache_dir": self.latent_cache_dir,
+            "thumbnail_size": self.thumbnail_size,
+            "thumbnail_dir": self.thumbnail_dir,
+            "journal_path": self.journal_path,
+            "resume": self.resume,
+            "devices": self.devices,
+            "threads_per_worker": self.threads_per_worker,
+            "overlap_stages": self.overlap_stages,
+            "prefetch_workers": self.prefetch_workers,
+            "writer_workers": self.writer_workers,
+            "stage_queue_size": self.stage_queue_size,
+            "plan_order": self.plan_order,
         }
 
 
@@ -2,11 +2,16 @@
 Core batch processing components.
 
 This submodule contains the main batch processing engine components including
-the batch processor, queue manager, and status tracker.
+the batch processor, queue manager, status tracker, worker pool, staged pipeline, job journal
+and execution planner.
 """
 
 from .queue import ImageQueue, ImageQueueItem
-from .status import StatusTracker, ProcessingStatus, ProcessingState, StatusSummary
+from .status import StatusTracker, ProcessingStatus, ProcessingState, StatusSummary, StageMetric, StatusEvent
+from .worker_pool import WorkerPool, resolve_worker_devices
+from .staged_pipeline import PipelineStage, StagedPipeline
+from .journal import JobJournal, JournalEntry, hash_config, hash_file
+from .planner import BatchPlanner, PlanKey
 
 __all__ = [
     'ImageQueue',
@@ -14,5 +19,17 @@ __all__ = [
     'StatusTracker',
     'ProcessingStatus',
     'ProcessingState',
-    'StatusSummary'
+    'StatusSummary',
+    'StageMetric',
+    'StatusEvent',
+    'WorkerPool',
+    'resolve_worker_devices',
+    'PipelineStage',
+    'StagedPipeline',
+    'JobJournal',
+    'JournalEntry',
+    'hash_config',
+    'hash_file',
+    'BatchPlanner',
+    'PlanKey'
 ]
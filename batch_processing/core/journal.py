@@ -0,0 +1,258 @@
+"""
+Write-ahead journal of batch jobs.
+
+This module provides the JobJournal class which appends one JSON line per
+state change of an image (started, completed, failed) to a file, and the
+hashing helpers that identify an image's input and the settings it was
+colorized with. A batch interrupted by a crash can then be resumed by
+skipping the images whose last record is "completed" for unchanged input
+and settings.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Default journal file name, kept in the output directory
+JOURNAL_FILENAME = ".cobra_journal.jsonl"
+
+# BatchConfig fields that change the colorized output of a page
+OUTPUT_SETTINGS = (
+    "style",
+    "seed",
+    "num_inference_steps",
+    "top_k",
+    "refine_scale",
+    "refine_tile_size",
+)
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Hash the content of a file.
+
+    Args:
+        path: File to hash
+        chunk_size: Bytes read at a time
+
+    Returns:
+        SHA-256 hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_config(config: Any) -> str:
+    """
+    Hash the settings and reference images that determine a page's output.
+
+    Paths, worker counts and other settings that do not change the output
+    are left out, so a resumed batch may use a different machine layout.
+
+    Args:
+        config: BatchConfig of the batch
+
+    Returns:
+        SHA-256 hex digest of the output settings and reference contents
+    """
+    settings = {name: getattr(config, name, None) for name in OUTPUT_SETTINGS}
+    settings["reference_images"] = [
+        hash_file(path) if os.path.isfile(path) else path
+        for path in config.reference_images
+    ]
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass
+class JournalEntry:
+    """
+    One record of the job journal.
+
+    Attributes:
+        key: Identifier of the image within the job (its base output path)
+        state: "started", "completed" or "failed"
+        input_hash: Content hash of the input image
+        config_hash: Hash of the output settings (see hash_config)
+        output_path: Path the output was (or is being) written to
+        time: Unix time of the record
+        error: Error message of a failed image
+    """
+    key: str
+    state: str
+    input_hash: str
+    config_hash: str
+    output_path: str
+    time: float
+    error: Optional[str] = None
+
+
+class JobJournal:
+    """
+    Append-only JSONL journal of the images of a batch job.
+
+    Every state change is appended and flushed to disk before processing
+    continues, and the file is replayed on open, so the journal reflects
+    every image whose record reached the disk before a crash. A truncated
+    last line from a crash mid-write is ignored.
+
+    Attributes:
+        path: Journal file
+    """
+
+    STARTED = "started"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    def __init__(self, path: str, fsync: bool = True):
+        """
+        Open (or create) a journal and replay its records.
+
+        Args:
+            path: Journal file, created with its directory if missing
+            fsync: Whether to fsync after every record, so records survive
+                a power loss and not only a process crash
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fsync = fsync
+        self._entries: Dict[str, JournalEntry] = {}
+        self._lock = threading.Lock()
+        self._replay()
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self._ends_mid_line():
+            # terminate a record truncated by a crash so the next record starts on its own line
+            self._file.write("\n")
+            self._file.flush()
+
+    def _ends_mid_line(self) -> bool:
+        if self.path.stat().st_size == 0:
+            return False
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def _replay(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = JournalEntry(**json.loads(line))
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Ignoring unreadable journal record {self.path}:{line_number}: {e}")
+                    continue
+                self._entries[entry.key] = entry
+        logger.info(f"Replayed job journal {self.path} ({len(self._entries)} images)")
+
+    def record(
+        self,
+        key: str,
+        state: str,
+        input_hash: str,
+        config_hash: str,
+        output_path: str,
+        error: Optional[str] = None
+    ) -> JournalEntry:
+        """
+        Append a state change of an image.
+
+        Args:
+            key: Identifier of the image within the job
+            state: "started", "completed" or "failed"
+            input_hash: Content hash of the input image
+            config_hash: Hash of the output settings
+            output_path: Output path of the image
+            error: Error message for failed images
+
+        Returns:
+            The appended JournalEntry
+
+        Raises:
+            ValueError: If the state is unknown
+        """
+        if state not in (self.STARTED, self.COMPLETED, self.FAILED):
+            raise ValueError(f"Invalid journal state: {state}")
+
+        entry = JournalEntry(key, state, input_hash, config_hash, output_path, time.time(), error)
+        line = json.dumps(asdict(entry)) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+            self._entries[key] = entry
+        return entry
+
+    def get_entry(self, key: str) -> Optional[JournalEntry]:
+        """
+        Get the latest record of an image.
+
+        Args:
+            key: Identifier of the image within the job
+
+        Returns:
+            The latest JournalEntry, or None if the image was never recorded
+        """
+        with self._lock:
+            return self._entries.get(key)
+
+    def is_completed(
+        self,
+        key: str,
+        input_hash: str,
+        config_hash: str,
+        output_exists: Callable[[str], bool] = os.path.exists
+    ) -> bool:
+        """
+        Check whether an image was completed with the same input and settings.
+
+        The output file must still exist; outputs are renamed into place
+        only once fully written, so an existing file is a complete one.
+
+        Args:
+            key: Identifier of the image within the job
+            input_hash: Content hash of the current input
+            config_hash: Hash of the current output settings
+            output_exists: Checks the recorded output path; defaults to a
+                file check, outputs written into a ZIP pass their own
+
+        Returns:
+            True if the image can be skipped
+        """
+        entry = self.get_entry(key)
+        return (
+            entry is not None
+            and entry.state == self.COMPLETED
+            and entry.input_hash == input_hash
+            and entry.config_hash == config_hash
+            and output_exists(entry.output_path)
+        )
+
+    def close(self) -> None:
+        """Close the journal file."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self) -> "JobJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,123 @@
+"""
+Execution planning for batch processing.
+
+This module provides the BatchPlanner class which orders queued images so
+pages that are resized to the same resolution bucket run back to back.
+Pages are otherwise processed in the order they were added, so a batch
+mixing page shapes keeps alternating the shapes the allocator and
+compiled graphs were warmed up for.
+"""
+
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .queue import ImageQueueItem
+from ..logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class PlanKey(NamedTuple):
+    """
+    Settings a page is processed with that are costly to switch.
+
+    Only the resolution bucket varies within a batch: style, reference
+    images and step count are batch-wide settings.
+
+    Attributes:
+        bucket: (width, height) entry of ratio_list the page is resized
+            to, or None if it could not be determined
+    """
+    bucket: Optional[Tuple[int, int]]
+
+
+class BatchPlanner:
+    """
+    Orders queue items to minimize setting switches.
+
+    Items are grouped by PlanKey, nested field by field. Within a group,
+    the sub-group continuing the setting already in effect goes first, the
+    others follow in order of first appearance; the first item therefore
+    keeps its place at the front (preview mode processes it first), and
+    items of a group keep their relative order.
+    """
+
+    def __init__(self, bucket_of: Optional[Callable[[ImageQueueItem], Optional[Tuple[int, int]]]] = None):
+        """
+        Initialize the planner.
+
+        Args:
+            bucket_of: Returns the resolution bucket of an item (see
+                cobra_engine.get_rate), or None if unknown. Without it all
+                items share one bucket.
+        """
+        self._bucket_of = bucket_of
+
+    def key_for(self, item: ImageQueueItem) -> PlanKey:
+        """
+        Get the plan key of an item.
+
+        Args:
+            item: Queue item
+
+        Returns:
+            PlanKey of the settings the item is processed with
+        """
+        return PlanKey(bucket=self._bucket_of(item) if self._bucket_of is not None else None)
+
+    def plan(self, items: Sequence[ImageQueueItem]) -> List[ImageQueueItem]:
+        """
+        Order items so items with equal settings are adjacent.
+
+        Args:
+            items: Items in their current processing order
+
+        Returns:
+            The same items in planned order
+        """
+        keys = [self.key_for(item) for item in items]
+        order: List[int] = []
+        self._arrange(list(range(len(items))), keys, 0, order)
+        planned = [items[i] for i in order]
+
+        if items:
+            before = self.count_switches(keys)
+            after = self.count_switches([keys[i] for i in order])
+            logger.info(
+                f"Planned {len(items)} images in {len(set(keys))} groups; switches "
+                + ", ".join(f"{field} {before[field]} -> {after[field]}" for field in PlanKey._fields)
+            )
+        return planned
+
+    def _arrange(self, indices: List[int], keys: List[PlanKey], level: int, order: List[int]) -> None:
+        """Append the indices to order, grouped by keys from field `level` on."""
+        if level == len(PlanKey._fields):
+            order.extend(indices)
+            return
+        groups: Dict[Hashable, List[int]] = {}
+        for i in indices:
+            groups.setdefault(keys[i][level], []).append(i)
+        if order:
+            # carry on with the setting in effect, if some of these pages use it
+            current = keys[order[-1]][level]
+            if current in groups:
+                groups = {current: groups.pop(current), **groups}
+        for group in groups.values():
+            self._arrange(group, keys, level + 1, order)
+
+    @staticmethod
+    def count_switches(keys: Sequence[PlanKey]) -> Dict[str, int]:
+        """
+        Count how often each setting changes along a sequence of keys.
+
+        Args:
+            keys: Plan keys in processing order
+
+        Returns:
+            Dictionary mapping each PlanKey field to its number of changes
+        """
+        switches = {field: 0 for field in PlanKey._fields}
+        for previous, current in zip(keys, keys[1:]):
+            for field, a, b in zip(PlanKey._fields, previous, current):
+                if a != b:
+                    switches[field] += 1
+        return switches
@@ -5,9 +5,11 @@ This module provides the ImageQueue class for managing the processing queue
 and the ImageQueueItem dataclass for representing items in the queue.
 """
 
+import heapq
+import itertools
+import threading
 from dataclasses import dataclass, field
-from typing import Optional, Dict, List
-from collections import deque
+from typing import Optional, Dict, List, Sequence
 
 
 @dataclass
@@ -48,20 +50,70 @@ class ImageQueue:
     
     This class provides a priority queue implementation for batch image processing.
     Images can be enqueued with different priorities, and higher priority items
-    are dequeued first.
+    are dequeued first; items with the same priority keep FIFO order.
+    
+    The queue is a binary heap of [-priority, sequence, item] entries, so
+    enqueue and dequeue are O(log n) even for jobs of tens of thousands of
+    pages. Removed and re-prioritized items are dropped lazily: their entry
+    is marked dead and skipped when it reaches the top of the heap. All
+    operations are thread-safe; get() blocks so several workers can consume
+    the same queue while a producer is still adding items, and iteration
+    walks a snapshot so it never races with consumers.
     """
     
     def __init__(self):
         """Initialize an empty image queue."""
-        self._queue: List[ImageQueueItem] = []
+        self._heap: List[list] = []
+        # latest live heap entry for each item id
+        self._entries: Dict[str, list] = {}
+        self._sequence = itertools.count()
         self._size: int = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+    
+    def _push(self, item: ImageQueueItem, sequence: int) -> None:
+        """Push an entry; the caller holds the lock."""
+        entry = [-item.priority, sequence, item]
+        heapq.heappush(self._heap, entry)
+        self._entries[item.id] = entry
+        self._size += 1
+    
+    def _discard_dead(self) -> None:
+        """Pop dead entries off the top of the heap; the caller holds the lock."""
+        while self._heap and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+    
+    def _pop(self) -> Optional[ImageQueueItem]:
+        """Pop the highest priority live item; the caller holds the lock."""
+        self._discard_dead()
+        if not self._heap:
+            return None
+        entry = heapq.heappop(self._heap)
+        item = entry[2]
+        if self._entries.get(item.id) is entry:
+            del self._entries[item.id]
+        self._size -= 1
+        return item
+    
+    def _kill(self, entry: list) -> ImageQueueItem:
+        """Mark an entry dead and forget it; the caller holds the lock."""
+        item = entry[2]
+        entry[2] = None
+        del self._entries[item.id]
+        self._size -= 1
+        # keep dead entries from dominating the heap after many removals
+        if len(self._heap) > 2 * self._size + 64:
+            self._heap = [live for live in self._heap if live[2] is not None]
+            heapq.heapify(self._heap)
+        return item
     
     def enqueue(self, item: ImageQueueItem) -> None:
         """
         Add an item to the queue.
         
         Items are inserted in priority order (higher priority first).
-        Items with the same priority maintain FIFO order.
+        Items with the same priority maintain FIFO order. Wakes one
+        consumer blocked in get().
         
         Args:
             item: The ImageQueueItem to add to the queue
@@ -69,15 +121,9 @@ class ImageQueue:
         if not isinstance(item, ImageQueueItem):
             raise TypeError(f"Expected ImageQueueItem, got {type(item)}")
         
-        # Find the correct position to insert based on priority
-        insert_pos = len(self._queue)
-        for i, queued_item in enumerate(self._queue):
-            if item.priority > queued_item.priority:
-                insert_pos = i
-                break
-        
-        self._queue.insert(insert_pos, item)
-        self._size += 1
+        with self._not_empty:
+            self._push(item, next(self._sequence))
+            self._not_empty.notify()
     
     def dequeue(self) -> Optional[ImageQueueItem]:
         """
@@ -86,12 +132,24 @@ class ImageQueue:
         Returns:
             The next ImageQueueItem to process, or None if queue is empty
         """
-        if self._size == 0:
-            return None
+        with self._lock:
+            return self._pop()
+    
+    def get(self, timeout: Optional[float] = None) -> Optional[ImageQueueItem]:
+        """
+        Remove and return the highest priority item, waiting for one if empty.
         
-        item = self._queue.pop(0)
-        self._size -= 1
-        return item
+        Args:
+            timeout: Maximum seconds to wait; None waits indefinitely
+            
+        Returns:
+            The next ImageQueueItem to process, or None if the timeout expired
+            with the queue still empty
+        """
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._size > 0, timeout=timeout):
+                return None
+            return self._pop()
     
     def peek(self) -> Optional[ImageQueueItem]:
         """
@@ -100,10 +158,76 @@ class ImageQueue:
         Returns:
             The next ImageQueueItem that would be dequeued, or None if queue is empty
         """
-        if self._size == 0:
-            return None
+        with self._lock:
+            self._discard_dead()
+            if not self._heap:
+                return None
+            
+            return self._heap[0][2]
+    
+    def remove(self, item_id: str) -> Optional[ImageQueueItem]:
+        """
+        Remove an item from the queue by id.
         
-        return self._queue[0]
+        Args:
+            item_id: Id of the item to remove; if several queued items share
+                the id, the most recently enqueued one is removed
+            
+        Returns:
+            The removed ImageQueueItem, or None if no queued item has the id
+        """
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if entry is None:
+                return None
+            return self._kill(entry)
+    
+    def update_priority(self, item_id: str, priority: int) -> bool:
+        """
+        Change the priority of a queued item.
+        
+        The item keeps its original enqueue position relative to other
+        items of its new priority.
+        
+        Args:
+            item_id: Id of the item to update
+            priority: New priority (higher = processed first)
+            
+        Returns:
+            True if the item was found and updated, False otherwise
+        """
+        with self._lock:
+            entry = self._entries.get(item_id)
+            if entry is None:
+                return False
+            sequence = entry[1]
+            item = self._kill(entry)
+            item.priority = priority
+            self._push(item, sequence)
+            return True
+    
+    def reorder(self, item_ids: Sequence[str]) -> int:
+        """
+        Rearrange queued items among their own queue positions.
+        
+        The listed items take the positions the listed items occupy, in
+        the given order; priorities still come first, and other items,
+        including any enqueued meanwhile, keep their places.
+        
+        Args:
+            item_ids: Ids of queued items in the desired order; ids no
+                longer in the queue are ignored
+        
+        Returns:
+            Number of items rearranged
+        """
+        with self._lock:
+            entries = [self._entries[item_id] for item_id in dict.fromkeys(item_ids) if item_id in self._entries]
+            sequences = sorted(entry[1] for entry in entries)
+            for entry, sequence in zip(entries, sequences):
+                entry[1] = sequence
+            heapq.heapify(self._heap)
+            return len(entries)
     
     def size(self) -> int:
         """
@@ -118,16 +242,34 @@ class ImageQueue:
         """
         Remove all items from the queue.
         """
-        self._queue.clear()
-        self._size = 0
+        with self._lock:
+            self._heap.clear()
+            self._entries.clear()
+            self._size = 0
+    
+    def snapshot(self) -> List[ImageQueueItem]:
+        """
+        Get the queued items in processing order without removing them.
+        
+        Returns:
+            List of the items at the time of the call
+        """
+        with self._lock:
+            entries = [entry for entry in self._heap if entry[2] is not None]
+        return [entry[2] for entry in sorted(entries, key=lambda entry: (entry[0], entry[1]))]
+    
+    def __contains__(self, item_id: str) -> bool:
+        """Support `item_id in queue`."""
+        with self._lock:
+            return item_id in self._entries
     
     def __len__(self) -> int:
         """Support len() function."""
         return self._size
     
     def __iter__(self):
-        """Support iteration over queue items."""
-        return iter(self._queue)
+        """Support iteration over a snapshot of the queue items, in processing order."""
+        return iter(self.snapshot())
     
     def __bool__(self) -> bool:
         """Support boolean evaluation (True if not empty)."""
@@ -0,0 +1,346 @@
+"""
+Staged pipeline for overlapped batch processing.
+
+This module provides the StagedPipeline class which runs a chain of stages
+(e.g. decode -> model -> write) on separate worker threads connected by
+bounded queues, so CPU-bound work such as image decoding and PNG encoding
+overlaps with model inference. Queue depths and per-stage utilization are
+recorded for tuning.
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+
+# Marks the end of the stream for one downstream worker
+_DONE = object()
+
+
+@dataclass
+class PipelineStage:
+    """
+    A stage of a StagedPipeline.
+
+    Attributes:
+        name: Stage name used in logs and statistics
+        func: Called as func(item, worker_idx) for every item. The return
+            value is passed to the next stage; None drops the item.
+        workers: Number of worker threads running the stage
+        cancellable: Whether queued items are discarded instead of processed
+            once the pipeline is asked to stop. Stages that persist results
+            should not be cancellable so finished work is never lost.
+    """
+    name: str
+    func: Callable[[Any, int], Any]
+    workers: int = 1
+    cancellable: bool = True
+
+
+@dataclass
+class StageStats:
+    """
+    Timing statistics of one stage.
+
+    Attributes:
+        name: Stage name
+        workers: Number of worker threads
+        items: Number of items processed
+        busy_time: Total seconds spent in the stage function, over all workers
+        input_wait_time: Total seconds workers waited for input (starved)
+        output_wait_time: Total seconds workers waited on a full output queue
+            (blocked by the next stage)
+    """
+    name: str
+    workers: int
+    items: int = 0
+    busy_time: float = 0.0
+    input_wait_time: float = 0.0
+    output_wait_time: float = 0.0
+
+
+class MonitoredQueue:
+    """
+    Bounded FIFO queue that records its depth over time.
+
+    Attributes:
+        name: Name of the consuming stage
+        capacity: Maximum number of items
+        max_depth: Largest depth observed
+    """
+
+    def __init__(self, name: str, capacity: int):
+        """
+        Initialize the MonitoredQueue.
+
+        Args:
+            name: Name of the consuming stage
+            capacity: Maximum number of items (at least 1)
+        """
+        self.name = name
+        self.capacity = capacity
+        self.max_depth = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=capacity)
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._depth_area = 0.0
+        self._start_time = time.perf_counter()
+        self._last_change = self._start_time
+
+    def _record(self, delta: int) -> None:
+        with self._lock:
+            now = time.perf_counter()
+            self._depth_area += self._depth * (now - self._last_change)
+            self._last_change = now
+            self._depth += delta
+            self.max_depth = max(self.max_depth, self._depth)
+
+    def put(self, item: Any) -> None:
+        """Add an item, blocking while the queue is full."""
+        self._queue.put(item)
+        if item is not _DONE:
+            self._record(1)
+
+    def get(self) -> Any:
+        """Remove and return the next item, blocking while the queue is empty."""
+        item = self._queue.get()
+        if item is not _DONE:
+            self._record(-1)
+        return item
+
+    def depth(self) -> int:
+        """Current number of items in the queue."""
+        with self._lock:
+            return self._depth
+
+    def mean_depth(self) -> float:
+        """Time-weighted average depth since the queue was created."""
+        with self._lock:
+            now = time.perf_counter()
+            area = self._depth_area + self._depth * (now - self._last_change)
+            elapsed = now - self._start_time
+            return area / elapsed if elapsed > 0 else 0.0
+
+
+class StagedPipeline:
+    """
+    Runs items through a chain of stages on overlapping worker threads.
+
+    The workers of the first stage pull items from `source` until it returns
+    None or `should_stop` returns True. Each later stage consumes the output
+    of the previous one through a MonitoredQueue of `queue_size` items, so a
+    slow stage applies back-pressure instead of letting decoded pages pile
+    up in memory. Exceptions raised by a stage function are logged and drop
+    the item; stage functions that need per-item error handling should do
+    it themselves and return None.
+
+    When `should_stop` becomes True, cancellable stages hand their queued
+    items to `on_discard` instead of processing them, while non-cancellable
+    stages drain normally.
+
+    Attributes:
+        stages: The stages in processing order
+        queues: Input queue of every stage after the first
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], Optional[Any]],
+        stages: Sequence[PipelineStage],
+        queue_size: int = 2,
+        should_stop: Optional[Callable[[], bool]] = None,
+        on_discard: Optional[Callable[[Any], None]] = None,
+    ):
+        """
+        Initialize the StagedPipeline.
+
+        Args:
+            source: Returns the next input item, or None when exhausted.
+                Called from the first stage's worker threads, so it must be
+                thread-safe.
+            stages: Stages in processing order
+            queue_size: Capacity of each queue between stages
+            should_stop: Checked before every item; True stops the pipeline
+            on_discard: Receives items discarded after a stop request
+        """
+        if not stages:
+            raise ValueError("StagedPipeline needs at least one stage")
+        if queue_size < 1:
+            raise ValueError(f"queue_size must be at least 1, got {queue_size}")
+        for stage in stages:
+            if stage.workers < 1:
+                raise ValueError(f"Stage '{stage.name}' needs at least 1 worker, got {stage.workers}")
+
+        self.source = source
+        self.stages = list(stages)
+        self.should_stop = should_stop or (lambda: False)
+        self.on_discard = on_discard
+        self.queues = [MonitoredQueue(stage.name, queue_size) for stage in self.stages[1:]]
+
+        self._stats = [StageStats(stage.name, stage.workers) for stage in self.stages]
+        self._stats_lock = threading.Lock()
+        self._remaining_workers = [stage.workers for stage in self.stages]
+        self._source_lock = threading.Lock()
+        self._start_time: Optional[float] = None
+        self._end_time: Optional[float] = None
+
+    def _next_input(self, stage_idx: int) -> Any:
+        if stage_idx > 0:
+            return self.queues[stage_idx - 1].get()
+        with self._source_lock:
+            if self.should_stop():
+                return _DONE
+            item = self.source()
+        return _DONE if item is None else item
+
+    def _discard(self, item: Any) -> None:
+        if self.on_discard is None:
+            return
+        try:
+            self.on_discard(item)
+        except Exception as e:
+            logger.error(f"Failed to discard pipeline item: {e}", exc_info=True)
+
+    def _finish_worker(self, stage_idx: int) -> None:
+        with self._stats_lock:
+            self._remaining_workers[stage_idx] -= 1
+            last_worker = self._remaining_workers[stage_idx] == 0
+        # The last worker of a stage ends the stream for every downstream worker
+        if last_worker and stage_idx + 1 < len(self.stages):
+            for _ in range(self.stages[stage_idx + 1].workers):
+                self.queues[stage_idx].put(_DONE)
+
+    def _worker(self, stage_idx: int, worker_idx: int) -> None:
+        stage = self.stages[stage_idx]
+        stats = self._stats[stage_idx]
+        output_queue = self.queues[stage_idx] if stage_idx < len(self.queues) else None
+
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = self._next_input(stage_idx)
+                busy_start = time.perf_counter()
+                if item is _DONE:
+                    with self._stats_lock:
+                        stats.input_wait_time += busy_start - wait_start
+                    break
+
+                if stage.cancellable and stage_idx > 0 and self.should_stop():
+                    self._discard(item)
+                    continue
+
+                try:
+                    result = stage.func(item, worker_idx)
+                except Exception as e:
+                    logger.error(f"Stage '{stage.name}' worker {worker_idx} failed: {e}", exc_info=True)
+                    result = None
+                busy_end = time.perf_counter()
+
+                if result is not None and output_queue is not None:
+                    output_queue.put(result)
+
+                with self._stats_lock:
+                    stats.items += 1
+                    stats.input_wait_time += busy_start - wait_start
+                    stats.busy_time += busy_end - busy_start
+                    stats.output_wait_time += time.perf_counter() - busy_end
+        finally:
+            self._finish_worker(stage_idx)
+
+    def run(self) -> None:
+        """Run all stages until the source is exhausted or a stop is requested."""
+        self._start_time = time.perf_counter()
+        self._end_time = None
+        threads = [
+            threading.Thread(
+                target=self._worker,
+                args=(stage_idx, worker_idx),
+                name=f"cobra-{stage.name}-{worker_idx}",
+                daemon=True,
+            )
+            for stage_idx, stage in enumerate(self.stages)
+            for worker_idx in range(stage.workers)
+        ]
+        logger.info(
+            "Starting staged pipeline: "
+            + " -> ".join(f"{stage.name} x{stage.workers}" for stage in self.stages)
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._end_time = time.perf_counter()
+
+    def elapsed_time(self) -> float:
+        """Seconds since the pipeline started (until it finished)."""
+        if self._start_time is None:
+            return 0.0
+        end_time = self._end_time if self._end_time is not None else time.perf_counter()
+        return end_time - self._start_time
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get queue depths and per-stage utilization.
+
+        Utilization is the fraction of the elapsed time the stage's workers
+        spent in the stage function. A model stage well below 1.0 with a
+        starved input (high input wait, empty input queue) calls for more
+        prefetch workers; a full output queue calls for more writers.
+
+        Returns:
+            Dictionary with:
+            - elapsed_time: Seconds since the pipeline started
+            - stages: Per stage name: workers, items, busy_time,
+              input_wait_time, output_wait_time and utilization
+            - queues: Per consuming stage name: depth, max_depth,
+              mean_depth and capacity
+        """
+        elapsed = self.elapsed_time()
+        stages: Dict[str, Dict[str, Any]] = {}
+        with self._stats_lock:
+            for stats in self._stats:
+                capacity = elapsed * stats.workers
+                stages[stats.name] = {
+                    "workers": stats.workers,
+                    "items": stats.items,
+                    "busy_time": stats.busy_time,
+                    "input_wait_time": stats.input_wait_time,
+                    "output_wait_time": stats.output_wait_time,
+                    "utilization": min(1.0, stats.busy_time / capacity) if capacity > 0 else 0.0,
+                }
+        queues = {
+            monitored.name: {
+                "depth": monitored.depth(),
+                "max_depth": monitored.max_depth,
+                "mean_depth": monitored.mean_depth(),
+                "capacity": monitored.capacity,
+            }
+            for monitored in self.queues
+        }
+        return {"elapsed_time": elapsed, "stages": stages, "queues": queues}
+
+    def format_stats(self) -> List[str]:
+        """Format get_stats() as human-readable log lines."""
+        stats = self.get_stats()
+        lines = []
+        for name, stage in stats["stages"].items():
+            line = (
+                f"{name}: {stage['items']} items, {stage['workers']} workers, "
+                f"utilization {stage['utilization'] * 100:.0f}%, "
+                f"waited {stage['input_wait_time']:.2f}s for input / "
+                f"{stage['output_wait_time']:.2f}s on output"
+            )
+            if name in stats["queues"]:
+                depth = stats["queues"][name]
+                line += (
+                    f", input queue mean {depth['mean_depth']:.2f} "
+                    f"max {depth['max_depth']}/{depth['capacity']}"
+                )
+            lines.append(line)
+        return lines
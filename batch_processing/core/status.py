@@ -3,14 +3,25 @@ Status tracking system for batch processing operations.
 
 This module provides the StatusTracker class for managing processing status
 and the ProcessingStatus dataclass for representing the status of individual images.
+State counts are maintained incrementally, and every change is pushed to
+subscribers as a StatusEvent, so observers never need to rescan the batch.
+Per-stage wall time and peak memory of every image are aggregated into
+percentiles and can be exported as JSON or in the Prometheus text format.
 """
 
 from dataclasses import dataclass, field
-from typing import Optional, Dict, List
+from typing import Any, Callable, Optional, Dict, List
 from enum import Enum
+import json
+import logging
+import math
+import threading
 import time
 
 
+logger = logging.getLogger(__name__)
+
+
 class ProcessingState(Enum):
     """Enumeration of possible processing states."""
     PENDING = "pending"
@@ -20,6 +31,32 @@ class ProcessingState(Enum):
     CANCELLED = "cancelled"
 
 
+@dataclass
+class StageMetric:
+    """
+    Wall time and peak memory of one processing stage of an image.
+    
+    Attributes:
+        duration: Total seconds spent in the stage
+        peak_memory: Peak memory in bytes observed during the stage
+            (None if unavailable)
+        calls: Number of times the stage ran (e.g. once per denoising step)
+    """
+    duration: float = 0.0
+    peak_memory: Optional[int] = None
+    calls: int = 0
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Linearly interpolated percentile (0-100) of an ascending list."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * q / 100.0
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
 @dataclass
 class ProcessingStatus:
     """
@@ -32,6 +69,8 @@ class ProcessingStatus:
         end_time: Timestamp when processing ended (None if not ended)
         error_message: Error message if processing failed (None if no error)
         output_path: Path to the output file if completed (None if not completed)
+        stage_metrics: StageMetric per stage name, in the order the stages ran
+        input_path: Path of the input image, if given when it was added
     """
     id: str
     state: str
@@ -39,6 +78,8 @@ class ProcessingStatus:
     end_time: Optional[float] = None
     error_message: Optional[str] = None
     output_path: Optional[str] = None
+    stage_metrics: Dict[str, StageMetric] = field(default_factory=dict)
+    input_path: Optional[str] = None
     
     def __post_init__(self):
         """Validate the status after initialization."""
@@ -80,6 +121,34 @@ class ProcessingStatus:
         ]
 
 
+@dataclass
+class StatusEvent:
+    """
+    One change to the tracked batch, delivered to StatusTracker subscribers.
+    
+    Attributes:
+        sequence: Position of the event in the tracker's event stream
+        kind: "added" for a new image, "updated" for a state change and
+            "cleared" when the tracker was cleared (image_id is None)
+        image_id: Identifier of the image that changed
+        state: State of the image after the change
+        previous_state: State before the change (None for added images)
+        input_path: Input path the image was added with
+        output_path: Output file path, once completed
+        error_message: Error message, once failed
+        timestamp: Time of the change
+    """
+    sequence: int
+    kind: str
+    image_id: Optional[str] = None
+    state: Optional[str] = None
+    previous_state: Optional[str] = None
+    input_path: Optional[str] = None
+    output_path: Optional[str] = None
+    error_message: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+
 @dataclass
 class StatusSummary:
     """
@@ -94,6 +163,9 @@ class StatusSummary:
         cancelled: Number of images that were cancelled
         start_time: Timestamp when batch processing started
         end_time: Timestamp when batch processing ended (None if ongoing)
+        stage_stats: Per stage name: images, total, mean, p50, p95 and max
+            seconds per image, and the max peak_memory in bytes (None if
+            unavailable)
     """
     total: int
     pending: int = 0
@@ -103,6 +175,7 @@ class StatusSummary:
     cancelled: int = 0
     start_time: Optional[float] = None
     end_time: Optional[float] = None
+    stage_stats: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     
     @property
     def is_complete(self) -> bool:
@@ -131,33 +204,105 @@ class StatusTracker:
     Tracks processing status for all images in a batch.
     
     This class maintains the status of each image and provides methods
-    to update and query status information.
+    to update and query status information. Counts per state are kept up
+    to date on every change, so summaries cost O(1) regardless of the batch
+    size (stage statistics excepted, see get_summary).
+    
+    Observers such as a UI subscribe to a stream of StatusEvent deltas
+    instead of polling every status. Subscribers are called synchronously,
+    in event order, on the thread making the change while the tracker's
+    lock is held: they must be quick (e.g. append to a deque) and must not
+    block on other threads that use the tracker.
     """
     
     def __init__(self):
         """Initialize an empty status tracker."""
         self._statuses: Dict[str, ProcessingStatus] = {}
+        self._counts: Dict[str, int] = {state.value: 0 for state in ProcessingState}
         self._batch_start_time: Optional[float] = None
         self._batch_end_time: Optional[float] = None
+        self._subscribers: Dict[int, Callable[[StatusEvent], None]] = {}
+        self._next_subscriber = 0
+        self._sequence = 0
+        # Workers of a concurrent batch update statuses from several threads
+        self._lock = threading.RLock()
     
-    def add_image(self, image_id: str) -> None:
+    def subscribe(self, callback: Callable[[StatusEvent], None]) -> Callable[[], None]:
         """
-        Add a new image to track with pending status.
+        Register a callback for every future status change.
         
         Args:
-            image_id: Unique identifier for the image
+            callback: Called with each StatusEvent; exceptions it raises are
+                logged so a faulty observer cannot break processing
+            
+        Returns:
+            A function that unsubscribes the callback
         """
-        if image_id in self._statuses:
-            raise ValueError(f"Image {image_id} is already being tracked")
+        with self._lock:
+            token = self._next_subscriber
+            self._next_subscriber += 1
+            self._subscribers[token] = callback
         
-        self._statuses[image_id] = ProcessingStatus(
-            id=image_id,
-            state=ProcessingState.PENDING.value
-        )
+        def unsubscribe() -> None:
+            with self._lock:
+                self._subscribers.pop(token, None)
+        
+        return unsubscribe
+    
+    def _emit(self, kind: str, status: Optional[ProcessingStatus] = None, previous_state: Optional[str] = None) -> None:
+        """Publish an event to the subscribers; the caller holds the lock."""
+        self._sequence += 1
+        if not self._subscribers:
+            return
+        if status is None:
+            event = StatusEvent(sequence=self._sequence, kind=kind)
+        else:
+            event = StatusEvent(
+                sequence=self._sequence,
+                kind=kind,
+                image_id=status.id,
+                state=status.state,
+                previous_state=previous_state,
+                input_path=status.input_path,
+                output_path=status.output_path,
+                error_message=status.error_message
+            )
+        for callback in list(self._subscribers.values()):
+            try:
+                callback(event)
+            except Exception as e:
+                logger.warning(f"Status subscriber failed on event {event.sequence}: {e}")
+    
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the latest event."""
+        return self._sequence
+    
+    def add_image(self, image_id: str, input_path: Optional[str] = None) -> None:
+        """
+        Add a new image to track with pending status.
         
-        # Set batch start time on first image
-        if self._batch_start_time is None:
-            self._batch_start_time = time.time()
+        Args:
+            image_id: Unique identifier for the image
+            input_path: Optional input path, reported to observers
+        """
+        with self._lock:
+            if image_id in self._statuses:
+                raise ValueError(f"Image {image_id} is already being tracked")
+            
+            status = ProcessingStatus(
+                id=image_id,
+                state=ProcessingState.PENDING.value,
+                input_path=input_path
+            )
+            self._statuses[image_id] = status
+            self._counts[status.state] += 1
+            
+            # Set batch start time on first image
+            if self._batch_start_time is None:
+                self._batch_start_time = time.time()
+            
+            self._emit("added", status)
     
     def update_status(
         self,
@@ -179,41 +324,85 @@ class StatusTracker:
             KeyError: If image_id is not being tracked
             ValueError: If state is invalid
         """
-        if image_id not in self._statuses:
-            raise KeyError(f"Image {image_id} is not being tracked")
-        
-        # Validate state
-        valid_states = [state.value for state in ProcessingState]
-        if state not in valid_states:
-            raise ValueError(
-                f"Invalid state: {state}. Must be one of {valid_states}"
-            )
-        
-        status = self._statuses[image_id]
-        old_state = status.state
-        status.state = state
-        
-        # Update timestamps based on state transitions
-        current_time = time.time()
-        
-        if state == ProcessingState.PROCESSING.value and old_state == ProcessingState.PENDING.value:
-            status.start_time = current_time
-        
-        if state in [ProcessingState.COMPLETED.value, ProcessingState.FAILED.value, ProcessingState.CANCELLED.value]:
-            if status.end_time is None:
-                status.end_time = current_time
-        
-        # Update error message and output path
-        if error_message is not None:
-            status.error_message = error_message
+        with self._lock:
+            if image_id not in self._statuses:
+                raise KeyError(f"Image {image_id} is not being tracked")
+            
+            # Validate state
+            valid_states = [state.value for state in ProcessingState]
+            if state not in valid_states:
+                raise ValueError(
+                    f"Invalid state: {state}. Must be one of {valid_states}"
+                )
+            
+            status = self._statuses[image_id]
+            old_state = status.state
+            status.state = state
+            self._counts[old_state] -= 1
+            self._counts[state] += 1
+            
+            # Update timestamps based on state transitions
+            current_time = time.time()
+            
+            if state == ProcessingState.PROCESSING.value and old_state == ProcessingState.PENDING.value:
+                status.start_time = current_time
+            
+            if state in [ProcessingState.COMPLETED.value, ProcessingState.FAILED.value, ProcessingState.CANCELLED.value]:
+                if status.end_time is None:
+                    status.end_time = current_time
+            
+            # Update error message and output path
+            if error_message is not None:
+                status.error_message = error_message
+            
+            if output_path is not None:
+                status.output_path = output_path
+            
+            # Check if batch is complete
+            if self._batch_end_time is None and self._terminal_count() == len(self._statuses):
+                self._batch_end_time = current_time
+            
+            self._emit("updated", status, previous_state=old_state)
+    
+    def _terminal_count(self) -> int:
+        """Number of images in a terminal state; the caller holds the lock."""
+        return (
+            self._counts[ProcessingState.COMPLETED.value]
+            + self._counts[ProcessingState.FAILED.value]
+            + self._counts[ProcessingState.CANCELLED.value]
+        )
+    
+    def record_stage(
+        self,
+        image_id: str,
+        stage: str,
+        duration: float,
+        peak_memory: Optional[int] = None
+    ) -> None:
+        """
+        Record one run of a processing stage of an image.
         
-        if output_path is not None:
-            status.output_path = output_path
+        Repeated runs of a stage (e.g. the denoiser on every step) add up
+        their durations and keep the highest peak memory.
         
-        # Check if batch is complete
-        summary = self.get_summary()
-        if summary.is_complete and self._batch_end_time is None:
-            self._batch_end_time = current_time
+        Args:
+            image_id: Unique identifier for the image
+            stage: Stage name (e.g. "decode", "denoise", "save")
+            duration: Seconds spent in the stage
+            peak_memory: Peak memory in bytes during the stage, if known
+            
+        Raises:
+            KeyError: If image_id is not being tracked
+        """
+        with self._lock:
+            if image_id not in self._statuses:
+                raise KeyError(f"Image {image_id} is not being tracked")
+            
+            metric = self._statuses[image_id].stage_metrics.setdefault(stage, StageMetric())
+            metric.duration += duration
+            metric.calls += 1
+            if peak_memory is not None:
+                metric.peak_memory = max(metric.peak_memory or 0, peak_memory)
     
     def get_status(self, image_id: str) -> ProcessingStatus:
         """
@@ -228,10 +417,11 @@ class StatusTracker:
         Raises:
             KeyError: If image_id is not being tracked
         """
-        if image_id not in self._statuses:
-            raise KeyError(f"Image {image_id} is not being tracked")
-        
-        return self._statuses[image_id]
+        with self._lock:
+            if image_id not in self._statuses:
+                raise KeyError(f"Image {image_id} is not being tracked")
+            
+            return self._statuses[image_id]
     
     def get_all_statuses(self) -> Dict[str, ProcessingStatus]:
         """
@@ -240,34 +430,149 @@ class StatusTracker:
         Returns:
             Dictionary mapping image IDs to their ProcessingStatus
         """
-        return self._statuses.copy()
+        with self._lock:
+            return self._statuses.copy()
     
-    def get_summary(self) -> StatusSummary:
+    def get_summary(self, include_stage_stats: bool = True) -> StatusSummary:
         """
         Generate a summary of the batch processing status.
         
+        Args:
+            include_stage_stats: Aggregate the per-stage percentiles, which
+                walks every image; pollers that only need counts pass False
+                to get an O(1) summary
+            
         Returns:
             StatusSummary with counts for each state
         """
-        summary = StatusSummary(
-            total=len(self._statuses),
-            start_time=self._batch_start_time,
-            end_time=self._batch_end_time
-        )
-        
+        with self._lock:
+            summary = StatusSummary(
+                total=len(self._statuses),
+                pending=self._counts[ProcessingState.PENDING.value],
+                processing=self._counts[ProcessingState.PROCESSING.value],
+                completed=self._counts[ProcessingState.COMPLETED.value],
+                failed=self._counts[ProcessingState.FAILED.value],
+                cancelled=self._counts[ProcessingState.CANCELLED.value],
+                start_time=self._batch_start_time,
+                end_time=self._batch_end_time
+            )
+            
+            if include_stage_stats:
+                summary.stage_stats = self._get_stage_stats()
+            return summary
+    
+    def _get_stage_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Aggregate the per-image stage metrics into percentiles."""
+        durations: Dict[str, List[float]] = {}
+        peaks: Dict[str, Optional[int]] = {}
         for status in self._statuses.values():
-            if status.state == ProcessingState.PENDING.value:
-                summary.pending += 1
-            elif status.state == ProcessingState.PROCESSING.value:
-                summary.processing += 1
-            elif status.state == ProcessingState.COMPLETED.value:
-                summary.completed += 1
-            elif status.state == ProcessingState.FAILED.value:
-                summary.failed += 1
-            elif status.state == ProcessingState.CANCELLED.value:
-                summary.cancelled += 1
+            for stage, metric in status.stage_metrics.items():
+                durations.setdefault(stage, []).append(metric.duration)
+                if metric.peak_memory is not None:
+                    peaks[stage] = max(peaks.get(stage) or 0, metric.peak_memory)
+                else:
+                    peaks.setdefault(stage, None)
+        
+        stage_stats = {}
+        for stage, values in durations.items():
+            values.sort()
+            stage_stats[stage] = {
+                "images": len(values),
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "max": values[-1],
+                "peak_memory": peaks[stage],
+            }
+        return stage_stats
+    
+    def export_metrics(self, format: str = "json") -> str:
+        """
+        Export the batch's state counts and stage metrics.
         
-        return summary
+        Args:
+            format: "json" for a JSON document with the summary, the
+                aggregated stage statistics and every image's stage
+                metrics, or "prometheus" for the Prometheus text
+                exposition format
+            
+        Returns:
+            The exported metrics
+            
+        Raises:
+            ValueError: If the format is unknown
+        """
+        with self._lock:
+            summary = self.get_summary()
+            images = {
+                image_id: {
+                    "state": status.state,
+                    "processing_time": status.processing_time,
+                    "stages": {
+                        stage: {
+                            "duration": metric.duration,
+                            "peak_memory": metric.peak_memory,
+                            "calls": metric.calls,
+                        }
+                        for stage, metric in status.stage_metrics.items()
+                    },
+                }
+                for image_id, status in self._statuses.items()
+            }
+        
+        counts = {
+            "total": summary.total,
+            "pending": summary.pending,
+            "processing": summary.processing,
+            "completed": summary.completed,
+            "failed": summary.failed,
+            "cancelled": summary.cancelled,
+        }
+        
+        if format == "json":
+            return json.dumps(
+                {
+                    "summary": dict(counts, elapsed_time=summary.elapsed_time, success_rate=summary.success_rate),
+                    "stages": summary.stage_stats,
+                    "images": images,
+                },
+                indent=2
+            )
+        
+        if format == "prometheus":
+            lines = [
+                "# HELP cobra_batch_images Number of images in the batch by state.",
+                "# TYPE cobra_batch_images gauge",
+            ]
+            for state, count in counts.items():
+                if state != "total":
+                    lines.append(f'cobra_batch_images{{state="{state}"}} {count}')
+            if summary.elapsed_time is not None:
+                lines += [
+                    "# HELP cobra_batch_elapsed_seconds Seconds since the batch started.",
+                    "# TYPE cobra_batch_elapsed_seconds gauge",
+                    f"cobra_batch_elapsed_seconds {summary.elapsed_time:.6f}",
+                ]
+            lines += [
+                "# HELP cobra_stage_duration_seconds Wall time of a processing stage per image.",
+                "# TYPE cobra_stage_duration_seconds summary",
+            ]
+            for stage, stats in summary.stage_stats.items():
+                lines.append(f'cobra_stage_duration_seconds{{stage="{stage}",quantile="0.5"}} {stats["p50"]:.6f}')
+                lines.append(f'cobra_stage_duration_seconds{{stage="{stage}",quantile="0.95"}} {stats["p95"]:.6f}')
+                lines.append(f'cobra_stage_duration_seconds_sum{{stage="{stage}"}} {stats["total"]:.6f}')
+                lines.append(f'cobra_stage_duration_seconds_count{{stage="{stage}"}} {stats["images"]}')
+            lines += [
+                "# HELP cobra_stage_peak_memory_bytes Highest peak memory observed in a processing stage.",
+                "# TYPE cobra_stage_peak_memory_bytes gauge",
+            ]
+            for stage, stats in summary.stage_stats.items():
+                if stats["peak_memory"] is not None:
+                    lines.append(f'cobra_stage_peak_memory_bytes{{stage="{stage}"}} {stats["peak_memory"]}')
+            return "\n".join(lines) + "\n"
+        
+        raise ValueError(f"Unknown metrics format: {format}. Must be 'json' or 'prometheus'")
     
     def get_images_by_state(self, state: str) -> List[str]:
         """
@@ -279,17 +584,21 @@ class StatusTracker:
         Returns:
             List of image IDs in the specified state
         """
-        return [
-            image_id
-            for image_id, status in self._statuses.items()
-            if status.state == state
-        ]
+        with self._lock:
+            return [
+                image_id
+                for image_id, status in self._statuses.items()
+                if status.state == state
+            ]
     
     def clear(self) -> None:
         """Clear all tracked statuses."""
-        self._statuses.clear()
-        self._batch_start_time = None
-        self._batch_end_time = None
+        with self._lock:
+            self._statuses.clear()
+            self._counts = {state.value: 0 for state in ProcessingState}
+            self._batch_start_time = None
+            self._batch_end_time = None
+            self._emit("cleared")
     
     def __len__(self) -> int:
         """Return the number of tracked images."""
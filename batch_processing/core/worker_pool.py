@@ -0,0 +1,164 @@
+"""
+Worker pool for concurrent batch processing.
+
+This module provides the WorkerPool class which drains a shared ImageQueue
+with several worker threads, each bound to its own inference engine, and
+helpers to spread workers over the available devices.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Callable, List, Optional, Sequence
+
+import torch
+
+from .queue import ImageQueue, ImageQueueItem
+
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_worker_devices(num_workers: int, devices: Optional[Sequence[str]] = None) -> List[torch.device]:
+    """
+    Assign a device to each worker.
+
+    Explicit devices are assigned round-robin. Otherwise workers are spread
+    over all visible CUDA devices, or share MPS / CPU when no CUDA device
+    is available.
+
+    Args:
+        num_workers: Number of workers
+        devices: Optional device names (e.g. ["cuda:0", "cuda:1"])
+
+    Returns:
+        One torch.device per worker
+    """
+    if num_workers < 1:
+        raise ValueError(f"num_workers must be at least 1, got {num_workers}")
+
+    if devices:
+        candidates = [torch.device(device) for device in devices]
+    elif torch.cuda.is_available():
+        candidates = [torch.device(f"cuda:{idx}") for idx in range(torch.cuda.device_count())]
+    elif torch.backends.mps.is_available():
+        candidates = [torch.device("mps")]
+    else:
+        candidates = [torch.device("cpu")]
+
+    return [candidates[idx % len(candidates)] for idx in range(num_workers)]
+
+
+def default_threads_per_worker(num_cpu_workers: int) -> int:
+    """
+    Split the host's cores evenly between CPU workers.
+
+    Args:
+        num_cpu_workers: Number of workers running on the CPU
+
+    Returns:
+        Number of intra-op threads per worker (at least 1)
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, num_cpu_workers))
+
+
+class WorkerPool:
+    """
+    Drains a shared ImageQueue with one thread per engine.
+
+    Every worker repeatedly dequeues the next item and hands it to
+    `process_item` together with its own engine, until the queue is empty
+    (and, if given, `more_coming` returns False) or `should_stop` returns
+    True. While more items are coming, idle workers block in
+    ImageQueue.get instead of exiting. Items already being processed when a
+    stop is requested are allowed to finish, which preserves the pause and
+    cancel semantics of the serial loop.
+
+    Attributes:
+        queue: Shared queue the workers pull from
+        engines: One engine per worker
+        processed_count: Number of items handed to workers so far
+    """
+
+    def __init__(
+        self,
+        queue: ImageQueue,
+        engines: Sequence[Any],
+        process_item: Callable[[ImageQueueItem, Any], None],
+        should_stop: Callable[[], bool],
+        more_coming: Optional[Callable[[], bool]] = None,
+    ):
+        """
+        Initialize the WorkerPool.
+
+        Args:
+            queue: Shared queue of ImageQueueItem
+            engines: One engine per worker; the pool size is len(engines)
+            process_item: Called as process_item(item, engine) for every item.
+                Exceptions are logged and do not stop the worker.
+            should_stop: Checked before every dequeue; True stops the worker
+            more_coming: Optional check whether a producer may still add
+                items; workers finding the queue empty wait while it is True
+        """
+        if not engines:
+            raise ValueError("WorkerPool needs at least one engine")
+
+        self.queue = queue
+        self.engines = list(engines)
+        self.process_item = process_item
+        self.should_stop = should_stop
+        self.more_coming = more_coming
+        self.processed_count = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def num_workers(self) -> int:
+        """Number of worker threads."""
+        return len(self.engines)
+
+    def _next_item(self) -> Optional[ImageQueueItem]:
+        while True:
+            if self.should_stop():
+                return None
+            item = self.queue.dequeue()
+            if item is not None or self.more_coming is None or not self.more_coming():
+                break
+            # short timeout so stop requests and the end of the feed are noticed
+            item = self.queue.get(timeout=0.1)
+            if item is not None:
+                break
+        if item is not None:
+            with self._count_lock:
+                self.processed_count += 1
+        return item
+
+    def _worker(self, worker_idx: int) -> None:
+        engine = self.engines[worker_idx]
+        logger.debug(f"Worker {worker_idx} started on {getattr(engine, 'device', 'unknown device')}")
+        while True:
+            item = self._next_item()
+            if item is None:
+                break
+            try:
+                self.process_item(item, engine)
+            except Exception as e:
+                logger.error(f"Worker {worker_idx} failed on {item.input_path}: {e}", exc_info=True)
+        logger.debug(f"Worker {worker_idx} finished")
+
+    def run(self) -> int:
+        """
+        Run all workers and wait until they finish.
+
+        Returns:
+            Number of items the workers dequeued
+        """
+        threads = [
+            threading.Thread(target=self._worker, args=(worker_idx,), name=f"cobra-worker-{worker_idx}", daemon=True)
+            for worker_idx in range(self.num_workers)
+        ]
+        logger.info(f"Starting {self.num_workers} workers")
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.processed_count
@@ -2,7 +2,7 @@
 File I/O operations for batch processing.
 
 This submodule handles file and directory operations including scanning,
-validation, ZIP file handling, and output path management.
+validation, ZIP file handling and streaming, and output path management.
 """
 
 from .zip_handler import (
@@ -13,6 +13,11 @@ from .zip_handler import (
     SUPPORTED_IMAGE_FORMATS
 )
 
+from .zip_source import ZipImageSource, ZipMember
+from .zip_writer import StreamingZipWriter
+from .scanner import DirectoryScanner, ScanManifest, check_image_header
+from .thumbnails import ThumbnailCache, open_output_image
+
 from .file_handler import (
     scan_directory,
     validate_image_file,
@@ -28,6 +33,14 @@ __all__ = [
     'create_output_zip',
     'separate_line_art_and_references',
     'SUPPORTED_IMAGE_FORMATS',
+    'ZipImageSource',
+    'ZipMember',
+    'StreamingZipWriter',
+    'DirectoryScanner',
+    'ScanManifest',
+    'check_image_header',
+    'ThumbnailCache',
+    'open_output_image',
     'scan_directory',
     'validate_image_file',
     'create_output_path',
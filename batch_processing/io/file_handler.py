@@ -17,25 +17,34 @@ logger = get_logger(__name__)
 
 # Supported image formats (imported from zip_handler for consistency)
 from .zip_handler import SUPPORTED_IMAGE_FORMATS
+from .scanner import DirectoryScanner
 
 
 def scan_directory(
     directory: str,
     recursive: bool = False,
-    supported_formats: Optional[Set[str]] = None
+    supported_formats: Optional[Set[str]] = None,
+    max_workers: int = 8,
+    manifest_path: Optional[str] = None,
+    check_headers: bool = False
 ) -> List[str]:
     """
     Scan a directory for valid image files.
     
     Identifies all supported image formats in the specified directory.
     Invalid files are skipped with logging. Optionally scans subdirectories
-    recursively.
+    recursively. Files are checked concurrently (see DirectoryScanner);
+    use DirectoryScanner.iter_images directly to consume images while the
+    scan is still running.
     
     Args:
         directory: Path to the directory to scan
         recursive: If True, scan subdirectories recursively
         supported_formats: Set of supported file extensions (e.g., {'.png', '.jpg'}).
                           If None, uses SUPPORTED_IMAGE_FORMATS
+        max_workers: Threads checking files
+        manifest_path: Optional ScanManifest file caching header checks
+        check_headers: Whether to also check each file's format signature
         
     Returns:
         List of absolute paths to valid image files
@@ -47,9 +56,6 @@ def scan_directory(
         >>> images = scan_directory('/path/to/images', recursive=True)
         >>> print(f"Found {len(images)} images")
     """
-    if supported_formats is None:
-        supported_formats = SUPPORTED_IMAGE_FORMATS
-    
     dir_path = Path(directory)
     
     # Validate directory exists
@@ -70,51 +76,16 @@ def scan_directory(
         logger.error(error_msg)
         raise ValidationError(error_msg)
     
-    logger.info(
-        f"Scanning directory: {directory} "
-        f"(recursive={'yes' if recursive else 'no'})"
-    )
-    
-    valid_images: List[str] = []
-    invalid_count = 0
-    
     try:
-        # Choose scanning method based on recursive flag
-        if recursive:
-            # Use rglob for recursive scanning
-            file_iterator = dir_path.rglob('*')
-        else:
-            # Use glob for non-recursive scanning
-            file_iterator = dir_path.glob('*')
-        
-        # Process each file
-        for file_path in file_iterator:
-            # Skip directories
-            if file_path.is_dir():
-                continue
-            
-            # Check if file has supported extension
-            if file_path.suffix.lower() in supported_formats:
-                # Validate the image file
-                if validate_image_file(str(file_path)):
-                    valid_images.append(str(file_path.absolute()))
-                    logger.debug(f"Found valid image: {file_path.name}")
-                else:
-                    invalid_count += 1
-                    logger.warning(f"Skipping invalid image file: {file_path}")
-            else:
-                # Log files with unsupported extensions at debug level
-                if file_path.suffix:  # Only log if there is an extension
-                    logger.debug(
-                        f"Skipping file with unsupported extension: {file_path.name}"
-                    )
-        
-        logger.info(
-            f"Scan complete: found {len(valid_images)} valid images, "
-            f"skipped {invalid_count} invalid files"
+        scanner = DirectoryScanner(
+            directory,
+            recursive=recursive,
+            supported_formats=supported_formats,
+            max_workers=max_workers,
+            manifest_path=manifest_path,
+            check_headers=check_headers
         )
-        
-        return valid_images
+        return scanner.scan()
         
     except PermissionError as e:
         error_msg = f"Permission denied accessing directory or files in: {directory}"
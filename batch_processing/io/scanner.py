@@ -0,0 +1,326 @@
+"""
+Concurrent directory scanning for batch processing.
+
+This module provides the DirectoryScanner class which walks an input
+directory, checks candidate images on a thread pool and yields valid images
+as soon as they are checked, and the ScanManifest class which persists the
+results of header checks keyed by path, size and modification time so a
+rescan of an unchanged tree does not read any file again.
+"""
+
+import json
+import os
+import stat
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from ..logging_config import get_logger
+from ..exceptions import ValidationError
+from .zip_handler import SUPPORTED_IMAGE_FORMATS
+
+logger = get_logger(__name__)
+
+# Default manifest file name, kept in the output directory
+MANIFEST_FILENAME = ".cobra_scan_manifest.json"
+
+# Leading bytes identifying each supported format
+IMAGE_SIGNATURES = {
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+}
+
+# Bytes read for a header check; enough for every signature above and RIFF/WEBP
+HEADER_SIZE = 16
+
+
+def check_image_header(path: str) -> bool:
+    """
+    Check that a file starts with the signature of its image format.
+
+    Only the first bytes are read, so this is far cheaper than decoding the
+    image while still rejecting truncated, mislabeled and placeholder files.
+
+    Args:
+        path: Path to the image file
+
+    Returns:
+        True if the header matches the file extension
+    """
+    suffix = Path(path).suffix.lower()
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+    except OSError as e:
+        logger.debug(f"Cannot read header of {path}: {e}")
+        return False
+
+    if suffix == '.webp':
+        return header[:4] == b'RIFF' and header[8:12] == b'WEBP'
+    return any(header.startswith(signature) for signature in IMAGE_SIGNATURES.get(suffix, ()))
+
+
+class ScanManifest:
+    """
+    Persistent cache of header check results.
+
+    Entries map an absolute path to the (size, mtime_ns) it had when it
+    was checked and the result; a lookup only hits when both still match.
+    The manifest is a JSON file written atomically.
+
+    Attributes:
+        path: Manifest file
+        hits: Number of lookups answered from the manifest
+        misses: Number of lookups that needed a check
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        """
+        Load a manifest, starting empty if it is missing or unreadable.
+
+        Args:
+            path: Manifest file
+        """
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if data.get("version") == self.VERSION:
+                    self._entries = data.get("entries", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable scan manifest {self.path}: {e}")
+
+    def lookup(self, path: str, size: int, mtime_ns: int) -> Optional[bool]:
+        """
+        Get the cached check result of an unchanged file.
+
+        Args:
+            path: Absolute path of the file
+            size: Current size of the file
+            mtime_ns: Current modification time of the file
+
+        Returns:
+            The cached result, or None if the file is unknown or changed
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def update(self, path: str, size: int, mtime_ns: int, valid: bool) -> None:
+        """
+        Record the check result of a file.
+
+        Args:
+            path: Absolute path of the file
+            size: Size of the file when checked
+            mtime_ns: Modification time of the file when checked
+            valid: Check result
+        """
+        with self._lock:
+            self._entries[path] = [size, mtime_ns, valid]
+
+    def prune(self, directory: str, seen: Set[str]) -> None:
+        """
+        Drop the entries of files under a directory that were not seen.
+
+        Args:
+            directory: Absolute path of the scanned directory
+            seen: Absolute paths found by the scan
+        """
+        prefix = os.path.join(directory, "")
+        with self._lock:
+            for path in [path for path in self._entries if path.startswith(prefix) and path not in seen]:
+                del self._entries[path]
+
+    def save(self) -> None:
+        """Write the manifest atomically; failures are logged, not raised."""
+        with self._lock:
+            content = json.dumps({"version": self.VERSION, "entries": self._entries})
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to write scan manifest {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DirectoryScanner:
+    """
+    Walk a directory and check its images concurrently.
+
+    The walk itself only lists directories; the per-file stat and header
+    read, which dominate on network filesystems, run on a thread pool.
+    Results are yielded in walk order as soon as they are available, with
+    a bounded number of checks in flight, so a consumer can start
+    processing the first images while the rest of the tree is scanned.
+
+    Attributes:
+        directory: Absolute path of the scanned directory
+        valid_count: Number of valid images yielded so far
+        invalid_count: Number of candidates rejected so far
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        recursive: bool = False,
+        supported_formats: Optional[Set[str]] = None,
+        max_workers: int = 8,
+        manifest_path: Optional[str] = None,
+        check_headers: bool = True
+    ):
+        """
+        Initialize the DirectoryScanner.
+
+        Args:
+            directory: Directory to scan
+            recursive: If True, scan subdirectories recursively
+            supported_formats: File extensions to consider; defaults to
+                SUPPORTED_IMAGE_FORMATS
+            max_workers: Threads checking files
+            manifest_path: Optional ScanManifest file caching header checks
+                across scans
+            check_headers: Whether to check each file's format signature
+                in addition to its size and permissions
+
+        Raises:
+            ValidationError: If the directory does not exist, is not a
+                directory or is not readable
+        """
+        dir_path = Path(directory)
+        if not dir_path.exists():
+            raise ValidationError(f"Directory does not exist: {directory}")
+        if not dir_path.is_dir():
+            raise ValidationError(f"Path is not a directory: {directory}")
+        if not os.access(directory, os.R_OK):
+            raise ValidationError(f"Directory is not readable: {directory}")
+
+        self.directory = str(dir_path.absolute())
+        self.recursive = recursive
+        self.supported_formats = supported_formats if supported_formats is not None else SUPPORTED_IMAGE_FORMATS
+        self.max_workers = max(1, max_workers)
+        self.check_headers = check_headers
+        self.manifest = ScanManifest(manifest_path) if manifest_path and check_headers else None
+        self.valid_count = 0
+        self.invalid_count = 0
+
+    def _walk(self) -> Iterator[str]:
+        """Yield candidate files in sorted order, each directory's files before its subdirectories, without stat calls."""
+        pending = [self.directory]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except PermissionError as e:
+                logger.warning(f"Skipping unreadable directory {directory}: {e}")
+                continue
+
+            subdirectories = []
+            for entry in entries:
+                if entry.is_dir():
+                    if self.recursive:
+                        subdirectories.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in self.supported_formats:
+                    yield entry.path
+                elif os.path.splitext(entry.name)[1]:
+                    logger.debug(f"Skipping file with unsupported extension: {entry.name}")
+            pending.extend(reversed(subdirectories))
+
+    def _check(self, path: str) -> Tuple[str, bool]:
+        """Stat and, if enabled, header-check one candidate."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return path, False
+        if not stat.S_ISREG(st.st_mode) or st.st_size == 0 or not os.access(path, os.R_OK):
+            return path, False
+        if not self.check_headers:
+            return path, True
+
+        if self.manifest is not None:
+            cached = self.manifest.lookup(path, st.st_size, st.st_mtime_ns)
+            if cached is not None:
+                return path, cached
+        valid = check_image_header(path)
+        if self.manifest is not None:
+            self.manifest.update(path, st.st_size, st.st_mtime_ns, valid)
+        return path, valid
+
+    def iter_images(self) -> Iterator[str]:
+        """
+        Yield the absolute paths of valid images as they are checked.
+
+        The manifest, if any, is saved once the walk completes.
+
+        Yields:
+            Absolute paths of valid images, in walk order
+        """
+        logger.info(
+            f"Scanning directory: {self.directory} "
+            f"(recursive={'yes' if self.recursive else 'no'}, workers={self.max_workers})"
+        )
+        window = self.max_workers * 4
+        seen: Set[str] = set()
+        in_flight = deque()
+
+        def collect():
+            path, valid = in_flight.popleft().result()
+            if valid:
+                self.valid_count += 1
+                return path
+            self.invalid_count += 1
+            logger.warning(f"Skipping invalid image file: {path}")
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scan") as executor:
+            for path in self._walk():
+                seen.add(path)
+                in_flight.append(executor.submit(self._check, path))
+                if len(in_flight) >= window:
+                    valid_path = collect()
+                    if valid_path is not None:
+                        yield valid_path
+            while in_flight:
+                valid_path = collect()
+                if valid_path is not None:
+                    yield valid_path
+
+        if self.manifest is not None:
+            self.manifest.prune(self.directory, seen)
+            self.manifest.save()
+            logger.debug(f"Scan manifest: {self.manifest.hits} hits, {self.manifest.misses} misses")
+
+        logger.info(
+            f"Scan complete: found {self.valid_count} valid images, "
+            f"skipped {self.invalid_count} invalid files"
+        )
+
+    def scan(self) -> List[str]:
+        """
+        Scan the whole directory.
+
+        Returns:
+            List of absolute paths to valid images, in walk order
+        """
+        return list(self.iter_images())
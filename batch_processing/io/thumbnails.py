@@ -0,0 +1,208 @@
+"""
+Thumbnail cache for batch outputs.
+
+This module provides the ThumbnailCache class which keeps a small JPEG
+preview of every output page, written by the batch writer right after the
+page is saved, so result galleries send previews of a few kilobytes to the
+browser instead of decoding and re-encoding full-resolution pages. Full
+resolution is only loaded on demand with open_output_image.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+from ..logging_config import get_logger
+from .zip_source import MEMBER_SEPARATOR
+
+logger = get_logger(__name__)
+
+THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 85
+
+# Under the system temp directory, which Gradio serves files from by default
+DEFAULT_THUMBNAIL_DIR = os.path.join(tempfile.gettempdir(), "cobra_thumbnails")
+
+
+def make_thumbnail(image: Image.Image, size: int = THUMBNAIL_SIZE) -> Image.Image:
+    """
+    Downscale an image to fit within size x size.
+
+    The image is resized in one pass with Image.resize's reducing_gap, so
+    the full-resolution image is neither copied nor resampled at full size.
+
+    Args:
+        image: Source image, left unchanged
+        size: Longest side of the thumbnail
+
+    Returns:
+        RGB thumbnail
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    scale = min(1.0, size / max(image.width, image.height))
+    if scale == 1.0:
+        return image.copy()
+    target = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(target, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+def load_thumbnail(image_path: str, size: int = THUMBNAIL_SIZE) -> Image.Image:
+    """
+    Decode an image file directly at thumbnail size.
+
+    JPEG files are decoded at a reduced scale with Image.draft; other
+    formats are shrunk with Image.thumbnail's reducing_gap.
+
+    Args:
+        image_path: Path to the image file
+        size: Longest side of the thumbnail
+
+    Returns:
+        RGB thumbnail
+    """
+    with Image.open(image_path) as image:
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return image.convert("RGB")
+
+
+def open_output_image(output_path: str) -> Image.Image:
+    """
+    Load a batch output at full resolution.
+
+    Args:
+        output_path: Path of an output file, or "archive.zip!/member" for a
+            page written to the output ZIP
+
+    Returns:
+        Loaded image
+
+    Raises:
+        OSError: If the file or archive member cannot be read
+    """
+    archive, separator, member = output_path.partition(MEMBER_SEPARATOR)
+    if not separator:
+        with Image.open(output_path) as image:
+            image.load()
+            return image
+    try:
+        with zipfile.ZipFile(archive, 'r') as zf:
+            data = zf.read(member)
+    except (KeyError, zipfile.BadZipFile) as e:
+        raise OSError(f"Cannot read {output_path}: {e}") from e
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+class ThumbnailCache:
+    """
+    On-disk cache of output thumbnails.
+
+    Thumbnails are stored as JPEG files under cache_dir, named after a hash
+    of the output path (kept outside output_dir, so they never end up in
+    the output ZIP). The batch writer saves one for every page it saves;
+    get() creates missing ones lazily from the output, e.g. for pages of an
+    earlier run.
+
+    Attributes:
+        cache_dir: Directory holding the thumbnails
+        size: Longest side of a thumbnail
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, size: int = THUMBNAIL_SIZE):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding the thumbnails, created on first
+                write; defaults to DEFAULT_THUMBNAIL_DIR
+            size: Longest side of a thumbnail
+        """
+        self.cache_dir = Path(cache_dir or DEFAULT_THUMBNAIL_DIR)
+        self.size = size
+
+    def path_for(self, output_path: str) -> Path:
+        """
+        Get the thumbnail path of an output.
+
+        Args:
+            output_path: Path of the output (see open_output_image)
+
+        Returns:
+            Path the thumbnail is stored at, whether or not it exists
+        """
+        key = hashlib.sha1(f"{os.path.abspath(output_path)}|{self.size}".encode()).hexdigest()[:20]
+        stem = Path(output_path.rpartition(MEMBER_SEPARATOR)[2]).stem
+        return self.cache_dir / key[:2] / f"{stem}_{key}.jpg"
+
+    def save(self, output_path: str, image: Image.Image) -> Optional[str]:
+        """
+        Store the thumbnail of a freshly saved output.
+
+        The thumbnail is written under a temporary name and renamed into
+        place, so readers never see a partial file. Failures are logged and
+        ignored; the thumbnail is then created by get() when it is needed.
+
+        Args:
+            output_path: Path the output was saved at
+            image: The saved image
+
+        Returns:
+            Path of the thumbnail, or None if it could not be written
+        """
+        thumbnail_path = self.path_for(output_path)
+        partial_path = thumbnail_path.with_name(f".{thumbnail_path.stem}.{uuid.uuid4().hex}.partial.jpg")
+        try:
+            thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+            make_thumbnail(image, self.size).save(partial_path, "JPEG", quality=THUMBNAIL_QUALITY)
+            os.replace(partial_path, thumbnail_path)
+        except OSError as e:
+            logger.warning(f"Failed to write thumbnail of {output_path}: {e}")
+            return None
+        finally:
+            if partial_path.exists():
+                partial_path.unlink()
+        return str(thumbnail_path)
+
+    def get(self, output_path: str) -> Optional[str]:
+        """
+        Get the thumbnail of an output, creating it if missing or stale.
+
+        Args:
+            output_path: Path of the output (see open_output_image)
+
+        Returns:
+            Path of the thumbnail, or None if the output cannot be read
+        """
+        thumbnail_path = self.path_for(output_path)
+        in_zip = MEMBER_SEPARATOR in output_path
+        try:
+            if in_zip:
+                # archive members are never replaced, only new ones appended (see StreamingZipWriter)
+                fresh = thumbnail_path.exists()
+            else:
+                # loose outputs are replaced atomically, so a thumbnail older than its output is stale
+                fresh = thumbnail_path.stat().st_mtime >= os.stat(output_path).st_mtime
+        except OSError:
+            fresh = False
+        if fresh:
+            return str(thumbnail_path)
+
+        try:
+            if in_zip:
+                with open_output_image(output_path) as image:
+                    return self.save(output_path, image)
+            with load_thumbnail(output_path, self.size) as image:
+                return self.save(output_path, image)
+        except OSError as e:
+            logger.warning(f"Cannot create thumbnail of {output_path}: {e}")
+            return None
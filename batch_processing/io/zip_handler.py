@@ -304,8 +304,8 @@ def create_output_zip(
                     # Just use the filename
                     arcname = image_file.name
                 
-                # Add to ZIP
-                zf.write(image_file, arcname)
+                # Add to ZIP; image data is already compressed, so it is stored as is
+                zf.write(image_file, arcname, compress_type=zipfile.ZIP_STORED)
                 logger.debug(f"Added to ZIP: {arcname}")
             
             # Add metadata file if provided
@@ -0,0 +1,246 @@
+"""
+Streaming image source over ZIP archives.
+
+This module provides the ZipImageSource class which lists the images of a
+ZIP archive from its central directory and reads each one straight from the
+archive into memory when it is needed, instead of extracting the whole
+archive to a temporary directory first. Nested ZIP archives are opened in
+memory.
+"""
+
+import io
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+from ..logging_config import get_logger
+from ..exceptions import ZIPExtractionError
+from .zip_handler import SUPPORTED_IMAGE_FORMATS, should_skip_file
+
+logger = get_logger(__name__)
+
+# Separates the archive path from the member name in ZipMember.path
+MEMBER_SEPARATOR = "!/"
+
+
+@dataclass(frozen=True)
+class ZipMember:
+    """
+    An image inside a (possibly nested) ZIP archive.
+
+    Attributes:
+        path: Display path of the image, e.g. "chapter.zip!/pages/01.png";
+            nested archives add one "!/" per level
+        name: Member name within its innermost archive
+        archive: Index of the innermost archive within the source
+        size: Uncompressed size in bytes
+        crc: CRC-32 of the uncompressed content, as stored in the archive
+    """
+    path: str
+    name: str
+    archive: int
+    size: int
+    crc: int
+
+    @property
+    def input_hash(self) -> str:
+        """Content identifier taken from the archive's CRC and size, without reading the member."""
+        return f"zip-crc32:{self.crc:08x}:{self.size}"
+
+
+class ZipImageSource:
+    """
+    Lazily read images of a ZIP archive.
+
+    Opening the source reads only the central directory of the archive
+    (and the bytes of nested archives, which are opened in memory). Image
+    members are read and decompressed one at a time on request. Reads may
+    come from several threads; zipfile serializes access to the underlying
+    file.
+
+    Attributes:
+        zip_path: Path of the outer archive
+        max_nested_level: How many levels of nested archives are opened
+    """
+
+    def __init__(self, zip_path: str, max_nested_level: int = 1):
+        """
+        Open a ZIP archive and list its images.
+
+        Args:
+            zip_path: Path of the ZIP archive
+            max_nested_level: Maximum nesting level of archives to open
+                (default: 1, like extract_zip_file)
+
+        Raises:
+            ZIPExtractionError: If the archive cannot be opened
+        """
+        self.zip_path = str(zip_path)
+        self.max_nested_level = max_nested_level
+        self._archives: List[zipfile.ZipFile] = []
+        self._members: List[ZipMember] = []
+        self._lock = threading.Lock()
+
+        try:
+            archive = zipfile.ZipFile(self.zip_path, 'r')
+        except zipfile.BadZipFile as e:
+            error_msg = f"Corrupted ZIP file: {self.zip_path}"
+            logger.error(error_msg)
+            raise ZIPExtractionError(error_msg) from e
+        except OSError as e:
+            error_msg = f"Failed to open ZIP file {self.zip_path}: {e}"
+            logger.error(error_msg)
+            raise ZIPExtractionError(error_msg) from e
+
+        self._add_archive(archive, Path(self.zip_path).name, nested_level=0)
+        logger.info(f"Found {len(self._members)} images in {Path(self.zip_path).name}")
+
+    def _add_archive(self, archive: zipfile.ZipFile, display_path: str, nested_level: int) -> None:
+        """List the images of an opened archive, descending into nested archives."""
+        index = len(self._archives)
+        self._archives.append(archive)
+
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+
+            member_path = PurePosixPath(info.filename)
+            if should_skip_file(Path(info.filename)):
+                logger.debug(f"Skipping metadata/hidden file: {member_path.name}")
+                continue
+
+            suffix = member_path.suffix.lower()
+            if suffix in SUPPORTED_IMAGE_FORMATS:
+                self._members.append(ZipMember(
+                    path=f"{display_path}{MEMBER_SEPARATOR}{info.filename}",
+                    name=info.filename,
+                    archive=index,
+                    size=info.file_size,
+                    crc=info.CRC,
+                ))
+
+            elif suffix == '.zip' and nested_level < self.max_nested_level:
+                logger.info(
+                    f"Found nested ZIP file: {member_path.name} "
+                    f"(level {nested_level + 1}/{self.max_nested_level})"
+                )
+                try:
+                    # Nested archives need random access, so they are held in memory rather than on disk
+                    nested = zipfile.ZipFile(io.BytesIO(archive.read(info)), 'r')
+                except (zipfile.BadZipFile, OSError) as e:
+                    logger.warning(f"Failed to open nested ZIP {member_path.name}: {e}")
+                    continue
+                self._add_archive(nested, f"{display_path}{MEMBER_SEPARATOR}{info.filename}", nested_level + 1)
+
+    def members(self) -> List[ZipMember]:
+        """
+        Get the images of the archive, in archive order.
+
+        Returns:
+            List of ZipMember, nested archives' images following the
+            position of the nested archive
+        """
+        return list(self._members)
+
+    def read(self, member: ZipMember) -> bytes:
+        """
+        Read and decompress one image.
+
+        Args:
+            member: Image to read
+
+        Returns:
+            The image file's bytes
+
+        Raises:
+            zipfile.BadZipFile: If the member fails its CRC check
+        """
+        with self._archives[member.archive].open(member.name) as f:
+            return f.read()
+
+    def open_stream(self, member: ZipMember) -> BinaryIO:
+        """
+        Open one image for reading without reading it.
+
+        The stream decompresses only what is read from it, so reading the
+        image header (e.g. with Image.open) costs a few kilobytes whatever
+        the size of the image.
+
+        Args:
+            member: Image to open
+
+        Returns:
+            Readable, seekable binary stream of the image file; close it
+            when done
+        """
+        return self._archives[member.archive].open(member.name)
+
+    def open_image(self, member: ZipMember) -> Image.Image:
+        """
+        Decode one image from memory.
+
+        Args:
+            member: Image to decode
+
+        Returns:
+            The loaded PIL image
+        """
+        image = Image.open(io.BytesIO(self.read(member)))
+        image.load()
+        return image
+
+    def iter_images(
+        self,
+        members: Optional[List[ZipMember]] = None,
+        prefetch: int = 2
+    ) -> Iterator[Tuple[ZipMember, Image.Image]]:
+        """
+        Decode images in order, reading ahead on background threads.
+
+        At most `prefetch` images beyond the one being consumed are decoded,
+        so memory stays bounded however large the archive is.
+
+        Args:
+            members: Images to decode; defaults to all images
+            prefetch: Number of images decoded ahead of the consumer
+
+        Yields:
+            (member, image) pairs in the order of `members`
+        """
+        members = self.members() if members is None else members
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max(1, prefetch), thread_name_prefix="zip-prefetch") as executor:
+            remaining = iter(members)
+            for member in remaining:
+                pending.append((member, executor.submit(self.open_image, member)))
+                if len(pending) >= max(1, prefetch):
+                    break
+            while pending:
+                member, future = pending.popleft()
+                image = future.result()
+                next_member = next(remaining, None)
+                if next_member is not None:
+                    pending.append((next_member, executor.submit(self.open_image, next_member)))
+                yield member, image
+
+    def close(self) -> None:
+        """Close the archive and the nested archives."""
+        with self._lock:
+            for archive in self._archives:
+                archive.close()
+            self._archives = []
+
+    def __enter__(self) -> "ZipImageSource":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._members)
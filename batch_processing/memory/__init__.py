@@ -6,5 +6,7 @@ to ensure efficient resource usage during batch operations.
 """
 
 from .memory_manager import MemoryManager
+from .reference_cache import ReferenceContextCache
+from .latent_cache import ReferenceLatentCache
 
-__all__ = ['MemoryManager']
+__all__ = ['MemoryManager', 'ReferenceContextCache', 'ReferenceLatentCache']
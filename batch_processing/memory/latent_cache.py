@@ -0,0 +1,195 @@
+"""
+Two-tier store for reference VAE latents.
+
+This module provides the ReferenceLatentCache class which keeps the VAE
+latent distributions of reference patches between pages and between runs.
+A reference patch at a given size always encodes to the same distribution,
+so pages (and later batches) that retrieve the same patch skip its VAE
+encode. Entries live in an in-memory LRU tier and, optionally, in an
+on-disk tier of .npy files that are memory-mapped on lookup.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceLatentCache:
+    """
+    Content-addressed cache of reference latent distributions.
+
+    Keys are opaque strings built by the pipeline from the patch content,
+    its target size and the VAE (see
+    CobraPixArtAlphaPipeline.reference_latent_key); values are the
+    ``latent_dist.parameters`` tensors of single patches. Lookups check the
+    memory tier first, then the disk tier, promoting disk hits into memory.
+    Writes to disk are atomic, so several processes can share a cache
+    directory.
+
+    Attributes:
+        max_entries: Maximum number of latents kept in memory
+        cache_dir: Directory of the on-disk tier, or None for memory only
+        memory_hits: Number of lookups served from memory
+        disk_hits: Number of lookups served from disk
+        misses: Number of failed lookups
+        evictions: Number of entries dropped from the memory tier
+    """
+
+    def __init__(self, max_entries: int = 256, cache_dir: Optional[str] = None):
+        """
+        Initialize the ReferenceLatentCache.
+
+        Args:
+            max_entries: Maximum number of latents in memory. 0 keeps none
+                in memory; the disk tier is still used if configured.
+            cache_dir: Optional directory of the persistent tier, created
+                if missing
+
+        Raises:
+            ValueError: If max_entries is negative
+        """
+        if max_entries < 0:
+            raise ValueError(f"max_entries must be non-negative, got {max_entries}")
+
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        # two-level fan-out keeps directories small for long-lived caches
+        return self.cache_dir / key[:2] / f"{key}.npy"
+
+    def get(self, key: str) -> Optional[torch.Tensor]:
+        """
+        Look up a latent, checking memory before disk.
+
+        Args:
+            key: Latent key
+
+        Returns:
+            The cached parameters tensor (memory-mapped CPU tensor for disk
+            hits), or None if not present
+        """
+        with self._lock:
+            latent = self._entries.get(key)
+            if latent is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return latent
+
+        if self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                # copy-on-write mapping: pages are read lazily and the array stays writable for torch
+                latent = torch.from_numpy(np.load(path, mmap_mode='c'))
+            except FileNotFoundError:
+                latent = None
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable cached latent {path}: {e}")
+                latent = None
+            if latent is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._insert(key, latent)
+                return latent
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, latent: torch.Tensor) -> None:
+        """
+        Store a latent in memory and, if configured, on disk.
+
+        Args:
+            key: Latent key
+            latent: ``latent_dist.parameters`` of one patch
+        """
+        # own copy, so a slice of an encoded batch does not keep the whole batch alive
+        latent = latent.detach().clone()
+        with self._lock:
+            self._insert(key, latent)
+
+        if self.cache_dir is not None:
+            path = self._path(key)
+            if path.exists():
+                return
+            # numpy has no bfloat16; the pipeline casts back to the VAE dtype
+            array = latent.cpu().float().numpy() if latent.dtype == torch.bfloat16 else latent.cpu().numpy()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, array)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Failed to write cached latent {path}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _insert(self, key: str, latent: torch.Tensor) -> None:
+        """Insert into the memory tier and evict; the caller holds the lock."""
+        if self.max_entries == 0:
+            return
+        self._entries[key] = latent
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self, disk: bool = False) -> None:
+        """
+        Drop the memory tier and reset statistics.
+
+        Args:
+            disk: Also delete the on-disk tier
+        """
+        with self._lock:
+            self._entries.clear()
+            self.memory_hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+            self.evictions = 0
+        if disk and self.cache_dir is not None:
+            for path in self.cache_dir.glob("*/*.npy"):
+                path.unlink(missing_ok=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with memory entry count, hits per tier, misses and
+            evictions
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (self.cache_dir is not None and self._path(key).exists())
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,149 @@
+"""
+LRU store for reusable reference contexts.
+
+This module provides the ReferenceContextCache class which keeps the
+reference-side K/V caches produced by the colorization pipeline resident
+between pages, so pages that share the same retrieved references,
+resolution and style skip the reference encode entirely.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceContextCache:
+    """
+    Least-recently-used store for pipeline reference contexts.
+
+    Entries are opaque to the cache; their size is read from an optional
+    ``nbytes`` attribute so a byte budget can be enforced alongside the
+    entry count.
+
+    Attributes:
+        max_entries: Maximum number of contexts kept resident
+        max_bytes: Optional upper bound on the summed ``nbytes`` of entries
+        hits: Number of successful lookups
+        misses: Number of failed lookups
+        evictions: Number of entries dropped to respect the limits
+    """
+
+    def __init__(self, max_entries: int = 4, max_bytes: Optional[int] = None):
+        """
+        Initialize the ReferenceContextCache.
+
+        Args:
+            max_entries: Maximum number of contexts to keep. 0 disables caching.
+            max_bytes: Optional byte budget across all entries
+
+        Raises:
+            ValueError: If a limit is negative
+        """
+        if max_entries < 0:
+            raise ValueError(f"max_entries must be non-negative, got {max_entries}")
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError(f"max_bytes must be non-negative, got {max_bytes}")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sizeof(context: Any) -> int:
+        return int(getattr(context, "nbytes", 0) or 0)
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a context and mark it as most recently used.
+
+        Args:
+            key: Context key
+
+        Returns:
+            The cached context, or None if not present
+        """
+        with self._lock:
+            context = self._entries.get(key)
+            if context is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return context
+
+    def put(self, key: str, context: Any) -> None:
+        """
+        Insert or replace a context, evicting least recently used entries.
+
+        Contexts larger than ``max_bytes`` on their own are not stored.
+
+        Args:
+            key: Context key
+            context: Context object to keep
+        """
+        if self.max_entries == 0:
+            return
+
+        size = self._sizeof(context)
+        if self.max_bytes is not None and size > self.max_bytes:
+            logger.debug(f"Reference context {key[:12]} ({size} bytes) exceeds cache budget, not stored")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._sizeof(self._entries.pop(key))
+            self._entries[key] = context
+            self._total_bytes += size
+
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._total_bytes > self.max_bytes
+            ):
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizeof(evicted)
+                self.evictions += 1
+                logger.debug(f"Evicted reference context {evicted_key[:12]}")
+
+    def clear(self) -> None:
+        """Drop all cached contexts and reset statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    @property
+    def total_bytes(self) -> int:
+        """Summed ``nbytes`` of all cached contexts."""
+        return self._total_bytes
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with entry count, byte usage, hits, misses and evictions
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
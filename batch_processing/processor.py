@@ -5,21 +5,35 @@ This module provides the BatchProcessor class which orchestrates the
 batch colorization of multiple comic line art images.
 """
 
+import io
 import logging
+import os
+import threading
 import time
-from pathlib import Path
-from typing import List, Optional, Dict, Any
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional
 import uuid
 
 import torch
 from PIL import Image
 
+from cobra_utils.stage_timer import StageTimer
+
 from .config import BatchConfig
 from .core.queue import ImageQueue, ImageQueueItem
 from .core.status import StatusTracker, ProcessingState
+from .core.worker_pool import WorkerPool, default_threads_per_worker, resolve_worker_devices
+from .core.staged_pipeline import PipelineStage, StagedPipeline
+from .core.journal import JOURNAL_FILENAME, JobJournal, hash_config, hash_file
+from .core.planner import BatchPlanner
 from .memory.memory_manager import MemoryManager
+from .memory.reference_cache import ReferenceContextCache
+from .memory.latent_cache import ReferenceLatentCache
 from .io.file_handler import validate_image_file, create_output_path, handle_filename_collision
-from .exceptions import BatchProcessingError, ImageProcessingError, ValidationError
+from .io.zip_source import MEMBER_SEPARATOR, ZipImageSource
+from .io.zip_writer import StreamingZipWriter
+from .io.thumbnails import ThumbnailCache
+from .exceptions import BatchProcessingError, ImageProcessingError, ValidationError, ZIPExtractionError
 from .logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -37,9 +51,21 @@ class BatchProcessor:
         queue: ImageQueue for managing images to process
         status_tracker: StatusTracker for monitoring processing status
         memory_manager: MemoryManager for efficient memory usage
+        reference_cache: ReferenceContextCache reusing reference K/V caches
+            across pages with identical references, resolution and style
+        latent_cache: ReferenceLatentCache reusing reference VAE latents
+            across pages and, with config.latent_cache_dir, across runs
+        journal: JobJournal recording the state of every image, or None
+            when neither config.journal_path nor config.resume is set
+        resumed_count: Number of images skipped as already completed
+        zip_writer: StreamingZipWriter receiving the outputs when
+            config.output_as_zip is set, created on first use
+        thumbnails: ThumbnailCache receiving a preview of every saved
+            output, or None when config.thumbnail_size is 0
+        engine: cobra_engine.Engine running the colorization stages
     """
     
-    def __init__(self, config: BatchConfig):
+    def __init__(self, config: BatchConfig, engine=None, engine_factory: Optional[Callable[[torch.device], Any]] = None):
         """
         Initialize the BatchProcessor.
         
@@ -48,6 +74,12 @@ class BatchProcessor:
         
         Args:
             config: BatchConfig with all processing parameters
+            engine: cobra_engine.Engine to run the models with. Defaults to
+                the process-wide engine shared with the Gradio app, resolved
+                (and loaded) on the first processed image.
+            engine_factory: Creates the engine of an additional worker for a
+                given device when max_concurrent > 1. Defaults to a new
+                cobra_engine.Engine on that device.
             
         Raises:
             ValidationError: If configuration is invalid
@@ -68,7 +100,9 @@ class BatchProcessor:
         
         # Initialize memory manager
         # Determine device
-        if torch.cuda.is_available():
+        if engine is not None:
+            device = engine.device
+        elif torch.cuda.is_available():
             device = torch.device("cuda")
         elif torch.backends.mps.is_available():
             device = torch.device("mps")
@@ -78,6 +112,61 @@ class BatchProcessor:
         self.memory_manager = MemoryManager(device=device, memory_threshold=0.8)
         logger.info(f"MemoryManager initialized for device: {device}")
         
+        # Reference K/V contexts shared by pages with the same references
+        self.reference_cache = ReferenceContextCache(max_entries=config.reference_cache_size)
+        logger.debug(f"ReferenceContextCache initialized (max_entries={config.reference_cache_size})")
+        
+        # Reference VAE latents, keyed by patch content so they survive changes in the retrieved set
+        self.latent_cache = ReferenceLatentCache(
+            max_entries=config.latent_cache_size,
+            cache_dir=config.latent_cache_dir
+        )
+        
+        # Write-ahead journal of image states, so a crashed batch can be resumed
+        journal_path = config.journal_path
+        if journal_path is None and config.resume:
+            journal_path = str(Path(config.output_dir) / JOURNAL_FILENAME)
+        self.journal = JobJournal(journal_path) if journal_path else None
+        self.resumed_count = 0
+        self._config_hash: Optional[str] = None
+        # Journal key and input hash of every queued image, by image id
+        self._journal_items: Dict[str, tuple] = {}
+        
+        # Output archive of config.output_as_zip, appended to as pages finish
+        self._zip_writer: Optional[StreamingZipWriter] = None
+        self._zip_writer_lock = threading.Lock()
+        
+        # Preview of every output for the result galleries, written alongside it
+        self.thumbnails = (
+            ThumbnailCache(cache_dir=config.thumbnail_dir, size=config.thumbnail_size)
+            if config.thumbnail_size > 0 else None
+        )
+        
+        # Background feed of images added while the batch runs (see feed_images)
+        self._feeder: Optional[threading.Thread] = None
+        self._feeding = False
+        
+        # Streaming ZIP inputs (see add_zip) and the archive member of each image read from one
+        self._zip_sources: List[ZipImageSource] = []
+        self._zip_members: Dict[str, tuple] = {}
+        
+        # Resolution bucket of each image added before processing starts (see _plan_queue)
+        self._plan_buckets: Dict[str, Optional[tuple]] = {}
+        
+        # Reference CLIP index per engine, built on its first page and shared by the whole batch
+        self._reference_indexes: Dict[int, Any] = {}
+        self._reference_index_lock = threading.Lock()
+        
+        # Inference engine, resolved lazily so constructing a processor loads no models
+        self._engine = engine
+        self._engine_factory = engine_factory
+        
+        # One engine per worker, created on the first concurrent run
+        self._worker_engines: Optional[List[Any]] = None
+        
+        # Staged pipeline of the current (or last) overlapped run, for its statistics
+        self._pipeline: Optional[StagedPipeline] = None
+        
         # Control flags for pause/resume/cancel
         self._paused = False
         self._cancelled = False
@@ -90,13 +179,141 @@ class BatchProcessor:
         
         logger.info("BatchProcessor initialization complete")
 
+    @property
+    def engine(self):
+        """
+        Inference engine used for colorization.
+        
+        Returns:
+            The engine passed at construction, or the shared default engine
+        """
+        if self._engine is None:
+            from cobra_engine import get_default_engine
+            self._engine = get_default_engine()
+        return self._engine
+
+    def _create_engine(self, device: torch.device):
+        """Create the engine of an additional worker on `device`."""
+        if self._engine_factory is not None:
+            return self._engine_factory(device)
+        from cobra_engine import Engine
+        return Engine(device=device, style=self.config.style)
+
+    def get_worker_engines(self) -> List[Any]:
+        """
+        Get one engine per worker, creating them on first use.
+        
+        Workers are assigned devices round-robin (see resolve_worker_devices).
+        The first worker reuses the processor's engine when it runs on the
+        same device. When several workers share the CPU, torch intra-op
+        threads are limited so the workers together use the host's cores.
+        
+        Returns:
+            List of max_concurrent engines
+        """
+        if self._worker_engines is None:
+            devices = resolve_worker_devices(self.config.max_concurrent, self.config.devices)
+            
+            cpu_workers = sum(1 for device in devices if device.type == "cpu")
+            if cpu_workers > 1 or self.config.threads_per_worker is not None:
+                num_threads = self.config.threads_per_worker or default_threads_per_worker(cpu_workers)
+                torch.set_num_threads(num_threads)
+                logger.info(f"Limiting torch to {num_threads} threads per worker for {cpu_workers} CPU workers")
+            
+            engines = []
+            for device in devices:
+                if not engines and self.engine.device == device:
+                    engines.append(self.engine)
+                else:
+                    engines.append(self._create_engine(device))
+            self._worker_engines = engines
+            logger.info(f"Created {len(engines)} workers on devices: {[str(device) for device in devices]}")
+        
+        return self._worker_engines
+
+    @property
+    def config_hash(self) -> str:
+        """Hash of the settings and references that determine the outputs (see hash_config)."""
+        if self._config_hash is None:
+            self._config_hash = hash_config(self.config)
+        return self._config_hash
+
+    @property
+    def zip_writer(self) -> Optional[StreamingZipWriter]:
+        """
+        Output archive of the batch, when config.output_as_zip is set.
+        
+        Created on first use at output_dir/zip_output_name. A resumed
+        batch continues an existing archive; otherwise an existing archive
+        is replaced with config.overwrite, or the new one is numbered.
+        
+        Returns:
+            The StreamingZipWriter, or None for loose file output
+        """
+        if not self.config.output_as_zip:
+            return None
+        with self._zip_writer_lock:
+            if self._zip_writer is None:
+                zip_path = str(Path(self.config.output_dir) / self.config.zip_output_name)
+                if not self.config.resume:
+                    zip_path = handle_filename_collision(path=zip_path, overwrite=self.config.overwrite)
+                self._zip_writer = StreamingZipWriter(zip_path, append=self.config.resume)
+                self._zip_writer.write_metadata({
+                    "style": self.config.style,
+                    "seed": self.config.seed,
+                    "steps": self.config.num_inference_steps,
+                    "top_k": self.config.top_k,
+                })
+            return self._zip_writer
+
+    def _close_zip_writer(self) -> None:
+        """Complete the output archive on disk at the end of a run; a later run reopens it."""
+        if self._zip_writer is None:
+            return
+        try:
+            self._zip_writer.close()
+        except ZIPExtractionError as e:
+            logger.error(f"Failed to finish output ZIP: {e}")
+    
+    def _output_exists(self, output_path: str) -> bool:
+        """Check whether a recorded output (a file, or a member of the output ZIP) exists."""
+        zip_writer = self.zip_writer
+        if zip_writer is not None:
+            archive, separator, name = output_path.partition(MEMBER_SEPARATOR)
+            if separator and archive == str(zip_writer.zip_path):
+                return name in zip_writer
+        return os.path.exists(output_path)
+
+    def _journal_record(self, queue_item: ImageQueueItem, state: str, error: Optional[str] = None) -> None:
+        """Append a state change of an image to the journal, if one is kept."""
+        journal_item = self._journal_items.get(queue_item.id)
+        if self.journal is None or journal_item is None:
+            return
+        key, input_hash = journal_item
+        try:
+            self.journal.record(key, state, input_hash, self.config_hash, queue_item.output_path, error)
+        except Exception as e:
+            logger.error(f"Failed to write job journal: {e}")
+            # Continue anyway - the image is only redone on resume
+
+    def _get_reference_index(self, engine):
+        """Get the reference index bound to `engine`, building it on first use."""
+        with self._reference_index_lock:
+            reference_index = self._reference_indexes.get(id(engine))
+            if reference_index is None:
+                reference_index = engine.build_reference_index(self.config.reference_images)
+                self._reference_indexes[id(engine)] = reference_index
+                logger.info(f"Built reference index from {len(reference_index)} reference images on {engine.device}")
+            return reference_index
+
     def add_images(self, image_paths: List[str]) -> None:
         """
         Add images to the processing queue.
         
         Validates each image, creates ImageQueueItem for valid images,
         and enqueues them for processing. Invalid images are skipped
-        with logging.
+        with logging. With config.resume, images the journal records as
+        completed with the same input and settings are skipped as well.
         
         Args:
             image_paths: List of paths to image files to process
@@ -111,59 +328,248 @@ class BatchProcessor:
         
         logger.info(f"Adding {len(image_paths)} images to processing queue")
         
+        counts = {"added": 0, "invalid": 0, "resumed": 0}
+        for image_path in image_paths:
+            counts[self._add_image_path(image_path)] += 1
+        
+        self._log_added(counts["added"], counts["invalid"], counts["resumed"])
+
+    def _add_image_path(self, image_path: str) -> str:
+        """
+        Validate and queue one image file.
+        
+        Returns:
+            "added", "invalid" or "resumed" (skipped as completed)
+        """
+        # Validate image file
+        if not validate_image_file(image_path):
+            logger.warning(f"Skipping invalid image: {image_path}")
+            return "invalid"
+        
+        try:
+            # Create output path
+            output_path = create_output_path(
+                input_path=image_path,
+                output_dir=self.config.output_dir,
+                suffix="_colorized"
+            )
+            
+            if self._enqueue_image(
+                image_path, output_path, lambda: hash_file(image_path), lambda: open(image_path, 'rb')
+            ) is None:
+                return "resumed"
+            return "added"
+            
+        except Exception as e:
+            logger.error(f"Failed to add image {image_path}: {str(e)}")
+            return "invalid"
+
+    def feed_images(self, image_paths: Iterable[str]) -> threading.Thread:
+        """
+        Add images from an iterable on a background thread.
+        
+        Meant for incremental sources such as DirectoryScanner.iter_images:
+        processing may be started right away, and the staged pipeline, the
+        sequential loop and the worker pool block on the queue for more
+        images instead of finishing while the feed is running.
+        
+        Args:
+            image_paths: Paths of image files, consumed on the feeder thread
+            
+        Returns:
+            The started feeder thread
+        """
+        def feed() -> None:
+            counts = {"added": 0, "invalid": 0, "resumed": 0}
+            try:
+                for image_path in image_paths:
+                    counts[self._add_image_path(image_path)] += 1
+            except Exception as e:
+                logger.error(f"Image feed failed: {e}", exc_info=True)
+            finally:
+                self._feeding = False
+            self.resumed_count += counts["resumed"]
+            logger.info(
+                f"Image feed complete: added {counts['added']} images, "
+                f"skipped {counts['invalid']} invalid and {counts['resumed']} already completed"
+            )
+        
+        self._feeding = True
+        self._feeder = threading.Thread(target=feed, name="image-feeder", daemon=True)
+        self._feeder.start()
+        return self._feeder
+
+    def _next_item(self) -> Optional[ImageQueueItem]:
+        """Dequeue the next image, waiting while a feed may still add images."""
+        while True:
+            item = self.queue.dequeue()
+            if item is not None or not self._feeding or self._paused or self._cancelled:
+                return item
+            # short timeout so pause, cancel and the end of the feed are noticed
+            item = self.queue.get(timeout=0.1)
+            if item is not None:
+                return item
+
+    def _resolution_bucket(self, open_input: Callable[[], BinaryIO]) -> Optional[tuple]:
+        """Get the ratio_list entry a page will be resized to, reading only its header."""
+        try:
+            from cobra_engine import get_rate
+            with open_input() as f, Image.open(f) as image:
+                return tuple(get_rate(image))
+        except Exception as e:
+            logger.debug(f"Cannot read image size: {e}")
+            return None
+
+    def _plan_queue(self) -> None:
+        """
+        Reorder the queued images with a BatchPlanner, if config.plan_order is set.
+        
+        The resolution buckets were read when the images were added.
+        Output paths were fixed then too, so only the processing order
+        changes; with a feed running, images added later are processed
+        after the planned ones.
+        """
+        if not self.config.plan_order or self.queue.size() < 2:
+            return
+        planner = BatchPlanner(bucket_of=lambda item: self._plan_buckets.get(item.id))
+        planned = planner.plan(self.queue.snapshot())
+        self.queue.reorder([item.id for item in planned])
+
+    def _progress_total(self, total_images: int) -> int:
+        """Batch size shown in progress logs; with a feed it grows as images are added."""
+        return len(self.status_tracker) if self._feeder is not None else total_images
+
+    def add_zip(self, zip_path: str, max_nested_level: int = 1) -> None:
+        """
+        Add the images of a ZIP archive to the processing queue.
+        
+        The archive is not extracted: its images are listed from the
+        central directory and each page is read from the archive into
+        memory by the load stage when it is processed, so the first page
+        starts without waiting for the whole archive. Nested archives are
+        opened in memory. Outputs are named after the members' file names.
+        
+        Args:
+            zip_path: Path of the ZIP archive
+            max_nested_level: Maximum nesting level of archives to open
+            
+        Raises:
+            ZIPExtractionError: If the archive cannot be opened
+            ValidationError: If the archive contains no images
+        """
+        source = ZipImageSource(zip_path, max_nested_level=max_nested_level)
+        members = source.members()
+        if not members:
+            source.close()
+            error_msg = f"No images found in ZIP file: {zip_path}"
+            logger.error(error_msg)
+            raise ValidationError(error_msg)
+        
+        logger.info(f"Adding {len(members)} images from {Path(zip_path).name} to processing queue")
+        self._zip_sources.append(source)
+        
         valid_count = 0
         invalid_count = 0
+        resumed_count = 0
+        output_dir = Path(self.config.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
         
-        for image_path in image_paths:
-            # Validate image file
-            if not validate_image_file(image_path):
-                logger.warning(f"Skipping invalid image: {image_path}")
-                invalid_count += 1
-                continue
-            
+        for member in members:
             try:
-                # Generate unique ID for this image
-                image_id = str(uuid.uuid4())
-                
-                # Create output path
-                output_path = create_output_path(
-                    input_path=image_path,
-                    output_dir=self.config.output_dir,
-                    suffix="_colorized"
+                name = PurePosixPath(member.name)
+                output_path = str((output_dir / f"{name.stem}_colorized{name.suffix}").absolute())
+                image_id = self._enqueue_image(
+                    member.path, output_path, lambda: member.input_hash, lambda: source.open_stream(member)
                 )
-                
-                # Handle filename collision
-                output_path = handle_filename_collision(
-                    path=output_path,
-                    overwrite=self.config.overwrite
-                )
-                
-                # Create queue item
-                queue_item = ImageQueueItem(
-                    id=image_id,
-                    input_path=image_path,
-                    output_path=output_path,
-                    config=None,  # Per-image config can be added later
-                    priority=0,
-                    image_type="line_art",  # Default type
-                    classification_confidence=None
-                )
-                
-                # Enqueue the item
-                self.queue.enqueue(queue_item)
-                
-                # Add to status tracker
-                self.status_tracker.add_image(image_id)
-                
-                valid_count += 1
-                logger.debug(f"Added to queue: {Path(image_path).name} -> {Path(output_path).name}")
-                
+                if image_id is None:
+                    resumed_count += 1
+                else:
+                    self._zip_members[image_id] = (source, member)
+                    valid_count += 1
             except Exception as e:
-                logger.error(f"Failed to add image {image_path}: {str(e)}")
+                logger.error(f"Failed to add image {member.path}: {str(e)}")
                 invalid_count += 1
         
+        self._log_added(valid_count, invalid_count, resumed_count)
+
+    def _enqueue_image(
+        self,
+        input_path: str,
+        output_path: str,
+        input_hash: Callable[[], str],
+        open_input: Callable[[], BinaryIO]
+    ) -> Optional[str]:
+        """
+        Queue one image, unless the journal records it as completed.
+        
+        Args:
+            input_path: Path (or ZIP member path) of the input image
+            output_path: Output path derived from the input name
+            input_hash: Computes the content hash of the input; only called
+                when a journal is kept
+            open_input: Opens the input file for reading; only its header
+                is read, to plan the processing order before processing
+                starts
+            
+        Returns:
+            The queued image's ID, or None if it was skipped on resume
+        """
+        journal_key = output_path
+        content_hash = None
+        entry = None
+        if self.journal is not None:
+            content_hash = input_hash()
+            if self.config.resume and self.journal.is_completed(
+                journal_key, content_hash, self.config_hash, self._output_exists
+            ):
+                logger.debug(f"Skipping completed image: {Path(input_path).name}")
+                return None
+            entry = self.journal.get_entry(journal_key)
+        
+        if entry is not None and (self.config.resume or self.config.overwrite):
+            # Output of an earlier run of this job: redo it in place rather than next to it
+            output_path = entry.output_path
+        else:
+            # Handle filename collision
+            output_path = handle_filename_collision(
+                path=output_path,
+                overwrite=self.config.overwrite
+            )
+        
+        # Generate unique ID for this image
+        image_id = str(uuid.uuid4())
+        
+        # Create queue item
+        queue_item = ImageQueueItem(
+            id=image_id,
+            input_path=input_path,
+            output_path=output_path,
+            config=None,  # Per-image config can be added later
+            priority=0,
+            image_type="line_art",  # Default type
+            classification_confidence=None
+        )
+        
+        if self.config.plan_order and not self._processing:
+            self._plan_buckets[image_id] = self._resolution_bucket(open_input)
+        
+        # Track before enqueueing: with a feed running, a worker may dequeue the item at once
+        self.status_tracker.add_image(image_id, input_path=input_path)
+        if self.journal is not None:
+            self._journal_items[image_id] = (journal_key, content_hash)
+        
+        # Enqueue the item
+        self.queue.enqueue(queue_item)
+        
+        logger.debug(f"Added to queue: {Path(input_path).name} -> {Path(output_path).name}")
+        return image_id
+
+    def _log_added(self, valid_count: int, invalid_count: int, resumed_count: int) -> None:
+        """Log the outcome of adding images, raising if nothing could be added."""
+        self.resumed_count += resumed_count
+        
         # Check if any valid images were added
-        if valid_count == 0:
+        if valid_count == 0 and resumed_count == 0:
             error_msg = f"No valid images added. {invalid_count} images were invalid."
             logger.error(error_msg)
             raise ValidationError(error_msg)
@@ -172,71 +578,127 @@ class BatchProcessor:
             f"Successfully added {valid_count} images to queue. "
             f"Skipped {invalid_count} invalid images."
         )
+        if resumed_count:
+            logger.info(f"Resumed: skipped {resumed_count} images already completed")
 
-    def process_single_image(self, queue_item: ImageQueueItem) -> None:
+    def _record_failure(self, queue_item: ImageQueueItem, stage: str, error: Exception) -> ImageProcessingError:
         """
-        Process a single image through the colorization pipeline.
+        Mark an image as failed after an error in one of its stages.
         
-        This method:
-        1. Loads the input image
-        2. Extracts line art from the image
-        3. Loads reference images
-        4. Calls the colorization pipeline
-        5. Saves the output with metadata
-        6. Updates status tracker
-        7. Clears memory after processing
+        Args:
+            queue_item: Item that failed
+            stage: Stage the error occurred in
+            error: The error raised by the stage
+            
+        Returns:
+            The ImageProcessingError to raise for the failure
+        """
+        input_path = queue_item.input_path
+        
+        if isinstance(error, ImageProcessingError):
+            # Already properly formatted, just update status
+            logger.error(f"Processing failed at stage '{stage}': {input_path}")
+            failure = error
+            error_message = f"Failed at {stage}"
+        else:
+            # Unexpected error - wrap with context
+            error_message = f"Unexpected error at stage '{stage}': {str(error)}"
+            logger.error(f"Processing failed: {error_message}", exc_info=error)
+            failure = ImageProcessingError(input_path, error_message)
+            failure.__cause__ = error
+        
+        try:
+            self.status_tracker.update_status(
+                image_id=queue_item.id,
+                state=ProcessingState.FAILED.value,
+                error_message=error_message
+            )
+        except Exception as status_error:
+            logger.error(f"Failed to update status: {status_error}")
+        
+        self._journal_record(queue_item, JobJournal.FAILED, str(failure))
+        return failure
+
+    def _stage_timer(self, queue_item: ImageQueueItem, device=None):
+        """
+        Create a StageTimer recording into the image's status.
+        
+        Stages on a CUDA device are reported when the timer is flushed,
+        together with the page's peak memory unless other workers share
+        the device (resetting its peak statistics is device-global).
         
         Args:
-            queue_item: ImageQueueItem containing image paths and config
+            queue_item: Item whose stages are timed
+            device: Device the stages run on; None for the CPU-only stages,
+                which are timed on the host and never touch the accelerator
+        """
+        def on_stage(stage: str, duration: float, peak_memory: Optional[int]) -> None:
+            try:
+                self.status_tracker.record_stage(queue_item.id, stage, duration, peak_memory)
+            except Exception as e:
+                logger.warning(f"Failed to record stage '{stage}': {e}")
+        
+        measure_peak = device is not None and not self._device_is_shared(device)
+        return StageTimer(on_stage, device, measure_peak=measure_peak)
+
+    def _device_is_shared(self, device) -> bool:
+        """Whether several workers run on a device."""
+        engines = self._worker_engines or []
+        return sum(1 for engine in engines if engine.device == torch.device(device)) > 1
+
+    def _open_input(self, queue_item: ImageQueueItem):
+        """Get the input of an image for Image.open: its path, or its bytes read from a ZIP archive."""
+        zip_member = self._zip_members.get(queue_item.id)
+        if zip_member is None:
+            return queue_item.input_path
+        source, member = zip_member
+        return io.BytesIO(source.read(member))
+
+    def _load_page(self, queue_item: ImageQueueItem):
+        """
+        Load and preprocess the input page of an image.
+        
+        This stage only uses the CPU, so the staged pipeline runs it ahead
+        of the model stage on prefetch threads.
+        
+        Args:
+            queue_item: Item whose input page to load
+            
+        Returns:
+            cobra_engine.PreprocessedPage of the input page
             
         Raises:
-            ImageProcessingError: If processing fails
+            ImageProcessingError: If the page cannot be loaded
         """
-        image_id = queue_item.id
         input_path = queue_item.input_path
-        output_path = queue_item.output_path
-        
-        logger.info(f"Processing image: {Path(input_path).name}")
         
         # Save progress before critical operation
         try:
             self.status_tracker.update_status(
-                image_id=image_id,
+                image_id=queue_item.id,
                 state=ProcessingState.PROCESSING.value
             )
         except Exception as e:
             logger.error(f"Failed to update status to processing: {e}")
             # Continue anyway - status update failure shouldn't stop processing
         
-        # Track which stage failed for better error reporting
-        current_stage = "initialization"
+        self._journal_record(queue_item, JobJournal.STARTED)
+        
+        current_stage = "loading input image"
+        logger.debug(f"Stage: {current_stage} - {input_path}")
         
         try:
-            # Import colorization functions from app.py
-            # Note: This is a simplified integration - in production, these would be
-            # refactored into a separate module
-            current_stage = "importing modules"
-            logger.debug(f"Stage: {current_stage}")
-            
             try:
-                from app import (
-                    extract_sketch_line_image,
-                    colorize_image,
-                    process_multi_images,
-                    device
-                )
+                from cobra_engine import preprocess_page
             except ImportError as e:
                 raise ImageProcessingError(
                     input_path,
                     f"Failed to import colorization modules: {e}"
                 ) from e
             
-            # Load input image
-            current_stage = "loading input image"
-            logger.debug(f"Stage: {current_stage} - {input_path}")
-            
             try:
-                input_image = Image.open(input_path)
+                with self._stage_timer(queue_item).stage("decode"):
+                    return preprocess_page(Image.open(self._open_input(queue_item)))
             except FileNotFoundError:
                 raise ImageProcessingError(
                     input_path,
@@ -252,6 +714,44 @@ class BatchProcessor:
                     input_path,
                     f"Failed to load image: {e}"
                 ) from e
+        
+        except Exception as e:
+            raise self._record_failure(queue_item, current_stage, e)
+
+    def _colorize_page(self, queue_item: ImageQueueItem, page, engine=None) -> Image.Image:
+        """
+        Run the models on a loaded page.
+        
+        Args:
+            queue_item: Item being processed
+            page: PreprocessedPage returned by _load_page
+            engine: Engine to run the models with. Defaults to the
+                processor's engine.
+            
+        Returns:
+            The colorized image
+            
+        Raises:
+            ImageProcessingError: If any model stage fails
+        """
+        input_path = queue_item.input_path
+        current_stage = "initializing engine"
+        stage_timer = None
+        
+        try:
+            logger.debug(f"Stage: {current_stage}")
+            
+            try:
+                if engine is None:
+                    engine = self.engine
+            except ImportError as e:
+                raise ImageProcessingError(
+                    input_path,
+                    f"Failed to import colorization modules: {e}"
+                ) from e
+            
+            # Wall time and peak memory of the model stages go into the image's status
+            stage_timer = self._stage_timer(queue_item, engine.device)
             
             # Extract line art from input image
             current_stage = "extracting line art"
@@ -265,7 +765,7 @@ class BatchProcessor:
                     query_image_origin,
                     extracted_image_ori,
                     resolution
-                ) = extract_sketch_line_image(input_image, self.config.style)
+                ) = engine.extract(page, self.config.style, stage_timer=stage_timer)
             except Exception as e:
                 raise ImageProcessingError(
                     input_path,
@@ -277,12 +777,8 @@ class BatchProcessor:
             logger.debug(f"Stage: {current_stage} - {len(self.config.reference_images)} references")
             
             try:
-                # Create file-like objects for reference images
-                class FileWrapper:
-                    def __init__(self, path):
-                        self.name = path
-                
-                reference_files = [FileWrapper(ref) for ref in self.config.reference_images]
+                # Reference patches are cropped and CLIP-encoded once per batch (per engine)
+                reference_index = self._get_reference_index(engine)
             except Exception as e:
                 raise ImageProcessingError(
                     input_path,
@@ -294,9 +790,9 @@ class BatchProcessor:
             logger.debug(f"Stage: {current_stage}")
             
             try:
-                output_gallery = colorize_image(
+                result = engine.run(
                     extracted_line=extracted_line,
-                    reference_images=reference_files,
+                    reference_index=reference_index,
                     resolution=resolution,
                     seed=self.config.seed,
                     num_inference_steps=self.config.num_inference_steps,
@@ -304,7 +800,12 @@ class BatchProcessor:
                     hint_mask=hint_mask,
                     hint_color=hint_color,
                     query_image_origin=query_image_origin,
-                    extracted_image_ori=extracted_image_ori
+                    extracted_image_ori=extracted_image_ori,
+                    reference_cache=self.reference_cache,
+                    reference_latent_cache=self.latent_cache,
+                    stage_timer=stage_timer,
+                    refine_scale=self.config.refine_scale,
+                    refine_tile_size=self.config.refine_tile_size
                 )
             except RuntimeError as e:
                 # Check if it's an OOM error
@@ -337,29 +838,87 @@ class BatchProcessor:
             logger.debug(f"Stage: {current_stage}")
             
             try:
-                if not output_gallery or len(output_gallery) == 0:
+                colorized_image = result.image
+                if colorized_image is None:
                     raise ImageProcessingError(
                         input_path,
                         "Colorization produced no output"
                     )
-                colorized_image = output_gallery[0]
-            except (IndexError, TypeError) as e:
+            except (AttributeError, TypeError) as e:
                 raise ImageProcessingError(
                     input_path,
                     f"Failed to extract colorized result: {e}"
                 ) from e
             
-            # Save output image
-            current_stage = "saving output"
+            return colorized_image
+        
+        except Exception as e:
+            raise self._record_failure(queue_item, current_stage, e)
+        
+        finally:
+            # Report the model stages, waiting once for the device
+            if stage_timer is not None:
+                try:
+                    stage_timer.flush()
+                except Exception as e:
+                    logger.warning(f"Failed to record stage timings: {e}")
+            
+            # Always clear memory after the models ran (success or failure)
+            logger.debug("Clearing memory after image processing")
+            try:
+                self.memory_manager.clear_cache()
+            except Exception as e:
+                logger.warning(f"Failed to clear memory cache: {e}")
+
+    def _save_page(self, queue_item: ImageQueueItem, colorized_image: Image.Image) -> None:
+        """
+        Save a colorized page, verify it and mark the image completed.
+        
+        The page is written to a temporary file next to the output and
+        renamed into place, so a crash never leaves a truncated output
+        behind that a resumed batch would take for a finished one. With
+        config.output_as_zip the page is encoded in memory and appended to
+        the output archive (see zip_writer) instead, and no loose file is
+        written.
+        
+        Args:
+            queue_item: Item being processed
+            colorized_image: Image returned by _colorize_page
+            
+        Raises:
+            ImageProcessingError: If the output cannot be saved
+        """
+        input_path = queue_item.input_path
+        output_path = queue_item.output_path
+        
+        # Save output image
+        current_stage = "saving output"
+        
+        try:
             logger.debug(f"Stage: {current_stage} - {output_path}")
             
             try:
-                # Ensure output directory exists
-                output_dir = Path(output_path).parent
-                output_dir.mkdir(parents=True, exist_ok=True)
-                
-                # Save the image
-                colorized_image.save(output_path)
+                zip_writer = self.zip_writer
+                if zip_writer is not None:
+                    with self._stage_timer(queue_item).stage("save"):
+                        member = zip_writer.add_image(Path(output_path).name, colorized_image)
+                    output_path = f"{zip_writer.zip_path}{MEMBER_SEPARATOR}{member}"
+                    queue_item.output_path = output_path
+                else:
+                    # Ensure output directory exists
+                    output_dir = Path(output_path).parent
+                    output_dir.mkdir(parents=True, exist_ok=True)
+                    
+                    # Save the image under a temporary name keeping the extension, which selects the format
+                    output = Path(output_path)
+                    partial_path = output.with_name(f".{output.stem}.{uuid.uuid4().hex}.partial{output.suffix}")
+                    try:
+                        with self._stage_timer(queue_item).stage("save"):
+                            colorized_image.save(partial_path)
+                        os.replace(partial_path, output_path)
+                    finally:
+                        if partial_path.exists():
+                            partial_path.unlink()
             except PermissionError:
                 raise ImageProcessingError(
                     input_path,
@@ -386,80 +945,336 @@ class BatchProcessor:
             current_stage = "verifying output"
             logger.debug(f"Stage: {current_stage}")
             
-            if not Path(output_path).exists():
+            if not self._output_exists(output_path):
                 raise ImageProcessingError(
                     input_path,
                     "Output file was not created"
                 )
             
-            # Verify file is not empty
-            if Path(output_path).stat().st_size == 0:
+            # Verify file is not empty (ZIP members are checked by the archive's CRC)
+            if zip_writer is None and Path(output_path).stat().st_size == 0:
                 raise ImageProcessingError(
                     input_path,
                     "Output file is empty"
                 )
+        
+        except Exception as e:
+            raise self._record_failure(queue_item, current_stage, e)
+        
+        # Thumbnail for the result galleries, before completion is announced to them
+        if self.thumbnails is not None:
+            with self._stage_timer(queue_item).stage("thumbnail"):
+                self.thumbnails.save(output_path, colorized_image)
+        
+        # Update status to completed
+        logger.debug("Stage: updating status")
+        
+        try:
+            self.status_tracker.update_status(
+                image_id=queue_item.id,
+                state=ProcessingState.COMPLETED.value,
+                output_path=output_path
+            )
+        except Exception as e:
+            logger.error(f"Failed to update status to completed: {e}")
+            # Don't fail the whole operation if status update fails
+        
+        self._journal_record(queue_item, JobJournal.COMPLETED)
+        
+        logger.info(f"Successfully processed: {Path(input_path).name}")
+
+    def process_single_image(self, queue_item: ImageQueueItem, engine=None) -> None:
+        """
+        Process a single image through the colorization pipeline.
+        
+        This method:
+        1. Loads and preprocesses the input image
+        2. Extracts line art from the image
+        3. Loads reference images
+        4. Calls the colorization pipeline
+        5. Saves the output with metadata
+        6. Updates status tracker
+        7. Clears memory after processing
+        
+        The staged pipeline (see _process_queue_staged) runs the same
+        stages, but overlaps them across pages.
+        
+        Args:
+            queue_item: ImageQueueItem containing image paths and config
+            engine: Engine to process the image with. Defaults to the
+                processor's engine; workers pass their own.
             
-            # Update status to completed
-            current_stage = "updating status"
-            logger.debug(f"Stage: {current_stage}")
+        Raises:
+            ImageProcessingError: If processing fails
+        """
+        logger.info(f"Processing image: {Path(queue_item.input_path).name}")
+        
+        page = self._load_page(queue_item)
+        colorized_image = self._colorize_page(queue_item, page, engine)
+        self._save_page(queue_item, colorized_image)
+
+    def _process_item(self, queue_item: ImageQueueItem, engine=None) -> bool:
+        """
+        Process one dequeued image, recording failures instead of raising.
+        
+        Args:
+            queue_item: Item to process
+            engine: Engine of the worker processing the item
             
-            try:
-                self.status_tracker.update_status(
-                    image_id=image_id,
-                    state=ProcessingState.COMPLETED.value,
-                    output_path=output_path
-                )
-            except Exception as e:
-                logger.error(f"Failed to update status to completed: {e}")
-                # Don't fail the whole operation if status update fails
+        Returns:
+            True if the image was processed successfully
+        """
+        try:
+            self.process_single_image(queue_item, engine=engine)
+            return True
             
-            logger.info(f"Successfully processed: {Path(input_path).name}")
+        except ImageProcessingError as e:
+            # Log error but continue with next image (resilience requirement)
+            logger.error(
+                f"Image processing failed: {str(e)} "
+                f"(Continuing with remaining images)"
+            )
+            # Status already updated in process_single_image
+            return False
             
-        except ImageProcessingError:
-            # Already properly formatted, just update status and re-raise
-            logger.error(f"Processing failed at stage '{current_stage}': {input_path}")
+        except Exception as e:
+            # Unexpected error - log with full context and continue
+            logger.error(
+                f"Unexpected error processing {queue_item.input_path}: {str(e)} "
+                f"(Continuing with remaining images)",
+                exc_info=True
+            )
             
+            # Update status to failed
             try:
                 self.status_tracker.update_status(
-                    image_id=image_id,
+                    image_id=queue_item.id,
                     state=ProcessingState.FAILED.value,
-                    error_message=f"Failed at {current_stage}"
+                    error_message=f"Unexpected error: {str(e)}"
                 )
             except Exception as status_error:
                 logger.error(f"Failed to update status: {status_error}")
-            
-            raise
-            
-        except Exception as e:
-            # Unexpected error - wrap with context
-            error_msg = f"Unexpected error at stage '{current_stage}': {str(e)}"
-            logger.error(f"Processing failed: {error_msg}", exc_info=True)
-            
+            return False
+        
+        finally:
+            # Trigger memory cleanup between images
             try:
+                self.memory_manager.trigger_gc_if_needed()
+            except Exception as mem_error:
+                logger.warning(f"Memory cleanup failed: {mem_error}")
+
+    def _cancel_remaining(self) -> None:
+        """Mark every image still in the queue as cancelled."""
+        while self.queue.size() > 0:
+            item = self.queue.dequeue()
+            if item:
                 self.status_tracker.update_status(
-                    image_id=image_id,
-                    state=ProcessingState.FAILED.value,
-                    error_message=error_msg
+                    image_id=item.id,
+                    state=ProcessingState.CANCELLED.value
                 )
-            except Exception as status_error:
-                logger.error(f"Failed to update status: {status_error}")
+
+    def _process_queue_staged(self, processed_count: int, total_images: int) -> int:
+        """
+        Process queued images in an overlapped StagedPipeline.
+        
+        Prefetch threads load and preprocess upcoming pages, one model
+        worker per engine (see get_worker_engines) runs the models, and
+        writer threads encode and save finished pages. The stages are
+        connected by queues of config.stage_queue_size pages, so the
+        accelerator never waits on image decoding or PNG encoding.
+        
+        On pause or cancel no new pages are loaded and loaded pages that
+        have not reached a model are put back into the queue; pages already
+        colorized are still saved.
+        
+        Args:
+            processed_count: Number of images of the batch already processed
+            total_images: Total number of images in the batch
             
-            # Re-raise as ImageProcessingError with full context
-            raise ImageProcessingError(input_path, error_msg) from e
+        Returns:
+            Number of images that failed
+        """
+        # A single worker resolves the processor's engine on its first page
+        engines = self.get_worker_engines() if self.config.max_concurrent > 1 else [None]
+        failures = []
+        progress_lock = threading.Lock()
+        progress = [processed_count]
         
-        finally:
-            # Always clear memory after processing (success or failure)
-            logger.debug("Clearing memory after image processing")
+        def load_page(queue_item: ImageQueueItem, worker_idx: int):
             try:
-                self.memory_manager.clear_cache()
-            except Exception as e:
-                logger.warning(f"Failed to clear memory cache: {e}")
+                return queue_item, self._load_page(queue_item)
+            except ImageProcessingError as e:
+                logger.error(f"Image processing failed: {str(e)} (Continuing with remaining images)")
+                with progress_lock:
+                    failures.append(queue_item.id)
+                return None
+        
+        def colorize_page(item, worker_idx: int):
+            queue_item, page = item
+            with progress_lock:
+                progress[0] += 1
+                current = progress[0]
+            logger.info(
+                f"Processing image {current}/{self._progress_total(total_images)}: "
+                f"{Path(queue_item.input_path).name}"
+            )
+            try:
+                return queue_item, self._colorize_page(queue_item, page, engines[worker_idx])
+            except ImageProcessingError as e:
+                logger.error(f"Image processing failed: {str(e)} (Continuing with remaining images)")
+                with progress_lock:
+                    failures.append(queue_item.id)
+                return None
+        
+        def save_page(item, worker_idx: int):
+            queue_item, colorized_image = item
+            try:
+                self._save_page(queue_item, colorized_image)
+            except ImageProcessingError as e:
+                logger.error(f"Image processing failed: {str(e)} (Continuing with remaining images)")
+                with progress_lock:
+                    failures.append(queue_item.id)
+            finally:
+                # Trigger memory cleanup between images
+                try:
+                    self.memory_manager.trigger_gc_if_needed()
+                except Exception as mem_error:
+                    logger.warning(f"Memory cleanup failed: {mem_error}")
+            return None
+        
+        def requeue_page(item) -> None:
+            queue_item = item[0]
+            self.queue.enqueue(queue_item)
+            self.status_tracker.update_status(
+                image_id=queue_item.id,
+                state=ProcessingState.PENDING.value
+            )
+        
+        pipeline = StagedPipeline(
+            source=self._next_item,
+            stages=[
+                PipelineStage("load", load_page, workers=self.config.prefetch_workers),
+                PipelineStage("model", colorize_page, workers=len(engines)),
+                PipelineStage("write", save_page, workers=self.config.writer_workers, cancellable=False),
+            ],
+            queue_size=self.config.stage_queue_size,
+            should_stop=lambda: self._paused or self._cancelled,
+            on_discard=requeue_page,
+        )
+        self._pipeline = pipeline
+        pipeline.run()
+        
+        for line in pipeline.format_stats():
+            logger.info(f"Pipeline {line}")
+        
+        if self._paused and not self._cancelled:
+            logger.info("Processing paused")
+        elif self._cancelled:
+            logger.info("Processing cancelled")
+            self._cancel_remaining()
+        return len(failures)
+
+    def _process_queue(self, processed_count: int, total_images: int) -> int:
+        """
+        Process queued images until the queue is empty, paused or cancelled.
+        
+        With config.overlap_stages the images run through an overlapped
+        StagedPipeline (see _process_queue_staged). Otherwise, with
+        max_concurrent == 1 images are processed sequentially on the
+        calling thread, and with more a WorkerPool drains the queue with
+        one worker per engine (see get_worker_engines). In all cases a
+        pause or cancel lets in-flight images finish and stops new ones
+        from starting; on cancel the remaining images are marked cancelled.
+        
+        Args:
+            processed_count: Number of images of the batch already processed
+            total_images: Total number of images in the batch
+            
+        Returns:
+            Number of images that failed
+        """
+        failed_count = 0
+        
+        if self.config.overlap_stages:
+            return self._process_queue_staged(processed_count, total_images)
+        
+        if self.config.max_concurrent > 1:
+            failures = []
+            progress_lock = threading.Lock()
+            progress = [processed_count]
+            
+            def process_item(queue_item: ImageQueueItem, engine) -> None:
+                with progress_lock:
+                    progress[0] += 1
+                    current = progress[0]
+                logger.info(
+                    f"Processing image {current}/{self._progress_total(total_images)}: "
+                    f"{Path(queue_item.input_path).name}"
+                )
+                if not self._process_item(queue_item, engine):
+                    with progress_lock:
+                        failures.append(queue_item.id)
+            
+            pool = WorkerPool(
+                self.queue,
+                self.get_worker_engines(),
+                process_item,
+                should_stop=lambda: self._paused or self._cancelled,
+                more_coming=lambda: self._feeding,
+            )
+            pool.run()
+            failed_count = len(failures)
+            
+            if self._paused and not self._cancelled:
+                logger.info("Processing paused")
+            elif self._cancelled:
+                logger.info("Processing cancelled")
+                self._cancel_remaining()
+            return failed_count
+        
+        while self.queue.size() > 0 or self._feeding:
+            # Check for pause
+            if self._paused:
+                logger.info("Processing paused")
+                break
+            
+            # Check for cancellation
+            if self._cancelled:
+                logger.info("Processing cancelled")
+                # Mark remaining images as cancelled
+                self._cancel_remaining()
+                break
+            
+            # Dequeue next image
+            queue_item = self._next_item()
+            if queue_item is None:
+                break
+            
+            # Update progress
+            processed_count += 1
+            logger.info(
+                f"Processing image {processed_count}/{self._progress_total(total_images)}: "
+                f"{Path(queue_item.input_path).name}"
+            )
+            
+            # Save progress before processing (in case of crash)
+            logger.debug(
+                f"About to process: {queue_item.input_path} "
+                f"(Progress: {processed_count}/{total_images})"
+            )
+            
+            # Process the image
+            if not self._process_item(queue_item):
+                failed_count += 1
+        
+        return failed_count
 
     def start_processing(self) -> None:
         """
         Start processing all images in the queue.
         
-        Processes images sequentially from the queue, handling errors
+        Processes images from the queue, sequentially or with
+        config.max_concurrent workers, handling errors
         gracefully without stopping the batch. Updates progress information
         and triggers memory cleanup between images.
         
@@ -473,7 +1288,10 @@ class BatchProcessor:
             BatchProcessingError: If processing cannot start (e.g., empty queue)
         """
         # Check if queue is empty
-        if self.queue.size() == 0:
+        if self.queue.size() == 0 and not self._feeding:
+            if self._feeder is not None:
+                logger.info("No images to process: the image feed added none")
+                return
             error_msg = "Cannot start processing: queue is empty"
             logger.error(error_msg)
             raise BatchProcessingError(error_msg)
@@ -492,6 +1310,9 @@ class BatchProcessor:
         if self.config.preview_mode and not self._preview_processed:
             logger.info("Preview mode enabled - will process first image only")
         
+        # Group pages that share settings; the first image stays first for preview mode
+        self._plan_queue()
+        
         # Set processing flag
         self._processing = True
         self._cancelled = False
@@ -506,7 +1327,7 @@ class BatchProcessor:
             # In preview mode, process only the first image
             if self.config.preview_mode and not self._preview_processed:
                 # Dequeue first image
-                queue_item = self.queue.dequeue()
+                queue_item = self._next_item()
                 if queue_item is None:
                     logger.error("Failed to dequeue first image for preview")
                     return
@@ -609,86 +1430,7 @@ class BatchProcessor:
                 return  # Stop here and wait for approval
             
             # Normal processing (non-preview mode or after preview approval)
-            # Process images sequentially
-            while self.queue.size() > 0:
-                # Check for pause
-                if self._paused:
-                    logger.info("Processing paused")
-                    break
-                
-                # Check for cancellation
-                if self._cancelled:
-                    logger.info("Processing cancelled")
-                    # Mark remaining images as cancelled
-                    while self.queue.size() > 0:
-                        item = self.queue.dequeue()
-                        if item:
-                            self.status_tracker.update_status(
-                                image_id=item.id,
-                                state=ProcessingState.CANCELLED.value
-                            )
-                    break
-                
-                # Dequeue next image
-                queue_item = self.queue.dequeue()
-                if queue_item is None:
-                    break
-                
-                # Update progress
-                processed_count += 1
-                logger.info(
-                    f"Processing image {processed_count}/{total_images}: "
-                    f"{Path(queue_item.input_path).name}"
-                )
-                
-                # Save progress before processing (in case of crash)
-                try:
-                    # Log current state for recovery
-                    logger.debug(
-                        f"About to process: {queue_item.input_path} "
-                        f"(Progress: {processed_count}/{total_images})"
-                    )
-                except Exception as log_error:
-                    # Don't fail if logging fails
-                    pass
-                
-                # Process the image
-                try:
-                    self.process_single_image(queue_item)
-                    
-                except ImageProcessingError as e:
-                    # Log error but continue with next image (resilience requirement)
-                    logger.error(
-                        f"Image processing failed: {str(e)} "
-                        f"(Continuing with remaining images)"
-                    )
-                    failed_count += 1
-                    # Status already updated in process_single_image
-                    
-                except Exception as e:
-                    # Unexpected error - log with full context and continue
-                    logger.error(
-                        f"Unexpected error processing {queue_item.input_path}: {str(e)} "
-                        f"(Continuing with remaining images)",
-                        exc_info=True
-                    )
-                    failed_count += 1
-                    
-                    # Update status to failed
-                    try:
-                        self.status_tracker.update_status(
-                            image_id=queue_item.id,
-                            state=ProcessingState.FAILED.value,
-                            error_message=f"Unexpected error: {str(e)}"
-                        )
-                    except Exception as status_error:
-                        logger.error(f"Failed to update status: {status_error}")
-                
-                # Trigger memory cleanup between images
-                try:
-                    self.memory_manager.trigger_gc_if_needed()
-                except Exception as mem_error:
-                    logger.warning(f"Memory cleanup failed: {mem_error}")
+            failed_count = self._process_queue(processed_count, total_images)
             
             # Get final summary
             summary = self.status_tracker.get_summary()
@@ -727,6 +1469,8 @@ class BatchProcessor:
             if not (self.config.preview_mode and self._preview_processed and not self._preview_approved):
                 self._processing = False
             
+            self._close_zip_writer()
+            
             # Final memory cleanup
             try:
                 self.memory_manager.clear_cache()
@@ -785,10 +1529,15 @@ class BatchProcessor:
         logger.info("Cancelling batch processing")
         self._cancelled = True
     
-    def get_status(self) -> Dict[str, Any]:
+    def get_status(self, include_stage_stats: bool = True) -> Dict[str, Any]:
         """
         Get the current batch processing status.
         
+        Args:
+            include_stage_stats: Include per-stage percentiles in the
+                summary; status pollers pass False, since aggregating them
+                walks every image while the counts are O(1)
+        
         Returns:
             Dictionary containing status information including:
             - summary: StatusSummary with counts and timing
@@ -796,8 +1545,17 @@ class BatchProcessor:
             - is_paused: Whether processing is paused
             - is_cancelled: Whether processing was cancelled
             - queue_size: Number of images remaining in queue
+            - reference_cache: Hit/miss statistics of the reference cache
+            - latent_cache: Hit/miss statistics of the reference latent cache
+            - resumed: Number of images skipped as completed by an earlier run
+            - output_zip: Path of the output archive, readable while the
+              batch runs, or None before the first page is saved or for
+              loose file output
+            - pipeline: Queue depths and per-stage utilization of the
+              staged pipeline (see StagedPipeline.get_stats), or None
+              before the first overlapped run
         """
-        summary = self.status_tracker.get_summary()
+        summary = self.status_tracker.get_summary(include_stage_stats=include_stage_stats)
         
         return {
             "summary": summary,
@@ -813,8 +1571,35 @@ class BatchProcessor:
             "cancelled": summary.cancelled,
             "success_rate": summary.success_rate,
             "elapsed_time": summary.elapsed_time,
+            "reference_cache": self.reference_cache.get_stats(),
+            "latent_cache": self.latent_cache.get_stats(),
+            "resumed": self.resumed_count,
+            "output_zip": str(self._zip_writer.zip_path) if self._zip_writer is not None else None,
+            "pipeline": self._pipeline.get_stats() if self._pipeline is not None else None,
         }
     
+    def export_metrics(self, path: str, format: Optional[str] = None) -> str:
+        """
+        Write the batch's per-stage timing and memory metrics to a file.
+        
+        Args:
+            path: Output file path
+            format: "json" or "prometheus"; inferred from the file
+                extension when None (.prom and .txt are Prometheus text,
+                anything else JSON)
+            
+        Returns:
+            The path the metrics were written to
+        """
+        if format is None:
+            format = "prometheus" if Path(path).suffix.lower() in (".prom", ".txt") else "json"
+        
+        metrics = self.status_tracker.export_metrics(format)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(metrics)
+        logger.info(f"Exported {format} metrics to {path}")
+        return path
+    
     def is_preview_mode(self) -> bool:
         """
         Check if preview mode is enabled.
@@ -926,82 +1711,7 @@ class BatchProcessor:
         failed_count = 0
         
         try:
-            while self.queue.size() > 0:
-                # Check for pause
-                if self._paused:
-                    logger.info("Processing paused")
-                    break
-                
-                # Check for cancellation
-                if self._cancelled:
-                    logger.info("Processing cancelled")
-                    # Mark remaining images as cancelled
-                    while self.queue.size() > 0:
-                        item = self.queue.dequeue()
-                        if item:
-                            self.status_tracker.update_status(
-                                image_id=item.id,
-                                state=ProcessingState.CANCELLED.value
-                            )
-                    break
-                
-                # Dequeue next image
-                queue_item = self.queue.dequeue()
-                if queue_item is None:
-                    break
-                
-                # Update progress
-                processed_count += 1
-                logger.info(
-                    f"Processing image {processed_count}/{total_images}: "
-                    f"{Path(queue_item.input_path).name}"
-                )
-                
-                # Save progress before processing
-                try:
-                    logger.debug(
-                        f"About to process: {queue_item.input_path} "
-                        f"(Progress: {processed_count}/{total_images})"
-                    )
-                except Exception:
-                    pass
-                
-                # Process the image
-                try:
-                    self.process_single_image(queue_item)
-                    
-                except ImageProcessingError as e:
-                    # Log error but continue with next image (resilience requirement)
-                    logger.error(
-                        f"Image processing failed: {str(e)} "
-                        f"(Continuing with remaining images)"
-                    )
-                    failed_count += 1
-                    
-                except Exception as e:
-                    # Unexpected error - log with full context and continue
-                    logger.error(
-                        f"Unexpected error processing {queue_item.input_path}: {str(e)} "
-                        f"(Continuing with remaining images)",
-                        exc_info=True
-                    )
-                    failed_count += 1
-                    
-                    # Update status to failed
-                    try:
-                        self.status_tracker.update_status(
-                            image_id=queue_item.id,
-                            state=ProcessingState.FAILED.value,
-                            error_message=f"Unexpected error: {str(e)}"
-                        )
-                    except Exception as status_error:
-                        logger.error(f"Failed to update status: {status_error}")
-                
-                # Trigger memory cleanup between images
-                try:
-                    self.memory_manager.trigger_gc_if_needed()
-                except Exception as mem_error:
-                    logger.warning(f"Memory cleanup failed: {mem_error}")
+            failed_count = self._process_queue(processed_count, total_images)
             
             # Get final summary
             summary = self.status_tracker.get_summary()
@@ -1024,6 +1734,8 @@ class BatchProcessor:
             # Clear processing flag
             self._processing = False
             
+            self._close_zip_writer()
+            
             # Final memory cleanup
             try:
                 self.memory_manager.clear_cache()
@@ -10,9 +10,13 @@ from .reference_preview import (
     filter_references,
     create_reference_preview_ui
 )
+from .status_view import StatusTableView
+from .results_gallery import ResultsGallery
 
 __all__ = [
     'ReferencePreviewGallery',
     'filter_references',
-    'create_reference_preview_ui'
+    'create_reference_preview_ui',
+    'StatusTableView',
+    'ResultsGallery'
 ]
@@ -13,6 +13,7 @@ from PIL import Image
 
 from ..logging_config import get_logger
 from ..classification.classifier import ImageType
+from ..io.thumbnails import THUMBNAIL_SIZE, load_thumbnail
 from ..exceptions import ValidationError
 
 logger = get_logger(__name__)
@@ -96,13 +97,17 @@ class ReferencePreviewGallery:
         """
         Load reference images and prepare them for display.
         
+        The gallery only needs previews, so each image is decoded directly
+        at thumbnail size instead of handing full-resolution pages to
+        gr.Gallery, which would re-encode and send them in full.
+        
         Args:
             reference_paths: List of paths to reference images
             classifications: Dictionary mapping paths to ImageType
             
         Returns:
             Tuple containing:
-            - List of PIL Images for gallery display
+            - List of PIL thumbnails for gallery display
             - List of checkbox choices (with confidence info)
             - List of initially selected indices (all selected by default)
         """
@@ -121,9 +126,8 @@ class ReferencePreviewGallery:
         
         for idx, path in enumerate(reference_paths):
             try:
-                # Load image
-                img = Image.open(path)
-                images.append(img)
+                # Load a thumbnail of the image
+                images.append(load_thumbnail(path, THUMBNAIL_SIZE))
                 
                 # Create choice label with confidence
                 filename = Path(path).name
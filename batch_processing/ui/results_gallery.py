@@ -0,0 +1,146 @@
+"""
+Incremental results gallery for the batch processing UIs.
+
+This module provides the ResultsGallery class which collects the finished
+pages of a batch from StatusTracker events and shows them by their cached
+thumbnails (see ThumbnailCache), so a UI refresh only looks at the pages
+completed since the previous refresh and never decodes a full-resolution
+output; a page is only loaded at full resolution when it is selected.
+"""
+
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Deque, List, Optional, Set, Tuple
+
+from PIL import Image
+
+from ..logging_config import get_logger
+from ..core.status import ProcessingState, StatusEvent, StatusTracker
+from ..io.thumbnails import ThumbnailCache, open_output_image
+from ..io.zip_source import MEMBER_SEPARATOR
+
+logger = get_logger(__name__)
+
+
+class ResultsGallery:
+    """
+    Thumbnail gallery of a batch's completed pages.
+
+    Like StatusTableView, the tracker subscriber only appends events to a
+    deque and refresh() applies them on the UI thread. Items are kept in
+    completion order, so the items of an earlier refresh are always a
+    prefix of the current ones until the tracker is cleared.
+
+    Attributes:
+        thumbnails: ThumbnailCache the thumbnails are read from
+        version: Identifier that changes whenever items are dropped, so a
+            client holding (version, item count) knows whether it is current
+    """
+
+    def __init__(self, tracker: StatusTracker, thumbnails: Optional[ThumbnailCache] = None):
+        """
+        Attach a gallery to a tracker, starting from its completed images.
+
+        Args:
+            tracker: StatusTracker of the batch
+            thumbnails: Cache the batch writes thumbnails to (see
+                BatchProcessor.thumbnails); defaults to the default cache
+        """
+        self.thumbnails = thumbnails or ThumbnailCache()
+        self.version = uuid.uuid4().hex
+        # (thumbnail path, caption) and output path of every item, in completion order
+        self._items: List[Tuple[str, str]] = []
+        self._output_paths: List[str] = []
+        self._shown: Set[str] = set()
+        self._events: Deque[StatusEvent] = deque()
+        # subscribe before the snapshot: events racing with it are replayed by refresh() and deduplicated
+        self._unsubscribe = tracker.subscribe(self._events.append)
+        for status in tracker.get_all_statuses().values():
+            if status.state == ProcessingState.COMPLETED.value and status.output_path:
+                self._add(status.output_path)
+
+    def _add(self, output_path: str) -> bool:
+        if output_path in self._shown:
+            return False
+        thumbnail_path = self.thumbnails.get(output_path)
+        if thumbnail_path is None:
+            return False
+        self._shown.add(output_path)
+        self._output_paths.append(output_path)
+        self._items.append((thumbnail_path, Path(output_path.rpartition(MEMBER_SEPARATOR)[2]).name))
+        return True
+
+    def refresh(self) -> int:
+        """
+        Apply the events received since the last refresh.
+
+        Returns:
+            Number of items added
+        """
+        added = 0
+        while self._events:
+            event = self._events.popleft()
+            if event.kind == "cleared":
+                self._items.clear()
+                self._output_paths.clear()
+                self._shown.clear()
+                self.version = uuid.uuid4().hex
+                added = 0
+            elif event.state == ProcessingState.COMPLETED.value and event.output_path:
+                added += self._add(event.output_path)
+        if added:
+            logger.debug(f"Results gallery added {added} items")
+        return added
+
+    def items(self, start: int = 0) -> List[Tuple[str, str]]:
+        """
+        Get gallery items.
+
+        Args:
+            start: Index of the first item
+
+        Returns:
+            (thumbnail path, caption) pairs, as accepted by gr.Gallery
+        """
+        return self._items[start:]
+
+    def output_path(self, index: int) -> Optional[str]:
+        """
+        Get the output path of an item.
+
+        Args:
+            index: Index of the item in the gallery
+
+        Returns:
+            Output path (see open_output_image), or None if out of range
+        """
+        if 0 <= index < len(self._output_paths):
+            return self._output_paths[index]
+        return None
+
+    def load_full_resolution(self, index: int) -> Optional[Image.Image]:
+        """
+        Load the output of an item at full resolution.
+
+        Args:
+            index: Index of the item in the gallery
+
+        Returns:
+            Loaded image, or None if out of range or unreadable
+        """
+        output_path = self.output_path(index)
+        if output_path is None:
+            return None
+        try:
+            return open_output_image(output_path)
+        except OSError as e:
+            logger.warning(f"Cannot load result {output_path}: {e}")
+            return None
+
+    def close(self) -> None:
+        """Stop receiving events from the tracker."""
+        self._unsubscribe()
+
+    def __len__(self) -> int:
+        return len(self._items)
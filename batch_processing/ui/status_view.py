@@ -0,0 +1,113 @@
+"""
+Paged batch status table for the batch processing UIs.
+
+This module provides the StatusTableView class which keeps one table row
+per image up to date from StatusTracker events, so a UI refresh only
+applies the changes since the previous refresh and renders a single page,
+instead of rebuilding a table of every image on every poll.
+"""
+
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+from ..logging_config import get_logger
+from ..core.status import ProcessingState, StatusEvent, StatusTracker
+
+logger = get_logger(__name__)
+
+# Progress column shown for each state
+STATE_PROGRESS = {
+    ProcessingState.PENDING.value: "0%",
+    ProcessingState.PROCESSING.value: "running",
+    ProcessingState.COMPLETED.value: "100%",
+}
+
+
+class StatusTableView:
+    """
+    Incrementally maintained, paged view of a batch's statuses.
+
+    The view subscribes to the tracker; the subscriber only appends events
+    to a deque, so processing threads never wait on the UI. refresh() then
+    applies the pending events on the UI thread, in order, and page_rows()
+    returns the rows of one page in the order images were added.
+
+    Attributes:
+        COLUMNS: Table headers, matching the rows returned by page_rows
+        page_size: Number of rows per page
+    """
+
+    COLUMNS = ["Image", "Status", "Progress", "Output"]
+
+    def __init__(self, tracker: StatusTracker, page_size: int = 50):
+        """
+        Attach a view to a tracker, starting from its current statuses.
+
+        Args:
+            tracker: StatusTracker of the batch
+            page_size: Number of rows per page (at least 1)
+        """
+        self.page_size = max(1, page_size)
+        self._rows: Dict[str, List[str]] = {}
+        self._order: List[str] = []
+        self._events: Deque[StatusEvent] = deque()
+        # subscribe before the snapshot: events racing with it are replayed in order by refresh()
+        self._unsubscribe = tracker.subscribe(self._events.append)
+        for status in tracker.get_all_statuses().values():
+            self._set_row(status.id, status.input_path, status.state, status.output_path)
+
+    def _set_row(self, image_id: str, input_path: Optional[str], state: str, output_path: Optional[str]) -> None:
+        row = self._rows.get(image_id)
+        if row is None:
+            row = self._rows[image_id] = [Path(input_path).name if input_path else "Unknown", "", "", ""]
+            self._order.append(image_id)
+        row[1] = state
+        row[2] = STATE_PROGRESS.get(state, "N/A")
+        row[3] = Path(output_path).name if output_path else "N/A"
+
+    def refresh(self) -> int:
+        """
+        Apply the events received since the last refresh.
+
+        Returns:
+            Number of events applied
+        """
+        applied = 0
+        while self._events:
+            event = self._events.popleft()
+            applied += 1
+            if event.kind == "cleared":
+                self._rows.clear()
+                self._order.clear()
+            else:
+                self._set_row(event.image_id, event.input_path, event.state, event.output_path)
+        if applied:
+            logger.debug(f"Status view applied {applied} events")
+        return applied
+
+    @property
+    def page_count(self) -> int:
+        """Number of pages, at least 1."""
+        return max(1, -(-len(self._order) // self.page_size))
+
+    def page_rows(self, page: int = 1) -> List[List[str]]:
+        """
+        Get the rows of one page.
+
+        Args:
+            page: 1-based page number, clamped to the existing pages
+
+        Returns:
+            Rows as lists of COLUMNS values
+        """
+        page = min(max(1, int(page)), self.page_count)
+        start = (page - 1) * self.page_size
+        return [list(self._rows[image_id]) for image_id in self._order[start:start + self.page_size]]
+
+    def close(self) -> None:
+        """Stop receiving events from the tracker."""
+        self._unsubscribe()
+
+    def __len__(self) -> int:
+        return len(self._order)
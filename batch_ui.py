@@ -18,21 +18,33 @@ from batch_processing.io.zip_handler import (
     is_zip_file,
     extract_zip_file,
     cleanup_temp_directory,
-    separate_line_art_and_references,
     create_output_zip
 )
-from batch_processing.classification.classifier import ImageClassifier
+from batch_processing.io.file_handler import separate_line_art_and_references
+from batch_processing.classification.classifier import ImageClassifier, CLASSIFICATION_CACHE_FILENAME
 from batch_processing.ui.reference_preview import (
     ReferencePreviewGallery,
     filter_references
 )
 from batch_processing.core.status import ProcessingState
+from batch_processing.ui.status_view import StatusTableView
+from batch_processing.ui.results_gallery import ResultsGallery
+from batch_processing.io.thumbnails import THUMBNAIL_SIZE, load_thumbnail
 
 # Global state for batch processing
 batch_processor: Optional[BatchProcessor] = None
 temp_extract_dir: Optional[str] = None
-classifier = ImageClassifier()
+# threads, not processes: spawned workers would re-run this module's model setup;
+# the persistent cache lets re-uploaded pages skip decoding entirely
+classifier = ImageClassifier(
+    use_processes=False,
+    cache_path=str(Path("./Cobra") / CLASSIFICATION_CACHE_FILENAME)
+)
 reference_gallery_manager = ReferencePreviewGallery()
+# Paged status table fed by the running batch's status events
+status_view: Optional[StatusTableView] = None
+# Thumbnail gallery of the running batch's finished pages
+results_view: Optional[ResultsGallery] = None
 
 # Store detected references for filtering
 detected_line_art: List[str] = []
@@ -68,11 +80,11 @@ def handle_zip_upload(zip_file) -> Tuple[str, List, str, List, str]:
             return "No images found in ZIP file", [], "0 selected", [], "No images found"
         
         # Classify images
-        line_art, references = separate_line_art_and_references(all_images, classifier)
+        line_art, references, classifications = separate_line_art_and_references(all_images, classifier)
         
-        # Get classifications for references
+        # Reuse the classifications of the references
         reference_classifications = {
-            path: classifier.classify(path) for path in references
+            path: classifications[path] for path in references
         }
         
         # Sort references by confidence (descending - best first)
@@ -88,7 +100,7 @@ def handle_zip_upload(zip_file) -> Tuple[str, List, str, List, str]:
         # Load images for gallery with labels showing confidence
         images_with_labels = []
         for ref in sorted_refs:
-            img = Image.open(ref)
+            img = load_thumbnail(ref, THUMBNAIL_SIZE)
             classification = reference_classifications.get(ref)
             confidence = classification.confidence if classification else 0
             
@@ -175,7 +187,8 @@ def start_batch_processing(
     num_inference_steps: int,
     top_k: int,
     output_dir: str,
-    selected_reference_names: List[str]
+    selected_reference_names: List[str],
+    max_concurrent: int = 1
 ) -> str:
     """
     Start batch processing with selected configuration.
@@ -187,11 +200,12 @@ def start_batch_processing(
         top_k: Top K references to use
         output_dir: Output directory for results
         selected_reference_names: Selected reference image filenames
+        max_concurrent: Number of images to process concurrently
         
     Returns:
         Status message
     """
-    global batch_processor, detected_line_art, detected_references
+    global batch_processor, status_view, results_view, detected_line_art, detected_references
     
     if not detected_line_art:
         return "❌ No images to process. Please upload a ZIP file or select a directory first."
@@ -231,11 +245,17 @@ def start_batch_processing(
             recursive=False,
             overwrite=False,
             preview_mode=False,
-            max_concurrent=1
+            max_concurrent=int(max_concurrent)
         )
         
         # Create batch processor
         batch_processor = BatchProcessor(config)
+        if status_view is not None:
+            status_view.close()
+        status_view = StatusTableView(batch_processor.status_tracker)
+        if results_view is not None:
+            results_view.close()
+        results_view = ResultsGallery(batch_processor.status_tracker, batch_processor.thumbnails)
         
         # Add images to queue
         batch_processor.add_images(detected_line_art)
@@ -258,45 +278,31 @@ def start_batch_processing(
         return f"❌ Error starting batch processing: {str(e)}"
 
 
-def get_batch_status() -> Tuple[pd.DataFrame, str, float]:
+def get_batch_status(page: int = 1) -> Tuple[pd.DataFrame, str, float]:
     """
     Get current batch processing status.
     
+    Args:
+        page: 1-based page of the status table to show
+    
     Returns:
         Tuple of (status_dataframe, progress_text, progress_value)
     """
-    global batch_processor
+    global batch_processor, status_view
     
-    if batch_processor is None:
-        empty_df = pd.DataFrame(columns=["Image", "Status", "Progress", "Output"])
+    if batch_processor is None or status_view is None:
+        empty_df = pd.DataFrame(columns=StatusTableView.COLUMNS)
         return empty_df, "No batch processing active", 0.0
     
     try:
-        # Get status from processor
-        status = batch_processor.get_status()
+        # Counts only: stage percentiles would walk every image on each poll
+        status = batch_processor.get_status(include_stage_stats=False)
         summary = status["summary"]
         
-        # Get all statuses
-        all_statuses = batch_processor.status_tracker.get_all_statuses()
-        
-        # Create dataframe
-        rows = []
-        for image_id, img_status in all_statuses.items():
-            # Find the queue item to get the filename
-            filename = "Unknown"
-            for item in [batch_processor.queue.peek()]:
-                if item and item.id == image_id:
-                    filename = Path(item.input_path).name
-                    break
-            
-            rows.append({
-                "Image": filename,
-                "Status": img_status.state,
-                "Progress": f"{img_status.progress:.0f}%" if hasattr(img_status, 'progress') else "N/A",
-                "Output": Path(img_status.output_path).name if img_status.output_path else "N/A"
-            })
-        
-        df = pd.DataFrame(rows)
+        # Apply the status changes since the last poll and render one page
+        status_view.refresh()
+        page = min(max(1, int(page or 1)), status_view.page_count)
+        df = pd.DataFrame(status_view.page_rows(page), columns=StatusTableView.COLUMNS)
         
         # Create progress text
         total = summary.total
@@ -306,6 +312,8 @@ def get_batch_status() -> Tuple[pd.DataFrame, str, float]:
         progress_text = f"Progress: {completed}/{total} completed"
         if failed > 0:
             progress_text += f", {failed} failed"
+        if status_view.page_count > 1:
+            progress_text += f" (page {page}/{status_view.page_count})"
         
         # Calculate progress value
         progress_value = (completed / total) if total > 0 else 0.0
@@ -350,33 +358,75 @@ def cancel_batch() -> str:
     return "⏹️ Batch processing cancelled"
 
 
-def get_batch_results() -> List[Image.Image]:
+def export_batch_metrics(metrics_format: str) -> str:
     """
-    Get all processed images for display in results gallery.
+    Export per-stage timing and memory metrics of the batch.
     
+    Args:
+        metrics_format: "JSON" or "Prometheus"
+        
     Returns:
-        List of PIL Images
+        Status message
     """
     global batch_processor
     
     if batch_processor is None:
-        return []
+        return "No batch processing active"
     
     try:
-        # Get all completed images
-        all_statuses = batch_processor.status_tracker.get_all_statuses()
-        
-        result_images = []
-        for img_status in all_statuses.values():
-            if img_status.state == ProcessingState.COMPLETED.value and img_status.output_path:
-                if Path(img_status.output_path).exists():
-                    result_images.append(Image.open(img_status.output_path))
-        
-        return result_images
+        extension = "prom" if metrics_format == "Prometheus" else "json"
+        metrics_path = Path(batch_processor.config.output_dir) / f"batch_metrics.{extension}"
+        batch_processor.export_metrics(str(metrics_path))
+        return f"✓ Exported metrics: {metrics_path}"
+    except Exception as e:
+        return f"❌ Error exporting metrics: {str(e)}"
+
+
+def get_batch_results(shown: Optional[List[str]] = None):
+    """
+    Get the results gallery, unless the browser already shows it.
+    
+    Args:
+        shown: [gallery version, item count] last sent to this browser
+            session, kept in a gr.State
+    
+    Returns:
+        Tuple of the gallery value ((thumbnail path, caption) pairs, or
+        gr.skip() when nothing was added since the last refresh) and the
+        new value of the state
+    """
+    global results_view
+    
+    if results_view is None:
+        return [], None
+    
+    try:
+        results_view.refresh()
+        current = [results_view.version, len(results_view)]
+        if shown == current:
+            return gr.skip(), shown
+        return results_view.items(), current
         
     except Exception as e:
         print(f"Error getting batch results: {e}")
-        return []
+        return gr.skip(), shown
+
+
+def get_full_result(evt: gr.SelectData) -> Optional[Image.Image]:
+    """
+    Load the selected result at full resolution.
+    
+    Args:
+        evt: Selection event of the results gallery
+    
+    Returns:
+        The output image, or None if it cannot be loaded
+    """
+    global results_view
+    
+    if results_view is None:
+        return None
+    return results_view.load_full_resolution(evt.index)
 
 
 def create_batch_processing_ui():
@@ -507,6 +557,14 @@ def create_batch_processing_ui():
                 value=3,
                 step=1
             )
+            
+            batch_workers = gr.Slider(
+                label="Concurrent Workers",
+                minimum=1,
+                maximum=8,
+                value=1,
+                step=1
+            )
     
     # Reference preview integration - Improved UI
     gr.Markdown("---")
@@ -610,6 +668,7 @@ def create_batch_processing_ui():
         resume_btn = gr.Button("▶️ Resume", size="sm")
         cancel_btn = gr.Button("⏹️ Cancel", size="sm")
         refresh_status_btn = gr.Button("🔄 Refresh Status", size="sm")
+        status_page = gr.Number(label="Status page", value=1, precision=0, minimum=1)
     
     # Batch results gallery
     gr.Markdown("---")
@@ -625,10 +684,22 @@ def create_batch_processing_ui():
             height="auto",
             object_fit="contain"
         )
+        # Full-resolution page, loaded only when a thumbnail is selected
+        full_result = gr.Image(label="Selected Result", type="pil", interactive=False)
+    
+    # [gallery version, item count] shown in this browser session (see get_batch_results)
+    results_shown = gr.State(None)
     
     with gr.Row():
         refresh_results_btn = gr.Button("🔄 Refresh Results", size="sm")
         download_all_btn = gr.Button("📥 Download All (ZIP)", size="sm")
+        metrics_format = gr.Dropdown(
+            label="Metrics Format",
+            choices=["JSON", "Prometheus"],
+            value="JSON",
+            scale=0
+        )
+        export_metrics_btn = gr.Button("📊 Export Metrics", size="sm")
     
     # Wire up batch processing workflow
     
@@ -703,10 +774,11 @@ def create_batch_processing_ui():
                 status_icon = "🟢 SELECTED" if selected_idx in new_selection else "⚪ NOT SELECTED"
                 
                 # Calculate quality score
+                edge_limit = classifier.edge_ratio_threshold
                 quality_checks = [
                     metrics.get('saturation', 0) > 0.15,
                     metrics.get('color_count', 0) > 1000,
-                    metrics.get('edge_density', 0) < 0.3
+                    metrics.get('edge_density', 0) < edge_limit
                 ]
                 quality_score = sum(quality_checks)
                 quality_rating = "⭐" * quality_score + "☆" * (3 - quality_score)
@@ -726,14 +798,14 @@ def create_batch_processing_ui():
 |--------|-------|--------|
 | Color Saturation | {metrics.get('saturation', 0):.1%} | {'✅ Pass' if metrics.get('saturation', 0) > 0.15 else '❌ Fail'} (>15%) |
 | Unique Colors | {metrics.get('color_count', 0):,} | {'✅ Pass' if metrics.get('color_count', 0) > 1000 else '❌ Fail'} (>1000) |
-| Edge Density | {metrics.get('edge_density', 0):.1%} | {'✅ Pass' if metrics.get('edge_density', 0) < 0.3 else '❌ Fail'} (<30%) |
+| Edge Density | {metrics.get('edge_density', 0):.1%} | {'✅ Pass' if metrics.get('edge_density', 0) < edge_limit else '❌ Fail'} (<{edge_limit:.0%}) |
 
 ---
 
 **💡 Why this is a good reference:**
 - {'✅' if metrics.get('saturation', 0) > 0.15 else '⚠️'} Rich, vibrant colors
 - {'✅' if metrics.get('color_count', 0) > 1000 else '⚠️'} Diverse color palette
-- {'✅' if metrics.get('edge_density', 0) < 0.3 else '⚠️'} Filled areas (not just lines)
+- {'✅' if metrics.get('edge_density', 0) < edge_limit else '⚠️'} Filled areas (not just lines)
 
 **Action:** Just {action} this image
 """
@@ -778,7 +850,7 @@ def create_batch_processing_ui():
     )
     
     # Connect start processing button
-    def start_processing_wrapper(style, seed, steps, top_k, output_dir, selected_indices):
+    def start_processing_wrapper(style, seed, steps, top_k, output_dir, selected_indices, workers):
         """Wrapper to convert indices to filenames for processing."""
         global detected_references
         
@@ -788,7 +860,7 @@ def create_batch_processing_ui():
         # Convert indices to filenames
         selected_names = [Path(detected_references[i]).name for i in selected_indices if i < len(detected_references)]
         
-        return start_batch_processing(style, seed, steps, top_k, output_dir, selected_names)
+        return start_batch_processing(style, seed, steps, top_k, output_dir, selected_names, workers)
     
     confirm_refs_btn.click(
         fn=start_processing_wrapper,
@@ -798,7 +870,8 @@ def create_batch_processing_ui():
             batch_steps,
             batch_top_k,
             output_dir,
-            selected_indices_state
+            selected_indices_state,
+            batch_workers
         ],
         outputs=[progress_text]
     )
@@ -810,13 +883,24 @@ def create_batch_processing_ui():
     
     # Connect refresh buttons
     refresh_status_btn.click(
-        fn=lambda: get_batch_status()[:2],  # Only return dataframe and text, not progress value
+        fn=lambda page: get_batch_status(page)[:2],  # Only return dataframe and text, not progress value
+        inputs=[status_page],
+        outputs=[status_table, progress_text]
+    )
+    status_page.change(
+        fn=lambda page: get_batch_status(page)[:2],
+        inputs=[status_page],
         outputs=[status_table, progress_text]
     )
     
     refresh_results_btn.click(
         fn=get_batch_results,
-        outputs=[results_gallery]
+        inputs=[results_shown],
+        outputs=[results_gallery, results_shown]
+    )
+    results_gallery.select(
+        fn=get_full_result,
+        outputs=[full_result]
     )
     
     # Download all as ZIP
@@ -844,3 +928,9 @@ def create_batch_processing_ui():
         fn=create_results_zip,
         outputs=[progress_text]
     )
+    
+    export_metrics_btn.click(
+        fn=export_batch_metrics,
+        inputs=[metrics_format],
+        outputs=[progress_text]
+    )
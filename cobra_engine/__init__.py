@@ -0,0 +1,49 @@
+"""
+Cobra inference engine.
+
+This package exposes the Cobra models behind a side-effect-free, lazily
+initialized Engine so the Gradio app, the batch CLI and tests can share
+one warm instance without importing Gradio.
+"""
+
+from .engine import (
+    DEFAULT_STYLE,
+    STYLE_ADAPTER_NAMES,
+    STYLE_CKPT_DIRS,
+    ColorizationResult,
+    Engine,
+    LineExtraction,
+    PreprocessedPage,
+    build_reference_grid,
+    fix_random_seeds,
+    get_default_engine,
+    get_rate,
+    preprocess_page,
+    ratio_list,
+    select_device,
+    set_default_engine,
+    transform,
+)
+from cobra_utils.line_extractor import LineExtractor
+from cobra_utils.stage_timer import StageTimer
+
+__all__ = [
+    "DEFAULT_STYLE",
+    "STYLE_ADAPTER_NAMES",
+    "STYLE_CKPT_DIRS",
+    "ColorizationResult",
+    "Engine",
+    "LineExtraction",
+    "LineExtractor",
+    "PreprocessedPage",
+    "StageTimer",
+    "build_reference_grid",
+    "fix_random_seeds",
+    "get_default_engine",
+    "get_rate",
+    "preprocess_page",
+    "ratio_list",
+    "select_device",
+    "set_default_engine",
+    "transform",
+]
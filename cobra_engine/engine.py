@@ -0,0 +1,943 @@
+"""
+Cobra inference engine.
+
+This module provides the Engine class which owns the Cobra models (line
+extractor, CLIP image encoder, colorization pipeline and GSRP heads) and
+exposes the extract / retrieve / colorize / refine stages as methods.
+
+Importing this module has no side effects: nothing is downloaded or loaded
+until a stage needs it, and Gradio is not part of the import graph, so the
+CLI, the Gradio tabs and tests can share one warm instance.
+"""
+
+import copy
+import logging
+import os
+import random
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+from torchvision import transforms
+
+from cobra_utils.line_extractor import LineExtractor
+from cobra_utils.reference_index import ReferenceIndex, image_to_tensor, window_patches
+from cobra_utils.stage_timer import StageTimer, timed_stage
+from cobra_utils.style_bank import StyleBank
+from cobra_utils.utils import (
+    MultiHiddenResNetModel,
+    get_pixart_config,
+    init_causal_dit,
+    res_skip,
+)
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPO_ID = "JunhaoZhuang/Cobra"
+DEFAULT_BASE_MODEL = "PixArt-alpha/PixArt-XL-2-1024-MS"
+DEFAULT_STYLE = 'line + shadow'
+
+# Checkpoint sub-directories of each style (GSRP head, transformer LoRA + controlnet) and its LoRA adapter name
+STYLE_CKPT_DIRS = {
+    'line': ('line_GSRP', 'line_ckpt'),
+    'line + shadow': ('shadow_GSRP', 'shadow_ckpt'),
+}
+STYLE_ADAPTER_NAMES = {
+    'line': 'line',
+    'line + shadow': 'shadow',
+}
+
+# Supported (width, height) page resolutions; pages are resized to the closest aspect ratio
+ratio_list = [[800, 800], [768, 896], [704, 928], [672, 960], [640, 1024], [608, 1056], [576, 1088], [576, 1184]]
+ratio_list += [[896, 768], [928, 704], [960, 672], [1024, 640], [1056, 608], [1088, 576], [1184, 576]]
+
+transform = transforms.Compose([
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
+])
+
+LORA_RANK = 128
+LORA_TARGET_MODULES = [
+    "to_k",
+    "to_q",
+    "to_v",
+    "to_out.0",
+    "proj_in",
+    "proj_out",
+    "ff.net.0.proj",
+    "ff.net.2",
+    "proj",
+    "linear",
+    "linear_1",
+    "linear_2",
+]
+GSRP_BLOCK_OUT_CHANNELS = [128, 128, 256, 512, 512]
+
+
+def select_device(device=None) -> torch.device:
+    """
+    Select the torch device for inference.
+
+    Args:
+        device: Explicit device (string or torch.device). When None, CUDA is
+            preferred, then MPS, then CPU.
+
+    Returns:
+        The selected torch.device
+    """
+    if device is not None:
+        return torch.device(device)
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cpu")
+
+
+def fix_random_seeds(seed: int, device: torch.device) -> None:
+    """Seed Python, NumPy and torch (including the accelerator) RNGs."""
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    if device.type == "cuda":
+        torch.cuda.manual_seed(seed)
+        torch.cuda.manual_seed_all(seed)
+    elif device.type == "mps":
+        torch.mps.manual_seed(seed)
+
+
+def get_rate(image: Image.Image) -> List[int]:
+    """Return the entry of `ratio_list` whose aspect ratio is closest to the image's."""
+    input_rate = image.size[0] / image.size[1]
+    min_diff = float('inf')
+    best_idx = 0
+
+    for i, ratio in enumerate(ratio_list):
+        ratio_rate = ratio[0] / ratio[1]
+        diff = abs(input_rate - ratio_rate)
+        if diff < min_diff:
+            min_diff = diff
+            best_idx = i
+
+    return ratio_list[best_idx]
+
+
+def open_reference_image(reference) -> Image.Image:
+    """Open a reference given as a PIL image, a path, or an uploaded file object with a `name`."""
+    if isinstance(reference, Image.Image):
+        return reference
+    return Image.open(getattr(reference, 'name', reference))
+
+
+def build_reference_grid(reference_patches: Sequence[Image.Image], resolution: Tuple[int, int]) -> Image.Image:
+    """Tile the retrieved reference patches into one preview image of the page size."""
+    tar_width, tar_height = resolution
+    grid_N = int(np.ceil(np.sqrt(len(reference_patches))))
+    small_tar_width = tar_width//grid_N
+    small_tar_height = tar_height//grid_N
+    grid_img = Image.new('RGB', (grid_N*small_tar_width, grid_N*small_tar_height), 'black')
+    for i in range(len(reference_patches)):
+        grid_img.paste(reference_patches[i].resize((small_tar_width, small_tar_height)), (i%grid_N*small_tar_width, int(i/grid_N)*small_tar_height))
+
+    draw = ImageDraw.Draw(grid_img)
+    draw.text((0, 0), "Reference Images", fill='red', font_size=50)
+    return grid_img
+
+
+class PreprocessedPage(NamedTuple):
+    """CPU-side preparation of a page for Engine.extract (see preprocess_page)."""
+
+    image: Image.Image
+    resolution: List[int]
+    gray: Image.Image
+
+
+def preprocess_page(image: Image.Image) -> PreprocessedPage:
+    """
+    Decode and resize a page without touching any model.
+
+    This is the CPU-bound part of Engine.extract. Running it ahead of time
+    (e.g. on a prefetch thread) lets the accelerator start on the line
+    extraction network as soon as the page reaches the model.
+
+    Args:
+        image: Input page; lazily opened images are fully decoded here
+
+    Returns:
+        PreprocessedPage with the original page, its target resolution and
+        the grayscale page resized to that resolution
+    """
+    image.load()
+    resolution = get_rate(image)
+    gray = image.resize(tuple(resolution)).convert('L').convert('RGB')
+    return PreprocessedPage(image, resolution, gray)
+
+
+class LineExtraction(NamedTuple):
+    """Output of Engine.extract, in the order the Gradio single-image tab expects."""
+
+    extracted_line: Image.Image
+    hint_color: Image.Image
+    hint_mask: Image.Image
+    query_image_origin: Image.Image
+    extracted_image_ori: Image.Image
+    resolution: List[int]
+
+
+@dataclass
+class ColorizationResult:
+    """
+    Output of Engine.run.
+
+    Attributes:
+        image: Final GSRP-refined colorized page
+        line_image: Line art the page was colorized from
+        hint_mask: Hint mask at latent resolution
+        hint_color: Color hints at page resolution
+        reference_grid: Preview of the retrieved reference patches
+    """
+
+    image: Image.Image
+    line_image: Image.Image
+    hint_mask: Image.Image
+    hint_color: Image.Image
+    reference_grid: Image.Image
+
+    def gallery(self) -> List[Image.Image]:
+        """Return the images in the order of the Gradio output gallery."""
+        return [self.image, self.line_image, self.hint_mask, self.hint_color, self.reference_grid]
+
+
+class Engine:
+    """
+    Lazily-initialized Cobra inference engine.
+
+    Models are loaded on first use of the stage that needs them (or all at
+    once via `load()`): `extract` only needs the line extractor,
+    `build_reference_index`/`retrieve` the CLIP encoder, and
+    `colorize`/`refine` the colorization pipeline and GSRP heads. Loading is
+    guarded by a lock so concurrent callers share a single load.
+
+    Attributes:
+        device: Torch device the models run on
+        dtype: Weight dtype of the pipeline and GSRP heads
+        style: Active colorization style ('line' or 'line + shadow')
+    """
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        device=None,
+        dtype: torch.dtype = torch.float16,
+        style: str = DEFAULT_STYLE,
+        repo_id: str = DEFAULT_REPO_ID,
+        cache_dir: str = './Cobra/',
+        base_model: str = DEFAULT_BASE_MODEL,
+        prompt_tensor_dir: Optional[str] = None,
+        line_dtype: torch.dtype = torch.float32,
+        line_channels_last: bool = False,
+        compile_line_model: bool = False,
+        line_batch_size: int = 8,
+    ):
+        """
+        Initialize the Engine without loading any model.
+
+        Args:
+            model_path: Local Cobra checkpoint directory. Defaults to the
+                COBRA_MODEL_PATH environment variable, then to a snapshot of
+                `repo_id` downloaded on first use.
+            device: Device to run on; see select_device
+            dtype: Weight dtype of the pipeline and GSRP heads
+            style: Initial colorization style
+            repo_id: Hugging Face repository of the Cobra checkpoints
+            cache_dir: Download cache for `repo_id`
+            base_model: PixArt model the transformer, VAE and scheduler come from
+            prompt_tensor_dir: Directory with the fixed prompt tensors.
+                Defaults to `prompt_tensor/` at the repository root.
+            line_dtype: Compute dtype of the line extraction network;
+                float16/bfloat16 are only worthwhile on accelerators
+            line_channels_last: Run the line extraction network in
+                channels_last memory format
+            compile_line_model: Wrap the line extraction network with
+                torch.compile
+            line_batch_size: Maximum number of pages per line extraction
+                forward in extract_batch
+
+        Raises:
+            ValueError: If the style is unknown
+        """
+        self._validate_style(style)
+        self._model_path = model_path or os.environ.get("COBRA_MODEL_PATH")
+        self.device = select_device(device)
+        self.dtype = dtype
+        self.style = style
+        self.repo_id = repo_id
+        self.cache_dir = cache_dir
+        self.base_model = base_model
+        self.prompt_tensor_dir = prompt_tensor_dir or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prompt_tensor'
+        )
+
+        self.line_dtype = line_dtype
+        self.line_channels_last = line_channels_last
+        self.compile_line_model = compile_line_model
+        self.line_batch_size = line_batch_size
+
+        self._line_model = None
+        self._line_extractor = None
+        self._image_encoder = None
+        self._image_processor = None
+        self._pipeline = None
+        self._style_bank = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_components(
+        cls,
+        line_model=None,
+        image_encoder=None,
+        image_processor=None,
+        pipeline=None,
+        style_bank: Optional[StyleBank] = None,
+        **kwargs,
+    ) -> "Engine":
+        """
+        Build an Engine around already-constructed models.
+
+        Components that are not given are still loaded lazily from the
+        checkpoint. When `pipeline` is given, `style_bank` provides its
+        controlnet and GSRP head per style.
+
+        Args:
+            line_model: Line extraction network (`res_skip`)
+            image_encoder: `CLIPVisionModelWithProjection`
+            image_processor: `CLIPImageProcessor`
+            pipeline: `CobraPixArtAlphaPipeline`
+            style_bank: StyleBank holding every style's weights
+            **kwargs: Forwarded to Engine.__init__
+
+        Returns:
+            Engine using the given components
+        """
+        engine = cls(**kwargs)
+        engine._line_model = line_model
+        engine._image_encoder = image_encoder
+        engine._image_processor = image_processor
+        if pipeline is not None:
+            engine._pipeline = pipeline
+            engine._style_bank = style_bank
+            engine._activate_style()
+        return engine
+
+    @staticmethod
+    def _validate_style(style: str) -> None:
+        if style not in STYLE_CKPT_DIRS:
+            raise ValueError("Invalid style: {}".format(style))
+
+    @property
+    def model_path(self) -> str:
+        """Local checkpoint directory, downloaded from `repo_id` on first access."""
+        with self._lock:
+            if self._model_path is None:
+                from huggingface_hub import snapshot_download
+
+                self._model_path = snapshot_download(repo_id=self.repo_id, cache_dir=self.cache_dir, repo_type="model")
+                logger.info(f"Cobra checkpoints at {self._model_path}")
+            return self._model_path
+
+    @property
+    def line_model(self):
+        """Line extraction network, loaded on first access."""
+        if self._line_model is None:
+            self.load_line_model()
+        return self._line_model
+
+    @property
+    def line_extractor(self) -> LineExtractor:
+        """Batched runner of the line extraction network, created on first access."""
+        if self._line_extractor is None:
+            line_model = self.line_model
+            with self._lock:
+                if self._line_extractor is None:
+                    self._line_extractor = LineExtractor(
+                        line_model,
+                        self.device,
+                        dtype=self.line_dtype,
+                        channels_last=self.line_channels_last,
+                        compile=self.compile_line_model,
+                        max_batch_size=self.line_batch_size,
+                    )
+        return self._line_extractor
+
+    @property
+    def image_encoder(self):
+        """CLIP image encoder, loaded on first access."""
+        if self._image_encoder is None:
+            self.load_image_encoder()
+        return self._image_encoder
+
+    @property
+    def image_processor(self):
+        """CLIP image processor, created on first access."""
+        if self._image_processor is None:
+            self.load_image_encoder()
+        return self._image_processor
+
+    @property
+    def pipeline(self):
+        """Colorization pipeline, loaded on first access."""
+        if self._pipeline is None:
+            self.load_pipeline()
+        return self._pipeline
+
+    @property
+    def style_bank(self) -> StyleBank:
+        """Resident weights of every style, loaded with the pipeline."""
+        if self._pipeline is None:
+            self.load_pipeline()
+        return self._style_bank
+
+    @property
+    def gsrp_model(self):
+        """GSRP head (`MultiHiddenResNetModel`) of the active style."""
+        return self.style_bank.activate(self.style).gsrp_model
+
+    def is_loaded(self) -> bool:
+        """Return True when every model has been loaded."""
+        return all(
+            component is not None
+            for component in (self._line_model, self._image_encoder, self._pipeline)
+        )
+
+    def load(self) -> "Engine":
+        """Load every model now instead of on first use."""
+        self.load_line_model()
+        self.load_image_encoder()
+        self.load_pipeline()
+        return self
+
+    def load_line_model(self) -> None:
+        """Load the line extraction network if it is not loaded yet."""
+        with self._lock:
+            if self._line_model is not None:
+                return
+            line_model = res_skip()
+            line_model.load_state_dict(torch.load(os.path.join(self.model_path, 'LE', 'erika.pth'), map_location=self.device))
+            line_model.eval()
+            self._line_model = line_model.to(self.device)
+            logger.info("Loaded line extraction model")
+
+    def load_image_encoder(self) -> None:
+        """Load the CLIP image encoder and processor if they are not loaded yet."""
+        with self._lock:
+            if self._image_processor is None:
+                from transformers import CLIPImageProcessor
+
+                self._image_processor = CLIPImageProcessor()
+            if self._image_encoder is None:
+                from transformers import CLIPVisionModelWithProjection
+
+                # retrieval only ranks embeddings, so half precision is enough on accelerators
+                encoder_dtype = torch.float32 if self.device.type == "cpu" else self.dtype
+                self._image_encoder = CLIPVisionModelWithProjection.from_pretrained(
+                    os.path.join(self.model_path, 'image_encoder'), torch_dtype=encoder_dtype
+                ).to(self.device)
+                logger.info("Loaded CLIP image encoder")
+
+    def load_pipeline(self) -> None:
+        """
+        Build the colorization pipeline if it is not loaded yet.
+
+        Every style's transformer LoRA, controlnet and GSRP head is loaded
+        into a StyleBank so that style switches never read from disk.
+        """
+        with self._lock:
+            if self._pipeline is not None:
+                return
+            from peft import LoraConfig
+            from diffusers import (
+                CausalSparseDiTControlModel,
+                CausalSparseDiTModel,
+                CobraPixArtAlphaPipeline,
+                PixArtTransformer2DModel,
+            )
+
+            pixart_config = get_pixart_config()
+            model_kwargs = dict(
+                num_attention_heads=pixart_config.get("num_attention_heads"),
+                attention_head_dim=pixart_config.get("attention_head_dim"),
+                in_channels=pixart_config.get("in_channels"),
+                out_channels=pixart_config.get("out_channels"),
+                num_layers=pixart_config.get("num_layers"),
+                dropout=pixart_config.get("dropout"),
+                norm_num_groups=pixart_config.get("norm_num_groups"),
+                cross_attention_dim=pixart_config.get("cross_attention_dim"),
+                attention_bias=pixart_config.get("attention_bias"),
+                sample_size=pixart_config.get("sample_size"),
+                patch_size=pixart_config.get("patch_size"),
+                activation_fn=pixart_config.get("activation_fn"),
+                num_embeds_ada_norm=pixart_config.get("num_embeds_ada_norm"),
+                upcast_attention=pixart_config.get("upcast_attention"),
+                norm_type=pixart_config.get("norm_type"),
+                norm_elementwise_affine=pixart_config.get("norm_elementwise_affine"),
+                norm_eps=pixart_config.get("norm_eps"),
+                caption_channels=pixart_config.get("caption_channels"),
+                attention_type=pixart_config.get("attention_type"),
+            )
+
+            transformer = PixArtTransformer2DModel.from_pretrained(
+                self.base_model, subfolder="transformer", revision=None, variant=None
+            )
+            causal_dit = init_causal_dit(CausalSparseDiTModel(**model_kwargs), transformer)
+            del transformer
+            logger.info("Loaded causal_dit")
+
+            transformer_lora_config = LoraConfig(
+                r=LORA_RANK,
+                lora_alpha=LORA_RANK,
+                init_lora_weights="gaussian",
+                target_modules=LORA_TARGET_MODULES,
+            )
+
+            # both styles stay resident: one LoRA adapter, controlnet and GSRP head per style
+            style_bank = StyleBank(causal_dit, transformer_lora_config)
+            for style, (gsrp_dir, ckpt_dir) in STYLE_CKPT_DIRS.items():
+                gsrp_model = MultiHiddenResNetModel(GSRP_BLOCK_OUT_CHANNELS, len(GSRP_BLOCK_OUT_CHANNELS))
+                gsrp_model.load_state_dict(self._load_checkpoint(gsrp_dir, 'MultiResNetModel.bin'), strict=True)
+
+                controlnet = CausalSparseDiTControlModel(cond_chanels=9, **model_kwargs)
+                controlnet.load_state_dict(self._load_checkpoint(ckpt_dir, 'controlnet.bin'), strict=True)
+
+                lora_state_dict = self._load_checkpoint(ckpt_dir, 'transformer_lora_pos.bin')
+                style_bank.add_style(style, STYLE_ADAPTER_NAMES[style], lora_state_dict, controlnet, gsrp_model)
+                logger.info(f"Loaded {style} ckpt")
+
+            causal_dit.to(self.device, dtype=self.dtype)
+            style_bank.to(self.device, dtype=self.dtype)
+            active = style_bank.activate(self.style)
+
+            pipeline = CobraPixArtAlphaPipeline.from_pretrained(
+                self.base_model,
+                transformer=causal_dit,
+                controlnet=active.controlnet,
+                safety_checker=None,
+                revision=None,
+                variant=None,
+                torch_dtype=self.dtype,
+            )
+            pipeline = pipeline.to(self.device)
+            pipeline.load_prompt_embeds(self.prompt_tensor_dir)
+
+            self._style_bank = style_bank
+            self._pipeline = pipeline
+
+    def _load_checkpoint(self, *parts: str):
+        return torch.load(os.path.join(self.model_path, *parts), map_location=self.device)
+
+    def _activate_style(self):
+        active = self._style_bank.activate(self.style)
+        self._pipeline.controlnet = active.controlnet
+        return active
+
+    def set_style(self, style: str) -> str:
+        """
+        Switch the active colorization style.
+
+        When the pipeline is loaded this swaps the active LoRA adapter,
+        controlnet and GSRP head; otherwise the style is applied at load time.
+
+        Args:
+            style: 'line' or 'line + shadow'
+
+        Returns:
+            The active style
+
+        Raises:
+            ValueError: If the style is unknown
+        """
+        self._validate_style(style)
+        with self._lock:
+            self.style = style
+            if self._pipeline is not None:
+                self._activate_style()
+        return style
+
+    def empty_cache(self) -> None:
+        """Release cached accelerator memory."""
+        if self.device.type == "cuda":
+            torch.cuda.empty_cache()
+        elif self.device.type == "mps":
+            torch.mps.empty_cache()
+
+    def extract_lines(self, image: Image.Image) -> Image.Image:
+        """Run the line extraction network on a grayscale version of `image`."""
+        return Image.fromarray(self.extract_lines_batch([image])[0].cpu().numpy())
+
+    def extract_lines_batch(self, images: Sequence[Image.Image]) -> List[torch.Tensor]:
+        """
+        Run the line extraction network on many pages at once.
+
+        Pages sharing a padded size are stacked into batches of
+        `line_batch_size`; see LineExtractor.
+
+        Args:
+            images: Pages as PIL images or uint8 arrays
+
+        Returns:
+            One (H, W) uint8 line art tensor per page, on the engine's device
+        """
+        return self.line_extractor.extract(images)
+
+    def extract_line_image(self, query_image_: Image.Image, resolution) -> Tuple[Image.Image, Image.Image]:
+        """Resize the page to `resolution`, extract its line art and create an empty hint mask."""
+        tar_width, tar_height = resolution
+        query_image = query_image_.resize((tar_width, tar_height))
+        query_image = query_image.convert('L').convert('RGB')
+        extracted_line = self.extract_lines(query_image)
+        extracted_line = extracted_line.convert('L').convert('RGB')
+        self.empty_cache()
+        return extracted_line, Image.new('RGB', (tar_width, tar_height), 'black')
+
+    def extract(self, query_image_, style: Optional[str] = None, stage_timer: Optional[StageTimer] = None) -> LineExtraction:
+        """
+        Extraction stage: produce the line art of a page.
+
+        For 'line + shadow' the dark and mid-tone regions of the page are
+        kept as shadow tones on top of the extracted lines.
+
+        Args:
+            query_image_: Input page, or a PreprocessedPage from preprocess_page
+            style: Style to switch to first; defaults to the active style
+            stage_timer: Optional StageTimer timing the "line_extraction" stage
+
+        Returns:
+            LineExtraction for the page
+        """
+        return self.extract_batch([query_image_], style=style, stage_timer=stage_timer)[0]
+
+    def extract_batch(
+        self, query_images: Sequence[Any], style: Optional[str] = None, stage_timer: Optional[StageTimer] = None
+    ) -> List[LineExtraction]:
+        """
+        Extraction stage for many pages, with batched line extraction.
+
+        Args:
+            query_images: Input pages, or PreprocessedPages from preprocess_page
+            style: Style to switch to first; defaults to the active style
+            stage_timer: Optional StageTimer timing the batch's "line_extraction" stage
+
+        Returns:
+            One LineExtraction per page, in input order
+        """
+        if style is not None and style != self.style:
+            self.set_style(style)
+        input_style = self.style
+
+        pages = [page if isinstance(page, PreprocessedPage) else preprocess_page(page) for page in query_images]
+        with timed_stage(stage_timer, "line_extraction"):
+            lines = [line.cpu().numpy() for line in self.extract_lines_batch([page.gray for page in pages])]
+        return [self._add_shadow_tones(page, line, input_style) for page, line in zip(pages, lines)]
+
+    @staticmethod
+    def _add_shadow_tones(page: PreprocessedPage, line: np.ndarray, input_style: str) -> LineExtraction:
+        """Build the LineExtraction of a page from its (H, W) uint8 line art."""
+        query_image_, resolution = page.image, page.resolution
+        extracted_line = Image.fromarray(line).convert('RGB')
+        hint_mask = Image.new('RGB', tuple(resolution), 'black')
+        extracted_sketch_line = Image.blend(extracted_line, extracted_line, 0.5)
+
+        extracted_sketch_line_ori = copy.deepcopy(extracted_sketch_line)
+
+        extracted_sketch_line_np = np.array(extracted_sketch_line)
+        extracted_sketch_line = Image.fromarray(np.uint8(extracted_sketch_line_np))
+        if input_style == 'line + shadow':
+            black_rate = 74
+            black_value = 18
+            gary_rate = 155
+            up_bound = 145
+            ori_np = np.array(extracted_sketch_line_ori)
+            query_image_np = np.array(page.gray)
+            extracted_sketch_line_np = np.array(extracted_sketch_line.convert('L').convert('RGB'))
+            ori_np[query_image_np <= black_rate] = black_value
+            ori_np[(ori_np > gary_rate) & (query_image_np < up_bound) & (query_image_np > black_rate)] = gary_rate
+            extracted_sketch_line_ori = Image.fromarray(np.uint8(ori_np))
+
+            extracted_sketch_line_np[query_image_np <= black_rate] = black_value
+            extracted_sketch_line_np[(extracted_sketch_line_np > gary_rate) & (query_image_np < up_bound) & (query_image_np > black_rate)] = gary_rate
+            extracted_sketch_line = Image.fromarray(np.uint8(extracted_sketch_line_np))
+
+        return LineExtraction(
+            extracted_sketch_line.convert('RGB'),
+            extracted_sketch_line.convert('RGB'),
+            hint_mask,
+            query_image_,
+            extracted_sketch_line_ori.convert('RGB'),
+            resolution,
+        )
+
+    def build_reference_index(self, reference_images: Sequence[Any]) -> ReferenceIndex:
+        """
+        Wrap reference images in a ReferenceIndex bound to the CLIP encoder.
+
+        Args:
+            reference_images: PIL images, paths, or uploaded files with a `name`
+
+        Returns:
+            ReferenceIndex shared by every page colorized with these references
+        """
+        images = [open_reference_image(reference) for reference in reference_images]
+        return ReferenceIndex(images, self.image_encoder, self.image_processor, self.device)
+
+    def retrieve(self, query_image_origin: Image.Image, resolution, top_k: int, reference_index: ReferenceIndex) -> List[List[Image.Image]]:
+        """
+        Retrieval stage: select reference patches for each quadrant of the page.
+
+        Args:
+            query_image_origin: Original (color or gray) page
+            resolution: Target (width, height) of the page
+            top_k: Number of reference patches per query patch
+            reference_index: Index of the batch's reference images
+
+        Returns:
+            One list of reference patches at half the page size per query patch
+        """
+        tar_width, tar_height = resolution
+        query_patches = window_patches(image_to_tensor(query_image_origin.resize((tar_width, tar_height))))
+
+        with torch.no_grad():
+            query_embeddings = reference_index.encode(query_patches)
+            top_k_patches = reference_index.retrieve(query_embeddings, (tar_width, tar_height), top_k)
+        return [[patch.resize((tar_width//2, tar_height//2)).convert('RGB') for patch in patches] for patches in top_k_patches]
+
+    def colorize(
+        self,
+        extracted_line: Image.Image,
+        reference_patches: List[List[Image.Image]],
+        resolution,
+        seed: int,
+        num_inference_steps: int,
+        hint_mask: Image.Image,
+        hint_color: Image.Image,
+        reference_cache=None,
+        **pipeline_kwargs,
+    ) -> Image.Image:
+        """
+        Colorization stage: denoise the page at `resolution`.
+
+        Args:
+            extracted_line: Line art of the page
+            reference_patches: Output of Engine.retrieve
+            resolution: Target (width, height) of the page
+            seed: Seed of the denoising generator
+            num_inference_steps: Number of denoising steps
+            hint_mask: Hint mask (resized to latent resolution here)
+            hint_color: Color hints at page resolution
+            reference_cache: Optional ReferenceContextCache reusing the
+                reference K/V cache across pages with the same references
+            **pipeline_kwargs: Extra CobraPixArtAlphaPipeline arguments
+
+        Returns:
+            Colorized page at `resolution`
+        """
+        from diffusers import CobraReferenceContext
+
+        tar_width, tar_height = resolution
+        pipeline = self.pipeline
+        query_image_bw = extracted_line.resize((tar_width, tar_height))
+        generator = torch.Generator(device=self.device).manual_seed(seed)
+        hint_mask = hint_mask.resize((tar_width//pipeline.vae_scale_factor, tar_height//pipeline.vae_scale_factor)).convert('RGB')
+        hint_color = hint_color.convert('RGB')
+
+        # reuse the reference K/V cache when the same patches were retrieved for this resolution and style
+        reference_context = None
+        if reference_cache is not None:
+            context_key = CobraReferenceContext.build_key(reference_patches, tar_height, tar_width, style=self.style)
+            reference_context = reference_cache.get(context_key)
+
+        pipeline_output = pipeline(
+            cond_input=query_image_bw.convert('RGB'),
+            cond_refs=reference_patches,
+            hint_mask=hint_mask,
+            hint_color=hint_color,
+            num_inference_steps=num_inference_steps,
+            generator=generator,
+            reference_context=reference_context,
+            return_reference_context=reference_cache is not None,
+            **pipeline_kwargs,
+        )
+        if reference_cache is not None and reference_context is None:
+            reference_context = pipeline_output[1]
+            reference_context.key = context_key
+            reference_cache.put(context_key, reference_context)
+        return pipeline_output[0][0]
+
+    def refine(
+        self,
+        colorized_image: Image.Image,
+        extracted_image_ori: Image.Image,
+        resolution,
+        scale: float = 1.5,
+        tile_size: Optional[int] = None,
+    ) -> Image.Image:
+        """
+        Refinement stage: upsample the colorized page with the GSRP head.
+
+        The colorized page and the line art are encoded at `scale` times the
+        page resolution and the VAE decodes with the GSRP-fused hidden states.
+        With `tile_size` set, encode, GSRP fusion and decode run per
+        overlapping tile (see AutoencoderKL.tiled_refine), so 2x-3x scales
+        fit in the memory of a single tile.
+
+        Args:
+            colorized_image: Output of Engine.colorize
+            extracted_image_ori: Line art with shadow tones from Engine.extract
+            resolution: Target (width, height) of the page
+            scale: Upscaling factor of the refined page
+            tile_size: Optional tile size in pixels of the refined page
+
+        Returns:
+            Refined page at `scale` times `resolution`, rounded down to
+            multiples of the VAE scale factor
+        """
+        tar_width, tar_height = resolution
+        pipeline = self.pipeline
+        gsrp_model = self.gsrp_model
+        vae_scale_factor = pipeline.vae_scale_factor
+        refine_size = (
+            int(tar_width*scale) // vae_scale_factor * vae_scale_factor,
+            int(tar_height*scale) // vae_scale_factor * vae_scale_factor,
+        )
+        query_image_vae = extracted_image_ori.resize(refine_size)
+        with torch.no_grad():
+            up_img = colorized_image.resize(query_image_vae.size)
+            test_low_color = transform(up_img).unsqueeze(0).to(self.device, dtype=self.dtype)
+            query_image_vae_ = transform(query_image_vae).unsqueeze(0).to(self.device, dtype=self.dtype)
+
+            def refine_hidden(hidden_list_color, hidden_list_bw):
+                hidden_list_double = [torch.cat((hidden_list_color[hidden_idx], hidden_list_bw[hidden_idx]), dim=1) for hidden_idx in range(len(hidden_list_color))]
+                return gsrp_model(hidden_list_double)
+
+            if tile_size is not None:
+                output = pipeline.vae.tiled_refine(test_low_color, query_image_vae_, refine_hidden, tile_size=tile_size)
+            else:
+                h_color, hidden_list_color = pipeline.vae._encode(test_low_color, return_dict=False, hidden_flag=True)
+                _, hidden_list_bw = pipeline.vae._encode(query_image_vae_, return_dict=False, hidden_flag=True)
+                hidden_list = refine_hidden(hidden_list_color, hidden_list_bw)
+                output = pipeline.vae._decode(h_color.sample(), return_dict=False, hidden_list=hidden_list)[0]
+
+            output[output > 1] = 1
+            output[output < -1] = -1
+            high_res_image = Image.fromarray(((output[0] * 0.5 + 0.5).permute(1, 2, 0).detach().cpu().numpy() * 255).astype(np.uint8)).convert("RGB")
+        self.empty_cache()
+        return high_res_image
+
+    def run(
+        self,
+        extracted_line: Image.Image,
+        reference_index: ReferenceIndex,
+        resolution,
+        seed: int,
+        num_inference_steps: int,
+        top_k: int,
+        hint_mask: Image.Image,
+        hint_color: Image.Image,
+        query_image_origin: Image.Image,
+        extracted_image_ori: Image.Image,
+        reference_cache=None,
+        progress: Optional[Callable[[str], Any]] = None,
+        stage_timer: Optional[StageTimer] = None,
+        refine_scale: float = 1.5,
+        refine_tile_size: Optional[int] = None,
+        **pipeline_kwargs,
+    ) -> ColorizationResult:
+        """
+        Run retrieval, colorization and refinement for one extracted page.
+
+        Args:
+            extracted_line: Line art from Engine.extract
+            reference_index: Index of the batch's reference images
+            resolution: Target (width, height) of the page
+            seed: Random seed
+            num_inference_steps: Number of denoising steps
+            top_k: Number of reference patches per query patch
+            hint_mask: Hint mask from Engine.extract (or user edited)
+            hint_color: Color hints from Engine.extract (or user edited)
+            query_image_origin: Original page from Engine.extract
+            extracted_image_ori: Line art with shadow tones from Engine.extract
+            reference_cache: Optional ReferenceContextCache
+            progress: Optional callable receiving a message before each stage
+            stage_timer: Optional StageTimer timing the "retrieval" and
+                "gsrp_refine" stages and the pipeline's stages
+            refine_scale: Upscaling factor of the GSRP refinement
+            refine_tile_size: Optional tile size of the GSRP refinement
+            **pipeline_kwargs: Extra CobraPixArtAlphaPipeline arguments
+
+        Returns:
+            ColorizationResult for the page
+        """
+        report = progress or (lambda message: None)
+        fix_random_seeds(seed, self.device)
+        tar_width, tar_height = resolution
+
+        report("Image retrieval in progress...")
+        with timed_stage(stage_timer, "retrieval"):
+            reference_patches = self.retrieve(query_image_origin, resolution, top_k, reference_index)
+        reference_grid = build_reference_grid([patch for patches in reference_patches for patch in patches], resolution)
+
+        report("Model inference in progress...")
+        colorized_image = self.colorize(
+            extracted_line,
+            reference_patches,
+            resolution,
+            seed,
+            num_inference_steps,
+            hint_mask,
+            hint_color,
+            reference_cache=reference_cache,
+            stage_timer=stage_timer,
+            **pipeline_kwargs,
+        )
+
+        report("Post-processing image...")
+        with timed_stage(stage_timer, "gsrp_refine"):
+            high_res_image = self.refine(
+                colorized_image, extracted_image_ori, resolution, scale=refine_scale, tile_size=refine_tile_size
+            )
+        report("Colorization complete!")
+
+        return ColorizationResult(
+            image=high_res_image,
+            line_image=extracted_line.resize((tar_width, tar_height)),
+            hint_mask=hint_mask.resize((tar_width//self.pipeline.vae_scale_factor, tar_height//self.pipeline.vae_scale_factor)).convert('RGB'),
+            hint_color=hint_color.convert('RGB'),
+            reference_grid=reference_grid,
+        )
+
+
+_default_engine: Optional[Engine] = None
+_default_engine_lock = threading.Lock()
+
+
+def get_default_engine() -> Engine:
+    """
+    Return the process-wide Engine shared by the Gradio tabs and the CLI.
+
+    The engine is created on first call; its models still load lazily.
+    """
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = Engine()
+        return _default_engine
+
+
+def set_default_engine(engine: Optional[Engine]) -> None:
+    """Replace the process-wide Engine (None resets it)."""
+    global _default_engine
+    with _default_engine_lock:
+        _default_engine = engine
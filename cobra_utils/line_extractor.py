@@ -0,0 +1,115 @@
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+
+# res_skip downsamples four times, so its input sides must be multiples of 16
+LINE_MODEL_MULTIPLE = 16
+# Value the network input is padded with (the checkpoint expects this, not white)
+PAD_VALUE = 1.0
+
+
+def to_gray_array(image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+    """Convert a page to the (H, W) uint8 grayscale array the line model reads."""
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    if image.mode == 'L':
+        return np.asarray(image)
+    return cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2GRAY)
+
+
+class LineExtractor:
+    """
+    Batched runner for the `res_skip` line extraction network.
+
+    Pages are grouped by their padded size (pages of one `ratio_list` resolution bucket share it), stacked into one
+    tensor per group and run `max_batch_size` at a time. The network can run in float16/bfloat16, in channels_last
+    memory format and through `torch.compile`; since the model is batch-norm in eval mode, batching does not change
+    the per-page output. Results are returned as uint8 tensors, so callers that stay on tensors skip the PIL round
+    trip.
+
+    The model is converted in place, so the extractor should be the only user of it.
+
+    Args:
+        model: `res_skip` network in eval mode.
+        device: Device to run on.
+        dtype: Compute dtype of the network.
+        channels_last: Whether to run the network in channels_last memory format.
+        compile: Whether to wrap the network with `torch.compile`.
+        max_batch_size: Maximum number of pages per forward.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        device,
+        dtype: torch.dtype = torch.float32,
+        channels_last: bool = False,
+        compile: bool = False,
+        max_batch_size: int = 8,
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+        self.device = torch.device(device)
+        self.dtype = dtype
+        self.channels_last = channels_last
+        self.max_batch_size = max_batch_size
+
+        model = model.to(self.device, dtype=dtype)
+        if channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        self.model = model
+        self._forward = torch.compile(model) if compile else model
+
+    @staticmethod
+    def padded_size(height: int, width: int) -> Tuple[int, int]:
+        """Network input size of a page of `height` x `width`."""
+        multiple = LINE_MODEL_MULTIPLE
+        return -(-height // multiple) * multiple, -(-width // multiple) * multiple
+
+    @torch.no_grad()
+    def _run(self, pages: List[np.ndarray], padded: Tuple[int, int]) -> torch.Tensor:
+        """Run one batch of grayscale pages sharing a padded size; returns (n, H_pad, W_pad) uint8 on device."""
+        rows, cols = padded
+        batch = []
+        for page in pages:
+            tensor = torch.from_numpy(page).to(self.device, non_blocking=True)
+            tensor = F.pad(tensor[None].to(self.dtype), (0, cols - page.shape[1], 0, rows - page.shape[0]), value=PAD_VALUE)
+            batch.append(tensor)
+        batch = torch.stack(batch)
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        output = self._forward(batch)
+        return output[:, 0].float().clamp_(0, 255).to(torch.uint8)
+
+    def extract(self, images: Sequence[Union[Image.Image, np.ndarray]]) -> List[torch.Tensor]:
+        """
+        Extract the line art of `images`.
+
+        Args:
+            images: Pages as PIL images or uint8 arrays (grayscale or RGB).
+
+        Returns:
+            One (H, W) uint8 tensor per page, in input order and on the extractor's device.
+        """
+        pages = [to_gray_array(image) for image in images]
+        groups: Dict[Tuple[int, int], List[int]] = OrderedDict()
+        for idx, page in enumerate(pages):
+            groups.setdefault(self.padded_size(*page.shape), []).append(idx)
+
+        results: List[torch.Tensor] = [None] * len(pages)
+        for padded, indices in groups.items():
+            for start in range(0, len(indices), self.max_batch_size):
+                chunk = indices[start:start + self.max_batch_size]
+                output = self._run([pages[idx] for idx in chunk], padded)
+                for row, idx in enumerate(chunk):
+                    height, width = pages[idx].shape
+                    results[idx] = output[row, :height, :width]
+        return results
@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+from cobra_utils.utils import process_image
+
+
+Patch = Union[Image.Image, torch.Tensor]
+
+
+def image_to_tensor(image: Image.Image) -> torch.Tensor:
+    """Convert a PIL image to a (3, H, W) uint8 tensor."""
+    return torch.from_numpy(np.array(image.convert('RGB'))).permute(2, 0, 1)
+
+
+def tensor_to_image(tensor: torch.Tensor) -> Image.Image:
+    """Convert a (3, H, W) uint8 tensor to a PIL image."""
+    return Image.fromarray(tensor.permute(1, 2, 0).cpu().numpy())
+
+
+def window_patches(image: torch.Tensor) -> List[torch.Tensor]:
+    """
+    Tensor equivalent of the crops of `process_image_Q_varres`.
+
+    Extracts the overlapping windows of three quarters of the page size with a stride of a quarter of the page size
+    (a 2x2 grid for ordinary page sizes), row by row. The windows are views of `image`.
+
+    Args:
+        image: (3, H, W) page already resized to the target resolution.
+
+    Returns:
+        The windows as (3, H // 4 * 3, W // 4 * 3) tensors.
+    """
+    height, width = image.shape[-2:]
+    windows = image.unfold(1, height // 4 * 3, height // 4).unfold(2, width // 4 * 3, width // 4)
+    return [windows[:, row, col] for row in range(windows.shape[1]) for col in range(windows.shape[2])]
+
+
+def reference_patches(image: torch.Tensor) -> List[torch.Tensor]:
+    """Tensor equivalent of `process_image_ref_varres`: the resized reference followed by its windows."""
+    return [image] + window_patches(image)
+
+
+def clip_preprocess(images: torch.Tensor, image_processor, device, dtype: torch.dtype) -> torch.Tensor:
+    """
+    Batched tensor version of `CLIPImageProcessor` for uint8 images of one size.
+
+    Resizes the shortest edge with one antialiased bicubic `interpolate`, center crops, rescales and normalizes in
+    place, following the processor's configuration. The result differs from the PIL path only by resampling
+    round-off.
+
+    Args:
+        images: (n, 3, H, W) uint8 images.
+        image_processor: `CLIPImageProcessor` whose configuration is followed.
+        device: Device to preprocess on.
+        dtype: Dtype of the returned pixel values.
+
+    Returns:
+        (n, 3, crop_height, crop_width) pixel values.
+    """
+    pixel_values = images.to(device, non_blocking=True).float()
+    if image_processor.do_resize:
+        height, width = pixel_values.shape[-2:]
+        shortest_edge = image_processor.size["shortest_edge"]
+        if height <= width:
+            size = (shortest_edge, int(shortest_edge * width / height))
+        else:
+            size = (int(shortest_edge * height / width), shortest_edge)
+        pixel_values = F.interpolate(pixel_values, size=size, mode="bicubic", align_corners=False, antialias=True)
+        # the PIL path stores the resized image as uint8
+        pixel_values.clamp_(0, 255).round_()
+    if image_processor.do_center_crop:
+        height, width = pixel_values.shape[-2:]
+        crop_height, crop_width = image_processor.crop_size["height"], image_processor.crop_size["width"]
+        top, left = (height - crop_height) // 2, (width - crop_width) // 2
+        pixel_values = pixel_values[..., top:top + crop_height, left:left + crop_width]
+    if image_processor.do_rescale:
+        pixel_values = pixel_values * image_processor.rescale_factor
+    if image_processor.do_normalize:
+        mean = torch.tensor(image_processor.image_mean, device=pixel_values.device).view(1, -1, 1, 1)
+        std = torch.tensor(image_processor.image_std, device=pixel_values.device).view(1, -1, 1, 1)
+        pixel_values.sub_(mean).div_(std)
+    return pixel_values.to(dtype)
+
+
+class ReferenceBucket:
+    """Reference patches and their L2-normalized CLIP embeddings for one target resolution."""
+
+    def __init__(self, resolution: Tuple[int, int], patches: List[torch.Tensor], embeddings: torch.Tensor):
+        self.resolution = resolution
+        self.patches = patches  # (3, h, w) uint8 views of the resized reference images
+        self.embeddings = embeddings  # (n_patches, dim), unit norm, on the encoder device
+
+    def __len__(self):
+        return len(self.patches)
+
+
+class ReferenceIndex:
+    """
+    Reference patch index shared by every page of a batch.
+
+    Every reference image is resized to a resolution bucket (an entry of `ratio_list`) once with `process_image` and
+    kept as a uint8 tensor; its patches (the whole image and the overlapping windows of `process_image_ref_varres`)
+    are views of it. The patches are preprocessed with batched tensor ops (see `clip_preprocess`) and encoded by the
+    CLIP image encoder in chunks of `encode_batch_size`, once per bucket. Retrieval for a page is then a single matmul
+    of the normalized query embeddings against the bucket followed by `topk`; only the selected patches are converted
+    back to PIL.
+
+    Args:
+        reference_images: Reference images as PIL images.
+        image_encoder: `CLIPVisionModelWithProjection` used to embed patches.
+        image_processor: `CLIPImageProcessor` matching the encoder.
+        device: Device the embeddings are kept on.
+        encode_batch_size: Number of patches per encoder forward.
+    """
+
+    def __init__(self, reference_images: Sequence[Image.Image], image_encoder, image_processor, device, encode_batch_size: int = 64):
+        self.reference_images = list(reference_images)
+        self.image_encoder = image_encoder
+        self.image_processor = image_processor
+        self.device = device
+        self.encode_batch_size = encode_batch_size
+        self._buckets: Dict[Tuple[int, int], ReferenceBucket] = {}
+
+    @torch.no_grad()
+    def encode(self, patches: Sequence[Patch]) -> torch.Tensor:
+        """
+        Embed patches with the CLIP encoder.
+
+        Patches of the same size are stacked and preprocessed together, `encode_batch_size` at a time.
+
+        Args:
+            patches: PIL images or (3, h, w) uint8 tensors.
+
+        Returns:
+            Unit-norm embeddings of shape (n, dim), in input order.
+        """
+        patches = [image_to_tensor(patch) if isinstance(patch, Image.Image) else patch for patch in patches]
+        groups: Dict[Tuple[int, int], List[int]] = OrderedDict()
+        for idx, patch in enumerate(patches):
+            groups.setdefault(tuple(patch.shape[-2:]), []).append(idx)
+
+        embeddings = [None] * len(patches)
+        for indices in groups.values():
+            for start in range(0, len(indices), self.encode_batch_size):
+                chunk = indices[start:start + self.encode_batch_size]
+                batch = torch.stack([patches[idx] for idx in chunk])
+                pixel_values = clip_preprocess(batch, self.image_processor, self.device, self.image_encoder.dtype)
+                for idx, embedding in zip(chunk, self.image_encoder(pixel_values).image_embeds):
+                    embeddings[idx] = embedding
+        return F.normalize(torch.stack(embeddings).float(), dim=-1)
+
+    def get_bucket(self, resolution: Tuple[int, int]) -> ReferenceBucket:
+        """Return the bucket for `resolution` (width, height), building it on first use."""
+        resolution = tuple(resolution)
+        bucket = self._buckets.get(resolution)
+        if bucket is None:
+            tar_width, tar_height = resolution
+            patches = []
+            for reference_image in self.reference_images:
+                patches += reference_patches(image_to_tensor(process_image(reference_image, tar_width, tar_height)))
+            bucket = ReferenceBucket(resolution, patches, self.encode(patches))
+            self._buckets[resolution] = bucket
+        return bucket
+
+    def prepare(self, resolutions: Sequence[Tuple[int, int]]) -> None:
+        """Build the buckets for `resolutions` ahead of time."""
+        for resolution in resolutions:
+            self.get_bucket(resolution)
+
+    @torch.no_grad()
+    def retrieve(self, query_embeddings: torch.Tensor, resolution: Tuple[int, int], top_k: int) -> List[List[Image.Image]]:
+        """
+        Select the `top_k` most similar reference patches for every query patch.
+
+        Args:
+            query_embeddings: Query patch embeddings of shape (n_query, dim); normalized here.
+            resolution: Target (width, height) bucket of the page.
+            top_k: Number of patches per query.
+
+        Returns:
+            One list of reference patches per query patch, most similar first.
+        """
+        bucket = self.get_bucket(resolution)
+        query_embeddings = F.normalize(query_embeddings.float(), dim=-1).to(bucket.embeddings.device)
+        similarities = query_embeddings @ bucket.embeddings.T
+        top_k_indices = similarities.topk(min(top_k, len(bucket)), dim=1).indices.tolist()
+        return [[tensor_to_image(bucket.patches[idx]) for idx in indices] for indices in top_k_indices]
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+    def __len__(self):
+        return len(self.reference_images)
@@ -0,0 +1,104 @@
+import contextlib
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import torch
+
+
+class StageTimer:
+    """
+    Measures named stages and reports them to a callback.
+
+    Stages never synchronize the device. On CUDA a stage records a pair of
+    CUDA events on the current stream and is reported by flush(), which
+    waits once for the last event; stages may therefore run once per
+    denoising step without serializing the GPU queue. On other devices the
+    wall time is reported when the stage ends.
+
+    Peak memory is measured once per timer (i.e. per page) rather than per
+    stage: with measure_peak on CUDA, the device's peak statistics are
+    reset when the timer is created and flush() reports the peak allocated
+    memory under the "model" stage. Resetting them is device-global, so
+    measure_peak must only be set when no other worker uses the device.
+    Other devices report no memory (the process's ru_maxrss is a lifetime
+    high-water mark, not a stage's peak).
+
+    Attributes:
+        device: Device the stages run on
+    """
+
+    def __init__(self, on_stage: Callable[[str, float, Optional[int]], None], device=None, measure_peak: bool = False):
+        """
+        Initialize the StageTimer.
+
+        Args:
+            on_stage: Called as on_stage(name, seconds, peak_memory_bytes)
+                for every stage; peak memory may be None
+            device: Device the stages run on; defaults to the CPU
+            measure_peak: Reset and report the CUDA peak memory of this
+                timer's stages (see the class docstring)
+        """
+        self.on_stage = on_stage
+        self.device = torch.device(device) if device is not None else torch.device("cpu")
+        self._deferred = self.device.type == "cuda"
+        self._measure_peak = measure_peak and self._deferred
+        # (name, start event, end event) of the stages not reported yet
+        self._pending: List[Tuple[str, "torch.cuda.Event", "torch.cuda.Event"]] = []
+        self._started = time.perf_counter()
+        if self._measure_peak:
+            torch.cuda.reset_peak_memory_stats(self.device)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time the body of the with-block as stage `name`.
+
+        The stage is recorded even if the body raises.
+        """
+        if not self._deferred:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.on_stage(name, time.perf_counter() - start, None)
+            return
+
+        start_event = torch.cuda.Event(enable_timing=True)
+        end_event = torch.cuda.Event(enable_timing=True)
+        stream = torch.cuda.current_stream(self.device)
+        start_event.record(stream)
+        try:
+            yield
+        finally:
+            end_event.record(stream)
+            self._pending.append((name, start_event, end_event))
+
+    def flush(self) -> None:
+        """
+        Report the stages recorded on CUDA, waiting once for them to finish.
+
+        With measure_peak, also reports a "model" stage covering the wall
+        time from the creation of the timer to this call and the peak
+        allocated memory meanwhile. Does nothing on other devices.
+        """
+        if not self._deferred:
+            return
+        pending, self._pending = self._pending, []
+        if pending:
+            pending[-1][2].synchronize()
+        for name, start_event, end_event in pending:
+            self.on_stage(name, start_event.elapsed_time(end_event) / 1000.0, None)
+        if self._measure_peak:
+            try:
+                peak = torch.cuda.max_memory_allocated(self.device)
+            except Exception:
+                peak = None
+            self.on_stage("model", time.perf_counter() - self._started, peak)
+            self._measure_peak = False
+
+
+def timed_stage(stage_timer: Optional[StageTimer], name: str):
+    """Return stage_timer.stage(name), or a no-op context when there is no timer."""
+    if stage_timer is None:
+        return contextlib.nullcontext()
+    return stage_timer.stage(name)
@@ -0,0 +1,96 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import torch
+import torch.nn as nn
+
+
+@dataclass
+class StyleWeights:
+    """Resident weights of one colorization style."""
+
+    adapter_name: str
+    controlnet: nn.Module
+    gsrp_model: nn.Module
+    # transformer tensors from the style checkpoint that are not LoRA weights, swapped in by pointer
+    extra_tensors: Dict[str, torch.Tensor] = field(default_factory=dict)
+
+
+class StyleBank:
+    """
+    Keeps the weights of every style resident so a style switch is a pointer swap.
+
+    The transformer LoRA of each style is loaded as a named PEFT adapter and activated with `set_adapter`. Every style
+    owns its own controlnet and GSRP head (`MultiHiddenResNetModel`) instance; switching swaps which instance the
+    pipeline uses. Non-LoRA tensors found in a LoRA checkpoint are kept per style and swapped into the transformer by
+    reassigning `.data`, so no checkpoint is read from disk after start-up.
+
+    Args:
+        transformer: The `CausalSparseDiTModel` shared by all styles.
+        lora_config: `peft.LoraConfig` used to create each style adapter.
+    """
+
+    def __init__(self, transformer: nn.Module, lora_config):
+        self.transformer = transformer
+        self.lora_config = lora_config
+        self.styles: Dict[str, StyleWeights] = {}
+        self.current_style: Optional[str] = None
+
+    def add_style(self, style: str, adapter_name: str, lora_state_dict: Dict[str, torch.Tensor], controlnet: nn.Module, gsrp_model: nn.Module):
+        """
+        Register a style from its transformer LoRA state dict, controlnet and GSRP head.
+
+        LoRA keys saved under the default PEFT adapter name are renamed to `adapter_name`.
+        """
+        if style in self.styles:
+            raise ValueError(f"Style already registered: {style}")
+
+        self.transformer.add_adapter(self.lora_config, adapter_name=adapter_name)
+        lora_tensors = {}
+        extra_tensors = {}
+        for key, value in lora_state_dict.items():
+            if "lora_" in key:
+                lora_tensors[key.replace(".default.", f".{adapter_name}.")] = value
+            else:
+                extra_tensors[key] = value
+        self.transformer.load_state_dict(lora_tensors, strict=False)
+
+        own_state = self.transformer.state_dict(keep_vars=True)
+        extra_tensors = {
+            key: value.to(device=own_state[key].device, dtype=own_state[key].dtype)
+            for key, value in extra_tensors.items()
+            if key in own_state
+        }
+
+        self.styles[style] = StyleWeights(adapter_name, controlnet, gsrp_model, extra_tensors)
+        self.current_style = None
+
+    def to(self, device=None, dtype=None) -> "StyleBank":
+        """Move every resident style to `device` / `dtype`."""
+        for weights in self.styles.values():
+            weights.controlnet.to(device, dtype=dtype)
+            weights.gsrp_model.to(device, dtype=dtype)
+            weights.extra_tensors = {
+                key: value.to(device=device, dtype=dtype if value.is_floating_point() else None)
+                for key, value in weights.extra_tensors.items()
+            }
+        return self
+
+    def activate(self, style: str) -> StyleWeights:
+        """
+        Make `style` the active style and return its weights.
+
+        Raises:
+            ValueError: If the style is not registered.
+        """
+        if style not in self.styles:
+            raise ValueError("Invalid style: {}".format(style))
+        weights = self.styles[style]
+        if style != self.current_style:
+            self.transformer.set_adapter(weights.adapter_name)
+            if weights.extra_tensors:
+                own_state = self.transformer.state_dict(keep_vars=True)
+                for key, value in weights.extra_tensors.items():
+                    own_state[key].data = value
+            self.current_style = style
+        return weights
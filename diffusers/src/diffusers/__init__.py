@@ -314,6 +314,7 @@ else:
             "PixArtAlphaPipeline",
             "ColorFlowPixArtAlphaPipeline",
             "CobraPixArtAlphaPipeline",
+            "CobraReferenceContext",
             "ColorFlowSDPipeline",
             "PixArtSigmaPAGPipeline",
             "PixArtSigmaPipeline",
@@ -772,6 +773,7 @@ if TYPE_CHECKING or DIFFUSERS_SLOW_IMPORT:
             PixArtAlphaPipeline,
             ColorFlowPixArtAlphaPipeline,
             CobraPixArtAlphaPipeline,
+            CobraReferenceContext,
             ColorFlowSDPipeline,
             PixArtSigmaPAGPipeline,
             PixArtSigmaPipeline,
@@ -11,7 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import Dict, Optional, Tuple, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import torch
 import torch.nn as nn
@@ -299,7 +299,8 @@ class AutoencoderKL(ModelMixin, ConfigMixin, FromOriginalModelMixin):
         return AutoencoderKLOutput(latent_dist=posterior)
 
     def _decode(self, z: torch.FloatTensor, return_dict: bool = True, hidden_list = None) -> Union[DecoderOutput, torch.FloatTensor]:
-        if self.use_tiling and (z.shape[-1] > self.tile_latent_min_size or z.shape[-2] > self.tile_latent_min_size):
+        # tiled_decode has no skip features; tile a hidden_list refinement with `tiled_refine` instead
+        if hidden_list is None and self.use_tiling and (z.shape[-1] > self.tile_latent_min_size or z.shape[-2] > self.tile_latent_min_size):
             return self.tiled_decode(z, return_dict=return_dict)
 
         z = self.post_quant_conv(z)
@@ -453,6 +454,83 @@ class AutoencoderKL(ModelMixin, ConfigMixin, FromOriginalModelMixin):
 
         return DecoderOutput(sample=dec)
 
+    def tiled_refine(
+        self,
+        x: torch.FloatTensor,
+        x_cond: torch.FloatTensor,
+        refine_hidden: Callable[[List[torch.Tensor], List[torch.Tensor]], List[torch.Tensor]],
+        tile_size: Optional[int] = None,
+        generator: Optional[torch.Generator] = None,
+    ) -> torch.FloatTensor:
+        r"""
+        Encode, refine and decode an image with skip features, tile by tile.
+
+        Each overlapping tile of `x` and `x_cond` is encoded with `hidden_flag=True`, `refine_hidden` maps the two
+        lists of encoder hidden states to the decoder's `hidden_list` (e.g. a GSRP `MultiHiddenResNetModel` on their
+        concatenation), and the tile's latent is decoded with that list. Decoded tiles are blended over their overlap
+        like in [`~AutoencoderKL.tiled_decode`]. Peak memory therefore depends on `tile_size` instead of the image
+        size, which keeps high-resolution refinement on fixed memory. With a `tile_size` at least as large as the
+        image, the result equals the untiled `_encode` / `_decode` path.
+
+        Args:
+            x (`torch.FloatTensor`): Image batch whose latent is decoded.
+            x_cond (`torch.FloatTensor`): Conditioning image batch of the same size, only used for its hidden states.
+            refine_hidden (`Callable`):
+                Called as `refine_hidden(hidden_list_x, hidden_list_cond)` for every tile; returns the decoder
+                `hidden_list`.
+            tile_size (`int`, *optional*):
+                Tile size in pixels; defaults to `tile_sample_min_size`. Tiles overlap by `tile_overlap_factor`.
+            generator (`torch.Generator`, *optional*):
+                Generator used to sample the posterior of every tile.
+
+        Returns:
+            `torch.FloatTensor`: The refined image batch, with the size of `x`.
+        """
+        if x.shape != x_cond.shape:
+            raise ValueError(f"x and x_cond must have the same shape, got {tuple(x.shape)} and {tuple(x_cond.shape)}")
+
+        scale_factor = 2 ** (len(self.config.block_out_channels) - 1)
+        tile_size = tile_size or self.tile_sample_min_size
+        overlap_size = int(tile_size * (1 - self.tile_overlap_factor))
+        if x.shape[-1] % scale_factor or x.shape[-2] % scale_factor or overlap_size % scale_factor:
+            raise ValueError(
+                f"Image size {tuple(x.shape[-2:])} and tile stride {overlap_size} must be multiples of {scale_factor}."
+            )
+        blend_extent = int(tile_size * self.tile_overlap_factor)
+        row_limit = tile_size - blend_extent
+
+        def refine_tile(tile, tile_cond):
+            posterior, hidden_list = self._encode(tile, return_dict=False, hidden_flag=True)
+            _, hidden_list_cond = self._encode(tile_cond, return_dict=False, hidden_flag=True)
+            hidden_list = refine_hidden(hidden_list, hidden_list_cond)
+            return self._decode(posterior.sample(generator), return_dict=False, hidden_list=hidden_list)[0]
+
+        if x.shape[-1] <= tile_size and x.shape[-2] <= tile_size:
+            return refine_tile(x, x_cond)
+
+        rows = []
+        for i in range(0, x.shape[2], overlap_size):
+            row = []
+            for j in range(0, x.shape[3], overlap_size):
+                tile = x[:, :, i : i + tile_size, j : j + tile_size]
+                tile_cond = x_cond[:, :, i : i + tile_size, j : j + tile_size]
+                row.append(refine_tile(tile, tile_cond))
+            rows.append(row)
+
+        result_rows = []
+        for i, row in enumerate(rows):
+            result_row = []
+            for j, tile in enumerate(row):
+                # blend the above tile and the left tile into the current tile
+                if i > 0:
+                    tile = self.blend_v(rows[i - 1][j], tile, blend_extent)
+                if j > 0:
+                    tile = self.blend_h(row[j - 1], tile, blend_extent)
+                result_row.append(tile[:, :, :row_limit, :row_limit])
+            result_rows.append(torch.cat(result_row, dim=3))
+
+        return torch.cat(result_rows, dim=2)
+
     def forward(
         self,
         sample: torch.FloatTensor,
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import math
+from functools import lru_cache
 from typing import List, Optional, Tuple, Union
 
 import numpy as np
@@ -288,6 +289,25 @@ class PatchEmbed(nn.Module):
         return (latent + pos_embed).to(latent.dtype)
 
 
+@lru_cache(maxsize=64)
+def _causal_pos_embed_slices(embed_dim, base_size, interpolation_scale, height, width, dtype, device):
+    pos_embed = get_2d_sincos_pos_embed(
+        embed_dim=embed_dim,
+        grid_size=(height, width * 2),
+        base_size=base_size,
+        interpolation_scale=interpolation_scale,
+    )
+    pos_all = torch.from_numpy(pos_embed).to(device=device, dtype=dtype)
+    # (height, 2 * width) grid -> 2 x 4 slots of (height / 2, width / 2)
+    h, w = height // 2, width // 2
+    pos_all = pos_all.reshape(2, h, 4, w, embed_dim).permute(0, 2, 1, 3, 4).reshape(8, h, w, embed_dim)
+    # slots 1, 2, 5, 6 form the page, the corner slots 0, 3, 4, 7 the four reference quadrants
+    pos_center = pos_all[[1, 2, 5, 6]].reshape(2, 2, h, w, embed_dim).permute(0, 2, 1, 3, 4)
+    pos_center = pos_center.reshape(1, height * width, embed_dim).contiguous()
+    pos_quadrants = tuple(pos_all[slot].reshape(1, h * w, embed_dim).contiguous() for slot in (0, 3, 4, 7))
+    return pos_center, pos_quadrants
+
+
 class CausalPatchEmbed(nn.Module):
     """2D Image to Patch Embedding with support for SD3 cropping."""
 
@@ -375,6 +395,20 @@ class CausalPatchEmbed(nn.Module):
         pos_embed = torch.from_numpy(pos_embed).float().unsqueeze(0)
         return pos_embed
 
+    def get_sliced_pos_embed(self, height, width, device=None, dtype=torch.float32):
+        """
+        Page and reference-quadrant positional embeddings for a `height` x `width` patch grid.
+
+        Returns `(pos_center, (pos_idx0, pos_idx1, pos_idx2, pos_idx3))`, where `pos_center` of shape
+        `(1, height * width, dim)` covers the page and each `pos_idx` of shape `(1, height * width / 4, dim)` one
+        reference quadrant. Results are cached per configuration, resolution, dtype and device and shared by every
+        `CausalPatchEmbed` with the same embedding settings, so they must not be modified in place.
+        """
+        device = torch.device(device) if device is not None else torch.device("cpu")
+        return _causal_pos_embed_slices(
+            self.pos_embed.shape[-1], self.base_size, self.interpolation_scale, height, width, dtype, device
+        )
+
     def forward(self, latent):
         latent = self.proj(latent)
         if self.flatten:
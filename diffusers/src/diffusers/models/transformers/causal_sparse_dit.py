@@ -241,6 +241,49 @@ class CausalSparseDiTModel(ModelMixin, ConfigMixin, PeftAdapterMixin):
             self.caption_projection = PixArtAlphaTextProjection(
                 in_features=self.config.caption_channels, hidden_size=self.inner_dim
             )
+        # projected captions keyed by (device, dtype), see `project_caption`
+        self._caption_cache = {}
+
+    def _caption_projection_state(self):
+        # identifies the caption_projection weights, including in-place reloads and PEFT adapter switches
+        state = []
+        for module in self.caption_projection.modules():
+            if hasattr(module, "active_adapters"):
+                state.append((tuple(module.active_adapters), module.disable_adapters, getattr(module, "merged", False)))
+        for param in self.caption_projection.parameters():
+            state.append((param.data_ptr(), param._version))
+        return tuple(state)
+
+    def project_caption(self, encoder_hidden_states: torch.Tensor) -> torch.Tensor:
+        """
+        Apply `caption_projection`, reusing the previous result for an unchanged caption tensor when grad is disabled.
+
+        Cobra conditions on one fixed prompt, so the text branch would otherwise recompute the same projection at every
+        denoising step of every page. The cache is keyed by the caption tensor's storage, version and shape and by the
+        state of the projection weights, so in-place weight loads and LoRA adapter changes invalidate it.
+        """
+        if torch.is_grad_enabled():
+            return self.caption_projection(encoder_hidden_states)
+
+        cache_key = (
+            encoder_hidden_states.data_ptr(),
+            encoder_hidden_states._version,
+            tuple(encoder_hidden_states.shape),
+            tuple(encoder_hidden_states.stride()),
+            self._caption_projection_state(),
+        )
+        slot = (encoder_hidden_states.device, encoder_hidden_states.dtype)
+        cached = self._caption_cache.get(slot)
+        if cached is not None and cached[0] == cache_key:
+            return cached[2]
+
+        projected = self.caption_projection(encoder_hidden_states)
+        # holding the input keeps its storage alive, so its data_ptr cannot be reused by another tensor
+        self._caption_cache[slot] = (cache_key, encoder_hidden_states, projected)
+        return projected
+
+    def clear_caption_cache(self):
+        self._caption_cache = {}
 
     def _set_gradient_checkpointing(self, module, value=False):
         if hasattr(module, "gradient_checkpointing"):
@@ -450,8 +493,9 @@ class CausalSparseDiTModel(ModelMixin, ConfigMixin, PeftAdapterMixin):
             K_cache_cur = []
             V_cache_cur = []
             N_ref = ref_hidden_states.shape[1]
-            if N_ref != sum(n_ref_lists[0]):
-                raise ValueError(f"Number of reference images ({N_ref}) does not match the sum of reference image counts ({sum(n_ref_lists[0])})")
+            for cur_n_ref_list in n_ref_lists:
+                if N_ref != sum(cur_n_ref_list):
+                    raise ValueError(f"Number of reference images ({N_ref}) does not match the sum of reference image counts ({sum(cur_n_ref_list)})")
 
             height_refs, width_refs = (
                 ref_hidden_states.shape[-2] // self.config.patch_size,
@@ -470,20 +514,9 @@ class CausalSparseDiTModel(ModelMixin, ConfigMixin, PeftAdapterMixin):
         hidden_states = self.pos_embed(hidden_states) # (b, l, c)
         # print('hidden_states',hidden_states.shape)
 
-        pos_all = self.pos_embed.get_pos_embed(height, width).to(hidden_states.device)
-        # print('pos_all',pos_all.shape)
-
-
-        pos_all = rearrange(pos_all, 'b (h w) c -> b h w c', h=height, w=width*2)
-        pos_all = rearrange(pos_all, 'b (ph h) (pw w) c -> b (ph pw) h w c', ph=2, pw=4)
-
-        if no_cache:
-            pos_idx0 = rearrange(pos_all[:,0,:,:,:], 'b h w c -> b (h w) c')
-            pos_idx1 = rearrange(pos_all[:,3,:,:,:], 'b h w c -> b (h w) c')
-            pos_idx2 = rearrange(pos_all[:,4,:,:,:], 'b h w c -> b (h w) c')
-            pos_idx3 = rearrange(pos_all[:,7,:,:,:], 'b h w c -> b (h w) c')
-        
-        pos_center = rearrange(rearrange(pos_all[:,[1,2,5,6],:,:,:], 'b (ph pw) h w c -> b (ph h) (pw w) c', ph=2, pw=2), 'b h w c -> b (h w) c')
+        pos_center, (pos_idx0, pos_idx1, pos_idx2, pos_idx3) = self.pos_embed.get_sliced_pos_embed(
+            height, width, device=hidden_states.device
+        )
 
         hidden_states = (hidden_states + pos_center).to(dtype=hidden_states.dtype)
 
@@ -537,7 +570,7 @@ class CausalSparseDiTModel(ModelMixin, ConfigMixin, PeftAdapterMixin):
         
 
         if self.caption_projection is not None:
-            encoder_hidden_states = self.caption_projection(encoder_hidden_states)
+            encoder_hidden_states = self.project_caption(encoder_hidden_states)
             encoder_hidden_states = encoder_hidden_states.view(batch_size, -1, hidden_states.shape[-1])
 
         # 2. Blocks
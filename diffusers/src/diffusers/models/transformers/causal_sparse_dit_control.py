@@ -419,14 +419,7 @@ class CausalSparseDiTControlModel(ModelMixin, ConfigMixin, PeftAdapterMixin):
         hidden_states = self.pos_embed(hidden_states) # (b, l, c)
         # print('hidden_states',hidden_states.shape)
 
-        pos_all = self.pos_embed.get_pos_embed(height, width).to(hidden_states.device)
-        # print('pos_all',pos_all.shape)
-
-
-        pos_all = rearrange(pos_all, 'b (h w) c -> b h w c', h=height, w=width*2)
-        pos_all = rearrange(pos_all, 'b (ph h) (pw w) c -> b (ph pw) h w c', ph=2, pw=4)
-
-        pos_center = rearrange(rearrange(pos_all[:,[1,2,5,6],:,:,:], 'b (ph pw) h w c -> b (ph h) (pw w) c', ph=2, pw=2), 'b h w c -> b (h w) c')
+        pos_center, _ = self.pos_embed.get_sliced_pos_embed(height, width, device=hidden_states.device)
 
         hidden_states = (hidden_states + pos_center).to(dtype=hidden_states.dtype)
 
@@ -247,7 +247,7 @@ else:
     _import_structure["pia"] = ["PIAPipeline"]
     _import_structure["pixart_alpha"] = ["PixArtAlphaPipeline", "PixArtSigmaPipeline"]
     _import_structure["colorflow"] = ["ColorFlowPixArtAlphaPipeline", "ColorFlowSDPipeline"]
-    _import_structure["cobra"] = ["CobraPixArtAlphaPipeline"]
+    _import_structure["cobra"] = ["CobraPixArtAlphaPipeline", "CobraReferenceContext"]
     _import_structure["semantic_stable_diffusion"] = ["SemanticStableDiffusionPipeline"]
     _import_structure["shap_e"] = ["ShapEImg2ImgPipeline", "ShapEPipeline"]
     _import_structure["stable_audio"] = [
@@ -580,7 +580,7 @@ if TYPE_CHECKING or DIFFUSERS_SLOW_IMPORT:
         from .pia import PIAPipeline
         from .pixart_alpha import PixArtAlphaPipeline, PixArtSigmaPipeline
         from .colorflow import ColorFlowPixArtAlphaPipeline, ColorFlowSDPipeline
-        from .cobra import CobraPixArtAlphaPipeline
+        from .cobra import CobraPixArtAlphaPipeline, CobraReferenceContext
         from .semantic_stable_diffusion import SemanticStableDiffusionPipeline
         from .shap_e import ShapEImg2ImgPipeline, ShapEPipeline
         from .stable_audio import StableAudioPipeline, StableAudioProjectionModel
@@ -22,7 +22,7 @@ except OptionalDependencyNotAvailable:
 
     _dummy_objects.update(get_objects_from_module(dummy_torch_and_transformers_objects))
 else:
-    _import_structure["pipeline_cobra_pixart"] = ["CobraPixArtAlphaPipeline"]
+    _import_structure["pipeline_cobra_pixart"] = ["CobraPixArtAlphaPipeline", "CobraReferenceContext"]
 
 if TYPE_CHECKING or DIFFUSERS_SLOW_IMPORT:
     try:
@@ -37,6 +37,7 @@ if TYPE_CHECKING or DIFFUSERS_SLOW_IMPORT:
             ASPECT_RATIO_512_BIN,
             ASPECT_RATIO_1024_BIN,
             CobraPixArtAlphaPipeline,
+            CobraReferenceContext,
         )
 
 else:
@@ -16,9 +16,13 @@ try:
     from torch_npu.contrib import transfer_to_npu
 except:
     print('torch_npu not found')
+import contextlib
+import hashlib
 import html
 import inspect
+import os
 import re
+from dataclasses import dataclass
 import numpy as np
 from PIL import Image
 import urllib.parse as ul
@@ -29,6 +33,7 @@ from transformers import T5EncoderModel, T5Tokenizer
 
 from ...image_processor import PixArtImageProcessor
 from ...models import AutoencoderKL, CausalSparseDiTModel, CausalSparseDiTControlModel
+from ...models.autoencoders.vae import DiagonalGaussianDistribution
 from ...schedulers import DPMSolverMultistepScheduler
 from ...utils import (
     BACKENDS_MAPPING,
@@ -52,6 +57,11 @@ if is_bs4_available():
 if is_ftfy_available():
     import ftfy
 
+# `prompt_tensor/` at the root of the Cobra checkout this vendored diffusers lives in
+DEFAULT_PROMPT_TENSOR_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), *([os.pardir] * 5), "prompt_tensor"
+)
+
 EXAMPLE_DOC_STRING = """
     Examples:
         ```py
@@ -205,6 +215,81 @@ def mask_to_tensor(PIL_image, normalize=True):
 
     return image_tensor
 
+
+@dataclass
+class CobraReferenceContext:
+    """
+    Reference-side K/V cache of the causal transformer, reusable across pages.
+
+    The reference tokens never attend to the page being colorized and are always embedded at timestep 0, so the
+    K/V tensors produced by the first denoising step only depend on the reference latents, their quadrant assignment,
+    the resolution and the loaded weights (style / LoRA). A context can therefore be handed back to the pipeline for
+    any later page sharing those inputs, which skips the reference VAE encode and the reference transformer pass.
+
+    Args:
+        K_cache (`List[torch.Tensor]`):
+            Per-block reference keys of shape `(batch, n_ref * tokens, inner_dim)`.
+        V_cache (`List[torch.Tensor]`):
+            Per-block reference values, same layout as `K_cache`.
+        num_ref_list (`List[int]`):
+            Number of references assigned to each of the four quadrants.
+        height (`int`):
+            Height in pixels of the `cond_input` the cache was built for.
+        width (`int`):
+            Width in pixels of the `cond_input` the cache was built for.
+        key (`str`, *optional*):
+            Identifier from [`CobraReferenceContext.build_key`], used by callers to look the context up.
+    """
+
+    K_cache: List[torch.Tensor]
+    V_cache: List[torch.Tensor]
+    num_ref_list: List[int]
+    height: int
+    width: int
+    key: Optional[str] = None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(t.numel() * t.element_size() for t in self.K_cache + self.V_cache)
+
+    def to(self, device=None, dtype=None) -> "CobraReferenceContext":
+        return CobraReferenceContext(
+            K_cache=[t.to(device=device, dtype=dtype) for t in self.K_cache],
+            V_cache=[t.to(device=device, dtype=dtype) for t in self.V_cache],
+            num_ref_list=list(self.num_ref_list),
+            height=self.height,
+            width=self.width,
+            key=self.key,
+        )
+
+    @staticmethod
+    def build_key(cond_refs: list, height: int, width: int, style: Optional[str] = None) -> str:
+        """
+        Hash the reference patches, their quadrant assignment, the resolution and the style into a cache key.
+
+        Args:
+            cond_refs (`list`):
+                The four per-quadrant lists of reference `PIL.Image.Image` passed to the pipeline.
+            height (`int`):
+                Height in pixels of `cond_input`.
+            width (`int`):
+                Width in pixels of `cond_input`.
+            style (`str`, *optional*):
+                Name of the loaded checkpoint / LoRA, so contexts from different weights never collide.
+
+        Returns:
+            `str`: Hex digest identifying the reference context.
+        """
+        digest = hashlib.sha1()
+        digest.update(f"{height}x{width}|{style}".encode())
+        for quadrant_idx, quadrant_refs in enumerate(cond_refs):
+            digest.update(f"|q{quadrant_idx}:{len(quadrant_refs)}".encode())
+            for ref in quadrant_refs:
+                digest.update(f"{ref.mode}{ref.size}".encode())
+                digest.update(ref.tobytes())
+        return digest.hexdigest()
+
+
 # Copied from diffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.retrieve_timesteps
 def retrieve_timesteps(
     scheduler,
@@ -322,6 +407,155 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
         self.vae_scale_factor = 2 ** (len(self.vae.config.block_out_channels) - 1)
         self.image_processor = PixArtImageProcessor(vae_scale_factor=self.vae_scale_factor)
 
+        # fixed T5 prompt embeddings, loaded once and kept per (device, dtype)
+        self.prompt_embeds = None
+        self.prompt_attention_mask = None
+        self._prompt_cache = {}
+
+    def load_prompt_embeds(self, prompt_tensor_dir: Optional[str] = None):
+        r"""
+        Load the fixed prompt embeddings Cobra conditions on.
+
+        Args:
+            prompt_tensor_dir (`str`, *optional*):
+                Directory containing `prompt_embeds.pt` and `prompt_attention_mask.pt`. Defaults to the
+                `COBRA_PROMPT_TENSOR_DIR` environment variable, then to `prompt_tensor/` at the root of the Cobra
+                checkout (`DEFAULT_PROMPT_TENSOR_DIR`), independently of the working directory.
+
+        Raises:
+            `FileNotFoundError`: If the directory does not exist, e.g. when diffusers is installed outside the Cobra
+                checkout and no directory is configured.
+        """
+        if prompt_tensor_dir is None:
+            prompt_tensor_dir = os.environ.get("COBRA_PROMPT_TENSOR_DIR") or os.path.normpath(DEFAULT_PROMPT_TENSOR_DIR)
+        if not os.path.isdir(prompt_tensor_dir):
+            raise FileNotFoundError(
+                f"Cobra prompt tensor directory {prompt_tensor_dir} does not exist; pass `prompt_tensor_dir` to "
+                "`load_prompt_embeds` or set the COBRA_PROMPT_TENSOR_DIR environment variable."
+            )
+        prompt_embeds = torch.load(os.path.join(prompt_tensor_dir, "prompt_embeds.pt"), map_location="cpu", weights_only=True)
+        prompt_attention_mask = torch.load(os.path.join(prompt_tensor_dir, "prompt_attention_mask.pt"), map_location="cpu", weights_only=True)
+        self.register_prompt_embeds(prompt_embeds, prompt_attention_mask)
+
+    def register_prompt_embeds(self, prompt_embeds: torch.Tensor, prompt_attention_mask: torch.Tensor):
+        r"""
+        Set the fixed prompt embeddings of shape `(seq_len, dim)` and their attention mask of shape `(seq_len,)`.
+        """
+        self.prompt_embeds = prompt_embeds
+        self.prompt_attention_mask = prompt_attention_mask
+        self._prompt_cache = {}
+
+    def _get_prompt_embeds(self, batch_size, device, dtype):
+        if self.prompt_embeds is None:
+            self.load_prompt_embeds()
+        cache_key = (torch.device(device), dtype)
+        if cache_key not in self._prompt_cache:
+            self._prompt_cache[cache_key] = (
+                self.prompt_embeds.to(device=device, dtype=dtype).unsqueeze(0),
+                self.prompt_attention_mask.to(device=device, dtype=dtype).unsqueeze(0),
+            )
+        prompt_embeds, prompt_attention_mask = self._prompt_cache[cache_key]
+        # expanded views share storage, so the transformer's caption projection cache hits across calls
+        return prompt_embeds.expand(batch_size, -1, -1), prompt_attention_mask.expand(batch_size, -1)
+
+    @staticmethod
+    def _timed_stage(stage_timer, name):
+        # `stage_timer` only needs a `stage(name)` context manager, e.g. `cobra_engine.StageTimer`
+        return stage_timer.stage(name) if stage_timer is not None else contextlib.nullcontext()
+
+    def reference_latent_key(self, cond_ref: Image.Image, width: int, height: int) -> str:
+        r"""
+        Content-addressed key of the VAE latent distribution of a reference patch.
+
+        The patch pixels identify both the reference image and the crop taken from it, so identical patches share a
+        key no matter which reference or quadrant they come from. The target size, the VAE dtype and the VAE
+        checkpoint are part of the key, so a persistent cache never mixes latents of different encodes.
+        """
+        digest = hashlib.sha1()
+        digest.update(f"{cond_ref.mode}{cond_ref.size}|{width}x{height}|{self.vae.dtype}|".encode())
+        digest.update(str(getattr(self.vae.config, "_name_or_path", "")).encode())
+        digest.update(cond_ref.tobytes())
+        return digest.hexdigest()
+
+    def encode_reference_latents(self, cond_refs, width, height, device, dtype, reference_latent_cache=None):
+        r"""
+        Sample the scaled VAE latents of the reference patches, encoding every distinct patch at most once.
+
+        Identical patches (the same patch is often retrieved for several quadrants) are encoded once per call, and
+        with a `reference_latent_cache` the latent distribution parameters are looked up before encoding and stored
+        after. Sampling happens on the assembled parameters of all patches, so the random draws match an uncached
+        encode of the full list.
+
+        Args:
+            cond_refs (`List[PIL.Image.Image]`): Reference patches in batch order.
+            width (`int`): Width the patches are resized to.
+            height (`int`): Height the patches are resized to.
+            device (`torch.device`): Device of the returned latents.
+            dtype (`torch.dtype`): Dtype the patches are prepared in before the VAE encode.
+            reference_latent_cache (*optional*):
+                Object with `get(key)` and `put(key, parameters)`, such as
+                `batch_processing.memory.ReferenceLatentCache`.
+
+        Returns:
+            `torch.Tensor`: Latents of shape `(len(cond_refs), C, height // 8, width // 8)`.
+        """
+        keys = [self.reference_latent_key(cond_ref, width, height) for cond_ref in cond_refs]
+        unique = {}
+        for cond_ref, key in zip(cond_refs, keys):
+            unique.setdefault(key, cond_ref)
+
+        parameters = {}
+        if reference_latent_cache is not None:
+            for key in unique:
+                cached = reference_latent_cache.get(key)
+                if cached is not None:
+                    parameters[key] = cached.to(device=device, dtype=self.vae.dtype)
+
+        missing = [key for key in unique if key not in parameters]
+        if missing:
+            images = self.prepare_image(
+                image=[unique[key] for key in missing],
+                width=width,
+                height=height,
+                batch_size=1,
+                num_images_per_prompt=1,
+                device=device,
+                dtype=dtype,
+            )
+            encoded = self.vae.encode(images.to(dtype=self.vae.dtype)).latent_dist.parameters
+            for key, key_parameters in zip(missing, encoded):
+                parameters[key] = key_parameters
+                if reference_latent_cache is not None:
+                    reference_latent_cache.put(key, key_parameters)
+
+        latent_dist = DiagonalGaussianDistribution(torch.stack([parameters[key] for key in keys]))
+        return latent_dist.sample() * self.vae.config.scaling_factor
+
+    @staticmethod
+    def _control_step_due(step, control_every_n_steps=1, control_max_steps=None):
+        r"""
+        Whether the controlnet runs on denoising `step`. The first step always runs it; afterwards it runs every
+        `control_every_n_steps` steps and never after the first `control_max_steps` steps.
+        """
+        if step == 0:
+            return True
+        if control_max_steps is not None and step >= control_max_steps:
+            return False
+        return step % control_every_n_steps == 0
+
+    @staticmethod
+    def _extrapolate_control(history, timestep):
+        r"""
+        Linearly extrapolate the control residuals to `timestep` from the last two computed `(timestep, residuals)`
+        entries of `history`. Falls back to the last residuals when fewer than two are available.
+        """
+        if len(history) < 2:
+            return history[-1][1]
+        (t0, control0), (t1, control1) = history[-2], history[-1]
+        if t1 == t0:
+            return control1
+        weight = (float(timestep) - t1) / (t1 - t0)
+        return [[c1[0] + (c1[0] - c0[0]) * weight] for c0, c1 in zip(control0, control1)]
 
     # Copied from diffusers.pipelines.stable_diffusion.pipeline_stable_diffusion.StableDiffusionPipeline.prepare_extra_step_kwargs
     def prepare_extra_step_kwargs(self, generator, eta):
@@ -458,6 +692,13 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
         cond_refs: list = None,
         hint_mask: PipelineImageInput = None,
         hint_color: PipelineImageInput = None,
+        reference_context: Optional[CobraReferenceContext] = None,
+        return_reference_context: bool = False,
+        reference_latent_cache=None,
+        control_every_n_steps: int = 1,
+        control_max_steps: Optional[int] = None,
+        control_reuse: str = "hold",
+        stage_timer=None,
         **kwargs,
     ) -> Union[ImagePipelineOutput, Tuple]:
         """
@@ -533,13 +774,50 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
                 `ASPECT_RATIO_1024_BIN`. After the produced latents are decoded into images, they are resized back to
                 the requested resolution. Useful for generating non-square images.
             max_sequence_length (`int` defaults to 120): Maximum sequence length to use with the `prompt`.
+            cond_input (`PIL.Image.Image` or `List[PIL.Image.Image]`):
+                Line-art page to colorize. Pass a list to denoise several pages of the same size in one batch; `hint_mask`,
+                `hint_color`, `cond_refs` and `reference_context` are then lists with one entry per page.
+            cond_refs (`list`):
+                Four per-quadrant lists of reference images at half the page size. Pages of a batch may split their
+                references differently across quadrants but must use the same total number of references.
+            hint_mask (`PIL.Image.Image` or `List[PIL.Image.Image]`):
+                Mask of the color hints at latent resolution.
+            hint_color (`PIL.Image.Image` or `List[PIL.Image.Image]`):
+                Color hints at page resolution.
+            reference_context ([`CobraReferenceContext`] or `List[CobraReferenceContext]`, *optional*):
+                Reference K/V cache from a previous call with the same references, resolution and weights. When given,
+                `cond_refs` is ignored and the reference branch of the transformer is skipped entirely. A single context
+                is shared by every page of a batch.
+            return_reference_context (`bool`, *optional*, defaults to `False`):
+                Whether to append the [`CobraReferenceContext`] used for this call (one per page for batched calls) to
+                the returned tuple.
+            reference_latent_cache (*optional*):
+                Cache of reference latent distributions keyed by [`~CobraPixArtAlphaPipeline.reference_latent_key`],
+                with `get(key)` and `put(key, parameters)` methods, such as
+                `batch_processing.memory.ReferenceLatentCache`. Cached references skip the VAE encode; identical
+                references within a call are encoded once either way.
+            control_every_n_steps (`int`, *optional*, defaults to 1):
+                Run the controlnet every `control_every_n_steps` denoising steps and reuse its residuals in between.
+                Its conditioning inputs are constant for a page, so only the noisy latent changes between steps. The
+                default runs it on every step.
+            control_max_steps (`int`, *optional*):
+                Run the controlnet only on the first `control_max_steps` steps and reuse its last residuals for the
+                rest of the schedule.
+            control_reuse (`str`, *optional*, defaults to `"hold"`):
+                How residuals are filled in on steps that skip the controlnet. `"hold"` reuses the last computed
+                residuals, `"linear"` extrapolates them in timestep from the last two computed steps.
+            stage_timer (*optional*):
+                Object whose `stage(name)` context manager times the `"vae_encode"`, `"controlnet"`, `"denoise"` and
+                `"vae_decode"` stages, such as `cobra_engine.StageTimer`. Stages that repeat per step are reported once
+                per step.
 
         Examples:
 
         Returns:
             [`~pipelines.ImagePipelineOutput`] or `tuple`:
                 If `return_dict` is `True`, [`~pipelines.ImagePipelineOutput`] is returned, otherwise a `tuple` is
-                returned where the first element is a list with the generated images
+                returned where the first element is a list with the generated images. With
+                `return_reference_context=True` the tuple is `(images, reference_context)`.
         """
         if "mask_feature" in kwargs:
             deprecation_message = "The use of `mask_feature` is deprecated. It is no longer used in any computation and that doesn't affect the end results. It will be removed in a future version."
@@ -559,16 +837,63 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
         #     orig_height, orig_width = height, width
         #     # height, width = self.image_processor.classify_height_width_bin(height, width, ratios=aspect_ratio_bin)
         #     height,width = orig_height,orig_width
-        width, height = cond_input.size
-        hint_width, hint_height = hint_color.size
-        if hint_width != width or hint_height != height:
-            raise ValueError(f"Width and height of hint_color must be the same as cond_input, but got {hint_width} and {hint_height} for cond_input with size {width} and {height}.")
-        for tmp_i in range(len(cond_refs)):
-            if cond_refs[tmp_i]!=[]:
-                width_ref, height_ref = cond_refs[tmp_i][0].size
-                break
-        if width_ref*2 != width or height_ref*2 != height:
-            raise ValueError(f"Width and height of cond_refs must be twice the size of cond_input, but got {width_ref} and {height_ref} for cond_input with size {width} and {height}.")
+        if not isinstance(control_every_n_steps, int) or control_every_n_steps < 1:
+            raise ValueError(f"`control_every_n_steps` has to be a positive integer but is {control_every_n_steps}.")
+        if control_max_steps is not None and control_max_steps < 1:
+            raise ValueError(f"`control_max_steps` has to be a positive integer but is {control_max_steps}.")
+        if control_reuse not in ("hold", "linear"):
+            raise ValueError(f"`control_reuse` has to be 'hold' or 'linear' but is {control_reuse}.")
+
+        # A single page is handled as a batch of one; batched calls pass one entry per page.
+        is_batched = isinstance(cond_input, (list, tuple))
+        cond_inputs = list(cond_input) if is_batched else [cond_input]
+        hint_colors = list(hint_color) if is_batched else [hint_color]
+        hint_masks = list(hint_mask) if is_batched else [hint_mask]
+        batch_size = len(cond_inputs)
+        if len(hint_colors) != batch_size or len(hint_masks) != batch_size:
+            raise ValueError(f"Got {batch_size} cond_input pages but {len(hint_colors)} hint_color and {len(hint_masks)} hint_mask entries.")
+
+        if reference_context is not None:
+            if isinstance(reference_context, (list, tuple)):
+                reference_contexts = list(reference_context)
+            else:
+                reference_contexts = [reference_context] * batch_size
+            if len(reference_contexts) != batch_size:
+                raise ValueError(f"Got {batch_size} cond_input pages but {len(reference_contexts)} reference contexts.")
+            cond_refs_list = None
+        else:
+            reference_contexts = None
+            cond_refs_list = list(cond_refs) if is_batched else [cond_refs]
+            if len(cond_refs_list) != batch_size:
+                raise ValueError(f"Got {batch_size} cond_input pages but {len(cond_refs_list)} cond_refs entries.")
+
+        width, height = cond_inputs[0].size
+        for page_idx in range(batch_size):
+            if cond_inputs[page_idx].size != (width, height):
+                page_width, page_height = cond_inputs[page_idx].size
+                raise ValueError(f"All pages of a batch must share one size, but page {page_idx} is {page_width}x{page_height} and page 0 is {width}x{height}.")
+            hint_width, hint_height = hint_colors[page_idx].size
+            if hint_width != width or hint_height != height:
+                raise ValueError(f"Width and height of hint_color must be the same as cond_input, but got {hint_width} and {hint_height} for cond_input with size {width} and {height}.")
+
+        width_ref, height_ref = width // 2, height // 2
+        if reference_contexts is not None:
+            for ctx in reference_contexts:
+                if ctx.width != width or ctx.height != height:
+                    raise ValueError(f"reference_context was built for {ctx.width}x{ctx.height} but cond_input is {width}x{height}.")
+            num_ref_lists = [list(ctx.num_ref_list) for ctx in reference_contexts]
+        else:
+            for page_refs in cond_refs_list:
+                for quadrant_refs in page_refs:
+                    for cond_ref in quadrant_refs:
+                        if cond_ref.size != (width_ref, height_ref):
+                            raise ValueError(f"Width and height of cond_refs must be half the size of cond_input, but got {cond_ref.size[0]} and {cond_ref.size[1]} for cond_input with size {width} and {height}.")
+            num_ref_lists = [[len(quadrant_refs) for quadrant_refs in page_refs] for page_refs in cond_refs_list]
+
+        # references of all pages are packed into one (batch, N_ref) block, so every page needs the same total
+        N_ref = sum(num_ref_lists[0])
+        if any(sum(num_ref_list) != N_ref for num_ref_list in num_ref_lists):
+            raise ValueError(f"Every page of a batch must use the same total number of references, got {[sum(num_ref_list) for num_ref_list in num_ref_lists]}.")
 
         self.check_inputs(
             height,
@@ -577,26 +902,14 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
         )
 
         # 2. Default height and width to transformer
-        batch_size = 1
-        n_ref_idx0 = len(cond_refs[0])
-        n_ref_idx1 = len(cond_refs[1])
-        n_ref_idx2 = len(cond_refs[2])
-        n_ref_idx3 = len(cond_refs[3])
-        cond_refs_idx0 = cond_refs[0]
-        cond_refs_idx1 = cond_refs[1]
-        cond_refs_idx2 = cond_refs[2]
-        cond_refs_idx3 = cond_refs[3]
-        N_ref = n_ref_idx0 + n_ref_idx1 + n_ref_idx2 + n_ref_idx3
-        num_ref_list = [n_ref_idx0, n_ref_idx1, n_ref_idx2, n_ref_idx3]
-        print('num_ref_list',num_ref_list)
+        logger.debug(f"num_ref_list: {num_ref_lists if is_batched else num_ref_lists[0]}")
         num_images_per_prompt = 1
 
         device = self._execution_device
 
-        prompt_embeds = torch.load('./prompt_tensor/prompt_embeds.pt').unsqueeze(0).repeat(batch_size * num_images_per_prompt, 1, 1)
-        prompt_embeds = prompt_embeds.to(dtype=self.transformer.dtype, device=device)
-        prompt_attention_mask = torch.load('./prompt_tensor/prompt_attention_mask.pt').unsqueeze(0).repeat(batch_size * num_images_per_prompt,1)
-        prompt_attention_mask = prompt_attention_mask.to(dtype=self.transformer.dtype, device=device)
+        prompt_embeds, prompt_attention_mask = self._get_prompt_embeds(
+            batch_size * num_images_per_prompt, device, self.transformer.dtype
+        )
 
         # here `guidance_scale` is defined analog to the guidance weight `w` of equation (2)
         # of the Imagen paper: https://arxiv.org/pdf/2205.11487.pdf . `guidance_scale = 1`
@@ -633,7 +946,7 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
 
 
         cond_input = self.prepare_image(
-            image=cond_input,
+            image=cond_inputs,
             width=width,
             height=height,
             batch_size=batch_size * num_images_per_prompt,
@@ -644,7 +957,7 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
         )
 
         hint_color = self.prepare_image(
-            image=hint_color,
+            image=hint_colors,
             width=width,
             height=height,
             batch_size=batch_size * num_images_per_prompt,
@@ -654,93 +967,20 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
             do_classifier_free_guidance=do_classifier_free_guidance,
         )
 
-        cond_refs_idx0 = [self.prepare_image(
-            image=cond_ref,
-            width=width_ref,
-            height=height_ref,
-            batch_size=batch_size * num_images_per_prompt,
-            num_images_per_prompt=num_images_per_prompt,
-            device=device,
-            dtype=self.controlnet.dtype,
-            do_classifier_free_guidance=do_classifier_free_guidance,
-        ) for cond_ref in cond_refs_idx0]
-        if len(cond_refs_idx0) > 0: 
-            cond_refs_idx0 = torch.cat(cond_refs_idx0, dim=0)
-        else:
-            cond_refs_idx0 = torch.zeros(0,0,0,0).to(dtype=self.controlnet.dtype, device=device)
-        cond_refs_idx1 = [self.prepare_image(
-            image=cond_ref,
-            width=width_ref,
-            height=height_ref,
-            batch_size=batch_size * num_images_per_prompt,
-            num_images_per_prompt=num_images_per_prompt,
-            device=device,
-            dtype=self.controlnet.dtype,
-            do_classifier_free_guidance=do_classifier_free_guidance,
-        ) for cond_ref in cond_refs_idx1]
-        if len(cond_refs_idx1) > 0:
-            cond_refs_idx1 = torch.cat(cond_refs_idx1, dim=0)
-        else:
-            cond_refs_idx1 = torch.zeros(0,0,0,0).to(dtype=self.controlnet.dtype, device=device)
-        cond_refs_idx2 = [self.prepare_image(
-            image=cond_ref,
-            width=width_ref,
-            height=height_ref,
-            batch_size=batch_size * num_images_per_prompt,
-            num_images_per_prompt=num_images_per_prompt,
-            device=device,
-            dtype=self.controlnet.dtype,
-            do_classifier_free_guidance=do_classifier_free_guidance,
-        ) for cond_ref in cond_refs_idx2]
-        if len(cond_refs_idx2) > 0:
-            cond_refs_idx2 = torch.cat(cond_refs_idx2, dim=0)
-        else:
-            cond_refs_idx2 = torch.zeros(0,0,0,0).to(dtype=self.controlnet.dtype, device=device)
-        cond_refs_idx3 = [self.prepare_image(
-            image=cond_ref,
-            width=width_ref,
-            height=height_ref,
-            batch_size=batch_size * num_images_per_prompt,
-            num_images_per_prompt=num_images_per_prompt,
-            device=device,
-            dtype=self.controlnet.dtype,
-            do_classifier_free_guidance=do_classifier_free_guidance,
-        ) for cond_ref in cond_refs_idx3]
-        if len(cond_refs_idx3) > 0:
-            cond_refs_idx3 = torch.cat(cond_refs_idx3, dim=0)
-        else:
-            cond_refs_idx3 = torch.zeros(0,0,0,0).to(dtype=self.controlnet.dtype, device=device)
-
-        all_cond_refs = []
-        if num_ref_list[0] != 0:
-            all_cond_refs.append(cond_refs_idx0)
-        if num_ref_list[1] != 0:
-            all_cond_refs.append(cond_refs_idx1)
-        if num_ref_list[2] != 0:
-            all_cond_refs.append(cond_refs_idx2)
-        if num_ref_list[3] != 0:
-            all_cond_refs.append(cond_refs_idx3)
-        cond_refs = torch.cat(all_cond_refs, dim=0)
-        # print('cond_refs',cond_refs.shape)
-
-        hint_mask = mask_to_tensor(hint_mask).to(dtype=self.controlnet.dtype, device=device)
-        # print('pipeline hint_mask',torch.max(hint_mask),torch.min(hint_mask))
-        # hint_mask_pil = transforms.ToPILImage()(hint_mask[0,:,:,:])
-        # hint_mask_pil.save('hint_mask.png')
-
-        
-
 
+        hint_mask = torch.cat([mask_to_tensor(page_hint_mask) for page_hint_mask in hint_masks], dim=0).to(dtype=self.controlnet.dtype, device=device)
 
         height, width = cond_input.shape[-2:]
-        # print(self.vae.dtype, self.controlnet.dtype, cond_image.dtype)
-        cond_input_latent = self.vae.encode(cond_input.to(dtype = self.vae.dtype)).latent_dist.sample() * self.vae.config.scaling_factor
-        cond_refs_latent=self.vae.encode(cond_refs.to(dtype = self.vae.dtype)).latent_dist.sample() * self.vae.config.scaling_factor
-        hint_color_latent = self.vae.encode(hint_color.to(dtype = self.vae.dtype)).latent_dist.sample() * self.vae.config.scaling_factor
-
-
-        cond_refs_latent = cond_refs_latent.unsqueeze(0) # 1 n_ref c h w
-        # print('cond_refs_latent',cond_refs_latent.shape)
+        with self._timed_stage(stage_timer, "vae_encode"):
+            cond_input_latent = self.vae.encode(cond_input.to(dtype = self.vae.dtype)).latent_dist.sample() * self.vae.config.scaling_factor
+            if reference_contexts is None:
+                # page-major, quadrant-minor order matches the per-page n_ref_lists
+                flat_cond_refs = [cond_ref for page_refs in cond_refs_list for quadrant_refs in page_refs for cond_ref in quadrant_refs]
+                cond_refs_latent = self.encode_reference_latents(
+                    flat_cond_refs, width_ref, height_ref, device, self.controlnet.dtype, reference_latent_cache
+                )
+                cond_refs_latent = rearrange(cond_refs_latent, '(b n_ref) c h w -> b n_ref c h w', b=batch_size)
+            hint_color_latent = self.vae.encode(hint_color.to(dtype = self.vae.dtype)).latent_dist.sample() * self.vae.config.scaling_factor
 
         # 6. Prepare extra step kwargs. TODO: Logic should ideally just be moved out of the pipeline
         extra_step_kwargs = self.prepare_extra_step_kwargs(generator, eta)
@@ -760,8 +1000,21 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
         num_warmup_steps = max(len(timesteps) - num_inference_steps * self.scheduler.order, 0)
 
 
-        K_cache = None
-        V_cache = None
+        if reference_contexts is not None:
+            K_cache = [
+                torch.cat([ctx.K_cache[block_idx] for ctx in reference_contexts], dim=0).to(device=device, dtype=self.transformer.dtype)
+                for block_idx in range(len(reference_contexts[0].K_cache))
+            ]
+            V_cache = [
+                torch.cat([ctx.V_cache[block_idx] for ctx in reference_contexts], dim=0).to(device=device, dtype=self.transformer.dtype)
+                for block_idx in range(len(reference_contexts[0].V_cache))
+            ]
+        else:
+            K_cache = None
+            V_cache = None
+
+        # (timestep, residuals) of the steps the controlnet actually ran on
+        control_history = []
 
         with self.progress_bar(total=num_inference_steps) as progress_bar:
             for i, t in enumerate(timesteps):
@@ -788,66 +1041,75 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
                 # broadcast to batch dimension in a way that's compatible with ONNX/Core ML
                 current_timestep = current_timestep.expand(latent_model_input.shape[0])
 
-                control_input = torch.concat([latent_model_input, cond_input_latent, hint_color_latent, hint_mask],1)
-
-                control_list = self.controlnet(
-                    control_input,
-                    encoder_hidden_states=None,
-                    encoder_attention_mask=None,
-                    timestep=current_timestep,
-                    added_cond_kwargs=added_cond_kwargs,
-                    return_dict=False,
-                )[0]
-
-                if no_cache:
-                    noise_pred, K_cache, V_cache = self.transformer(
-                        latent_model_input.to(dtype=self.transformer.dtype),
-                        cond_refs_latent.to(dtype=self.transformer.dtype),
-                        n_ref_lists = [num_ref_list],
-                        encoder_hidden_states=prompt_embeds.to(dtype=self.transformer.dtype),
-                        encoder_attention_mask=prompt_attention_mask,
-                        timestep=current_timestep,
-                        added_cond_kwargs=added_cond_kwargs,
-                        control_list = control_list,
-                        return_dict=False,
-                        K_cache=None,
-                        V_cache=None,
-                    )
+                if self._control_step_due(i, control_every_n_steps, control_max_steps):
+                    control_input = torch.concat([latent_model_input, cond_input_latent, hint_color_latent, hint_mask],1)
+
+                    with self._timed_stage(stage_timer, "controlnet"):
+                        control_list = self.controlnet(
+                            control_input,
+                            encoder_hidden_states=None,
+                            encoder_attention_mask=None,
+                            timestep=current_timestep,
+                            added_cond_kwargs=added_cond_kwargs,
+                            return_dict=False,
+                        )[0]
+                    control_history = control_history[-1:] + [(float(t), control_list)]
+                elif control_reuse == "linear":
+                    control_list = self._extrapolate_control(control_history, t)
                 else:
-                    noise_pred, _, _ = self.transformer(
-                        latent_model_input.to(dtype=self.transformer.dtype),
-                        None,
-                        n_ref_lists = None,
-                        encoder_hidden_states=prompt_embeds.to(dtype=self.transformer.dtype),
-                        encoder_attention_mask=prompt_attention_mask,
-                        timestep=current_timestep,
-                        added_cond_kwargs=added_cond_kwargs,
-                        control_list = control_list,
-                        return_dict=False,
-                        K_cache=K_cache,
-                        V_cache=V_cache,
-                    )
-
-                # learned sigma
-                if self.transformer.config.out_channels // 2 == latent_channels:
-                    noise_pred = noise_pred.chunk(2, dim=1)[0]
-                else:
-                    noise_pred = noise_pred
+                    control_list = control_history[-1][1]
+
+                with self._timed_stage(stage_timer, "denoise"):
+                    if no_cache:
+                        noise_pred, K_cache, V_cache = self.transformer(
+                            latent_model_input.to(dtype=self.transformer.dtype),
+                            cond_refs_latent.to(dtype=self.transformer.dtype),
+                            n_ref_lists = num_ref_lists,
+                            encoder_hidden_states=prompt_embeds.to(dtype=self.transformer.dtype),
+                            encoder_attention_mask=prompt_attention_mask,
+                            timestep=current_timestep,
+                            added_cond_kwargs=added_cond_kwargs,
+                            control_list = control_list,
+                            return_dict=False,
+                            K_cache=None,
+                            V_cache=None,
+                        )
+                    else:
+                        noise_pred, _, _ = self.transformer(
+                            latent_model_input.to(dtype=self.transformer.dtype),
+                            None,
+                            n_ref_lists = None,
+                            encoder_hidden_states=prompt_embeds.to(dtype=self.transformer.dtype),
+                            encoder_attention_mask=prompt_attention_mask,
+                            timestep=current_timestep,
+                            added_cond_kwargs=added_cond_kwargs,
+                            control_list = control_list,
+                            return_dict=False,
+                            K_cache=K_cache,
+                            V_cache=V_cache,
+                        )
+
+                    # learned sigma
+                    if self.transformer.config.out_channels // 2 == latent_channels:
+                        noise_pred = noise_pred.chunk(2, dim=1)[0]
+                    else:
+                        noise_pred = noise_pred
 
-                # compute previous image: x_t -> x_t-1
-                if num_inference_steps == 1:
+                    # compute previous image: x_t -> x_t-1
+                    if num_inference_steps == 1:
 
-                    latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).pred_original_sample
+                        latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs).pred_original_sample
 
-                else:
-                    latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
+                    else:
+                        latents = self.scheduler.step(noise_pred, t, latents, **extra_step_kwargs, return_dict=False)[0]
 
                 # call the callback, if provided
                 if i == len(timesteps) - 1 or ((i + 1) > num_warmup_steps and (i + 1) % self.scheduler.order == 0):
                     progress_bar.update()
         ref_out_idx = 0
         if not output_type == "latent":
-            image = self.vae.decode(latents.to(dtype = self.vae.dtype) / self.vae.config.scaling_factor, return_dict=False)[0]
+            with self._timed_stage(stage_timer, "vae_decode"):
+                image = self.vae.decode(latents.to(dtype = self.vae.dtype) / self.vae.config.scaling_factor, return_dict=False)[0]
         else:
             image = latents
 
@@ -856,4 +1118,22 @@ class CobraPixArtAlphaPipeline(DiffusionPipeline):
         # Offload all models
         self.maybe_free_model_hooks()
 
+        if return_reference_context:
+            if reference_context is None:
+                # copy the pages of a batch apart, so a cached context does not keep the whole batch's K/V alive
+                # (every page has the same reference total, so the slices carry no padding)
+                reference_context = [
+                    CobraReferenceContext(
+                        K_cache=[k[page_idx : page_idx + 1].clone() if k.shape[0] > 1 else k for k in K_cache],
+                        V_cache=[v[page_idx : page_idx + 1].clone() if v.shape[0] > 1 else v for v in V_cache],
+                        num_ref_list=num_ref_lists[page_idx],
+                        height=height,
+                        width=width,
+                    )
+                    for page_idx in range(batch_size)
+                ]
+                if not is_batched:
+                    reference_context = reference_context[0]
+            return (image, reference_context)
+
         return (image,)